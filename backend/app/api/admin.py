@@ -0,0 +1,308 @@
+"""
+Admin diagnostics API for CIMEIKA
+Production profiling and introspection, protected by X-ADMIN-KEY
+"""
+import asyncio
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from app.core.security import verify_admin_key
+from app.core.audit_log import get_audit_log
+from app.core.heap import get_store_sizes, heap_tracker
+from app.core.profiler import ProfilerBusyError, endpoint_codes, profiler
+from app.core.slow_requests import get_latency_budgets, slow_request_log
+from app.core.logging import get_logger
+from app.engines.rule_packs import RulePackError, get_rule_registry
+from app.engines.rule_stats import SORT_KEYS, rule_stats
+
+logger = get_logger(__name__)
+GroupBy = Literal["lineno", "filename", "traceback"]
+RuleSort = Literal[SORT_KEYS]
+
+router = APIRouter(
+    prefix="/api/admin",
+    tags=["admin"],
+    dependencies=[Depends(verify_admin_key)],
+    include_in_schema=False
+)
+
+
+@router.get("/profile")
+async def profile(
+    request: Request,
+    seconds: float = Query(5.0, gt=0, le=30, description="Profile duration"),
+    interval_ms: float = Query(5.0, ge=1, le=1000, description="Sampling interval"),
+    format: Literal["collapsed", "speedscope"] = Query("collapsed", description="Output format"),
+    route: Optional[str] = Query(None, description="Keep only stacks serving this route template")
+):
+    """
+    Sample all threads for a while and return the aggregated stacks
+    
+    The sampler runs on a worker thread, so the event loop keeps serving
+    traffic (and shows up in the profile) while it runs.
+    
+    Returns:
+        Collapsed stacks (text/plain) or speedscope JSON
+    """
+    codes = None
+    if route is not None:
+        codes = endpoint_codes(request.app, route)
+        if not codes:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown route: {route}")
+    
+    logger.info(f"Profiling for {seconds}s every {interval_ms}ms (route={route})")
+    try:
+        result = await asyncio.to_thread(profiler.run, seconds, interval_ms / 1000, codes)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    
+    headers = {"X-Profile-Samples": str(result.samples)}
+    if format == "speedscope":
+        return JSONResponse(result.speedscope(name=route or "cimeika"), headers=headers)
+    return PlainTextResponse(result.collapsed(), headers=headers)
+
+
+@router.get("/heap")
+async def heap_status():
+    """
+    tracemalloc state, kept snapshots and in-process store sizes
+    
+    Returns:
+        dict: {"tracing", "traced_bytes", "peak_bytes", "snapshots", "stores"}
+    """
+    traced, peak = tracemalloc.get_traced_memory()
+    return {
+        "tracing": heap_tracker.tracing,
+        "traced_bytes": traced,
+        "peak_bytes": peak,
+        "snapshots": heap_tracker.snapshots(),
+        "stores": await asyncio.to_thread(get_store_sizes),
+    }
+
+
+@router.get("/heap/stores")
+async def heap_stores():
+    """
+    Entries and estimated bytes of each known in-process store
+    
+    Works without tracemalloc.
+    """
+    return await asyncio.to_thread(get_store_sizes)
+
+
+@router.post("/heap/start")
+async def heap_start(frames: int = Query(10, ge=1, le=50, description="Frames stored per allocation")):
+    """
+    Start tracing allocations (slows down every allocation until stopped)
+    """
+    heap_tracker.start(frames)
+    logger.warning(f"tracemalloc started ({frames} frames)")
+    return {"tracing": True, "frames": tracemalloc.get_traceback_limit()}
+
+
+@router.post("/heap/stop")
+async def heap_stop():
+    """Stop tracing allocations and drop all snapshots"""
+    heap_tracker.stop()
+    logger.info("tracemalloc stopped")
+    return {"tracing": False}
+
+
+@router.post("/heap/snapshots")
+async def heap_snapshot(
+    limit: int = Query(20, ge=1, le=500, description="Allocation sites to return"),
+    group_by: GroupBy = Query("lineno", description="Group allocations by")
+):
+    """
+    Take a snapshot and return its largest allocation sites
+    
+    Returns:
+        dict: {"id", "taken_at", "traced_bytes", "top", "stores"}
+    """
+    try:
+        record = await asyncio.to_thread(heap_tracker.take)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    top = await asyncio.to_thread(heap_tracker.top, record["id"], limit, group_by)
+    return {
+        "id": record["id"],
+        "taken_at": record["taken_at"],
+        "traced_bytes": record["traced_bytes"],
+        "top": top,
+        "stores": record["stores"],
+    }
+
+
+@router.get("/heap/snapshots/{snapshot_id}")
+async def heap_snapshot_top(
+    snapshot_id: int,
+    limit: int = Query(20, ge=1, le=500, description="Allocation sites to return"),
+    group_by: GroupBy = Query("lineno", description="Group allocations by")
+):
+    """Largest allocation sites of a kept snapshot"""
+    try:
+        top = await asyncio.to_thread(heap_tracker.top, snapshot_id, limit, group_by)
+    except KeyError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown snapshot: {snapshot_id}")
+    return {"id": snapshot_id, "top": top}
+
+
+@router.get("/heap/diff")
+async def heap_diff(
+    base: int = Query(..., description="Older snapshot id"),
+    target: int = Query(..., description="Newer snapshot id"),
+    limit: int = Query(20, ge=1, le=500, description="Allocation sites to return"),
+    group_by: GroupBy = Query("lineno", description="Group allocations by")
+):
+    """
+    Allocation sites and stores that grew between two snapshots
+    
+    Returns:
+        dict: {"base", "target", "elapsed_seconds", "traced_bytes_diff", "sites", "stores"}
+    """
+    try:
+        return await asyncio.to_thread(heap_tracker.diff, base, target, limit, group_by)
+    except KeyError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown snapshot: {e.args[0]}")
+
+
+@router.get("/slow-requests")
+async def slow_requests(
+    route: Optional[str] = Query(None, description="Only this route template"),
+    min_ms: float = Query(0, ge=0, description="Only requests at least this slow"),
+    limit: int = Query(50, ge=1, le=500, description="Maximum number of requests")
+):
+    """
+    Recent requests that exceeded their latency budget, newest first
+    
+    Returns:
+        dict: {"captured", "budgets", "requests": [summary]}; the full
+        diagnostics bundle is at /slow-requests/{id}
+    """
+    entries = slow_request_log.query(route=route, min_duration_ms=min_ms, limit=limit)
+    return {
+        "captured": slow_request_log.captured,
+        "budgets": get_latency_budgets().to_dict(),
+        "requests": [
+            {
+                "id": entry["id"],
+                "captured_at": entry["captured_at"],
+                "method": entry["method"],
+                "route": entry["route"],
+                "status": entry["status"],
+                "duration_ms": entry["duration_ms"],
+                "budget_ms": entry["budget_ms"],
+                "sql_queries": len(entry["sql"]),
+                "sql_ms": entry["sql_ms"],
+                "trace_id": entry["trace_id"],
+            }
+            for entry in entries
+        ],
+    }
+
+
+@router.get("/slow-requests/{request_id}")
+async def slow_request(request_id: int):
+    """
+    Diagnostics bundle of one slow request
+    
+    Returns:
+        dict: Route, sanitized params, status, timings, SQL statements, span
+        tree and the stack at the moment the budget was exceeded
+    """
+    entry = slow_request_log.get(request_id)
+    if entry is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown slow request: {request_id}")
+    return entry
+
+
+@router.get("/audit")
+async def audit(
+    since: Optional[datetime] = Query(None, description="Only entries at or after this time (UTC if naive)"),
+    until: Optional[datetime] = Query(None, description="Only entries before this time"),
+    path: Optional[str] = Query(None, description="Only paths starting with this"),
+    status_code: Optional[str] = Query(
+        None, alias="status", pattern=r"^[1-5](\d\d|xx)$", description="Status code (404) or class (5xx)"
+    ),
+    percentile: Optional[float] = Query(
+        None, gt=0, le=100, description="Only entries at or above this latency percentile of the matches"
+    ),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of entries")
+):
+    """
+    Audit log entries, newest first
+    
+    Searches the stored files when AUDIT_LOG_DIR is set (every worker's
+    entries, within AUDIT_LOG_FLUSH_INTERVAL), otherwise this process's
+    in-memory ring.
+    
+    Returns:
+        dict: {"source", "matched", "threshold_ms", "entries", "store"}
+    """
+    audit_log = get_audit_log()
+    result = await asyncio.to_thread(audit_log.query, since, until, path, status_code, percentile, limit)
+    result["store"] = audit_log.stats()
+    return result
+
+
+@router.get("/rules")
+async def rules():
+    """
+    Loaded rule packs and their reload history
+    
+    Returns:
+        dict: Rule set version, packs, reload/failure counts and last error
+    """
+    return get_rule_registry().status()
+
+
+@router.get("/rules/stats")
+async def rules_stats(sort: RuleSort = Query("seconds", description="Order, highest first")):
+    """
+    Evaluations, matches and cost of each rule in this process
+    
+    Returns:
+        dict: {"since", "rules_version", "never_matched": [current rules
+        without a match], "patterns": [RuleStats.snapshot entries]}
+    """
+    rules = get_rule_registry().rules
+    names = [pattern.name for pattern in rules.patterns]
+    patterns = rule_stats.snapshot(names, sort)
+    return {
+        "since": datetime.fromtimestamp(rule_stats.since, timezone.utc).isoformat(),
+        "rules_version": rules.version,
+        "never_matched": [entry["pattern"] for entry in patterns if entry["pattern"] in names and not entry["matches"]],
+        "patterns": patterns,
+    }
+
+
+@router.post("/rules/stats/reset")
+async def rules_stats_reset():
+    """
+    Start the rule statistics of this process over
+    
+    Returns:
+        dict: {"since"}
+    """
+    rule_stats.reset()
+    return {"since": datetime.fromtimestamp(rule_stats.since, timezone.utc).isoformat()}
+
+
+@router.post("/rules/reload")
+async def rules_reload():
+    """
+    Reload the rule pack files now
+    
+    Returns:
+        dict: Status of the new rules (as GET /rules)
+    """
+    registry = get_rule_registry()
+    try:
+        await asyncio.to_thread(registry.reload)
+    except RulePackError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    logger.info(f"Rule packs reloaded on request: version {registry.rules.version}")
+    return registry.status()
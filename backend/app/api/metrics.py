@@ -0,0 +1,21 @@
+"""
+Metrics exposition endpoint for CIMEIKA API
+Serves Prometheus text format for scraping
+"""
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from app.core.prometheus import REGISTRY, CONTENT_TYPE_LATEST
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics() -> Response:
+    """
+    Prometheus scrape endpoint
+    
+    Returns:
+        Response: All registered metrics in text exposition format 0.0.4
+    """
+    return Response(content=REGISTRY.generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -2,12 +2,24 @@
 Participant API for CI/CD integration
 Handles analysis of CI failures and provides actionable guidance
 """
-from fastapi import APIRouter, Depends, Request, status
+import asyncio
+import codecs
+import json
+import time
+from functools import partial
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional, Literal
+from typing import AsyncIterator, List, Dict, Any, Optional, Literal
 from datetime import datetime, timezone
 
+from app.core import heap
+from app.core.audit_log import get_audit_log
+from app.core.config import settings
 from app.core.security import verify_api_key
+from app.core.quota import get_quota_engine
+from app.core.rate_limit import RateLimitResult
+from app.core.result_cache import get_result_cache
 from app.core.metrics import (
     increment_interaction_count,
     update_participant_last_call,
@@ -15,13 +27,15 @@ from app.core.metrics import (
     record_error
 )
 from app.core.logging import get_logger
-from app.engines.rule_engine import RuleEngine
+from app.engines.artifacts import get_artifact_scanner
+from app.engines.fingerprint import Fingerprint, fingerprint_log, get_failure_index, text_digest
+from app.engines.rule_engine import RuleEngine, StreamAnalysis
 
 logger = get_logger(__name__)
 router = APIRouter(prefix="/api/participant", tags=["participant"])
 
-# Initialize rule engine
-rule_engine = RuleEngine()
+# Initialize rule engine (repeated logs are served from the result cache)
+rule_engine = RuleEngine(cache=get_result_cache())
 
 
 # Request/Response Schemas
@@ -64,10 +78,91 @@ class Action(BaseModel):
     details: str = Field(..., description="Action details")
 
 
+class MatchLocation(BaseModel):
+    """Where a pattern matched in the input text"""
+    line: int = Field(..., description="1-based line number")
+    start: int = Field(..., description="Start offset (characters)")
+    end: int = Field(..., description="End offset (characters)")
+    byte_start: int = Field(..., description="Start offset (UTF-8 bytes)")
+    byte_end: int = Field(..., description="End offset (UTF-8 bytes)")
+    excerpt: str = Field(..., description="The matching line (up to 200 characters)")
+
+
+class PatternMatchResult(BaseModel):
+    """A recognized failure pattern"""
+    pattern: str = Field(..., description="Pattern name")
+    message: str = Field(..., description="Pattern guidance message")
+    severity: Literal["info", "warn", "error"] = Field(..., description="Pattern severity")
+    score: float = Field(..., description="Confidence score, 0..1")
+    count: int = Field(..., description="Number of matches (capped at 1000)")
+    locations: List[MatchLocation] = Field(default_factory=list, description="First matches and the last one")
+    artifact: Optional[str] = Field(None, description="Artifact the locations refer to (None for the text)")
+
+
+class ArtifactScan(BaseModel):
+    """How an artifact was scanned"""
+    name: str = Field(..., description="Artifact name")
+    status: Literal["ok", "too_large", "invalid", "timeout", "error"] = Field(
+        ..., description="ok, too_large (skipped), invalid (not base64), timeout (partial matches) or error"
+    )
+    bytes: int = Field(..., description="Decoded size (estimated if not decoded)")
+    elapsed_ms: float = Field(..., description="Scan time")
+
+
+class BudgetReport(BaseModel):
+    """Rules left out of an analysis that exceeded its CPU budget"""
+    pattern: str = Field(..., description="Rule that was running when the budget ran out")
+    skipped: List[str] = Field(default_factory=list, description="Rules not evaluated")
+    cpu_ms: float = Field(..., description="CPU time spent matching")
+    budget_ms: float = Field(..., description="CPU budget (RULE_CPU_BUDGET)")
+
+
+class FailureRun(BaseModel):
+    """A CI run whose log was fingerprinted"""
+    at: str = Field(..., description="When the log was analyzed (ISO 8601, UTC)")
+    repo: Optional[str] = Field(None, description="Repository name")
+    run_id: Optional[str] = Field(None, description="CI run ID")
+    pr: Optional[int] = Field(None, description="Pull request number")
+
+
+class FailureCluster(BaseModel):
+    """Runs whose logs failed the same way"""
+    id: str = Field(..., description="Cluster id (fingerprint of its first log)")
+    seen: int = Field(..., description="Runs in the cluster")
+    first_seen: FailureRun = Field(..., description="First run of the cluster")
+    last_seen: FailureRun = Field(..., description="Latest run of the cluster")
+    repos: List[str] = Field(default_factory=list, description="Repositories the failure was seen in")
+    fingerprints: int = Field(..., description="Distinct fingerprints in the cluster")
+    lines: List[str] = Field(default_factory=list, description="Normalized error lines of its first log")
+
+
+class FailureMatch(BaseModel):
+    """How a log matched the known failures"""
+    fingerprint: str = Field(..., description="Fingerprint of the log (GET /failures/{fingerprint})")
+    match: Literal["new", "exact", "similar"] = Field(
+        ..., description="new cluster, exact (same fingerprint seen before) or similar (near-duplicate)"
+    )
+    short_circuit: bool = Field(..., description="Only the rules that matched this exact log before were run")
+    cluster: FailureCluster = Field(..., description="The failure cluster")
+
+
+class FailureLookup(FailureCluster):
+    """A failure cluster with a one-line summary"""
+    summary: str = Field(..., description='e.g. "seen 3 times, first at run 1234"')
+
+
 class ParticipantOutputs(BaseModel):
     """Participant response outputs"""
     patch_unified_diff: Optional[str] = Field(None, description="Unified diff patch (if available)")
     actions: List[Action] = Field(default_factory=list, description="Suggested actions")
+    matches: List[PatternMatchResult] = Field(
+        default_factory=list,
+        description="Every matching pattern, best-scoring first (message and actions come from the first)"
+    )
+    artifacts: List[ArtifactScan] = Field(default_factory=list, description="Scan of each request artifact")
+    budget_exceeded: Optional[BudgetReport] = Field(
+        None, description="Set when the analysis stopped at its CPU budget (matches are partial)"
+    )
 
 
 class ParticipantResponse(BaseModel):
@@ -76,48 +171,55 @@ class ParticipantResponse(BaseModel):
     message: str = Field(..., description="Response message")
     severity: Literal["info", "warn", "error"] = Field(..., description="Message severity")
     outputs: ParticipantOutputs = Field(..., description="Response outputs")
+    failure: Optional[FailureMatch] = Field(
+        None, description="Known failure cluster of the log (None without error lines)"
+    )
+
 
+class StreamStats(BaseModel):
+    """How much of a streamed log was analyzed"""
+    bytes_received: int = Field(..., description="Request body bytes read")
+    chars_analyzed: int = Field(..., description="Log characters run through the patterns")
+    windows: int = Field(..., description="Analysis windows")
+    stopped_early: bool = Field(..., description="Stopped at a high-severity match before the end")
+    matches: List[str] = Field(default_factory=list, description="Matched patterns, in rule order")
 
-# Rate limiting storage (in-memory MVP)
-_rate_limit_storage: Dict[str, List[float]] = {}
-_RATE_LIMIT_WINDOW = 60  # 1 minute
-_RATE_LIMIT_MAX = 30  # 30 requests per minute per key
 
+class ParticipantStreamResponse(ParticipantResponse):
+    """Participant response for a streamed log"""
+    stream: StreamStats = Field(..., description="Streaming statistics")
 
-def check_rate_limit(api_key: str) -> bool:
+
+async def check_rate_limit(request: Request, api_key: str) -> Optional[RateLimitResult]:
     """
-    Check if request is within rate limit
+    Charge the API-key quotas configured for this route
+    
+    Runs in a worker thread when the rate limit backend waits on Redis.
     
     Args:
+        request: Incoming request (route, method and body size)
         api_key: API key making the request
         
     Returns:
-        bool: True if allowed, False if rate limited
+        RateLimitResult | None: Quota decision, or None if no API-key quota applies
     """
-    import time
-    
-    now = time.time()
-    cutoff = now - _RATE_LIMIT_WINDOW
-    
-    # Clean old entries
-    if api_key in _rate_limit_storage:
-        _rate_limit_storage[api_key] = [
-            ts for ts in _rate_limit_storage[api_key] if ts > cutoff
-        ]
-    else:
-        _rate_limit_storage[api_key] = []
-    
-    # Check limit
-    if len(_rate_limit_storage[api_key]) >= _RATE_LIMIT_MAX:
-        return False
-    
-    # Add current request
-    _rate_limit_storage[api_key].append(now)
-    return True
+    content_length = request.headers.get("Content-Length", "")
+    engine = get_quota_engine()
+    check = partial(
+        engine.check_request,
+        request.url.path,
+        request.method,
+        "api_key",
+        api_key,
+        int(content_length) if content_length.isdigit() else 0
+    )
+    if engine.backend.blocking:
+        return await asyncio.to_thread(check)
+    return check()
 
 
-# Audit log storage (in-memory MVP)
-_audit_log: List[Dict[str, Any]] = []
+heap.register_store("participant.audit_log", lambda: get_audit_log().ring)
+heap.register_store("participant.failure_index", lambda: get_failure_index()._clusters)
 
 
 def log_audit(path: str, status_code: int, latency_ms: float, metadata: Optional[Dict] = None):
@@ -137,11 +239,64 @@ def log_audit(path: str, status_code: int, latency_ms: float, metadata: Optional
         "latency_ms": latency_ms,
         "metadata": metadata or {}
     }
-    _audit_log.append(entry)
+    get_audit_log().record(entry)
+
+
+def record_failure(
+    metadata: InputMetadata,
+    fingerprint: Fingerprint,
+    analysis: Dict[str, Any],
+    known_rules: Optional[List[str]],
+    rules_version: Optional[str],
+    digest: Optional[str] = None
+) -> FailureMatch:
+    """
+    Add an analyzed run to the failure index
+    
+    Args:
+        metadata: Request metadata (repo, run_id, pr)
+        fingerprint: Fingerprint of the log
+        analysis: Its analysis result
+        known_rules: Rules the analysis was limited to (None for a full scan)
+        rules_version: Rule set version of the analysis
+        digest: text_digest() of the log (None when short-circuiting is off)
     
-    # Keep only last 1000 entries
-    if len(_audit_log) > 1000:
-        _audit_log.pop(0)
+    Returns:
+        FailureMatch: The run's failure cluster
+    """
+    rules = None
+    # Only complete scans of the text teach the index which rules a fingerprint needs
+    if known_rules is None and "budget_exceeded" not in analysis["outputs"]:
+        rules = sorted({match["pattern"] for match in analysis["outputs"]["matches"] if not match.get("artifact")})
+    cluster, match = get_failure_index().record(
+        fingerprint,
+        {"repo": metadata.repo, "run_id": metadata.run_id, "pr": metadata.pr},
+        rules,
+        rules_version,
+        digest
+    )
+    return FailureMatch(
+        fingerprint=fingerprint.digest,
+        match=match,
+        short_circuit=known_rules is not None,
+        cluster=FailureCluster(**cluster)
+    )
+
+
+@router.get("/failures/{fingerprint}", response_model=FailureLookup)
+async def failure_lookup(fingerprint: str, api_key: str = Depends(verify_api_key)) -> FailureLookup:
+    """
+    Known failure cluster of a fingerprint (as returned in the failure field of /message)
+    
+    Clusters are kept in the memory of each API process.
+    """
+    cluster = get_failure_index().get(fingerprint)
+    if cluster is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown fingerprint: {fingerprint}")
+    first = cluster["first_seen"]
+    times = "once" if cluster["seen"] == 1 else f"{cluster['seen']} times"
+    first_at = f"run {first['run_id']}" if first.get("run_id") else first["at"]
+    return FailureLookup(**cluster, summary=f"seen {times}, first at {first_at}")
 
 
 @router.post("/message", response_model=ParticipantResponse, status_code=status.HTTP_200_OK)
@@ -156,7 +311,6 @@ async def participant_message(
     Analyzes CI failures and provides actionable guidance.
     Requires X-API-KEY header for authentication.
     """
-    import time
     start_time = time.time()
     
     try:
@@ -164,15 +318,16 @@ async def participant_message(
         record_request()
         
         # Check rate limit
-        if not check_rate_limit(api_key):
+        quota = await check_rate_limit(request, api_key)
+        if quota is not None and not quota.allowed:
             record_error()
             latency_ms = (time.time() - start_time) * 1000
             log_audit(str(request.url.path), 429, latency_ms, {"reason": "rate_limit"})
             
-            from fastapi import HTTPException
             raise HTTPException(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail="Rate limit exceeded. Maximum 30 requests per minute."
+                detail=f"Rate limit exceeded. {quota.reason}",
+                headers={"Retry-After": str(quota.retry_after)}
             )
         
         # Log request (minimal)
@@ -187,11 +342,38 @@ async def participant_message(
             for a in data.input.artifacts
         ] if data.input.artifacts else None
         
-        analysis = rule_engine.analyze(
+        # Artifacts are decoded and scanned concurrently, off the event loop
+        scans = None
+        if artifacts_list:
+            scans = await get_artifact_scanner().scan(artifacts_list, rule_engine.rules_version)
+        
+        # A log analyzed before (same text, same rule set) only reruns the rules it matched
+        fingerprint = None
+        known_rules = None
+        digest = None
+        rules_version = rule_engine.rules_version
+        if settings.FINGERPRINT_ENABLED:
+            fingerprint = fingerprint_log(data.input.text, settings.FINGERPRINT_TAIL_CHARS)
+            if fingerprint is not None and settings.FINGERPRINT_SHORT_CIRCUIT and not artifacts_list:
+                digest = text_digest(data.input.text)
+                known_rules = get_failure_index().known_rules(fingerprint, rules_version, digest)
+        
+        analyze = partial(
+            rule_engine.analyze,
             text=data.input.text,
             mode=data.mode,
-            artifacts=artifacts_list
+            artifacts=artifacts_list,
+            scans=scans,
+            rules=known_rules
         )
+        if rule_engine.cache is not None and rule_engine.cache.blocking:
+            # Result cache lookups wait on Redis: keep them off the event loop
+            analysis = await asyncio.to_thread(analyze)
+        else:
+            analysis = analyze()
+        failure = None
+        if fingerprint is not None:
+            failure = record_failure(data.input.metadata, fingerprint, analysis, known_rules, rules_version, digest)
         
         # Build response
         response = ParticipantResponse(
@@ -200,8 +382,12 @@ async def participant_message(
             severity=analysis["severity"],
             outputs=ParticipantOutputs(
                 patch_unified_diff=analysis["outputs"]["patch_unified_diff"],
-                actions=[Action(**action) for action in analysis["outputs"]["actions"]]
-            )
+                actions=[Action(**action) for action in analysis["outputs"]["actions"]],
+                matches=analysis["outputs"]["matches"],
+                artifacts=analysis["outputs"].get("artifacts", []),
+                budget_exceeded=analysis["outputs"].get("budget_exceeded")
+            ),
+            failure=failure
         )
         
         # Update metrics
@@ -234,3 +420,236 @@ async def participant_message(
         log_audit(str(request.url.path), 500, latency_ms, {"error": str(e)[:100]})
         logger.error(f"Error processing participant message: {e}", exc_info=True)
         raise
+
+
+NDJSON_TYPES = ("application/x-ndjson", "application/jsonl", "application/json-lines")
+
+
+class StreamTooLargeError(ValueError):
+    """Raised when a streamed body exceeds PARTICIPANT_STREAM_MAX_BYTES"""
+
+
+class LogStreamReader:
+    """
+    Decodes a streamed request body into log text
+    
+    A plain body is the log itself (any chunking). An NDJSON body holds one
+    record per line, either a JSON string or an object with a "text" field;
+    records are joined as log lines.
+    """
+    
+    def __init__(self, request: Request, max_bytes: int):
+        self.request = request
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        content_type = request.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        self.ndjson = content_type in NDJSON_TYPES
+    
+    @staticmethod
+    def _record_text(line: str) -> str:
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid NDJSON line: {e}")
+        if isinstance(record, dict):
+            record = record.get("text")
+        if not isinstance(record, str):
+            raise ValueError('NDJSON records must be strings or objects with a "text" string')
+        return record + "\n"
+    
+    async def texts(self) -> AsyncIterator[str]:
+        """
+        Yield decoded text as body chunks arrive
+        
+        Raises:
+            StreamTooLargeError: If the body exceeds max_bytes
+            ValueError: If an NDJSON line is invalid
+        """
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        partial = ""
+        async for chunk in self.request.stream():
+            self.bytes += len(chunk)
+            if self.bytes > self.max_bytes:
+                raise StreamTooLargeError(f"Log stream exceeds {self.max_bytes} bytes")
+            text = decoder.decode(chunk)
+            if not self.ndjson:
+                if text:
+                    yield text
+                continue
+            lines = (partial + text).split("\n")
+            partial = lines.pop()
+            records = "".join(self._record_text(line) for line in lines if line.strip())
+            if records:
+                yield records
+        
+        text = partial + decoder.decode(b"", final=True)
+        if self.ndjson:
+            text = self._record_text(text) if text.strip() else ""
+        if text:
+            yield text
+
+
+def _stream_response(
+    analysis: StreamAnalysis,
+    reader: LogStreamReader,
+    result: Dict[str, Any]
+) -> ParticipantStreamResponse:
+    return ParticipantStreamResponse(
+        participant="cimeika-api",
+        message=result["message"],
+        severity=result["severity"],
+        outputs=ParticipantOutputs(
+            patch_unified_diff=result["outputs"]["patch_unified_diff"],
+            actions=[Action(**action) for action in result["outputs"]["actions"]],
+            matches=result["outputs"]["matches"],
+            budget_exceeded=result["outputs"].get("budget_exceeded")
+        ),
+        stream=StreamStats(
+            bytes_received=reader.bytes,
+            chars_analyzed=analysis.chars,
+            windows=analysis.windows,
+            stopped_early=analysis.stopped_early,
+            matches=analysis.matches
+        )
+    )
+
+
+async def _analyze_stream(analysis: StreamAnalysis, reader: LogStreamReader) -> AsyncIterator[None]:
+    """
+    Feed the body into the analysis, yielding after every analyzed window
+    
+    Windows are analyzed in a worker thread so a large log does not hold
+    the event loop.
+    """
+    async for text in reader.texts():
+        windows = analysis.windows
+        done = await asyncio.to_thread(analysis.feed, text)
+        if analysis.windows != windows:
+            yield
+        if done:
+            return
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class BodyStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse for handlers that keep reading the request body
+    
+    StreamingResponse listens for a client disconnect on receive(), which
+    would consume body chunks the generator still has to read.
+    """
+    
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+@router.post(
+    "/message/stream",
+    response_model=ParticipantStreamResponse,
+    status_code=status.HTTP_200_OK,
+    responses={200: {"content": {"text/event-stream": {}}}}
+)
+async def participant_message_stream(
+    request: Request,
+    conversation_id: str = Query(..., description="Conversation identifier"),
+    topic: str = Query(..., description="Topic or context of the request"),
+    mode: Literal["analysis", "autofix", "logger"] = Query("analysis", description="Operation mode"),
+    stop_early: bool = Query(True, description="Stop reading at the first error-severity match"),
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    Streaming variant of /message for large CI logs
+    
+    The body is the log itself (text/plain, chunked uploads welcome) or
+    NDJSON log records, analyzed incrementally in bounded memory. With
+    ``Accept: text/event-stream`` progress is reported as SSE "progress"
+    events followed by a "result" event.
+    """
+    start_time = time.time()
+    record_request()
+    
+    quota = await check_rate_limit(request, api_key)
+    if quota is not None and not quota.allowed:
+        record_error()
+        log_audit(str(request.url.path), 429, (time.time() - start_time) * 1000, {"reason": "rate_limit"})
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Rate limit exceeded. {quota.reason}",
+            headers={"Retry-After": str(quota.retry_after)}
+        )
+    
+    logger.info(
+        f"Participant stream received: conversation_id={conversation_id}, "
+        f"mode={mode}, topic={topic}"
+    )
+    analysis = rule_engine.stream(
+        mode=mode,
+        window=settings.PARTICIPANT_STREAM_WINDOW,
+        lookbehind=settings.PARTICIPANT_STREAM_LOOKBEHIND,
+        stop_severity="error" if stop_early else None
+    )
+    reader = LogStreamReader(request, settings.PARTICIPANT_STREAM_MAX_BYTES)
+    
+    def finish() -> ParticipantStreamResponse:
+        response = _stream_response(analysis, reader, analysis.finish())
+        increment_interaction_count()
+        update_participant_last_call()
+        latency_ms = (time.time() - start_time) * 1000
+        log_audit(
+            str(request.url.path),
+            200,
+            latency_ms,
+            {
+                "mode": mode,
+                "severity": response.severity,
+                "actions_count": len(response.outputs.actions),
+                "bytes": reader.bytes
+            }
+        )
+        logger.info(
+            f"Participant stream processed: severity={response.severity}, bytes={reader.bytes}, "
+            f"stopped_early={analysis.stopped_early}, latency={latency_ms:.2f}ms"
+        )
+        return response
+    
+    def failed(e: Exception) -> int:
+        record_error()
+        code = (
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE if isinstance(e, StreamTooLargeError)
+            else status.HTTP_400_BAD_REQUEST
+        )
+        log_audit(str(request.url.path), code, (time.time() - start_time) * 1000, {"error": str(e)[:100]})
+        return code
+    
+    if "text/event-stream" not in request.headers.get("Accept", ""):
+        try:
+            async for _ in _analyze_stream(analysis, reader):
+                pass
+        except ValueError as e:
+            raise HTTPException(status_code=failed(e), detail=str(e))
+        return await asyncio.to_thread(finish)
+    
+    async def events() -> AsyncIterator[str]:
+        try:
+            async for _ in _analyze_stream(analysis, reader):
+                yield _sse("progress", {
+                    "bytes_received": reader.bytes,
+                    "chars_analyzed": analysis.chars,
+                    "matches": analysis.matches
+                })
+        except ValueError as e:
+            yield _sse("error", {"status": failed(e), "detail": str(e)})
+            return
+        response = await asyncio.to_thread(finish)
+        yield _sse("result", response.model_dump())
+    
+    return BodyStreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -5,8 +5,11 @@ Provides comprehensive system status and metrics
 from fastapi import APIRouter, status
 from typing import Dict, Any
 
+from app.core import multiprocess
 from app.core.config import settings
 from app.core.metrics import get_full_metrics
+from app.core.loop_monitor import get_loop_monitor
+from app.core.result_cache import get_cache_status
 from app.core.logging import get_logger
 
 logger = get_logger(__name__)
@@ -28,9 +31,13 @@ async def get_status() -> Dict[str, Any]:
             - Timezone info
             - Participant API status
             - Request/error rates
+            - Event loop lag
+            - Rule engine result cache hit ratio
     """
-    # Get metrics from metrics module
-    metrics = get_full_metrics()
+    # Get metrics from metrics module (one read of the other workers' files)
+    with multiprocess.scrape():
+        metrics = get_full_metrics()
+        result_cache = get_cache_status()
     
     # Build comprehensive status response
     response = {
@@ -39,7 +46,9 @@ async def get_status() -> Dict[str, Any]:
         "розгортання": "HuggingFace / Docker",
         "статус": "running",
         "версія": settings.API_VERSION,
-        **metrics  # Add all metrics (interaction count, uptime, times, participant API, etc.)
+        **metrics,  # Add all metrics (interaction count, uptime, times, participant API, etc.)
+        "event_loop": get_loop_monitor().get_status(),
+        "result_cache": result_cache
     }
     
     logger.debug(f"Status endpoint called: uptime={metrics['uptime']}, interactions={metrics['загальна_кількість_взаємодій']}")
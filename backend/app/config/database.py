@@ -8,6 +8,8 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.orm import declarative_base
 from dotenv import load_dotenv
+from app.core.prometheus import instrument_engine
+from app.core import tracing
 
 # Load environment variables
 load_dotenv()
@@ -33,6 +35,11 @@ engine = create_engine(
     echo=os.getenv('SQLALCHEMY_ECHO', '0') == '1'  # Enable SQL logging in debug
 )
 
+# Record statement counts and timings on the metrics surface, and a span
+# per statement in sampled traces
+instrument_engine(engine)
+tracing.instrument_engine(engine)
+
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -0,0 +1,397 @@
+"""
+Audit log for CIMEIKA API
+Fixed-size in-memory ring of recent requests, with a background writer that
+appends them in batches to rotating gzip-compressed JSONL files
+"""
+import atexit
+import gzip
+import heapq
+import json
+import math
+import os
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.prometheus import AUDIT_LOG_ENTRIES
+
+logger = get_logger(__name__)
+
+ACTIVE_FILE = "audit.jsonl.gz"
+ROTATED_PREFIX = "audit-"
+
+
+def _utc(value: datetime) -> datetime:
+    """Aware UTC time (naive times are taken as UTC)"""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _status_matches(status_code: int, status: str) -> bool:
+    if status.endswith("xx"):
+        return status_code // 100 == int(status[0])
+    return status_code == int(status)
+
+
+def percentile(values: List[float], p: float) -> float:
+    """
+    Nearest-rank percentile
+    
+    Args:
+        values: Values (any order, not empty)
+        p: Percentile in (0, 100]
+    
+    Returns:
+        float: Smallest value with at least p% of the values at or below it
+    """
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+class AuditLog:
+    """
+    Recent audit entries in memory, all of them on disk
+    
+    record() only appends to two bounded deques: the ring of the last
+    max_entries entries, and the entries not yet written. A writer thread
+    wakes every flush_interval seconds (or once batch_size entries wait),
+    compresses the pending batch into one gzip member and appends it to
+    audit.jsonl.gz with a single write, so workers sharing a directory never
+    interleave partial lines. Past max_bytes the file is renamed to
+    audit-<UTC time>-<pid>.jsonl.gz and only the newest `backups` rotated
+    files are kept. If the disk falls behind by max_pending entries, the
+    oldest unwritten ones are dropped (and counted) rather than growing
+    memory.
+    
+    Without a directory nothing is written and queries only see the ring.
+    """
+    
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        directory: Optional[str] = None,
+        max_bytes: int = 16 * 1024 * 1024,
+        backups: int = 10,
+        flush_interval: float = 1.0,
+        batch_size: int = 500,
+        max_pending: int = 10000
+    ):
+        """
+        Initialize log
+        
+        Args:
+            max_entries: Entries kept in memory
+            directory: Directory of the JSONL files (None keeps entries in memory only)
+            max_bytes: Compressed size at which the active file is rotated
+            backups: Rotated files kept
+            flush_interval: Seconds between writes
+            batch_size: Pending entries that trigger an early write
+            max_pending: Unwritten entries kept before the oldest are dropped
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.ring: deque = deque(maxlen=max_entries)
+        self._pending: Optional[deque] = deque(maxlen=max_pending) if directory else None
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self.rotations = 0
+    
+    def record(self, entry: Dict[str, Any]) -> None:
+        """
+        Add an entry (never blocks on disk)
+        
+        Args:
+            entry: JSON-serializable entry with "timestamp", "path",
+                "status_code" and "latency_ms"
+        """
+        # deque appends are atomic: no lock on the request path
+        self.recorded += 1
+        self.ring.append(entry)
+        pending = self._pending
+        if pending is None:
+            return
+        if len(pending) == pending.maxlen:
+            self.dropped += 1
+            AUDIT_LOG_ENTRIES.labels("dropped").inc()
+        pending.append(entry)
+        if len(pending) >= self.batch_size:
+            self._wake.set()
+    
+    def flush(self) -> int:
+        """
+        Append the pending entries to the active file
+        
+        Returns:
+            int: Entries written
+        """
+        if self.directory is None:
+            return 0
+        with self._write_lock:
+            pending = self._pending
+            batch = []
+            for _ in range(len(pending)):
+                try:
+                    batch.append(pending.popleft())
+                except IndexError:
+                    # A full deque evicted its oldest entry meanwhile
+                    break
+            if not batch:
+                return 0
+            lines = "".join(json.dumps(entry, separators=(",", ":"), default=str) + "\n" for entry in batch)
+            data = gzip.compress(lines.encode("utf-8"))
+            path = os.path.join(self.directory, ACTIVE_FILE)
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o640)
+                try:
+                    os.write(fd, data)
+                    size = os.fstat(fd).st_size
+                finally:
+                    os.close(fd)
+            except OSError as e:
+                logger.warning(f"Failed to write {len(batch)} audit entries: {e}")
+                self.dropped += len(batch)
+                AUDIT_LOG_ENTRIES.labels("dropped").inc(len(batch))
+                return 0
+            self.written += len(batch)
+            AUDIT_LOG_ENTRIES.labels("written").inc(len(batch))
+            if size >= self.max_bytes:
+                self._rotate(path)
+            return len(batch)
+    
+    def _rotate(self, path: str) -> None:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+        try:
+            os.replace(path, os.path.join(self.directory, f"{ROTATED_PREFIX}{stamp}-{os.getpid()}.jsonl.gz"))
+        except FileNotFoundError:
+            # Another worker rotated it first
+            return
+        except OSError as e:
+            logger.warning(f"Failed to rotate the audit log: {e}")
+            return
+        self.rotations += 1
+        rotated = self._rotated()
+        for name in rotated[:max(0, len(rotated) - self.backups)]:
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except OSError:
+                pass
+    
+    def _rotated(self) -> List[str]:
+        """Rotated file names, oldest first"""
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        return sorted(name for name in names if name.startswith(ROTATED_PREFIX) and name.endswith(".jsonl.gz"))
+    
+    def _files(self) -> List[str]:
+        """Rotated files, oldest first, then the active file if any"""
+        if self.directory is None:
+            return []
+        files = self._rotated()
+        if os.path.exists(os.path.join(self.directory, ACTIVE_FILE)):
+            files.append(ACTIVE_FILE)
+        return files
+    
+    def _read(self, name: str) -> Iterator[Dict[str, Any]]:
+        try:
+            with gzip.open(os.path.join(self.directory, name), "rt", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            return
+        except (OSError, EOFError) as e:
+            # A member still being appended, or cut short by a crash
+            logger.debug(f"Audit file {name} ends early: {e}")
+    
+    def _stored(self, since: Optional[datetime]) -> Iterator[Dict[str, Any]]:
+        """Entries on disk and not yet written, skipping files rotated before `since`"""
+        for name in self._rotated():
+            if since is not None:
+                rotated_at = datetime.strptime(name[len(ROTATED_PREFIX):].split("-")[0], "%Y%m%dT%H%M%S%f")
+                if rotated_at.replace(tzinfo=timezone.utc) < since:
+                    continue
+            yield from self._read(name)
+        yield from self._read(ACTIVE_FILE)
+        yield from list(self._pending)
+    
+    @staticmethod
+    def _filter(
+        entries: Iterable[Dict[str, Any]],
+        since: Optional[datetime],
+        until: Optional[datetime],
+        path: Optional[str],
+        status: Optional[str]
+    ) -> Iterator[Tuple[datetime, Dict[str, Any]]]:
+        for entry in entries:
+            try:
+                at = _utc(datetime.fromisoformat(entry["timestamp"]))
+            except (KeyError, TypeError, ValueError):
+                continue
+            if since is not None and at < since:
+                continue
+            if until is not None and at >= until:
+                continue
+            if path is not None and not str(entry.get("path", "")).startswith(path):
+                continue
+            if status is not None and not _status_matches(int(entry.get("status_code", 0)), status):
+                continue
+            yield at, entry
+    
+    def query(
+        self,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        path: Optional[str] = None,
+        status: Optional[str] = None,
+        min_percentile: Optional[float] = None,
+        limit: int = 100
+    ) -> Dict[str, Any]:
+        """
+        Entries matching all filters, newest first
+        
+        With a directory every stored entry is searched (plus this process's
+        unwritten ones; other workers' appear within flush_interval),
+        otherwise only the in-memory ring.
+        
+        Args:
+            since: Only entries at or after this time
+            until: Only entries before this time
+            path: Only paths starting with this
+            status: Status code ("404") or class ("5xx")
+            min_percentile: Only entries at or above this latency percentile
+                of the entries matching the other filters (e.g. 99)
+            limit: Maximum number of entries returned
+        
+        Returns:
+            dict: {"source", "matched", "threshold_ms", "entries"}
+        """
+        since = _utc(since) if since is not None else None
+        until = _utc(until) if until is not None else None
+        
+        def matching() -> Iterator[Tuple[datetime, Dict[str, Any]]]:
+            if self.directory is None:
+                entries = list(self.ring)
+            else:
+                entries = self._stored(since)
+            return self._filter(entries, since, until, path, status)
+        
+        threshold = None
+        if min_percentile is not None:
+            latencies = [float(entry.get("latency_ms", 0)) for _, entry in matching()]
+            if latencies:
+                threshold = percentile(latencies, min_percentile)
+        
+        matched = 0
+        newest: List[Tuple[datetime, int, Dict[str, Any]]] = []
+        for at, entry in matching():
+            if threshold is not None and float(entry.get("latency_ms", 0)) < threshold:
+                continue
+            matched += 1
+            item = (at, matched, entry)
+            if len(newest) < limit:
+                heapq.heappush(newest, item)
+            elif item > newest[0]:
+                heapq.heapreplace(newest, item)
+        
+        return {
+            "source": "memory" if self.directory is None else "files",
+            "matched": matched,
+            "threshold_ms": threshold,
+            "entries": [entry for _, _, entry in sorted(newest, reverse=True)],
+        }
+    
+    def start(self) -> bool:
+        """
+        Start the writer (no-op without a directory)
+        
+        Returns:
+            bool: True if entries are written to disk
+        """
+        if self.directory is None:
+            return False
+        if self._writer is not None and self._writer.is_alive():
+            return True
+        os.makedirs(self.directory, exist_ok=True)
+        self._stop.clear()
+        self._writer = threading.Thread(target=self._write_loop, name="audit-log-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.stop)
+        logger.info(f"Audit log written to {self.directory}")
+        return True
+    
+    def stop(self) -> None:
+        """Stop the writer and write what is still pending"""
+        if self._writer is not None:
+            self._stop.set()
+            self._wake.set()
+            self._writer.join(timeout=5)
+            self._writer = None
+        self.flush()
+    
+    def _write_loop(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"Audit log write failed: {e}")
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Counters and files
+        
+        Returns:
+            dict: "entries" in memory, "pending", "recorded", "written",
+            "dropped", "rotations", "directory" and "files"
+        """
+        return {
+            "entries": len(self.ring),
+            "pending": len(self._pending) if self._pending is not None else 0,
+            "recorded": self.recorded,
+            "written": self.written,
+            "dropped": self.dropped,
+            "rotations": self.rotations,
+            "directory": self.directory,
+            "files": self._files(),
+        }
+
+
+_audit_log: Optional[AuditLog] = None
+
+
+def get_audit_log() -> AuditLog:
+    """
+    Get the process-wide audit log
+    
+    Returns:
+        AuditLog: Log configured from the AUDIT_LOG_* settings
+    """
+    global _audit_log
+    if _audit_log is None:
+        _audit_log = AuditLog(
+            max_entries=settings.AUDIT_LOG_MAX_ENTRIES,
+            directory=settings.AUDIT_LOG_DIR or None,
+            max_bytes=settings.AUDIT_LOG_MAX_BYTES,
+            backups=settings.AUDIT_LOG_BACKUPS,
+            flush_interval=settings.AUDIT_LOG_FLUSH_INTERVAL,
+            batch_size=settings.AUDIT_LOG_BATCH_SIZE,
+            max_pending=settings.AUDIT_LOG_MAX_PENDING,
+        )
+    return _audit_log
@@ -21,6 +21,17 @@ class Settings:
     
     # Logging
     LOG_LEVEL: str = os.getenv('LOG_LEVEL', 'INFO').upper()
+    # Write log records from a background thread (request threads only enqueue)
+    LOG_QUEUE_ENABLED: bool = os.getenv('LOG_QUEUE_ENABLED', 'true').lower() == 'true'
+    # Records waiting for the writer; further records are dropped, not blocked on
+    LOG_QUEUE_SIZE: int = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+    # Per call site, at most LOG_THROTTLE_BURST records below ERROR are written
+    # every LOG_THROTTLE_WINDOW seconds; the rest are counted and summarized
+    LOG_THROTTLE_ENABLED: bool = os.getenv('LOG_THROTTLE_ENABLED', 'true').lower() == 'true'
+    LOG_THROTTLE_WINDOW: float = float(os.getenv('LOG_THROTTLE_WINDOW', '10'))
+    LOG_THROTTLE_BURST: int = int(os.getenv('LOG_THROTTLE_BURST', '20'))
+    # Share of INFO/DEBUG records kept per logger, e.g. "app.modules.kazkar.websocket=0.1"
+    LOG_SAMPLE_RATES: str = os.getenv('LOG_SAMPLE_RATES', '')
     
     # API Configuration
     API_VERSION: str = "2.2.1"
@@ -57,6 +68,49 @@ class Settings:
     REDIS_PORT: int = int(os.getenv('REDIS_PORT', '6379'))
     REDIS_PASSWORD: Optional[str] = os.getenv('REDIS_PASSWORD', None)
     
+    # Rate limiting
+    # Quota policy file (defaults to app/config/rate_limits.yaml)
+    RATE_LIMIT_CONFIG: Optional[str] = os.getenv('RATE_LIMIT_CONFIG', None)
+    # Counter storage: 'memory' (per process) or 'redis' (shared across workers)
+    RATE_LIMIT_BACKEND: str = os.getenv('RATE_LIMIT_BACKEND', 'memory').lower()
+    # Requests per key admitted locally between Redis syncs (0 = sync every request)
+    RATE_LIMIT_LOCAL_BATCH: int = int(os.getenv('RATE_LIMIT_LOCAL_BATCH', '10'))
+    RATE_LIMIT_SYNC_INTERVAL: float = float(os.getenv('RATE_LIMIT_SYNC_INTERVAL', '1.0'))
+    RATE_LIMIT_REDIS_TIMEOUT: float = float(os.getenv('RATE_LIMIT_REDIS_TIMEOUT', '0.1'))
+    
+    # Metrics
+    # Shared directory for per-worker metric state in multi-worker deployments
+    # (empty it before the server starts); unset = per-process metrics
+    METRICS_MULTIPROC_DIR: Optional[str] = os.getenv('METRICS_MULTIPROC_DIR', None)
+    # Seconds between per-worker state writes
+    METRICS_SYNC_INTERVAL: float = float(os.getenv('METRICS_SYNC_INTERVAL', '1.0'))
+    
+    # Tracing
+    # Spans export to memory (inspect in-process) or a JSON lines file
+    TRACING_ENABLED: bool = os.getenv('TRACING_ENABLED', 'false').lower() == 'true'
+    # Share of requests traced when no traceparent header decides it
+    TRACE_SAMPLE_RATE: float = float(os.getenv('TRACE_SAMPLE_RATE', '0.1'))
+    TRACE_EXPORTER: str = os.getenv('TRACE_EXPORTER', 'memory').lower()
+    TRACE_FILE: str = os.getenv('TRACE_FILE', 'logs/traces.jsonl')
+    
+    # Event loop monitoring
+    LOOP_MONITOR_ENABLED: bool = os.getenv('LOOP_MONITOR_ENABLED', 'true').lower() == 'true'
+    LOOP_LAG_INTERVAL: float = float(os.getenv('LOOP_LAG_INTERVAL', '0.05'))
+    # Seconds the loop may stay blocked before the blocking stack is captured
+    LOOP_BLOCK_THRESHOLD: float = float(os.getenv('LOOP_BLOCK_THRESHOLD', '0.1'))
+    # Dev/test only: raise BlockingCallError inside code that blocks the loop
+    LOOP_BLOCKING_STRICT: bool = os.getenv('LOOP_BLOCKING_STRICT', 'false').lower() == 'true'
+    
+    # Slow-request capture
+    # Requests over their latency budget are kept with a diagnostics bundle.
+    # Off by default: it records spans for every request, sampled or not
+    SLOW_REQUEST_CAPTURE: bool = os.getenv('SLOW_REQUEST_CAPTURE', 'false').lower() == 'true'
+    # Budgets file (defaults to app/config/latency_budgets.yaml)
+    SLOW_REQUEST_CONFIG: Optional[str] = os.getenv('SLOW_REQUEST_CONFIG', None)
+    SLOW_REQUEST_BUFFER: int = int(os.getenv('SLOW_REQUEST_BUFFER', '200'))
+    # Spans kept per captured request (the rest of the span tree is cut)
+    SLOW_REQUEST_MAX_SPANS: int = int(os.getenv('SLOW_REQUEST_MAX_SPANS', '100'))
+    
     # Security
     SECRET_KEY: str = os.getenv('SECRET_KEY', 'change_me_in_production')
     
@@ -64,6 +118,70 @@ class Settings:
     CIMEIKA_PARTICIPANT_KEY: Optional[str] = os.getenv('CIMEIKA_PARTICIPANT_KEY', None)
     PARTICIPANT_API_KEY: Optional[str] = os.getenv('PARTICIPANT_API_KEY', None)
     
+    # Streaming participant analysis (/api/participant/message/stream)
+    PARTICIPANT_STREAM_MAX_BYTES: int = int(os.getenv('PARTICIPANT_STREAM_MAX_BYTES', str(256 * 1024 * 1024)))
+    # Characters analyzed at a time, and re-searched from the previous window
+    PARTICIPANT_STREAM_WINDOW: int = int(os.getenv('PARTICIPANT_STREAM_WINDOW', str(1024 * 1024)))
+    PARTICIPANT_STREAM_LOOKBEHIND: int = int(os.getenv('PARTICIPANT_STREAM_LOOKBEHIND', str(64 * 1024)))
+    
+    # Rule engine result cache (repeated logs are not analyzed again)
+    RESULT_CACHE_ENABLED: bool = os.getenv('RESULT_CACHE_ENABLED', 'true').lower() == 'true'
+    # memory (per process) or redis (shared, with a per-process memory tier)
+    RESULT_CACHE_BACKEND: str = os.getenv('RESULT_CACHE_BACKEND', 'memory').lower()
+    RESULT_CACHE_MAX_BYTES: int = int(os.getenv('RESULT_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+    RESULT_CACHE_TTL: float = float(os.getenv('RESULT_CACHE_TTL', '3600'))
+    RESULT_CACHE_REDIS_TIMEOUT: float = float(os.getenv('RESULT_CACHE_REDIS_TIMEOUT', '0.1'))
+    
+    # Artifact scanning (decoded and matched in a process pool)
+    # Pool processes per API worker; 0 scans in a thread instead
+    ARTIFACT_WORKERS: int = int(os.getenv('ARTIFACT_WORKERS', '2'))
+    # Largest decoded artifact scanned, and seconds per artifact scan
+    ARTIFACT_MAX_BYTES: int = int(os.getenv('ARTIFACT_MAX_BYTES', str(10 * 1024 * 1024)))
+    ARTIFACT_TIMEOUT: float = float(os.getenv('ARTIFACT_TIMEOUT', '5.0'))
+    
+    # Rule packs (CI failure rules)
+    # Comma-separated pack files or directories (defaults to app/config/rules)
+    RULE_PACKS: Optional[str] = os.getenv('RULE_PACKS', None)
+    # Compiled packs, keyed by pack hash (private to this user, defaults to
+    # backend/data/rule-packs); empty disables the cache
+    RULE_PACK_CACHE_DIR: str = os.getenv(
+        'RULE_PACK_CACHE_DIR',
+        os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'data', 'rule-packs')
+    )
+    # Seconds between checks for changed pack files; 0 disables hot reload
+    RULE_PACK_RELOAD_INTERVAL: float = float(os.getenv('RULE_PACK_RELOAD_INTERVAL', '2.0'))
+    
+    # Rule regex safety
+    # re (repeats bounded by RULE_REGEX_MAX_REPEAT) or re2 (linear time, needs google-re2)
+    RULE_REGEX_ENGINE: str = os.getenv('RULE_REGEX_ENGINE', 're').lower()
+    # Largest repeat count of a rule regex quantifier; 0 leaves them unbounded
+    RULE_REGEX_MAX_REPEAT: int = int(os.getenv('RULE_REGEX_MAX_REPEAT', '1000'))
+    # Longest slice of a line one regex call sees; 0 is unlimited
+    RULE_REGEX_MAX_SPAN: int = int(os.getenv('RULE_REGEX_MAX_SPAN', '16384'))
+    # Thread CPU seconds one analysis may spend matching; 0 is unlimited
+    RULE_CPU_BUDGET: float = float(os.getenv('RULE_CPU_BUDGET', '2.0'))
+    
+    # Failure fingerprints (CI runs grouped into known failure clusters, per process)
+    FINGERPRINT_ENABLED: bool = os.getenv('FINGERPRINT_ENABLED', 'true').lower() == 'true'
+    FINGERPRINT_MAX_CLUSTERS: int = int(os.getenv('FINGERPRINT_MAX_CLUSTERS', '10000'))
+    # Largest SimHash distance (bits of 64) between logs of one cluster
+    FINGERPRINT_MAX_DISTANCE: int = int(os.getenv('FINGERPRINT_MAX_DISTANCE', '8'))
+    # Characters read from the end of a log for its error lines
+    FINGERPRINT_TAIL_CHARS: int = int(os.getenv('FINGERPRINT_TAIL_CHARS', str(256 * 1024)))
+    # A log analyzed before (same text) only runs the rules that matched it
+    FINGERPRINT_SHORT_CIRCUIT: bool = os.getenv('FINGERPRINT_SHORT_CIRCUIT', 'false').lower() == 'true'
+    
+    # Audit log (ring of recent requests; batched to rotating gzip JSONL files when a directory is set)
+    AUDIT_LOG_MAX_ENTRIES: int = int(os.getenv('AUDIT_LOG_MAX_ENTRIES', '1000'))
+    AUDIT_LOG_DIR: Optional[str] = os.getenv('AUDIT_LOG_DIR', None)
+    # Compressed size at which the active file is rotated, and rotated files kept
+    AUDIT_LOG_MAX_BYTES: int = int(os.getenv('AUDIT_LOG_MAX_BYTES', str(16 * 1024 * 1024)))
+    AUDIT_LOG_BACKUPS: int = int(os.getenv('AUDIT_LOG_BACKUPS', '10'))
+    AUDIT_LOG_FLUSH_INTERVAL: float = float(os.getenv('AUDIT_LOG_FLUSH_INTERVAL', '1.0'))
+    AUDIT_LOG_BATCH_SIZE: int = int(os.getenv('AUDIT_LOG_BATCH_SIZE', '500'))
+    # Unwritten entries kept if the disk falls behind; older ones are dropped
+    AUDIT_LOG_MAX_PENDING: int = int(os.getenv('AUDIT_LOG_MAX_PENDING', '10000'))
+    
     @property
     def database_url(self) -> str:
         """
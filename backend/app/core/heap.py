@@ -0,0 +1,262 @@
+"""
+Heap diagnostics for CIMEIKA API
+tracemalloc snapshots, allocation diffs and sizes of in-process stores
+"""
+import gc
+import sys
+import time
+import tracemalloc
+import types
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional
+from app.core.profiler import short_filename
+
+# Objects walked per store before deep_sizeof gives up
+MAX_WALK = 500_000
+
+# Allocations made by the diagnostics themselves
+_IGNORED_FILES = (tracemalloc.__file__, "<frozen importlib._bootstrap>", "<unknown>")
+
+# Referenced by stores but not owned by them
+_SHARED_TYPES = (
+    type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType,
+    types.MethodType, types.CodeType, types.FrameType,
+)
+
+# name -> (function returning the store object, whether to walk into it)
+_stores: Dict[str, tuple] = {}
+
+
+def register_store(name: str, get: Callable[[], Any], deep: bool = True) -> None:
+    """
+    Register an in-process store whose size should be reported
+    
+    Args:
+        name: Store name, "<module>.<store>"
+        get: Returns the store object (called on every report)
+        deep: Walk into the store to estimate its full size; otherwise only
+            the container itself is measured (e.g. sets of sockets)
+    """
+    _stores[name] = (get, deep)
+
+
+def deep_sizeof(obj: Any, limit: int = MAX_WALK) -> Dict[str, Any]:
+    """
+    Estimate the memory held by an object graph
+    
+    Follows everything the garbage collector sees as referenced (container
+    items, instance attributes, slots); classes, modules and functions are
+    shared and not counted. Each object is counted once. Instances are never
+    asked for their __dict__, which would slow down their attribute access
+    from then on.
+    
+    Args:
+        obj: Root object
+        limit: Maximum number of objects to visit
+    
+    Returns:
+        dict: {"bytes", "objects", "truncated"}
+    """
+    seen = set()
+    pending = [obj]
+    size = 0
+    while pending and len(seen) < limit:
+        current = pending.pop()
+        if id(current) in seen or isinstance(current, _SHARED_TYPES):
+            continue
+        seen.add(id(current))
+        size += sys.getsizeof(current)
+        pending.extend(gc.get_referents(current))
+    return {"bytes": size, "objects": len(seen), "truncated": bool(pending)}
+
+
+def get_store_sizes() -> Dict[str, Dict[str, Any]]:
+    """
+    Size of every registered store
+    
+    Returns:
+        dict: {name: {"entries", "bytes", "objects", "truncated"}}
+    """
+    sizes = {}
+    for name, (get, deep) in sorted(_stores.items()):
+        store = get()
+        try:
+            entries = len(store)
+        except TypeError:
+            entries = None
+        if deep:
+            size = deep_sizeof(store)
+        else:
+            size = {"bytes": sys.getsizeof(store), "objects": 1, "truncated": False}
+        sizes[name] = {"entries": entries, **size}
+    return sizes
+
+
+def _site(frame: tracemalloc.Frame) -> str:
+    return f"{short_filename(frame.filename)}:{frame.lineno}"
+
+
+class HeapTracker:
+    """
+    Named tracemalloc snapshots with top-N and diff queries
+    
+    tracemalloc slows down every allocation while it is tracing, so it is
+    only started on request (or with PYTHONTRACEMALLOC). Only the most
+    recent ``max_snapshots`` snapshots are kept; each also records the
+    store sizes at that moment so growth can be attributed.
+    """
+    
+    def __init__(self, max_snapshots: int = 5):
+        """
+        Initialize tracker
+        
+        Args:
+            max_snapshots: Snapshots kept in memory
+        """
+        self.max_snapshots = max_snapshots
+        self._snapshots: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._next_id = 1
+        self._lock = Lock()
+    
+    @property
+    def tracing(self) -> bool:
+        """Whether tracemalloc is tracing allocations"""
+        return tracemalloc.is_tracing()
+    
+    def start(self, frames: int = 10) -> None:
+        """
+        Start tracing allocations
+        
+        Args:
+            frames: Stack frames stored per allocation
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+    
+    def stop(self) -> None:
+        """Stop tracing and drop all snapshots"""
+        with self._lock:
+            self._snapshots.clear()
+        tracemalloc.stop()
+    
+    def take(self) -> Dict[str, Any]:
+        """
+        Take a snapshot
+        
+        Returns:
+            dict: Snapshot record {"id", "taken_at", "traced_bytes", "stores", "snapshot"}
+        
+        Raises:
+            RuntimeError: If tracemalloc is not tracing
+        """
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc is not tracing; start it first")
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, filename) for filename in _IGNORED_FILES]
+        )
+        traced, _ = tracemalloc.get_traced_memory()
+        stores = get_store_sizes()
+        with self._lock:
+            record = {
+                "id": self._next_id,
+                "taken_at": time.time(),
+                "traced_bytes": traced,
+                "stores": stores,
+                "snapshot": snapshot,
+            }
+            self._snapshots[self._next_id] = record
+            self._next_id += 1
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+        return record
+    
+    def get(self, snapshot_id: int) -> Optional[Dict[str, Any]]:
+        """Snapshot record by id, or None if unknown or evicted"""
+        return self._snapshots.get(snapshot_id)
+    
+    def snapshots(self) -> List[Dict[str, Any]]:
+        """Kept snapshots (without the tracemalloc data), oldest first"""
+        with self._lock:
+            return [
+                {"id": r["id"], "taken_at": r["taken_at"], "traced_bytes": r["traced_bytes"]}
+                for r in self._snapshots.values()
+            ]
+    
+    def top(self, snapshot_id: int, limit: int = 20, group_by: str = "lineno") -> List[Dict[str, Any]]:
+        """
+        Largest allocation sites of a snapshot
+        
+        Args:
+            snapshot_id: Snapshot id
+            limit: Number of sites
+            group_by: "lineno", "filename" or "traceback"
+        
+        Returns:
+            list: [{"site", "size_bytes", "count", "traceback"?}]
+        
+        Raises:
+            KeyError: If the snapshot is unknown
+        """
+        record = self._snapshots[snapshot_id]
+        stats = record["snapshot"].statistics(group_by)[:limit]
+        result = []
+        for stat in stats:
+            entry = {"site": _site(stat.traceback[0]), "size_bytes": stat.size, "count": stat.count}
+            if group_by == "traceback":
+                entry["traceback"] = [_site(frame) for frame in stat.traceback]
+            result.append(entry)
+        return result
+    
+    def diff(self, base_id: int, target_id: int, limit: int = 20, group_by: str = "lineno") -> Dict[str, Any]:
+        """
+        Allocation growth between two snapshots
+        
+        Args:
+            base_id: Older snapshot id
+            target_id: Newer snapshot id
+            limit: Number of sites
+            group_by: "lineno", "filename" or "traceback"
+        
+        Returns:
+            dict: {"traced_bytes_diff", "sites": [...], "stores": {name: delta}}
+        
+        Raises:
+            KeyError: If a snapshot is unknown
+        """
+        base = self._snapshots[base_id]
+        target = self._snapshots[target_id]
+        stats = target["snapshot"].compare_to(base["snapshot"], group_by)[:limit]
+        sites = []
+        for stat in stats:
+            entry = {
+                "site": _site(stat.traceback[0]),
+                "size_bytes": stat.size,
+                "size_diff_bytes": stat.size_diff,
+                "count": stat.count,
+                "count_diff": stat.count_diff,
+            }
+            if group_by == "traceback":
+                entry["traceback"] = [_site(frame) for frame in stat.traceback]
+            sites.append(entry)
+        
+        stores = {}
+        for name, after in target["stores"].items():
+            before = base["stores"].get(name, {})
+            stores[name] = {
+                "entries": after["entries"],
+                "entries_diff": (after["entries"] or 0) - (before.get("entries") or 0),
+                "bytes": after["bytes"],
+                "bytes_diff": after["bytes"] - before.get("bytes", 0),
+            }
+        return {
+            "base": base_id,
+            "target": target_id,
+            "elapsed_seconds": round(target["taken_at"] - base["taken_at"], 3),
+            "traced_bytes_diff": target["traced_bytes"] - base["traced_bytes"],
+            "sites": sites,
+            "stores": stores,
+        }
+
+
+heap_tracker = HeapTracker()
@@ -0,0 +1,388 @@
+"""
+Streaming latency percentiles for CIMEIKA API
+Log-bucketed, mergeable histograms over sliding sub-windows
+"""
+import math
+import time
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from app.core import heap, multiprocess
+
+# Linear sub-buckets per power of two: bucket width is 1/32 of the value's
+# octave, so reported percentiles (bucket midpoints) are within ~3%
+SUB_BUCKETS = 16
+# Tracked range: ~0.5us (2**-21) to 256s (2**8); values outside are clamped
+MIN_EXPONENT = -20
+MAX_EXPONENT = 8
+BUCKET_COUNT = (MAX_EXPONENT - MIN_EXPONENT + 1) * SUB_BUCKETS
+
+QUANTILES = (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("p999", 0.999))
+
+# Sliding windows reported per series
+LATENCY_WINDOWS = {"1m": 60, "5m": 300}
+
+
+def bucket_index(value: float) -> int:
+    """
+    Map a value (seconds) to its bucket in constant time
+    
+    Args:
+        value: Observed value
+    
+    Returns:
+        int: Bucket index in [0, BUCKET_COUNT)
+    """
+    if value <= 0:
+        return 0
+    mantissa, exponent = math.frexp(value)
+    if exponent < MIN_EXPONENT:
+        return 0
+    if exponent > MAX_EXPONENT:
+        return BUCKET_COUNT - 1
+    return (exponent - MIN_EXPONENT) * SUB_BUCKETS + int((mantissa - 0.5) * 2 * SUB_BUCKETS)
+
+
+def bucket_value(index: int) -> float:
+    """
+    Representative value (midpoint) of a bucket
+    
+    Args:
+        index: Bucket index
+    
+    Returns:
+        float: Value in seconds
+    """
+    exponent, sub = divmod(index, SUB_BUCKETS)
+    scale = math.ldexp(1.0, exponent + MIN_EXPONENT)
+    return (0.5 + (sub + 0.5) / (2 * SUB_BUCKETS)) * scale
+
+
+class LatencyHistogram:
+    """
+    Sparse log-bucketed histogram
+    
+    Histograms with the same bucket layout merge by adding counts, so
+    per-route histograms combine exactly into per-module ones and
+    sub-windows combine into sliding windows.
+    """
+    
+    __slots__ = ("counts", "count", "sum")
+    
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.sum = 0.0
+    
+    def record(self, value: float) -> None:
+        """Add one observation"""
+        index = bucket_index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.sum += value
+    
+    def merge(self, other: "LatencyHistogram") -> "LatencyHistogram":
+        """
+        Add another histogram's observations into this one
+        
+        Returns:
+            LatencyHistogram: self
+        """
+        counts = self.counts
+        for index, count in other.counts.items():
+            counts[index] = counts.get(index, 0) + count
+        self.count += other.count
+        self.sum += other.sum
+        return self
+    
+    def export_state(self) -> Dict[str, Any]:
+        """Buckets as JSON-serializable data"""
+        return {"counts": [[index, count] for index, count in self.counts.items()], "sum": self.sum}
+    
+    def merge_state(self, state: Dict[str, Any]) -> "LatencyHistogram":
+        """
+        Add another histogram's exported buckets
+        
+        Returns:
+            LatencyHistogram: self
+        """
+        counts = self.counts
+        for index, count in state["counts"]:
+            counts[index] = counts.get(index, 0) + count
+            self.count += count
+        self.sum += state["sum"]
+        return self
+    
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Estimate a quantile
+        
+        Args:
+            q: Quantile in [0, 1]
+        
+        Returns:
+            float | None: Value in seconds, or None without observations
+        """
+        if self.count == 0:
+            return None
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return bucket_value(index)
+        return bucket_value(max(self.counts))
+    
+    def summary(self) -> Dict[str, float]:
+        """
+        Count, mean and percentiles in milliseconds
+        
+        Returns:
+            dict: {"count", "mean_ms", "p50", "p90", "p99", "p999"}
+        """
+        result: Dict[str, float] = {
+            "count": self.count,
+            "mean_ms": round(self.sum / self.count * 1000, 3) if self.count else 0.0,
+        }
+        for label, q in QUANTILES:
+            value = self.quantile(q)
+            result[label] = round(value * 1000, 3) if value is not None else 0.0
+        return result
+
+
+class LatencySketch:
+    """
+    Sliding-window latency distribution
+    
+    A ring of sub-window histograms (20 x 15s = 5 minutes). Recording
+    touches only the current sub-window; a query merges the sub-windows
+    inside the requested window. Memory is bounded by
+    sub_windows * BUCKET_COUNT counters per series.
+    """
+    
+    def __init__(self, sub_windows: int = 20, sub_window_seconds: int = 15):
+        """
+        Initialize sketch
+        
+        Args:
+            sub_windows: Number of sub-windows in the ring
+            sub_window_seconds: Length of one sub-window
+        """
+        self.sub_windows = sub_windows
+        self.sub_window_seconds = sub_window_seconds
+        self._histograms = [LatencyHistogram() for _ in range(sub_windows)]
+        self._slots = [-1] * sub_windows
+        self._lock = Lock()
+    
+    @property
+    def span(self) -> int:
+        """Longest window the sketch can answer, in seconds"""
+        return self.sub_windows * self.sub_window_seconds
+    
+    def record(self, value: float, now: Optional[float] = None) -> None:
+        """
+        Record one observation
+        
+        Args:
+            value: Latency in seconds
+            now: Observation time (defaults to time.time())
+        """
+        slot = int((time.time() if now is None else now) // self.sub_window_seconds)
+        index = slot % self.sub_windows
+        bucket = bucket_index(value)
+        with self._lock:
+            histogram = self._histograms[index]
+            if self._slots[index] != slot:
+                self._slots[index] = slot
+                histogram = self._histograms[index] = LatencyHistogram()
+            # Inlined LatencyHistogram.record; this runs per request
+            counts = histogram.counts
+            counts[bucket] = counts.get(bucket, 0) + 1
+            histogram.count += 1
+            histogram.sum += value
+    
+    def snapshot(self, window_seconds: int = 300, now: Optional[float] = None) -> LatencyHistogram:
+        """
+        Merge the sub-windows covering the last window_seconds
+        
+        The window is rounded up to whole sub-windows and capped at span.
+        
+        Args:
+            window_seconds: Window length in seconds
+            now: Query time (defaults to time.time())
+        
+        Returns:
+            LatencyHistogram: Merged distribution (a copy)
+        """
+        current = int((time.time() if now is None else now) // self.sub_window_seconds)
+        width = min(self.sub_windows, -(-window_seconds // self.sub_window_seconds))
+        oldest = current - width + 1
+        merged = LatencyHistogram()
+        with self._lock:
+            for slot, histogram in zip(self._slots, self._histograms):
+                if oldest <= slot <= current:
+                    merged.merge(histogram)
+        return merged
+    
+    def export_state(self) -> List[list]:
+        """Non-empty sub-windows as [slot, histogram state] pairs"""
+        with self._lock:
+            return [
+                [slot, histogram.export_state()]
+                for slot, histogram in zip(self._slots, self._histograms)
+                if slot >= 0 and histogram.count
+            ]
+    
+    def merge_state(self, state: List[list]) -> None:
+        """
+        Add another sketch's exported sub-windows
+        
+        Args:
+            state: Output of export_state (same sub-window layout)
+        """
+        with self._lock:
+            for slot, histogram_state in state:
+                index = slot % self.sub_windows
+                if self._slots[index] < slot:
+                    self._slots[index] = slot
+                    self._histograms[index] = LatencyHistogram()
+                elif self._slots[index] > slot:
+                    continue
+                self._histograms[index].merge_state(histogram_state)
+
+
+# "METHOD /route/template" -> (module, sketch)
+_sketches: Dict[str, Tuple[str, LatencySketch]] = {}
+_sketches_lock = Lock()
+
+
+def get_sketch(name: str, module: str) -> LatencySketch:
+    """
+    Get (or create) the latency sketch of a route
+    
+    Args:
+        name: Series name, "METHOD /route/template"
+        module: Module the route belongs to
+    
+    Returns:
+        LatencySketch: The sketch
+    """
+    entry = _sketches.get(name)
+    if entry is None:
+        with _sketches_lock:
+            entry = _sketches.setdefault(name, (module, LatencySketch()))
+    return entry[1]
+
+
+def export_state() -> Dict[str, list]:
+    """
+    Export this process's sketches for multi-worker aggregation
+    
+    Returns:
+        dict: {route: [module, sketch state]}
+    """
+    return {name: [module, sketch.export_state()] for name, (module, sketch) in list(_sketches.items())}
+
+
+def get_sketches() -> Dict[str, Tuple[str, LatencySketch]]:
+    """
+    Get route sketches of this process, or merged over all workers
+    
+    Returns:
+        dict: {route: (module, sketch)}
+    """
+    if not multiprocess.is_enabled():
+        return dict(_sketches)
+    return multiprocess.scrape_cached("latency.sketches", lambda: _merge_sketches(multiprocess.read_states("latency")))
+
+
+def _merge_sketches(states: List[Dict[str, list]]) -> Dict[str, Tuple[str, LatencySketch]]:
+    merged: Dict[str, Tuple[str, LatencySketch]] = {}
+    for state in states:
+        for name, (module, sketch_state) in state.items():
+            if name not in merged:
+                merged[name] = (module, LatencySketch())
+            merged[name][1].merge_state(sketch_state)
+    return merged
+
+
+def merge_states(states: List[Dict[str, list]]) -> Dict[str, list]:
+    """
+    Combine exported states of exited workers into one
+    
+    Args:
+        states: export_state outputs
+    
+    Returns:
+        dict: {route: [module, sketch state]}
+    """
+    return {
+        name: [module, sketch.export_state()]
+        for name, (module, sketch) in _merge_sketches(states).items()
+    }
+
+
+def get_window_histograms(
+    window_seconds: int,
+    now: Optional[float] = None,
+    sketches: Optional[Dict[str, Tuple[str, LatencySketch]]] = None
+) -> Dict[str, Tuple[str, LatencyHistogram]]:
+    """
+    Snapshot every route over one window
+    
+    Args:
+        window_seconds: Window length in seconds
+        now: Query time (defaults to time.time())
+        sketches: Sketches to read (defaults to get_sketches())
+    
+    Returns:
+        dict: {route: (module, histogram)} for routes with observations
+    """
+    now = time.time() if now is None else now
+    sketches = get_sketches() if sketches is None else sketches
+    result = {}
+    for name, (module, sketch) in sketches.items():
+        histogram = sketch.snapshot(window_seconds, now)
+        if histogram.count:
+            result[name] = (module, histogram)
+    return result
+
+
+def merge_by_module(histograms: Iterable[Tuple[str, LatencyHistogram]]) -> Dict[str, LatencyHistogram]:
+    """
+    Merge route histograms into per-module histograms
+    
+    Args:
+        histograms: (module, histogram) pairs
+    
+    Returns:
+        dict: {module: merged histogram}
+    """
+    modules: Dict[str, LatencyHistogram] = {}
+    for module, histogram in histograms:
+        modules.setdefault(module, LatencyHistogram()).merge(histogram)
+    return modules
+
+
+def get_latency_summary(now: Optional[float] = None) -> Dict[str, Dict[str, Dict[str, Dict[str, float]]]]:
+    """
+    Percentiles per route and per module for every window
+    
+    Returns:
+        dict: {"routes": {route: {window: summary}},
+               "modules": {module: {window: summary}}}
+    """
+    now = time.time() if now is None else now
+    sketches = get_sketches()
+    routes: Dict[str, Dict[str, Dict[str, float]]] = {}
+    modules: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for label, seconds in LATENCY_WINDOWS.items():
+        histograms = get_window_histograms(seconds, now, sketches)
+        for name, (_, histogram) in histograms.items():
+            routes.setdefault(name, {})[label] = histogram.summary()
+        for module, histogram in merge_by_module(histograms.values()).items():
+            modules.setdefault(module, {})[label] = histogram.summary()
+    return {"routes": routes, "modules": modules}
+
+
+multiprocess.register_state("latency", export_state, merge_states)
+heap.register_store("latency.sketches", lambda: _sketches)
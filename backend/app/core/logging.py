@@ -2,19 +2,60 @@
 Structured logging configuration for CIMEIKA API
 Provides consistent logging across all modules
 """
+import atexit
 import logging
+import queue
+import random
 import sys
 import json
-from datetime import datetime
-from typing import Any, Dict
+import time
+from json.encoder import encode_basestring_ascii
+from logging.handlers import QueueHandler, QueueListener
+from threading import Lock
+from typing import Any, Dict, Optional, Tuple
 from app.core.config import settings
 
+# Encoder for "extra" payloads; messages go through the C string encoder
+_extra_encoder = json.JSONEncoder(separators=(",", ":"), default=str)
+
 
 class StructuredFormatter(logging.Formatter):
     """
     Custom formatter that outputs logs in structured JSON format
+    
+    The JSON is assembled from pre-encoded pieces: the fields that are fixed
+    for a call site (level, logger, module, function) are encoded once and
+    cached, and the timestamp text is reused within the same second, so a
+    record costs one string encode of its message.
     """
     
+    def __init__(self):
+        super().__init__()
+        # (logger, level, module, function) -> (fields before message, fields after)
+        self._static: Dict[Tuple[str, int, str, str], Tuple[str, str]] = {}
+        self._second: Tuple[int, str] = (-1, "")
+    
+    def _timestamp(self, created: float) -> str:
+        second = int(created)
+        cached = self._second
+        if cached[0] != second:
+            cached = self._second = (second, time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(second)))
+        return f"{cached[1]}.{min(999_999, round((created - second) * 1_000_000)):06d}Z"
+    
+    def _static_fields(self, record: logging.LogRecord) -> Tuple[str, str]:
+        key = (record.name, record.levelno, record.module, record.funcName)
+        fields = self._static.get(key)
+        if fields is None:
+            if len(self._static) > 10_000:
+                self._static.clear()
+            fields = self._static[key] = (
+                f'"level":{encode_basestring_ascii(record.levelname)},'
+                f'"logger":{encode_basestring_ascii(record.name)},"message":',
+                f',"module":{encode_basestring_ascii(record.module)},'
+                f'"function":{encode_basestring_ascii(record.funcName or "")},"line":',
+            )
+        return fields
+    
     def format(self, record: logging.LogRecord) -> str:
         """
         Format log record as JSON
@@ -25,25 +66,28 @@ class StructuredFormatter(logging.Formatter):
         Returns:
             str: JSON-formatted log entry
         """
-        log_data: Dict[str, Any] = {
-            "timestamp": datetime.utcnow().isoformat() + "Z",
-            "level": record.levelname,
-            "logger": record.name,
-            "message": record.getMessage(),
-            "module": record.module,
-            "function": record.funcName,
-            "line": record.lineno,
-        }
+        head, tail = self._static_fields(record)
+        parts = [
+            '{"timestamp":"', self._timestamp(record.created), '",',
+            head, encode_basestring_ascii(record.getMessage()),
+            tail, str(record.lineno),
+        ]
         
         # Add exception info if present
         if record.exc_info:
-            log_data["exception"] = self.formatException(record.exc_info)
+            if not record.exc_text:
+                record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            parts.append(',"exception":')
+            parts.append(encode_basestring_ascii(record.exc_text))
         
         # Add extra fields if present
         if hasattr(record, "extra"):
-            log_data["extra"] = record.extra
+            parts.append(',"extra":')
+            parts.append(_extra_encoder.encode(record.extra))
         
-        return json.dumps(log_data)
+        parts.append("}")
+        return "".join(parts)
 
 
 class SimpleFormatter(logging.Formatter):
@@ -58,13 +102,164 @@ class SimpleFormatter(logging.Formatter):
         )
 
 
+class DroppingQueueHandler(QueueHandler):
+    """
+    Queue handler that never blocks or formats on the logging thread
+    
+    Records are handed to the writer thread as they are (only %-style
+    arguments are merged, since they may be mutated later). When more than
+    ``max_size`` records are waiting the record is dropped and counted
+    instead of blocking the request.
+    """
+    
+    def __init__(self, log_queue: queue.SimpleQueue, max_size: int = 10_000):
+        super().__init__(log_queue)
+        self.max_size = max_size
+        self.dropped = 0
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+    
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.queue.qsize() >= self.max_size:
+            self.dropped += 1
+            return
+        self.queue.put_nowait(record)
+    
+    def handle(self, record: logging.LogRecord) -> bool:
+        # The queue is thread-safe, so skip the handler lock
+        if not self.filter(record):
+            return False
+        try:
+            self.enqueue(self.prepare(record))
+        except Exception:
+            self.handleError(record)
+        return True
+
+
+def parse_sample_rates(value: str) -> Dict[str, float]:
+    """
+    Parse per-logger sample rates
+    
+    Args:
+        value: Comma-separated "logger=rate" pairs, rate in [0, 1]
+    
+    Returns:
+        dict: {logger name: rate}
+    
+    Raises:
+        ValueError: If a pair is malformed or a rate is out of range
+    """
+    rates = {}
+    for pair in value.split(","):
+        if not pair.strip():
+            continue
+        name, sep, rate = pair.partition("=")
+        if not sep or not name.strip():
+            raise ValueError(f"Invalid log sample rate {pair.strip()!r}, expected logger=rate")
+        rates[name.strip()] = float(rate)
+        if not 0 <= rates[name.strip()] <= 1:
+            raise ValueError(f"Log sample rate for {name.strip()} must be between 0 and 1")
+    return rates
+
+
+class LogThrottleFilter(logging.Filter):
+    """
+    Sampling and per-call-site rate limiting for log records
+    
+    Every call site (file and line) may write ``burst`` records per
+    ``window`` seconds; further records are dropped and counted, and the
+    next record written from that site says how many similar messages were
+    suppressed. This keeps floods (e.g. a warning per rejected request
+    during an attack) from saturating the log pipeline while still showing
+    their volume. ERROR and above always pass.
+    
+    Loggers listed in ``sample_rates`` additionally keep only that share of
+    their INFO/DEBUG records.
+    """
+    
+    def __init__(self, window: float = 10.0, burst: int = 20, sample_rates: Optional[Dict[str, float]] = None):
+        """
+        Initialize filter
+        
+        Args:
+            window: Rate limit window in seconds
+            burst: Records written per call site per window
+            sample_rates: {logger name: share of INFO/DEBUG records kept}
+        """
+        super().__init__()
+        self.window = window
+        self.burst = burst
+        self.sample_rates = sample_rates or {}
+        self.suppressed = 0
+        self.sampled_out = 0
+        # (pathname, lineno) -> [window start, written, suppressed]
+        self._sites: Dict[Tuple[str, int], list] = {}
+        self._lock = Lock()
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.ERROR:
+            return True
+        
+        rate = self.sample_rates.get(record.name)
+        if rate is not None and record.levelno < logging.WARNING and random.random() >= rate:
+            self.sampled_out += 1
+            return False
+        
+        now = record.created
+        key = (record.pathname, record.lineno)
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None:
+                if len(self._sites) > 10_000:
+                    self._sites.clear()
+                site = self._sites[key] = [now, 0, 0]
+            elif now - site[0] >= self.window:
+                site[0] = now
+                site[1] = 0
+            if site[1] >= self.burst:
+                site[2] += 1
+                self.suppressed += 1
+                return False
+            site[1] += 1
+            suppressed, site[2] = site[2], 0
+        
+        if suppressed:
+            record.msg = (
+                f"{record.getMessage()} ({suppressed} similar messages suppressed "
+                f"in last {self.window:g}s)"
+            )
+            record.args = None
+        return True
+
+
+_listener: Optional[QueueListener] = None
+
+
+def stop_logging() -> None:
+    """Stop the background writer after flushing queued records"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
 def setup_logging() -> logging.Logger:
     """
     Configure and return the root logger
     
+    With LOG_QUEUE_ENABLED the root logger only enqueues records; a
+    background listener formats and writes them, so slow stdout never
+    stalls a request.
+    
     Returns:
         logging.Logger: Configured root logger
     """
+    global _listener
+    
     # Get log level from settings
     log_level = getattr(logging, settings.LOG_LEVEL, logging.INFO)
     
@@ -72,7 +267,8 @@ def setup_logging() -> logging.Logger:
     root_logger = logging.getLogger()
     root_logger.setLevel(log_level)
     
-    # Remove existing handlers
+    # Remove existing handlers (and the writer feeding them)
+    stop_logging()
     root_logger.handlers.clear()
     
     # Create console handler
@@ -86,7 +282,22 @@ def setup_logging() -> logging.Logger:
         formatter = SimpleFormatter()
     
     console_handler.setFormatter(formatter)
-    root_logger.addHandler(console_handler)
+    if settings.LOG_QUEUE_ENABLED:
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        _listener = QueueListener(log_queue, console_handler, respect_handler_level=True)
+        _listener.start()
+        handler: logging.Handler = DroppingQueueHandler(log_queue, settings.LOG_QUEUE_SIZE)
+    else:
+        handler = console_handler
+    
+    # Throttle on the logging thread, before records are queued
+    if settings.LOG_THROTTLE_ENABLED:
+        handler.addFilter(LogThrottleFilter(
+            window=settings.LOG_THROTTLE_WINDOW,
+            burst=settings.LOG_THROTTLE_BURST,
+            sample_rates=parse_sample_rates(settings.LOG_SAMPLE_RATES)
+        ))
+    root_logger.addHandler(handler)
     
     # Set specific log levels for noisy libraries
     logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
@@ -111,6 +322,7 @@ def get_logger(name: str) -> logging.Logger:
 
 # Setup logging on module import
 logger = setup_logging()
+atexit.register(stop_logging)
 
 
 # Convenience functions for structured logging
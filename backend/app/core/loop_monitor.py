@@ -0,0 +1,239 @@
+"""
+Event loop monitoring for CIMEIKA API
+Continuous loop lag measurement and blocking-call detection
+"""
+import asyncio
+import ctypes
+import inspect
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.prometheus import LOOP_BLOCKS, LOOP_LAG
+
+logger = get_logger(__name__)
+
+# Frames from these files are "our" code when attributing a block
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class BlockingCallError(RuntimeError):
+    """Raised (strict mode) inside code that blocked the event loop"""
+
+
+def _is_app_frame(filename: str) -> bool:
+    return filename.startswith(APP_ROOT) and "site-packages" not in filename
+
+
+def route_code_map(app) -> Dict[Any, str]:
+    """
+    Map route endpoint code objects to route templates
+    
+    Args:
+        app: FastAPI/Starlette application
+    
+    Returns:
+        dict: {code object: route path}
+    """
+    codes = {}
+    for route in getattr(app, "routes", []):
+        endpoint = getattr(route, "endpoint", None)
+        if endpoint is None:
+            continue
+        code = getattr(inspect.unwrap(endpoint), "__code__", None)
+        if code is not None:
+            codes[code] = route.path
+    return codes
+
+
+class LoopMonitor:
+    """
+    Watchdog for the asyncio event loop
+    
+    A loop task wakes every ``interval`` seconds and records how late it
+    woke up (loop lag). A watchdog thread checks the task's heartbeat; when
+    the loop has been stuck for more than ``threshold`` seconds it captures
+    the loop thread's stack and attributes the block to a route (the
+    endpoint whose frame is on the stack) and a function (the innermost
+    application frame).
+    
+    In strict mode the watchdog also raises BlockingCallError inside the
+    blocked code, so blocking calls in async handlers fail loudly. This
+    injects an asynchronous exception into the loop thread and is meant for
+    development and tests only.
+    """
+    
+    def __init__(
+        self,
+        app=None,
+        interval: float = 0.05,
+        threshold: float = 0.1,
+        strict: bool = False,
+        max_reports: int = 100
+    ):
+        """
+        Initialize loop monitor
+        
+        Args:
+            app: Application whose routes blocks are attributed to
+            interval: Seconds between lag measurements
+            threshold: Seconds the loop may be stuck before a block is reported
+            strict: Raise BlockingCallError in blocking code
+            max_reports: Block reports kept in memory
+        """
+        self.app = app
+        self.interval = interval
+        self.threshold = threshold
+        self.strict = strict
+        self.reports: deque = deque(maxlen=max_reports)
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        
+        self._route_codes: Dict[Any, str] = {}
+        self._loop_thread: Optional[int] = None
+        self._heartbeat = 0.0
+        self._reported_heartbeat = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+    
+    @property
+    def running(self) -> bool:
+        """Whether the monitor is active"""
+        return self._task is not None and not self._task.done()
+    
+    def start(self) -> None:
+        """Start monitoring the running event loop (call from inside it)"""
+        if self.running:
+            return
+        loop = asyncio.get_running_loop()
+        self._route_codes = route_code_map(self.app) if self.app is not None else {}
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = loop.create_task(self._measure())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+    
+    async def stop(self) -> None:
+        """Stop monitoring"""
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+    
+    async def _measure(self) -> None:
+        loop = asyncio.get_running_loop()
+        interval = self.interval
+        while True:
+            expected = loop.time() + interval
+            await asyncio.sleep(interval)
+            lag = max(0.0, loop.time() - expected)
+            self._heartbeat = time.monotonic()
+            self.last_lag = lag
+            if lag > self.max_lag:
+                self.max_lag = lag
+            LOOP_LAG.observe(lag)
+    
+    def _watch(self) -> None:
+        period = min(self.interval, self.threshold) / 2
+        while not self._stop.wait(period):
+            heartbeat = self._heartbeat
+            stalled = time.monotonic() - heartbeat - self.interval
+            if stalled < self.threshold or heartbeat == self._reported_heartbeat:
+                continue
+            self._reported_heartbeat = heartbeat
+            try:
+                self._report(stalled)
+            except Exception as e:
+                logger.warning(f"Loop monitor failed to capture a block: {e}")
+    
+    def _report(self, stalled: float) -> None:
+        frame = sys._current_frames().get(self._loop_thread)
+        if frame is None:
+            return
+        
+        route = None
+        function = None
+        current = frame
+        while current is not None:
+            code = current.f_code
+            if function is None and _is_app_frame(code.co_filename):
+                function = f"{code.co_filename[len(APP_ROOT) + 1:]}:{code.co_name}:{current.f_lineno}"
+            if route is None and code in self._route_codes:
+                route = self._route_codes[code]
+            current = current.f_back
+        stack = traceback.format_stack(frame)
+        
+        report = {
+            "detected_at": time.time(),
+            "blocked_for_ms": round(stalled * 1000, 1),
+            "route": route or "<none>",
+            "function": function or "<unknown>",
+            "stack": [line.rstrip() for line in stack[-15:]],
+        }
+        self.reports.append(report)
+        LOOP_BLOCKS.labels(report["route"]).inc()
+        logger.warning(
+            f"Event loop blocked for {report['blocked_for_ms']}ms in {report['function']} "
+            f"(route {report['route']})"
+        )
+        
+        if self.strict and time.monotonic() - self._heartbeat > self.threshold:
+            ctypes.pythonapi.PyThreadState_SetAsyncExc(
+                ctypes.c_ulong(self._loop_thread), ctypes.py_object(BlockingCallError)
+            )
+    
+    def get_reports(self) -> List[Dict[str, Any]]:
+        """Recent block reports, oldest first"""
+        return list(self.reports)
+    
+    def get_status(self) -> Dict[str, Any]:
+        """
+        Summary for status endpoints
+        
+        Returns:
+            dict: running, lag figures in ms and number of blocks seen
+        """
+        return {
+            "running": self.running,
+            "lag_ms": round(self.last_lag * 1000, 3),
+            "max_lag_ms": round(self.max_lag * 1000, 3),
+            "blocks": len(self.reports),
+        }
+
+
+_monitor: Optional[LoopMonitor] = None
+
+
+def get_loop_monitor(app=None) -> LoopMonitor:
+    """
+    Get the process-wide loop monitor
+    
+    Args:
+        app: Application to attribute blocks to (first call only)
+    
+    Returns:
+        LoopMonitor: Monitor configured from LOOP_* settings
+    """
+    global _monitor
+    if _monitor is None:
+        _monitor = LoopMonitor(
+            app,
+            interval=settings.LOOP_LAG_INTERVAL,
+            threshold=settings.LOOP_BLOCK_THRESHOLD,
+            strict=settings.LOOP_BLOCKING_STRICT
+        )
+    return _monitor
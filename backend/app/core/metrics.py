@@ -4,10 +4,11 @@ Tracks uptime, interaction counts, and rolling statistics
 """
 import time
 from datetime import datetime, timezone
-from typing import Dict, Any
-from collections import deque
+from typing import Dict, Any, Iterable, List, Optional
 from threading import Lock
 from zoneinfo import ZoneInfo
+from app.core import heap, multiprocess
+from app.core.latency import get_latency_summary
 
 # Application start time
 _start_time = time.time()
@@ -20,14 +21,149 @@ _interaction_lock = Lock()
 _participant_last_call: datetime | None = None
 _participant_lock = Lock()
 
-# Rolling request/error tracking (last 5 minutes)
-_request_timestamps = deque(maxlen=1000)  # Keep last 1000 requests
-_error_timestamps = deque(maxlen=1000)    # Keep last 1000 errors
-_rolling_lock = Lock()
-
 # Kyiv timezone
 KYIV_TZ = ZoneInfo("Europe/Kyiv")
 
+# Rolling windows reported per series
+ROLLING_WINDOWS = {"1m": 60, "5m": 300, "1h": 3600}
+
+
+class RollingCounter:
+    """
+    Event counts over a sliding time window, kept in a ring of time buckets
+    
+    Each slot remembers which bucket it currently holds, so stale slots are
+    recycled lazily on write and skipped on read: recording is O(1) and a
+    query is O(buckets), independent of the request rate.
+    """
+    
+    def __init__(self, buckets: int = 300, bucket_seconds: int = 1):
+        """
+        Initialize rolling counter
+        
+        Args:
+            buckets: Number of slots in the ring
+            bucket_seconds: Width of one slot in seconds
+        """
+        self.buckets = buckets
+        self.bucket_seconds = bucket_seconds
+        self._counts = [0] * buckets
+        self._slots = [-1] * buckets
+        self._lock = Lock()
+    
+    @property
+    def span(self) -> int:
+        """Longest window the counter can answer, in seconds"""
+        return self.buckets * self.bucket_seconds
+    
+    def add(self, count: int = 1, now: Optional[float] = None) -> None:
+        """
+        Record events
+        
+        Args:
+            count: Number of events
+            now: Event time (defaults to time.time())
+        """
+        if now is None:
+            now = time.time()
+        with self._lock:
+            self._record(count, now)
+    
+    def _record(self, count: int, now: float) -> None:
+        """Add events to the bucket of `now` (lock held)"""
+        slot = int(now // self.bucket_seconds)
+        index = slot % self.buckets
+        if self._slots[index] != slot:
+            self._slots[index] = slot
+            self._counts[index] = count
+        else:
+            self._counts[index] += count
+    
+    def count(self, window_seconds: int, now: Optional[float] = None) -> int:
+        """
+        Count events in the last window_seconds
+        
+        The window is rounded up to whole buckets and capped at span.
+        
+        Args:
+            window_seconds: Window length in seconds
+            now: Query time (defaults to time.time())
+        
+        Returns:
+            int: Event count
+        """
+        current = int((time.time() if now is None else now) // self.bucket_seconds)
+        width = min(self.buckets, -(-window_seconds // self.bucket_seconds))
+        oldest = current - width + 1
+        with self._lock:
+            return sum(
+                count for slot, count in zip(self._slots, self._counts)
+                if oldest <= slot <= current
+            )
+    
+    def export_state(self) -> List[List[int]]:
+        """Occupied buckets as [bucket, count] pairs"""
+        with self._lock:
+            return [[slot, count] for slot, count in zip(self._slots, self._counts) if slot >= 0]
+    
+    def merge_state(self, state: List[List[int]]) -> None:
+        """
+        Add another counter's exported buckets
+        
+        Args:
+            state: Output of export_state (same bucket layout)
+        """
+        with self._lock:
+            for slot, count in state:
+                index = slot % self.buckets
+                if self._slots[index] < slot:
+                    self._slots[index] = slot
+                    self._counts[index] = count
+                elif self._slots[index] == slot:
+                    self._counts[index] += count
+
+
+class RollingSeries:
+    """
+    A named event series answering 1m/5m/1h windows
+    
+    Per-second buckets cover the last 5 minutes exactly; per-minute buckets
+    cover the last hour (to within one minute).
+    """
+    
+    def __init__(self):
+        self.fine = RollingCounter(buckets=300, bucket_seconds=1)
+        self.coarse = RollingCounter(buckets=60, bucket_seconds=60)
+        # Both rings share one lock so a series is updated atomically
+        self._lock = self.fine._lock = self.coarse._lock = Lock()
+    
+    def add(self, count: int = 1, now: Optional[float] = None) -> None:
+        """Record events (see RollingCounter.add)"""
+        if now is None:
+            now = time.time()
+        with self._lock:
+            self.fine._record(count, now)
+            self.coarse._record(count, now)
+    
+    def count(self, window_seconds: int, now: Optional[float] = None) -> int:
+        """Count events in the last window_seconds (see RollingCounter.count)"""
+        if window_seconds <= self.fine.span:
+            return self.fine.count(window_seconds, now)
+        return self.coarse.count(window_seconds, now)
+    
+    def export_state(self) -> Dict[str, List[List[int]]]:
+        """Both rings as JSON-serializable data"""
+        return {"fine": self.fine.export_state(), "coarse": self.coarse.export_state()}
+    
+    def merge_state(self, state: Dict[str, List[List[int]]]) -> None:
+        """Add another series' exported rings"""
+        self.fine.merge_state(state.get("fine", []))
+        self.coarse.merge_state(state.get("coarse", []))
+
+
+_series: Dict[str, RollingSeries] = {}
+_series_lock = Lock()
+
 
 def get_uptime_seconds() -> float:
     """
@@ -39,14 +175,17 @@ def get_uptime_seconds() -> float:
     return time.time() - _start_time
 
 
-def get_uptime_formatted() -> str:
+def get_uptime_formatted(uptime_seconds: Optional[float] = None) -> str:
     """
     Get formatted uptime string (HH:MM:SS)
     
+    Args:
+        uptime_seconds: Uptime to format (defaults to this process's)
+    
     Returns:
         str: Formatted uptime
     """
-    uptime_seconds = int(get_uptime_seconds())
+    uptime_seconds = int(get_uptime_seconds() if uptime_seconds is None else uptime_seconds)
     hours = uptime_seconds // 3600
     minutes = (uptime_seconds % 3600) // 60
     seconds = uptime_seconds % 60
@@ -97,31 +236,86 @@ def get_participant_last_call() -> str | None:
         return _participant_last_call.isoformat()
 
 
-def record_request() -> None:
-    """Record a request timestamp for rolling statistics"""
-    with _rolling_lock:
-        _request_timestamps.append(time.time())
+def get_series(name: str) -> RollingSeries:
+    """
+    Get (or create) a rolling event series
+    
+    Args:
+        name: Series name, e.g. "requests", "errors", "rate_limited" or
+            "requests.<module>"
+    
+    Returns:
+        RollingSeries: The series
+    """
+    series = _series.get(name)
+    if series is None:
+        with _series_lock:
+            series = _series.setdefault(name, RollingSeries())
+    return series
 
 
-def record_error() -> None:
-    """Record an error timestamp for rolling statistics"""
-    with _rolling_lock:
-        _error_timestamps.append(time.time())
+def record_event(name: str, count: int = 1) -> None:
+    """
+    Record events on a rolling series
+    
+    Args:
+        name: Series name
+        count: Number of events
+    """
+    get_series(name).add(count)
 
 
-def _count_recent(timestamps: deque, window_seconds: int) -> int:
+def get_event_count(name: str, window_seconds: int = 300) -> int:
     """
-    Count timestamps within the given window
+    Count events of a series within a window
     
     Args:
-        timestamps: Deque of timestamps
-        window_seconds: Time window in seconds
-        
+        name: Series name
+        window_seconds: Window length (up to one hour)
+    
+    Returns:
+        int: Event count (0 for unknown series)
+    """
+    series = _series.get(name)
+    if series is None:
+        return 0
+    return series.count(window_seconds)
+
+
+def get_rolling_counts(
+    names: Optional[Iterable[str]] = None,
+    series: Optional[Dict[str, RollingSeries]] = None
+) -> Dict[str, Dict[str, int]]:
+    """
+    Get counts of several series over every rolling window
+    
+    Args:
+        names: Series to report (defaults to all)
+        series: Series to read (defaults to this process's)
+    
     Returns:
-        int: Count of timestamps within window
+        dict: {series: {"1m": n, "5m": n, "1h": n}}
     """
-    cutoff = time.time() - window_seconds
-    return sum(1 for ts in timestamps if ts > cutoff)
+    now = time.time()
+    series = _series if series is None else series
+    selected: List[str] = sorted(series) if names is None else list(names)
+    return {
+        name: {
+            label: (series[name].count(seconds, now) if name in series else 0)
+            for label, seconds in ROLLING_WINDOWS.items()
+        }
+        for name in selected
+    }
+
+
+def record_request() -> None:
+    """Record a request for rolling statistics"""
+    get_series("requests").add()
+
+
+def record_error() -> None:
+    """Record an error for rolling statistics"""
+    get_series("errors").add()
 
 
 def get_requests_last_5m() -> int:
@@ -131,8 +325,7 @@ def get_requests_last_5m() -> int:
     Returns:
         int: Request count
     """
-    with _rolling_lock:
-        return _count_recent(_request_timestamps, 300)  # 5 minutes = 300 seconds
+    return get_event_count("requests", 300)  # 5 minutes = 300 seconds
 
 
 def get_errors_last_5m() -> int:
@@ -142,8 +335,7 @@ def get_errors_last_5m() -> int:
     Returns:
         int: Error count
     """
-    with _rolling_lock:
-        return _count_recent(_error_timestamps, 300)
+    return get_event_count("errors", 300)
 
 
 def get_kyiv_time() -> datetime:
@@ -166,6 +358,83 @@ def get_utc_time() -> datetime:
     return datetime.now(timezone.utc)
 
 
+def export_state() -> Dict[str, Any]:
+    """
+    Export this process's metrics for multi-worker aggregation
+    
+    Returns:
+        dict: JSON-serializable state
+    """
+    return {
+        "start_time": _start_time,
+        "interactions": get_interaction_count(),
+        "participant_last_call": get_participant_last_call(),
+        "series": {name: series.export_state() for name, series in list(_series.items())},
+    }
+
+
+def merge_states(states: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Combine exported states of exited workers into one
+    
+    Args:
+        states: export_state outputs
+    
+    Returns:
+        dict: State in the export_state shape, without a start time
+    """
+    series: Dict[str, RollingSeries] = {}
+    for state in states:
+        for name, rings in state["series"].items():
+            series.setdefault(name, RollingSeries()).merge_state(rings)
+    last_calls = [state["participant_last_call"] for state in states if state["participant_last_call"]]
+    return {
+        "start_time": None,
+        "interactions": sum(state["interactions"] for state in states),
+        "participant_last_call": max(last_calls) if last_calls else None,
+        "series": {name: rolling.export_state() for name, rolling in series.items()},
+    }
+
+
+def get_totals() -> Dict[str, Any]:
+    """
+    Get counters for this process, or summed over all workers
+    
+    With METRICS_MULTIPROC_DIR set, states of every worker are merged:
+    interactions and rolling series add up (exited workers included),
+    uptime is the oldest live worker's and the participant last call is the
+    most recent one.
+    
+    Returns:
+        dict: {"start_time", "interactions", "participant_last_call", "series"}
+    """
+    if not multiprocess.is_enabled():
+        return {
+            "start_time": _start_time,
+            "interactions": get_interaction_count(),
+            "participant_last_call": get_participant_last_call(),
+            "series": _series,
+        }
+    
+    return multiprocess.scrape_cached("metrics.totals", _merge_totals)
+
+
+def _merge_totals() -> Dict[str, Any]:
+    states = multiprocess.read_states("metrics")
+    series: Dict[str, RollingSeries] = {}
+    for state in states:
+        for name, rings in state["series"].items():
+            series.setdefault(name, RollingSeries()).merge_state(rings)
+    # ISO8601 UTC timestamps of one format order lexicographically
+    last_calls = [state["participant_last_call"] for state in states if state["participant_last_call"]]
+    return {
+        "start_time": min(state["start_time"] for state in states if state["start_time"] is not None),
+        "interactions": sum(state["interactions"] for state in states),
+        "participant_last_call": max(last_calls) if last_calls else None,
+        "series": series,
+    }
+
+
 def get_full_metrics() -> Dict[str, Any]:
     """
     Get all metrics for status endpoint
@@ -175,17 +444,25 @@ def get_full_metrics() -> Dict[str, Any]:
     """
     kyiv_time = get_kyiv_time()
     utc_time = get_utc_time()
+    totals = get_totals()
+    rolling = get_rolling_counts(series=totals["series"])
     
     return {
-        "загальна_кількість_взаємодій": get_interaction_count(),
-        "uptime": get_uptime_formatted(),
+        "загальна_кількість_взаємодій": totals["interactions"],
+        "uptime": get_uptime_formatted(time.time() - totals["start_time"]),
         "timezone": "Europe/Kyiv",
         "utc_time": utc_time.isoformat(),
         "local_time": kyiv_time.isoformat(),
         "participant_api": {
             "enabled": True,
-            "last_call_at": get_participant_last_call()
+            "last_call_at": totals["participant_last_call"]
         },
-        "requests_last_5m": get_requests_last_5m(),
-        "errors_last_5m": get_errors_last_5m()
+        "requests_last_5m": rolling.get("requests", {}).get("5m", 0),
+        "errors_last_5m": rolling.get("errors", {}).get("5m", 0),
+        "rolling": rolling,
+        "latency": get_latency_summary()
     }
+
+
+multiprocess.register_state("metrics", export_state, merge_states)
+heap.register_store("metrics.rolling_series", lambda: _series)
@@ -0,0 +1,303 @@
+"""
+Multi-process metrics aggregation for CIMEIKA API
+Per-worker state files in a shared directory, merged at read time
+"""
+import atexit
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Accumulated state of exited workers
+RETIRED_FILE = "retired.json"
+
+# name -> function exporting this process's state as JSON-serializable data
+_providers: Dict[str, Callable[[], Any]] = {}
+# name -> function combining several exported states into one
+_mergers: Dict[str, Callable[[List[Any]], Any]] = {}
+
+_writer: Optional[threading.Thread] = None
+_stop = threading.Event()
+
+# Worker files and derived values shared by everything one scrape reads
+_scrape: ContextVar[Optional[Dict[str, Any]]] = ContextVar("metrics_scrape", default=None)
+
+
+def register_state(
+    name: str,
+    export: Callable[[], Any],
+    merge: Optional[Callable[[List[Any]], Any]] = None
+) -> None:
+    """
+    Register a piece of per-process state to share with other workers
+    
+    Args:
+        name: State name (one per module, e.g. "metrics")
+        export: Returns the current state as JSON-serializable data
+        merge: Combines exported states into one, so exited workers' state
+            can be kept in the retired file (without it, it is dropped)
+    """
+    _providers[name] = export
+    if merge is not None:
+        _mergers[name] = merge
+
+
+def is_enabled() -> bool:
+    """Whether metrics are aggregated across workers"""
+    return bool(settings.METRICS_MULTIPROC_DIR)
+
+
+def pid_alive(pid: int) -> bool:
+    """Whether a worker process still exists"""
+    if not pid or pid < 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # Exists but belongs to another user
+        return True
+    return True
+
+
+def _state_path(pid: int) -> str:
+    return os.path.join(settings.METRICS_MULTIPROC_DIR, f"worker_{pid}.json")
+
+
+def export_states() -> Dict[str, Any]:
+    """
+    Export every registered state of this process
+    
+    Returns:
+        dict: {name: state}
+    """
+    return {name: export() for name, export in list(_providers.items())}
+
+
+def write_state() -> None:
+    """
+    Write this worker's state file
+    
+    The file is replaced atomically, so readers never see a partial write.
+    """
+    payload = {"pid": os.getpid(), "written_at": time.time(), "states": export_states()}
+    _write_json(_state_path(os.getpid()), payload)
+
+
+@contextmanager
+def scrape() -> Iterator[None]:
+    """
+    Read the worker files at most once within the block
+    
+    Everything a /metrics or /api/status request reads (several state
+    names, gauges computed at scrape time) then shares one read of the
+    directory, and values cached with scrape_cached() are computed once.
+    """
+    if _scrape.get() is not None:
+        yield
+        return
+    token = _scrape.set({})
+    try:
+        yield
+    finally:
+        _scrape.reset(token)
+
+
+def scrape_cached(key: str, compute: Callable[[], Any]) -> Any:
+    """
+    Compute a value once per scrape (every time outside of one)
+    
+    Args:
+        key: Cache key, unique per kind of value
+        compute: Computes the value
+    """
+    cache = _scrape.get()
+    if cache is None:
+        return compute()
+    if key not in cache:
+        cache[key] = compute()
+    return cache[key]
+
+
+def _load(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path: str, payload: Dict[str, Any]) -> None:
+    """Replace a file atomically"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".worker_", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(payload, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _retire(directory: str, filenames: List[str]) -> None:
+    """
+    Fold exited workers' files into the retired file and remove them
+    
+    Each file is first claimed by renaming it, so when several workers
+    scrape at once only one folds it; the retired file itself is updated
+    under an exclusive lock.
+    """
+    claimed = []
+    for filename in filenames:
+        claim = os.path.join(directory, f".retiring_{os.getpid()}_{filename}")
+        try:
+            os.rename(os.path.join(directory, filename), claim)
+        except OSError:
+            continue
+        claimed.append(claim)
+    if not claimed:
+        return
+    
+    with open(os.path.join(directory, ".retired.lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        retired_path = os.path.join(directory, RETIRED_FILE)
+        retired = (_load(retired_path) or {}).get("states", {})
+        exited = [(_load(claim) or {}).get("states", {}) for claim in claimed]
+        states = {}
+        for name, merge in _mergers.items():
+            parts = [state[name] for state in [retired, *exited] if name in state]
+            if parts:
+                states[name] = merge(parts)
+        _write_json(retired_path, {"pid": None, "written_at": time.time(), "states": states})
+    for claim in claimed:
+        try:
+            os.unlink(claim)
+        except OSError:
+            pass
+    logger.info(f"Folded metrics of {len(claimed)} exited worker(s) into {RETIRED_FILE}")
+
+
+def _read_payloads() -> List[Dict[str, Any]]:
+    """Other workers' files, with exited workers folded into the retired file"""
+    directory = settings.METRICS_MULTIPROC_DIR
+    own_file = f"worker_{os.getpid()}.json"
+    try:
+        files = os.listdir(directory)
+    except OSError as e:
+        logger.warning(f"Cannot read metrics directory: {e}")
+        return []
+    
+    payloads = []
+    exited = []
+    for filename in files:
+        if filename == own_file or not filename.startswith("worker_") or not filename.endswith(".json"):
+            continue
+        payload = _load(os.path.join(directory, filename))
+        if payload is None:
+            continue
+        if not pid_alive(payload.get("pid")):
+            exited.append(filename)
+            continue
+        payloads.append(payload)
+    
+    if exited:
+        try:
+            _retire(directory, exited)
+        except OSError as e:
+            logger.warning(f"Cannot fold exited workers' metrics: {e}")
+    retired = _load(os.path.join(directory, RETIRED_FILE))
+    if retired is not None:
+        payloads.append(retired)
+    return payloads
+
+
+def read_states(name: str) -> List[Any]:
+    """
+    Collect one state from every worker
+    
+    This process contributes its live state; other workers contribute
+    their last written file (at most METRICS_SYNC_INTERVAL old). Files of
+    exited workers are folded into one retired state (see register_state),
+    so their counts stay in the totals without their files piling up.
+    Within scrape() the directory is read once.
+    
+    Args:
+        name: State name
+    
+    Returns:
+        list: States, this process's first
+    """
+    export = _providers.get(name)
+    states = [export()] if export is not None else []
+    if not is_enabled():
+        return states
+    for payload in scrape_cached("multiprocess.payloads", _read_payloads):
+        state = payload.get("states", {}).get(name)
+        if state is not None:
+            states.append(state)
+    return states
+
+
+def _write_loop(interval: float) -> None:
+    while not _stop.wait(interval):
+        try:
+            write_state()
+        except Exception as e:
+            logger.warning(f"Failed to write worker metrics: {e}")
+
+
+def start() -> bool:
+    """
+    Start sharing this worker's metrics (no-op without METRICS_MULTIPROC_DIR)
+    
+    Call once per worker process, after forking (e.g. from the app lifespan).
+    
+    Returns:
+        bool: True if sharing is enabled
+    """
+    global _writer
+    if not is_enabled():
+        return False
+    if _writer is not None and _writer.is_alive():
+        return True
+    
+    os.makedirs(settings.METRICS_MULTIPROC_DIR, exist_ok=True)
+    write_state()
+    _stop.clear()
+    _writer = threading.Thread(
+        target=_write_loop,
+        args=(settings.METRICS_SYNC_INTERVAL,),
+        name="metrics-writer",
+        daemon=True
+    )
+    _writer.start()
+    atexit.register(stop)
+    logger.info(f"Multi-process metrics enabled: {settings.METRICS_MULTIPROC_DIR}")
+    return True
+
+
+def stop() -> None:
+    """Stop the writer and flush this worker's final state"""
+    global _writer
+    if _writer is None:
+        return
+    _stop.set()
+    _writer.join(timeout=5)
+    _writer = None
+    try:
+        write_state()
+    except Exception as e:
+        logger.warning(f"Failed to write final worker metrics: {e}")
@@ -0,0 +1,209 @@
+"""
+Sampling profiler for CIMEIKA API
+Statistical stack sampling of all threads, exported as collapsed stacks or speedscope JSON
+"""
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# (filename, line, function) from the outermost to the innermost frame
+Stack = Tuple[Tuple[str, int, str], ...]
+
+
+class ProfilerBusyError(RuntimeError):
+    """Raised when a profile is requested while another one is running"""
+
+
+class Profile:
+    """Result of a sampling run"""
+    
+    def __init__(self, stacks: Counter, interval: float, started_at: float, duration: float, samples: int):
+        self.stacks = stacks
+        self.interval = interval
+        self.started_at = started_at
+        self.duration = duration
+        self.samples = samples
+    
+    def collapsed(self) -> str:
+        """
+        Render in the collapsed format (flamegraph.pl, speedscope, inferno)
+        
+        Returns:
+            str: One "frame;frame;frame count" line per distinct stack
+        """
+        lines = []
+        for (thread_name, stack), count in self.stacks.most_common():
+            frames = [thread_name] + [f"{function} ({short_filename(filename)}:{line})" for filename, line, function in stack]
+            lines.append(";".join(frame.replace(";", ":") for frame in frames) + f" {count}")
+        return "\n".join(lines) + ("\n" if lines else "")
+    
+    def speedscope(self, name: str = "cimeika") -> Dict[str, Any]:
+        """
+        Render as a speedscope sampled profile (one profile per thread)
+        
+        Returns:
+            dict: speedscope file-format JSON
+        """
+        frame_index: Dict[Tuple[str, int, str], int] = {}
+        frames: List[Dict[str, Any]] = []
+        per_thread: Dict[str, Tuple[List[List[int]], List[float]]] = {}
+        
+        for (thread_name, stack), count in self.stacks.items():
+            indexes = []
+            for frame in stack:
+                index = frame_index.get(frame)
+                if index is None:
+                    index = frame_index[frame] = len(frames)
+                    frames.append({"name": frame[2], "file": frame[0], "line": frame[1]})
+                indexes.append(index)
+            samples, weights = per_thread.setdefault(thread_name, ([], []))
+            samples.append(indexes)
+            weights.append(count * self.interval)
+        
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "cimeika-profiler",
+            "shared": {"frames": frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": thread_name,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": samples,
+                    "weights": weights,
+                }
+                for thread_name, (samples, weights) in sorted(per_thread.items())
+            ],
+        }
+
+
+def short_filename(filename: str) -> str:
+    """Path relative to site-packages or the backend directory"""
+    marker = "site-packages/"
+    index = filename.rfind(marker)
+    if index != -1:
+        return filename[index + len(marker):]
+    return filename.rsplit("/backend/", 1)[-1]
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler sampling every thread's stack at a fixed interval
+    
+    Sampling runs on its own thread and only reads frames, so the profiled
+    code is never paused or instrumented; the cost is one stack walk per
+    thread per interval. Only one profile runs at a time.
+    """
+    
+    def __init__(self, max_seconds: float = 30.0, min_interval: float = 0.001):
+        """
+        Initialize profiler
+        
+        Args:
+            max_seconds: Longest allowed profile
+            min_interval: Shortest allowed sampling interval
+        """
+        self.max_seconds = max_seconds
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+    
+    @property
+    def busy(self) -> bool:
+        """Whether a profile is running"""
+        return self._lock.locked()
+    
+    def run(
+        self,
+        seconds: float,
+        interval: float = 0.005,
+        codes: Optional[Set[Any]] = None
+    ) -> Profile:
+        """
+        Sample all threads for a while (blocks the calling thread)
+        
+        Args:
+            seconds: Profile duration (capped at max_seconds)
+            interval: Seconds between samples
+            codes: If given, keep only stacks containing one of these code
+                objects (e.g. a route's endpoint)
+        
+        Returns:
+            Profile: Aggregated stacks
+        
+        Raises:
+            ProfilerBusyError: If another profile is running
+        """
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError("A profile is already running")
+        try:
+            return self._sample(min(seconds, self.max_seconds), max(interval, self.min_interval), codes)
+        finally:
+            self._lock.release()
+    
+    def _sample(self, seconds: float, interval: float, codes: Optional[Set[Any]]) -> Profile:
+        own = threading.get_ident()
+        stacks: Counter = Counter()
+        samples = 0
+        started_at = time.time()
+        start = time.perf_counter()
+        deadline = start + seconds
+        next_sample = start
+        
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            if now < next_sample:
+                time.sleep(next_sample - now)
+                continue
+            next_sample += interval
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = _walk(frame, codes)
+                if stack is not None:
+                    stacks[(names.get(ident, str(ident)), stack)] += 1
+            samples += 1
+        
+        return Profile(stacks, interval, started_at, time.perf_counter() - start, samples)
+
+
+def _walk(frame, codes: Optional[Set[Any]]) -> Optional[Stack]:
+    """Outermost-first stack of a frame, or None if filtered out"""
+    stack = []
+    matched = codes is None
+    while frame is not None:
+        code = frame.f_code
+        if not matched and code in codes:
+            matched = True
+        stack.append((code.co_filename, frame.f_lineno, code.co_name))
+        frame = frame.f_back
+    if not matched:
+        return None
+    stack.reverse()
+    return tuple(stack)
+
+
+def endpoint_codes(app, route_path: str) -> Set[Any]:
+    """
+    Code objects of the endpoints serving a route template
+    
+    Args:
+        app: FastAPI/Starlette application
+        route_path: Route template, e.g. "/api/participant/message"
+    
+    Returns:
+        set: Matching code objects (empty if the route is unknown)
+    """
+    from app.core.loop_monitor import route_code_map
+    
+    return {code for code, path in route_code_map(app).items() if path == route_path}
+
+
+profiler = SamplingProfiler()
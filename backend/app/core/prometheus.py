@@ -0,0 +1,725 @@
+"""
+Prometheus-compatible metrics for CIMEIKA API
+Counters, gauges and histograms with text exposition (format 0.0.4)
+"""
+import os
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from threading import Lock
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from app.core import multiprocess
+from app.core.latency import QUANTILES, get_sketch, get_window_histograms, merge_by_module
+from app.core.metrics import get_series
+
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+# Latency buckets in seconds, tuned for API handlers and DB statements
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Slower outbound calls (OpenAI)
+OUTBOUND_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    """Escape a label value for the text exposition format"""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    """Format a sample value"""
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Registry:
+    """Collection of metrics exposed together"""
+    
+    def __init__(self, shared: bool = False):
+        """
+        Initialize registry
+        
+        Args:
+            shared: Aggregate samples across workers when
+                METRICS_MULTIPROC_DIR is set
+        """
+        self._metrics: List["Metric"] = []
+        self._lock = Lock()
+        self.shared = shared
+    
+    def register(self, metric: "Metric") -> None:
+        """Add a metric to the registry"""
+        with self._lock:
+            if any(m.name == metric.name for m in self._metrics):
+                raise ValueError(f"Duplicate metric: {metric.name}")
+            self._metrics.append(metric)
+    
+    def get(self, name: str) -> Optional["Metric"]:
+        """Find a registered metric by name"""
+        return next((m for m in self._metrics if m.name == name), None)
+    
+    def generate_latest(self) -> str:
+        """
+        Render every metric in the Prometheus text format
+        
+        Returns:
+            str: Exposition text
+        """
+        with multiprocess.scrape():
+            if self.shared and multiprocess.is_enabled():
+                return self._generate_merged()
+            lines: List[str] = []
+            for metric in list(self._metrics):
+                lines.extend(metric.expose())
+            return "\n".join(lines) + "\n"
+    
+    def export_state(self) -> Dict[str, object]:
+        """
+        Export this process's samples for multi-worker aggregation
+        
+        Returns:
+            dict: {"pid", "metrics": {name: samples}}
+        """
+        return {
+            "pid": os.getpid(),
+            "metrics": {metric.name: metric.export_state() for metric in list(self._metrics)},
+        }
+    
+    def merge_states(self, states: List[Dict[str, object]]) -> Dict[str, object]:
+        """
+        Combine exported states of exited workers into one
+        
+        Counters and histograms add up; gauges only count live workers, so
+        they are left out.
+        
+        Args:
+            states: export_state outputs
+        
+        Returns:
+            dict: {"pid": None, "metrics": {name: samples}}
+        """
+        merged = {}
+        for metric in list(self._metrics):
+            if metric.type == "gauge":
+                continue
+            samples = [(False, state["metrics"].get(metric.name, [])) for state in states]
+            children = metric.merged_children(samples)
+            merged[metric.name] = [[list(values), metric._export_child(child)] for values, child in children.items()]
+        return {"pid": None, "metrics": merged}
+    
+    def _generate_merged(self) -> str:
+        """Render samples summed over every worker's exported state"""
+        states = multiprocess.read_states("prometheus")
+        own_pid = os.getpid()
+        live = [
+            state["pid"] == own_pid or multiprocess.pid_alive(state["pid"])
+            for state in states
+        ]
+        lines: List[str] = []
+        for metric in list(self._metrics):
+            samples = [
+                (alive, state["metrics"].get(metric.name, []))
+                for alive, state in zip(live, states)
+            ]
+            lines.extend(metric.expose(metric.merged_children(samples)))
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry(shared=True)
+multiprocess.register_state("prometheus", REGISTRY.export_state, REGISTRY.merge_states)
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+    
+    def __init__(self):
+        self.value = 0.0
+        self._lock = Lock()
+    
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class _GaugeChild:
+    __slots__ = ("value", "_lock", "_function")
+    
+    def __init__(self):
+        self.value = 0.0
+        self._lock = Lock()
+        self._function: Optional[Callable[[], float]] = None
+    
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+    
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value -= amount
+    
+    def set(self, value: float) -> None:
+        self.value = float(value)
+    
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Compute the value at scrape time"""
+        self._function = function
+    
+    def get(self) -> float:
+        if self._function is not None:
+            return float(self._function())
+        return self.value
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+    
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        # One slot per bound plus +Inf; stored non-cumulative
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = Lock()
+    
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+    
+    def snapshot(self) -> Tuple[List[int], float]:
+        with self._lock:
+            return list(self.counts), self.sum
+
+
+class Metric(ABC):
+    """Base class for labelled metric families"""
+    
+    type = "untyped"
+    
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        registry: Optional[Registry] = REGISTRY
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = Lock()
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+        if registry is not None:
+            registry.register(self)
+    
+    @abstractmethod
+    def _new_child(self):
+        """A child holding the values of one label combination"""
+        pass
+    
+    def labels(self, *values: str):
+        """
+        Get the child for a label combination
+        
+        Args:
+            *values: Label values in labelnames order
+        
+        Returns:
+            Child metric with inc/observe/set methods
+        """
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+    
+    def _label_string(self, values: Tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+    
+    @abstractmethod
+    def _samples(self, children: Dict[Tuple[str, ...], object]) -> List[str]:
+        """Exposition lines of the given children"""
+        pass
+    
+    def _export_child(self, child):
+        return child.value
+    
+    def _merge_child(self, child, value) -> None:
+        child.value += value
+    
+    def export_state(self) -> List[list]:
+        """This process's samples as JSON-serializable [labels, value] pairs"""
+        return [[list(values), self._export_child(child)] for values, child in list(self._children.items())]
+    
+    def merged_children(self, samples: List[Tuple[bool, List[list]]]) -> Dict[Tuple[str, ...], object]:
+        """
+        Sum exported samples of several workers into fresh children
+        
+        Args:
+            samples: (worker alive, export_state output) per worker
+        
+        Returns:
+            dict: {label values: child}
+        """
+        children: Dict[Tuple[str, ...], object] = {}
+        for _, worker_samples in samples:
+            for values, value in worker_samples:
+                key = tuple(values)
+                child = children.get(key)
+                if child is None:
+                    child = children[key] = self._new_child()
+                self._merge_child(child, value)
+        return children
+    
+    def expose(self, children: Optional[Dict[Tuple[str, ...], object]] = None) -> List[str]:
+        """
+        Render HELP, TYPE and sample lines
+        
+        Args:
+            children: Samples to render (defaults to this process's)
+        """
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ] + self._samples(dict(self._children) if children is None else children)
+
+
+class Counter(Metric):
+    """Monotonically increasing counter"""
+    
+    type = "counter"
+    
+    def _new_child(self):
+        return _CounterChild()
+    
+    def inc(self, amount: float = 1.0) -> None:
+        """Increment the unlabelled counter"""
+        self._children[()].inc(amount)
+    
+    def _samples(self, children: Dict[Tuple[str, ...], object]) -> List[str]:
+        return [
+            f"{self.name}{self._label_string(values)} {_format_value(child.value)}"
+            for values, child in children.items()
+        ]
+
+
+class Gauge(Metric):
+    """Value that can go up and down, or be computed at scrape time"""
+    
+    type = "gauge"
+    
+    def _new_child(self):
+        return _GaugeChild()
+    
+    def inc(self, amount: float = 1.0) -> None:
+        """Increment the unlabelled gauge"""
+        self._children[()].inc(amount)
+    
+    def dec(self, amount: float = 1.0) -> None:
+        """Decrement the unlabelled gauge"""
+        self._children[()].dec(amount)
+    
+    def set(self, value: float) -> None:
+        """Set the unlabelled gauge"""
+        self._children[()].set(value)
+    
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Compute the unlabelled gauge at scrape time"""
+        self._children[()].set_function(function)
+    
+    def export_state(self) -> List[list]:
+        """This process's samples, except gauges computed at scrape time"""
+        return [
+            [list(values), child.value]
+            for values, child in list(self._children.items())
+            if child._function is None
+        ]
+    
+    def merged_children(self, samples: List[Tuple[bool, List[list]]]) -> Dict[Tuple[str, ...], object]:
+        """Sum live workers' gauges; scrape-time gauges are computed locally"""
+        children = super().merged_children([(alive, s) for alive, s in samples if alive])
+        for values, child in list(self._children.items()):
+            if child._function is not None:
+                children[values] = child
+        return children
+    
+    def _samples(self, children: Dict[Tuple[str, ...], object]) -> List[str]:
+        return [
+            f"{self.name}{self._label_string(values)} {_format_value(child.get())}"
+            for values, child in children.items()
+        ]
+
+
+class Histogram(Metric):
+    """Bucketed distribution of observations"""
+    
+    type = "histogram"
+    
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+        registry: Optional[Registry] = REGISTRY
+    ):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+    
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+    
+    def observe(self, value: float) -> None:
+        """Observe a value on the unlabelled histogram"""
+        self._children[()].observe(value)
+    
+    def _export_child(self, child):
+        counts, total = child.snapshot()
+        return [counts, total]
+    
+    def _merge_child(self, child, value) -> None:
+        counts, total = value
+        for index, count in enumerate(counts):
+            child.counts[index] += count
+        child.sum += total
+    
+    def _samples(self, children: Dict[Tuple[str, ...], object]) -> List[str]:
+        lines = []
+        for values, child in children.items():
+            counts, total = child.snapshot()
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{self._label_string(values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_string(values)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{self._label_string(values)} {cumulative}")
+        return lines
+
+
+class WindowQuantiles(Metric):
+    """
+    Sliding-window latency percentiles from app.core.latency
+    
+    Computed at scrape time over the last window_seconds; exposed as gauges
+    because the window makes them non-cumulative.
+    """
+    
+    type = "gauge"
+    
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        window_seconds: int = 300,
+        by_module: bool = False,
+        registry: Optional[Registry] = REGISTRY
+    ):
+        self.window_seconds = window_seconds
+        self.by_module = by_module
+        labelnames = ("module", "quantile") if by_module else ("method", "route", "module", "quantile")
+        super().__init__(name, documentation, labelnames, registry)
+    
+    def _new_child(self):
+        raise TypeError(f"{self.name} is computed at scrape time and has no children to update")
+    
+    def export_state(self) -> List[list]:
+        """Nothing to export: the sketches are shared by app.core.latency"""
+        return []
+    
+    def _samples(self, children: Dict[Tuple[str, ...], object]) -> List[str]:
+        histograms = get_window_histograms(self.window_seconds)
+        if self.by_module:
+            series = [((module,), histogram) for module, histogram in merge_by_module(histograms.values()).items()]
+        else:
+            series = [
+                (tuple(name.split(" ", 1)) + (module,), histogram)
+                for name, (module, histogram) in histograms.items()
+            ]
+        lines = []
+        for values, histogram in sorted(series, key=lambda item: item[0]):
+            for _, q in QUANTILES:
+                labels = self._label_string(values + (str(q),))
+                lines.append(f"{self.name}{labels} {_format_value(histogram.quantile(q))}")
+        return lines
+
+
+# ===== Application metrics =====
+
+HTTP_REQUESTS = Counter(
+    "cimeika_http_requests_total",
+    "HTTP requests by route template, method and status",
+    ("method", "route", "status", "module"),
+)
+HTTP_LATENCY = Histogram(
+    "cimeika_http_request_duration_seconds",
+    "HTTP request latency by route template, method and status",
+    ("method", "route", "status", "module"),
+)
+HTTP_IN_PROGRESS = Gauge(
+    "cimeika_http_requests_in_progress",
+    "HTTP requests currently being served",
+)
+
+DB_STATEMENTS = Counter(
+    "cimeika_db_statements_total",
+    "SQL statements executed by statement type",
+    ("operation",),
+)
+DB_LATENCY = Histogram(
+    "cimeika_db_statement_duration_seconds",
+    "SQL statement execution time by statement type",
+    ("operation",),
+)
+
+WS_CONNECTIONS = Gauge(
+    "cimeika_websocket_connections",
+    "Open WebSocket connections by channel",
+    ("channel",),
+)
+WS_BROADCASTS = Counter(
+    "cimeika_websocket_broadcasts_total",
+    "WebSocket broadcasts by channel and event",
+    ("channel", "event"),
+)
+WS_MESSAGES = Counter(
+    "cimeika_websocket_messages_sent_total",
+    "WebSocket messages sent by channel",
+    ("channel",),
+)
+
+RULE_ANALYSES = Counter(
+    "cimeika_rule_engine_analyses_total",
+    "Rule engine analyses by mode and resulting severity",
+    ("mode", "severity"),
+)
+RULE_LATENCY = Histogram(
+    "cimeika_rule_engine_analysis_duration_seconds",
+    "Rule engine analysis time",
+)
+RULE_CACHE = Counter(
+    "cimeika_rule_engine_cache_total",
+    "Rule engine result cache lookups by outcome",
+    ("result",),
+)
+RULE_BUDGET_EXCEEDED = Counter(
+    "cimeika_rule_engine_budget_exceeded_total",
+    "Analyses stopped by the CPU budget, by the rule that was running",
+    ("pattern",),
+)
+RULE_PATTERN_EVALUATIONS = Counter(
+    "cimeika_rule_pattern_evaluations_total",
+    "Texts each rule was run over",
+    ("pattern",),
+)
+RULE_PATTERN_MATCHES = Counter(
+    "cimeika_rule_pattern_matches_total",
+    "Texts each rule matched",
+    ("pattern",),
+)
+RULE_PATTERN_SECONDS = Counter(
+    "cimeika_rule_pattern_seconds_total",
+    "Time spent running each rule",
+    ("pattern",),
+)
+FAILURE_FINGERPRINTS = Counter(
+    "cimeika_failure_fingerprints_total",
+    "Fingerprinted CI logs by how they matched the known failure clusters",
+    ("match",),
+)
+AUDIT_LOG_ENTRIES = Counter(
+    "cimeika_audit_log_entries_total",
+    "Audit log entries written to disk or dropped before they could be",
+    ("outcome",),
+)
+
+OPENAI_CALLS = Counter(
+    "cimeika_openai_requests_total",
+    "OpenAI API calls by model and outcome",
+    ("model", "outcome"),
+)
+OPENAI_LATENCY = Histogram(
+    "cimeika_openai_request_duration_seconds",
+    "OpenAI API call latency by model",
+    ("model",),
+    buckets=OUTBOUND_BUCKETS,
+)
+
+LOOP_LAG = Histogram(
+    "cimeika_event_loop_lag_seconds",
+    "Delay of event loop wake-ups beyond their schedule",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+LOOP_BLOCKS = Counter(
+    "cimeika_event_loop_blocks_total",
+    "Times the event loop was blocked past the threshold, by route",
+    ("route",),
+)
+SLOW_REQUESTS = Counter(
+    "cimeika_slow_requests_total",
+    "Requests that exceeded their route's latency budget",
+    ("route",),
+)
+
+HTTP_LATENCY_WINDOW = WindowQuantiles(
+    "cimeika_http_request_latency_5m_seconds",
+    "HTTP request latency percentiles over the last 5 minutes, per route"
+)
+MODULE_LATENCY_WINDOW = WindowQuantiles(
+    "cimeika_module_latency_5m_seconds",
+    "HTTP request latency percentiles over the last 5 minutes, per module",
+    by_module=True
+)
+
+UPTIME = Gauge("cimeika_uptime_seconds", "Seconds since the application started")
+INTERACTIONS = Gauge("cimeika_interactions", "Total interactions served (participant API)")
+
+
+def _route_labels(scope: dict) -> Tuple[str, str]:
+    """Route template and module for a request scope"""
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    if path is None:
+        # Unmatched requests share one label to keep cardinality bounded
+        return "<unmatched>", "none"
+    parts = path.split("/")
+    # /api/v1/<module>/... belongs to a module, everything else to the core
+    module = parts[3] if len(parts) > 3 and parts[1] == "api" and parts[2] == "v1" else "core"
+    return path, module or "core"
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording per-route request metrics
+    
+    Labels use the matched route template (``/api/v1/kazkar/{story_id}``),
+    never the raw path, so cardinality stays bounded.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        status_holder = [500]
+        
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder[0] = message["status"]
+            await send(message)
+        
+        HTTP_IN_PROGRESS.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            HTTP_IN_PROGRESS.dec()
+            record_http_request(scope, status_holder[0], duration)
+
+
+_HTTP_METHODS = frozenset(("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"))
+
+# (route, method, status) -> (counter child, histogram child, rolling series,
+# latency sketch); skips label formatting and lookups on the hot path
+_http_children: Dict[tuple, tuple] = {}
+
+
+def record_http_request(scope: dict, status_code: int, duration: float) -> None:
+    """
+    Record one served request
+    
+    Besides the Prometheus families, this feeds the rolling series behind
+    /api/status (requests.<module>, errors.<module> for 5xx, rate_limited)
+    and the route's sliding-window latency sketch.
+    
+    Args:
+        scope: ASGI scope (after routing)
+        status_code: Response status code
+        duration: Seconds spent serving the request
+    """
+    method = scope.get("method", "")
+    if method not in _HTTP_METHODS:
+        method = "OTHER"
+    key = (getattr(scope.get("route"), "path", None), method, status_code)
+    children = _http_children.get(key)
+    if children is None:
+        route, module = _route_labels(scope)
+        labels = (method, route, str(status_code), module)
+        series = [get_series(f"requests.{module}")]
+        if status_code >= 500:
+            series.append(get_series(f"errors.{module}"))
+        elif status_code == 429:
+            series.append(get_series("rate_limited"))
+        children = (
+            HTTP_REQUESTS.labels(*labels),
+            HTTP_LATENCY.labels(*labels),
+            tuple(series),
+            get_sketch(f"{method} {route}", module),
+        )
+        _http_children[key] = children
+    children[0].inc()
+    children[1].observe(duration)
+    now = time.time()
+    for rolling in children[2]:
+        rolling.add(1, now)
+    children[3].record(duration, now)
+
+
+def instrument_engine(engine) -> None:
+    """
+    Record SQL statement counts and timings for a SQLAlchemy engine
+    
+    Args:
+        engine: SQLAlchemy Engine
+    """
+    from sqlalchemy import event
+    
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("cimeika_query_start", []).append(time.perf_counter())
+    
+    def _finish(conn, statement: str) -> None:
+        starts = conn.info.get("cimeika_query_start")
+        if not starts:
+            return
+        duration = time.perf_counter() - starts.pop()
+        operation = (statement or "").lstrip().split(" ", 1)[0].upper() or "OTHER"
+        if operation not in ("SELECT", "INSERT", "UPDATE", "DELETE"):
+            operation = "OTHER"
+        DB_STATEMENTS.labels(operation).inc()
+        DB_LATENCY.labels(operation).observe(duration)
+    
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        _finish(conn, statement)
+    
+    # Failed statements never reach after_cursor_execute; pop their start
+    # here so later statements on the connection keep their own
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        if exception_context.connection is not None:
+            _finish(exception_context.connection, exception_context.statement)
+
+
+def _bind_status_gauges() -> None:
+    """Expose the status-endpoint counters as scrape-time gauges"""
+    from app.core import metrics
+    
+    # Totals span every worker when METRICS_MULTIPROC_DIR is set
+    UPTIME.set_function(lambda: time.time() - metrics.get_totals()["start_time"])
+    INTERACTIONS.set_function(lambda: metrics.get_totals()["interactions"])
+
+
+_bind_status_gauges()
@@ -0,0 +1,302 @@
+"""
+Quota policy engine for CIMEIKA API
+Declarative per-route, per-method, per-IP and per-API-key rate limits
+"""
+import hashlib
+import time
+from pathlib import Path
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+import yaml
+from app.core import heap
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.rate_limit import (
+    RateLimiter,
+    RateLimitBackend,
+    RateLimitResult,
+    get_rate_limit_backend,
+)
+
+logger = get_logger(__name__)
+
+DEFAULT_CONFIG_PATH = Path(__file__).parent.parent / "config" / "rate_limits.yaml"
+
+KEY_TYPES = ("ip", "api_key")
+
+
+def api_key_id(api_key: str) -> str:
+    """
+    Stable identifier for an API key that is safe to store and log
+    
+    Args:
+        api_key: Raw API key
+    
+    Returns:
+        str: First 16 hex chars of the key's SHA-256
+    """
+    return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+
+class Quota:
+    """A named limit bucket charged by one or more rules"""
+    
+    def __init__(self, name: str, spec: Dict[str, Any], backend: RateLimitBackend):
+        key = spec.get("key", "ip")
+        if key not in KEY_TYPES:
+            raise ValueError(f"Quota '{name}': key must be one of {KEY_TYPES}, got '{key}'")
+        if not isinstance(spec.get("per_minute"), int) or spec["per_minute"] <= 0:
+            raise ValueError(f"Quota '{name}': per_minute must be a positive integer")
+        
+        self.name = name
+        self.key = key
+        self.limiter = RateLimiter(
+            requests_per_minute=spec["per_minute"],
+            requests_per_hour=spec.get("per_hour"),
+            backend=backend,
+            name=name
+        )
+        
+        # Per-key limits, each with its own namespace in the backend
+        self.overrides: Dict[str, RateLimiter] = {
+            str(override_key): RateLimiter(
+                requests_per_minute=limits.get("per_minute", spec["per_minute"]),
+                requests_per_hour=limits.get("per_hour", spec.get("per_hour")),
+                backend=backend,
+                name=f"{name}@{override_key}"
+            )
+            for override_key, limits in (spec.get("overrides") or {}).items()
+        }
+    
+    def limiter_for(self, key: str) -> RateLimiter:
+        """Get the limiter that applies to a key"""
+        return self.overrides.get(key, self.limiter)
+
+
+class QuotaRule:
+    """Maps matching requests to the quotas they charge and their cost"""
+    
+    def __init__(self, spec: Dict[str, Any], quotas: Dict[str, Quota]):
+        path = spec.get("path")
+        if not isinstance(path, str) or not path.startswith("/"):
+            raise ValueError(f"Rate limit rule needs an absolute path, got {path!r}")
+        
+        self.path = path
+        self.prefix = path.endswith("/")
+        self.methods = {m.upper() for m in spec["methods"]} if spec.get("methods") else None
+        self.cost = int(spec.get("cost", 1))
+        unit_kb = spec.get("payload_unit_kb")
+        self.payload_unit = int(unit_kb) * 1024 if unit_kb else 0
+        
+        names = spec.get("quotas") or []
+        unknown = [n for n in names if n not in quotas]
+        if unknown:
+            raise ValueError(f"Rate limit rule '{path}' references unknown quotas: {unknown}")
+        self.quotas: List[Quota] = [quotas[n] for n in names]
+    
+    def matches(self, path: str, method: str) -> bool:
+        """Check whether the rule applies to a request"""
+        if self.methods is not None and method not in self.methods:
+            return False
+        if self.prefix:
+            return path.startswith(self.path)
+        return path == self.path
+    
+    def cost_for(self, content_length: int = 0) -> int:
+        """Weight of a request carrying content_length bytes of body"""
+        if self.payload_unit and content_length > 0:
+            return self.cost + content_length // self.payload_unit
+        return self.cost
+
+
+class QuotaEngine:
+    """
+    Single rate limiting engine driven by a declarative quota config
+    
+    The config (see app/config/rate_limits.yaml) defines named quotas and
+    ordered rules mapping routes and methods to the quotas they charge.
+    Each quota is a sliding-window RateLimiter on the shared backend, so a
+    check is one O(1) backend hit per charged quota.
+    """
+    
+    def __init__(self, config: Dict[str, Any], backend: Optional[RateLimitBackend] = None):
+        """
+        Initialize quota engine
+        
+        Args:
+            config: Parsed quota config
+            backend: Counter storage (defaults to the process-wide backend)
+        
+        Raises:
+            ValueError: If the config is invalid
+        """
+        self.backend = backend or get_rate_limit_backend()
+        self.version = config.get("version", 1)
+        
+        self.quotas: Dict[str, Quota] = {
+            name: Quota(name, spec or {}, self.backend)
+            for name, spec in (config.get("quotas") or {}).items()
+        }
+        self.rules: List[QuotaRule] = [QuotaRule(spec, self.quotas) for spec in config.get("rules") or []]
+        self.exclude_paths: List[str] = list(config.get("exclude") or [])
+        
+        # Exact-path lookups are O(1); prefix rules are few and kept in order
+        self._exact_excludes = set(self.exclude_paths)
+        self._prefix_excludes = tuple(p.rstrip("/") + "/" for p in self.exclude_paths if p != "/")
+        self._match_cache: Dict[Tuple[str, str], Optional[QuotaRule]] = {}
+        self._cache_lock = Lock()
+    
+    @classmethod
+    def from_file(cls, path: Optional[str] = None, backend: Optional[RateLimitBackend] = None) -> "QuotaEngine":
+        """
+        Load an engine from a YAML quota config
+        
+        Args:
+            path: Config path (defaults to RATE_LIMIT_CONFIG or the bundled config)
+            backend: Counter storage
+        
+        Returns:
+            QuotaEngine: Configured engine
+        """
+        config_path = Path(path or settings.RATE_LIMIT_CONFIG or DEFAULT_CONFIG_PATH)
+        with open(config_path, "r", encoding="utf-8") as f:
+            config = yaml.safe_load(f) or {}
+        return cls(config, backend=backend)
+    
+    @classmethod
+    def simple(
+        cls,
+        requests_per_minute: int = 60,
+        requests_per_hour: Optional[int] = 1000,
+        exclude_paths: Optional[List[str]] = None,
+        backend: Optional[RateLimitBackend] = None
+    ) -> "QuotaEngine":
+        """Build a single per-IP quota applied to every path"""
+        return cls(
+            {
+                "quotas": {
+                    "ip": {"key": "ip", "per_minute": requests_per_minute, "per_hour": requests_per_hour}
+                },
+                "rules": [{"path": "/", "quotas": ["ip"]}],
+                "exclude": exclude_paths or [],
+            },
+            backend=backend
+        )
+    
+    def is_excluded(self, path: str) -> bool:
+        """Check whether a path is excluded from rate limiting"""
+        return path in self._exact_excludes or path.startswith(self._prefix_excludes)
+    
+    def match(self, path: str, method: str = "GET") -> Optional[QuotaRule]:
+        """
+        Find the rule for a request
+        
+        Args:
+            path: Request path
+            method: HTTP method
+        
+        Returns:
+            QuotaRule | None: First matching rule, or None if excluded/unmatched
+        """
+        cache_key = (path, method)
+        try:
+            return self._match_cache[cache_key]
+        except KeyError:
+            pass
+        
+        rule = None
+        if not self.is_excluded(path):
+            rule = next((r for r in self.rules if r.matches(path, method)), None)
+        
+        # Paths come from clients, so keep the memo bounded
+        with self._cache_lock:
+            if len(self._match_cache) >= 4096:
+                self._match_cache.clear()
+            self._match_cache[cache_key] = rule
+        return rule
+    
+    def check(
+        self,
+        rule: QuotaRule,
+        key_type: str,
+        key: str,
+        content_length: int = 0
+    ) -> Optional[RateLimitResult]:
+        """
+        Charge every quota of a rule that is keyed by key_type
+        
+        All or nothing: if a quota rejects the request, the quotas charged
+        before it are refunded, so rejected retries do not use them up.
+        
+        Args:
+            rule: Matched rule
+            key_type: "ip" or "api_key"
+            key: Client IP or raw API key
+            content_length: Request body size in bytes
+        
+        Returns:
+            RateLimitResult | None: The most restrictive result, or None if
+            the rule charges no quota of this key type
+        """
+        if key_type == "api_key":
+            key = api_key_id(key)
+        
+        cost = rule.cost_for(content_length)
+        now = time.time()
+        result = None
+        charged: List[Tuple[RateLimiter, int]] = []
+        for quota in rule.quotas:
+            if quota.key != key_type:
+                continue
+            limiter = quota.limiter_for(key)
+            # A single request may never cost more than the quota can hold
+            quota_cost = min(cost, min(size_limit for _, size_limit, _ in limiter.windows))
+            quota_result = limiter.check(key, cost=quota_cost, now=now)
+            if not quota_result.allowed:
+                for charged_limiter, charged_cost in charged:
+                    charged_limiter.refund(key, charged_cost, now)
+                return quota_result
+            charged.append((limiter, quota_cost))
+            if result is None or quota_result.remaining < result.remaining:
+                result = quota_result
+        return result
+    
+    def check_request(
+        self,
+        path: str,
+        method: str,
+        key_type: str,
+        key: str,
+        content_length: int = 0
+    ) -> Optional[RateLimitResult]:
+        """Match a request and charge its quotas of key_type (see check)"""
+        rule = self.match(path, method)
+        if rule is None:
+            return None
+        return self.check(rule, key_type, key, content_length)
+    
+    def reset(self) -> None:
+        """Forget all counters"""
+        self.backend.reset()
+
+
+_engine: Optional[QuotaEngine] = None
+
+
+def get_quota_engine() -> QuotaEngine:
+    """
+    Get the process-wide quota engine
+    
+    Returns:
+        QuotaEngine: Engine loaded from the configured quota file
+    """
+    global _engine
+    if _engine is None:
+        _engine = QuotaEngine.from_file()
+        logger.info(
+            f"Rate limit quotas loaded: {len(_engine.quotas)} quotas, {len(_engine.rules)} rules"
+        )
+    return _engine
+
+
+heap.register_store("quota.match_cache", lambda: get_quota_engine()._match_cache)
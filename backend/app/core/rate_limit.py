@@ -1,67 +1,372 @@
 """
 Rate limiting middleware for CIMEIKA API
-Simple in-memory rate limiting per IP address
+Sliding-window-counter rate limiting per IP address
+with in-memory or shared (Redis) counter storage
 """
+import asyncio
+import math
 import time
-from typing import Dict, Tuple
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from threading import Lock
+from typing import List, NamedTuple, Optional, Tuple
 from fastapi import Request, HTTPException, status
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import JSONResponse
+from app.core import heap
+from app.core.config import settings
 from app.core.logging import get_logger
+from app.core.tracing import start_span
 
 logger = get_logger(__name__)
 
 
+class RateLimitResult(NamedTuple):
+    """Outcome of a single rate limit check"""
+    allowed: bool
+    reason: str
+    limit: int
+    remaining: int
+    retry_after: int
+
+
+def _retry_after(size: int, limit: int, cost: int, elapsed: float, current: int, previous: int) -> int:
+    """
+    Seconds until a sliding window would admit a request of the given cost
+    
+    The window estimate is ``previous * (1 - t / size) + current``; the
+    previous window's share decays linearly while the current one only
+    grows, so the wait is solved in closed form instead of probed.
+    
+    Args:
+        size: Window size in seconds
+        limit: Maximum weight per window
+        cost: Weight of the rejected request
+        elapsed: Seconds elapsed in the current window
+        current: Weight counted in the current window
+        previous: Weight counted in the previous window
+    
+    Returns:
+        int: Whole seconds to wait (at least 1)
+    """
+    if cost > limit:
+        return size
+    
+    if current + cost <= limit:
+        # Wait for the previous window's share to decay far enough
+        target = size * (1 - (limit - current - cost) / previous)
+        wait = target - elapsed
+    else:
+        # Current window is full: wait for the rollover, then for the
+        # (now previous) window's share to decay
+        wait = (size - elapsed) + size * max(0.0, 1 - (limit - cost) / current)
+    
+    return max(1, math.ceil(wait))
+
+
+# (window size in seconds, limit, label)
+Window = Tuple[int, int, str]
+
+
+class RateLimitBackend(ABC):
+    """
+    Storage strategy for rate limit counters
+    
+    A backend applies sliding-window-counter checks for a key against a
+    set of windows and atomically counts the request when it is admitted.
+    
+    Backends with ``blocking`` set may wait on the network in hit(), so
+    async callers run checks against them in a worker thread.
+    """
+    
+    blocking = False
+    
+    @abstractmethod
+    def hit(self, key: str, windows: List[Window], cost: int, now: float) -> RateLimitResult:
+        """
+        Check and count a request
+        
+        Args:
+            key: Namespaced rate limit key
+            windows: Windows to enforce
+            cost: Weight of the request
+            now: Current time
+        
+        Returns:
+            RateLimitResult: Decision with remaining quota and retry hint
+        """
+        pass
+    
+    @abstractmethod
+    def refund(self, key: str, windows: List[Window], cost: int, now: float) -> None:
+        """
+        Uncount a request admitted by hit() (e.g. rejected by another quota)
+        
+        Args:
+            key: Namespaced rate limit key
+            windows: Windows the request was counted in
+            cost: Weight it was counted with
+            now: Current time
+        """
+        pass
+    
+    @abstractmethod
+    def reset(self) -> None:
+        """Forget all tracked keys"""
+        pass
+    
+    def start(self) -> None:
+        """Start background work, if the backend has any (call once per worker)"""
+    
+    def stop(self) -> None:
+        """Stop background work and flush what it holds"""
+
+
+class MemoryBackend(RateLimitBackend):
+    """
+    In-process sliding-window-counter storage
+    
+    Each key keeps a counter for the current and previous fixed window of
+    every limit, and the request rate is estimated by weighting the
+    previous window by how much of it still overlaps the sliding window.
+    Checks are O(1) and state is a handful of integers per key.
+    
+    Keys live in an LRU-ordered dict: idle keys expire from the cold end as
+    new requests arrive, and the dict never grows past ``max_entries``, so
+    memory stays bounded even under IP-spray traffic.
+    
+    Counters are per process; use the Redis backend to share them across
+    workers and replicas.
+    """
+    
+    def __init__(self, max_entries: int = 100_000, idle_ttl: int = 7200):
+        """
+        Initialize memory backend
+        
+        Args:
+            max_entries: Maximum number of tracked keys
+            idle_ttl: Seconds after which an idle key is dropped. A key's
+                previous window still counts, so this should be at least
+                two of the longest windows.
+        """
+        self.max_entries = max_entries
+        self.idle_ttl = idle_ttl
+        
+        # Storage: {key: [last_seen, (window_index, current, previous) * n]}
+        self.storage: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = Lock()
+    
+    def _expire(self, now: float) -> None:
+        """Drop idle keys from the cold end of the LRU order"""
+        cutoff = now - self.idle_ttl
+        storage = self.storage
+        while storage:
+            key = next(iter(storage))
+            if storage[key][0] >= cutoff:
+                break
+            del storage[key]
+    
+    def hit(self, key: str, windows: List[Window], cost: int, now: float) -> RateLimitResult:
+        """Check and count a request (see RateLimitBackend.hit)"""
+        with self._lock:
+            self._expire(now)
+            
+            state = self.storage.get(key)
+            if state is None:
+                state = [now] + [0, 0, 0] * len(windows)
+                self.storage[key] = state
+                if len(self.storage) > self.max_entries:
+                    self.storage.popitem(last=False)
+            else:
+                self.storage.move_to_end(key)
+            state[0] = now
+            
+            remaining = None
+            limit_for_remaining = 0
+            for i, (size, limit, label) in enumerate(windows):
+                base = 1 + 3 * i
+                index = int(now // size)
+                if state[base] != index:
+                    # Roll the window; the old current becomes previous only
+                    # if it is the immediately preceding window
+                    state[base + 2] = state[base + 1] if index == state[base] + 1 else 0
+                    state[base + 1] = 0
+                    state[base] = index
+                
+                elapsed = now - index * size
+                current, previous = state[base + 1], state[base + 2]
+                estimated = previous * (1 - elapsed / size) + current
+                
+                if estimated + cost > limit:
+                    return RateLimitResult(
+                        allowed=False,
+                        reason=f"Too many requests. Limit: {limit}/{label}",
+                        limit=limit,
+                        remaining=0,
+                        retry_after=_retry_after(size, limit, cost, elapsed, current, previous)
+                    )
+                
+                window_remaining = int(limit - estimated - cost)
+                if remaining is None or window_remaining < remaining:
+                    remaining = window_remaining
+                    limit_for_remaining = limit
+            
+            for i in range(len(windows)):
+                state[2 + 3 * i] += cost
+        
+        return RateLimitResult(
+            allowed=True,
+            reason="OK",
+            limit=limit_for_remaining,
+            remaining=max(0, remaining),
+            retry_after=0
+        )
+    
+    def refund(self, key: str, windows: List[Window], cost: int, now: float) -> None:
+        """Uncount a request (see RateLimitBackend.refund)"""
+        with self._lock:
+            state = self.storage.get(key)
+            if state is None:
+                return
+            for i, (size, _, _) in enumerate(windows):
+                base = 1 + 3 * i
+                # Only the window the request was counted in
+                if state[base] == int(now // size):
+                    state[base + 1] = max(0, state[base + 1] - cost)
+    
+    def reset(self) -> None:
+        """Forget all tracked keys"""
+        with self._lock:
+            self.storage.clear()
+
+
+_backend: Optional[RateLimitBackend] = None
+
+
+def get_rate_limit_backend() -> RateLimitBackend:
+    """
+    Get the process-wide rate limit backend selected by settings
+    
+    With RATE_LIMIT_BACKEND=redis and REDIS_HOST set, counters are shared
+    through Redis; otherwise (or if the redis package is missing) they are
+    kept in process memory.
+    
+    Returns:
+        RateLimitBackend: Shared backend instance
+    """
+    global _backend
+    if _backend is not None:
+        return _backend
+    
+    if settings.RATE_LIMIT_BACKEND == "redis":
+        if not settings.REDIS_HOST:
+            logger.warning("RATE_LIMIT_BACKEND=redis but REDIS_HOST is not set, using memory backend")
+        else:
+            try:
+                from app.core.rate_limit_redis import RedisBackend
+                _backend = RedisBackend.from_settings()
+                logger.info(
+                    f"Rate limiting backend: redis ({settings.REDIS_HOST}:{settings.REDIS_PORT})"
+                )
+                return _backend
+            except ImportError:
+                logger.warning(
+                    "redis package not installed, using memory rate limit backend. "
+                    "Install with: pip install redis"
+                )
+    
+    _backend = MemoryBackend()
+    return _backend
+
+
+def _local_counters():
+    backend = get_rate_limit_backend()
+    if isinstance(backend, MemoryBackend):
+        return backend.storage
+    # Redis: local pre-count state (the fallback only fills while Redis is down)
+    return getattr(backend, "_local", {})
+
+
+heap.register_store("rate_limit.counters", _local_counters)
+
+
 class RateLimiter:
     """
-    Simple in-memory rate limiter
+    Sliding-window rate limiter
     
-    Tracks requests per IP address and enforces rate limits
+    Enforces a per-minute and an optional per-hour limit per key. Counting
+    is delegated to a RateLimitBackend; keys are namespaced by ``name`` so
+    several limiters can share one backend.
     """
     
     def __init__(
         self,
         requests_per_minute: int = 60,
-        requests_per_hour: int = 1000
+        requests_per_hour: Optional[int] = 1000,
+        max_entries: int = 100_000,
+        backend: Optional[RateLimitBackend] = None,
+        name: str = "ip"
     ):
         """
         Initialize rate limiter
         
         Args:
             requests_per_minute: Maximum requests per minute per IP
-            requests_per_hour: Maximum requests per hour per IP
+            requests_per_hour: Maximum requests per hour per IP (None to disable)
+            max_entries: Maximum number of tracked keys (private memory backend only)
+            backend: Counter storage (defaults to a private MemoryBackend)
+            name: Key namespace within the backend
         """
         self.requests_per_minute = requests_per_minute
         self.requests_per_hour = requests_per_hour
+        self.name = name
         
-        # Storage: {ip: [(timestamp, count_minute, count_hour), ...]}
-        self.storage: Dict[str, Tuple[float, int, int]] = {}
+        self.windows: List[Window] = [(60, requests_per_minute, "minute")]
+        if requests_per_hour is not None:
+            self.windows.append((3600, requests_per_hour, "hour"))
         
-        # Cleanup interval (seconds)
-        self.last_cleanup = time.time()
-        self.cleanup_interval = 300  # 5 minutes
-    
-    def _cleanup_old_entries(self) -> None:
-        """Remove old entries from storage to prevent memory leak"""
-        now = time.time()
+        # A key's previous window still counts, so state idle for two of the
+        # longest windows carries no information and can be dropped
+        self.idle_ttl = 2 * max(size for size, _, _ in self.windows)
         
-        if now - self.last_cleanup < self.cleanup_interval:
-            return
+        self.backend = backend or MemoryBackend(max_entries=max_entries, idle_ttl=self.idle_ttl)
+    
+    @property
+    def storage(self) -> dict:
+        """Tracked keys of a memory backend (empty for remote backends)"""
+        return getattr(self.backend, "storage", {})
+    
+    def check(self, key: str, cost: int = 1, now: Optional[float] = None) -> RateLimitResult:
+        """
+        Check and count a request
         
-        # Remove entries older than 1 hour
-        cutoff = now - 3600
-        to_remove = [
-            ip for ip, (timestamp, _, _) in self.storage.items()
-            if timestamp < cutoff
-        ]
+        Rejected requests are not counted, so a client that backs off for
+        ``retry_after`` seconds is admitted again.
         
-        for ip in to_remove:
-            del self.storage[ip]
+        Args:
+            key: Client IP address (or any other rate limit key)
+            cost: Weight of the request
+            now: Current time (defaults to time.time())
         
-        self.last_cleanup = now
+        Returns:
+            RateLimitResult: Decision with remaining quota and retry hint
+        """
+        if now is None:
+            now = time.time()
+        return self.backend.hit(f"{self.name}:{key}", self.windows, cost, now)
+    
+    def refund(self, key: str, cost: int = 1, now: Optional[float] = None) -> None:
+        """
+        Uncount a request admitted by check()
         
-        if to_remove:
-            logger.debug(f"Cleaned up {len(to_remove)} old rate limit entries")
+        Args:
+            key: Key it was checked with
+            cost: Weight it was checked with
+            now: Current time (defaults to time.time())
+        """
+        if now is None:
+            now = time.time()
+        self.backend.refund(f"{self.name}:{key}", self.windows, cost, now)
     
     def is_allowed(self, ip: str) -> Tuple[bool, str]:
         """
@@ -69,61 +374,29 @@ class RateLimiter:
         
         Args:
             ip: Client IP address
-            
+        
         Returns:
             Tuple of (allowed: bool, reason: str)
         """
-        now = time.time()
-        
-        # Periodic cleanup
-        self._cleanup_old_entries()
-        
-        # Get or initialize counters for this IP
-        if ip not in self.storage:
-            self.storage[ip] = (now, 1, 1)
-            return True, "OK"
-        
-        last_time, count_minute, count_hour = self.storage[ip]
-        
-        # Calculate time windows
-        minute_ago = now - 60
-        hour_ago = now - 3600
-        
-        # Reset counters if outside time windows
-        if last_time < minute_ago:
-            # More than a minute passed, reset minute counter
-            count_minute = 0
-        
-        if last_time < hour_ago:
-            # More than an hour passed, reset hour counter
-            count_hour = 0
-        
-        # Increment counters
-        count_minute += 1
-        count_hour += 1
-        
-        # Check limits
-        if count_minute > self.requests_per_minute:
-            logger.warning(
-                f"Rate limit exceeded for IP {ip}: {count_minute} requests/minute"
-            )
-            return False, f"Too many requests. Limit: {self.requests_per_minute}/minute"
-        
-        if count_hour > self.requests_per_hour:
-            logger.warning(
-                f"Rate limit exceeded for IP {ip}: {count_hour} requests/hour"
-            )
-            return False, f"Too many requests. Limit: {self.requests_per_hour}/hour"
+        result = self.check(ip)
         
-        # Update storage
-        self.storage[ip] = (now, count_minute, count_hour)
+        if not result.allowed:
+            # Lazy %-args: most of these are throttled away during a flood
+            logger.warning("Rate limit exceeded for IP %s: %s", ip, result.reason)
         
-        return True, "OK"
+        return result.allowed, result.reason
+    
+    def reset(self) -> None:
+        """Forget all tracked keys"""
+        self.backend.reset()
 
 
 class RateLimitMiddleware(BaseHTTPMiddleware):
     """
     FastAPI middleware for rate limiting
+    
+    Charges the per-IP quotas of the matching QuotaEngine rule. Quotas keyed
+    by API key are charged by the endpoints that authenticate the key.
     """
     
     def __init__(
@@ -131,23 +404,32 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
         app,
         requests_per_minute: int = 60,
         requests_per_hour: int = 1000,
-        exclude_paths: list = None
+        exclude_paths: list = None,
+        engine=None
     ):
         """
         Initialize middleware
         
         Args:
             app: FastAPI application
-            requests_per_minute: Max requests per minute
-            requests_per_hour: Max requests per hour
-            exclude_paths: List of paths to exclude from rate limiting
+            requests_per_minute: Max requests per minute (without engine)
+            requests_per_hour: Max requests per hour (without engine)
+            exclude_paths: List of paths to exclude from rate limiting (without engine)
+            engine: QuotaEngine with the full quota policy
         """
         super().__init__(app)
-        self.limiter = RateLimiter(requests_per_minute, requests_per_hour)
-        self.exclude_paths = exclude_paths or ["/health", "/ready", "/api/docs", "/api/redoc"]
+        if engine is None:
+            from app.core.quota import QuotaEngine
+            engine = QuotaEngine.simple(
+                requests_per_minute,
+                requests_per_hour,
+                exclude_paths or ["/health", "/ready", "/api/docs", "/api/redoc"]
+            )
+        self.engine = engine
         
         logger.info(
-            f"Rate limiting enabled: {requests_per_minute}/min, {requests_per_hour}/hour"
+            f"Rate limiting enabled: {len(engine.quotas)} quotas, {len(engine.rules)} rules "
+            f"({type(engine.backend).__name__})"
         )
     
     async def dispatch(self, request: Request, call_next):
@@ -157,40 +439,54 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
         Args:
             request: Incoming request
             call_next: Next middleware/handler
-            
+        
         Returns:
             Response or rate limit error
         """
-        # Skip rate limiting for excluded paths
-        if any(request.url.path.startswith(path) for path in self.exclude_paths):
-            return await call_next(request)
+        with start_span("rate_limit.check") as span:
+            # Skip rate limiting for excluded and unmatched paths
+            rule = self.engine.match(request.url.path, request.method)
+            if rule is not None:
+                # Get client IP
+                # Check X-Forwarded-For header first (for proxy/load balancer)
+                client_ip = request.headers.get("X-Forwarded-For")
+                if client_ip:
+                    # X-Forwarded-For can contain multiple IPs, take the first one
+                    client_ip = client_ip.split(",")[0].strip()
+                else:
+                    # Fallback to direct connection IP
+                    client_ip = request.client.host if request.client else "unknown"
+                
+                content_length = request.headers.get("Content-Length", "")
+                content_length = int(content_length) if content_length.isdigit() else 0
+                
+                # Check rate limit (off the event loop if the backend waits on Redis)
+                if self.engine.backend.blocking:
+                    result = await asyncio.to_thread(self.engine.check, rule, "ip", client_ip, content_length)
+                else:
+                    result = self.engine.check(rule, "ip", client_ip, content_length)
+                span.set_attribute("rule", rule.path)
+                if result is not None:
+                    span.set_attribute("allowed", result.allowed)
         
-        # Get client IP
-        # Check X-Forwarded-For header first (for proxy/load balancer)
-        client_ip = request.headers.get("X-Forwarded-For")
-        if client_ip:
-            # X-Forwarded-For can contain multiple IPs, take the first one
-            client_ip = client_ip.split(",")[0].strip()
-        else:
-            # Fallback to direct connection IP
-            client_ip = request.client.host if request.client else "unknown"
-        
-        # Check rate limit
-        allowed, reason = self.limiter.is_allowed(client_ip)
+        if rule is None or result is None:
+            return await call_next(request)
         
-        if not allowed:
+        if not result.allowed:
             logger.warning(
-                f"Rate limit exceeded for {client_ip} on {request.url.path}: {reason}"
+                "Rate limit exceeded for %s on %s: %s", client_ip, request.url.path, result.reason
             )
             return JSONResponse(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
                 content={
                     "error": "rate_limit_exceeded",
-                    "message": reason,
+                    "message": result.reason,
                     "detail": "Please try again later"
                 },
                 headers={
-                    "Retry-After": "60"  # Suggest retry after 60 seconds
+                    "Retry-After": str(result.retry_after),
+                    "X-RateLimit-Limit": str(result.limit),
+                    "X-RateLimit-Remaining": "0"
                 }
             )
         
@@ -198,7 +494,11 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
         response = await call_next(request)
         
         # Add rate limit headers to response
-        response.headers["X-RateLimit-Limit-Minute"] = str(self.limiter.requests_per_minute)
-        response.headers["X-RateLimit-Limit-Hour"] = str(self.limiter.requests_per_hour)
+        limiter = next(q for q in rule.quotas if q.key == "ip").limiter_for(client_ip)
+        response.headers["X-RateLimit-Limit-Minute"] = str(limiter.requests_per_minute)
+        if limiter.requests_per_hour is not None:
+            response.headers["X-RateLimit-Limit-Hour"] = str(limiter.requests_per_hour)
+        response.headers["X-RateLimit-Limit"] = str(result.limit)
+        response.headers["X-RateLimit-Remaining"] = str(result.remaining)
         
         return response
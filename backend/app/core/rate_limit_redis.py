@@ -0,0 +1,375 @@
+"""
+Redis rate limit backend for CIMEIKA API
+Shares sliding-window counters across uvicorn workers and replicas
+"""
+import threading
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import List, Optional
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.rate_limit import (
+    MemoryBackend,
+    RateLimitBackend,
+    RateLimitResult,
+    Window,
+    _retry_after,
+)
+
+logger = get_logger(__name__)
+
+
+# Sliding-window-counter check, executed atomically by Redis.
+#
+# KEYS[1]  key prefix ("ratelimit:{<key>}"; the hash tag keeps every window
+#          of a key in one cluster slot)
+# ARGV[1]  now (seconds, float)
+# ARGV[2]  pending weight admitted locally since the last sync; always counted
+# ARGV[3]  cost of the request being checked (0 = flush only, negative =
+#          refund that much from the current windows)
+# ARGV[4.] window size, limit pairs
+#
+# Returns {1, remaining, limit} when admitted (or refunded), or
+#         {0, window, current, previous, elapsed} when rejected.
+SLIDING_WINDOW_LUA = """
+local now = tonumber(ARGV[1])
+local pending = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local n = (#ARGV - 3) / 2
+local indexes = {}
+local remaining = nil
+local remaining_limit = 0
+
+for i = 1, n do
+  local size = tonumber(ARGV[2 + 2 * i])
+  local index = math.floor(now / size)
+  indexes[i] = index
+  if pending > 0 then
+    local k = KEYS[1] .. ':' .. size .. ':' .. index
+    redis.call('INCRBY', k, pending)
+    redis.call('EXPIRE', k, size * 2)
+  end
+end
+
+if cost < 0 then
+  for i = 1, n do
+    local k = KEYS[1] .. ':' .. tonumber(ARGV[2 + 2 * i]) .. ':' .. indexes[i]
+    local current = tonumber(redis.call('GET', k) or '0')
+    if current > 0 then
+      redis.call('DECRBY', k, math.min(current, -cost))
+    end
+  end
+  return {1, 0, 0}
+end
+
+for i = 1, n do
+  local size = tonumber(ARGV[2 + 2 * i])
+  local limit = tonumber(ARGV[3 + 2 * i])
+  local index = indexes[i]
+  local elapsed = now - index * size
+  local current = tonumber(redis.call('GET', KEYS[1] .. ':' .. size .. ':' .. index) or '0')
+  local previous = tonumber(redis.call('GET', KEYS[1] .. ':' .. size .. ':' .. (index - 1)) or '0')
+  local estimated = previous * (1 - elapsed / size) + current
+  if estimated + cost > limit then
+    return {0, i, current, previous, tostring(elapsed)}
+  end
+  local left = math.floor(limit - estimated - cost)
+  if remaining == nil or left < remaining then
+    remaining = left
+    remaining_limit = limit
+  end
+end
+
+if cost > 0 then
+  for i = 1, n do
+    local size = tonumber(ARGV[2 + 2 * i])
+    local k = KEYS[1] .. ':' .. size .. ':' .. indexes[i]
+    redis.call('INCRBY', k, cost)
+    redis.call('EXPIRE', k, size * 2)
+  end
+end
+
+return {1, remaining, remaining_limit}
+"""
+
+
+class RedisBackend(RateLimitBackend):
+    """
+    Redis-backed sliding-window-counter storage
+    
+    Every check is a single atomic Lua call, so all workers and replicas
+    enforce one shared quota per key.
+    
+    To cut round-trips, a key with plenty of quota left is pre-counted
+    locally: up to ``local_batch`` requests (never more than half of the
+    last known remaining quota) are admitted without contacting Redis and
+    flushed with the next sync. ``sync_interval`` bounds how stale the
+    local view may get; once started, a background thread also flushes keys
+    that went idle with requests still pending.
+    
+    If Redis is unreachable the backend degrades to a per-process memory
+    backend and retries Redis after ``retry_interval`` seconds, so an
+    outage loosens limits instead of failing requests. Locally admitted
+    requests stay pending through the outage and are charged once Redis is
+    back.
+    
+    Syncs wait on Redis, so async callers check off the event loop (see
+    RateLimitBackend.blocking).
+    """
+    
+    blocking = True
+    
+    def __init__(
+        self,
+        client,
+        local_batch: int = 10,
+        sync_interval: float = 1.0,
+        retry_interval: float = 5.0,
+        max_entries: int = 10_000,
+        fallback: Optional[RateLimitBackend] = None
+    ):
+        """
+        Initialize Redis backend
+        
+        Args:
+            client: redis.Redis client (anything with register_script)
+            local_batch: Max requests per key admitted locally between syncs (0 disables)
+            sync_interval: Max seconds between syncs of a key
+            retry_interval: Seconds to stay on the fallback after a Redis error
+            max_entries: Max keys with local pre-count state
+            fallback: Backend used while Redis is unreachable
+        """
+        self.client = client
+        self.script = client.register_script(SLIDING_WINDOW_LUA)
+        self.local_batch = local_batch
+        self.sync_interval = sync_interval
+        self.retry_interval = retry_interval
+        self.max_entries = max_entries
+        self.fallback = fallback or MemoryBackend()
+        
+        # Local pre-count state:
+        # {key: [remaining_at_sync, pending, synced_at, limit, windows]}
+        self._local: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = Lock()
+        self._down_until = 0.0
+        self._stop = threading.Event()
+        self._syncer: Optional[threading.Thread] = None
+    
+    @classmethod
+    def from_settings(cls) -> "RedisBackend":
+        """
+        Build a backend from REDIS_* and RATE_LIMIT_* settings
+        
+        Raises:
+            ImportError: If the redis package is not installed
+        """
+        import redis
+        
+        client = redis.Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            password=settings.REDIS_PASSWORD,
+            socket_timeout=settings.RATE_LIMIT_REDIS_TIMEOUT,
+            socket_connect_timeout=settings.RATE_LIMIT_REDIS_TIMEOUT,
+        )
+        return cls(
+            client,
+            local_batch=settings.RATE_LIMIT_LOCAL_BATCH,
+            sync_interval=settings.RATE_LIMIT_SYNC_INTERVAL,
+        )
+    
+    @property
+    def available(self) -> bool:
+        """Whether Redis is currently considered reachable"""
+        return time.time() >= self._down_until
+    
+    def _call(self, key: str, windows: List[Window], pending: int, cost: int, now: float) -> list:
+        """Run the sliding window script for a key"""
+        args = [repr(now), pending, cost]
+        for size, limit, _ in windows:
+            args.extend((size, limit))
+        return self.script(keys=[f"ratelimit:{{{key}}}"], args=args)
+    
+    def _mark_down(self, error: Exception, now: float) -> None:
+        """Switch to the fallback backend for retry_interval seconds"""
+        if now >= self._down_until:
+            logger.warning(
+                f"Redis rate limit backend unreachable ({error}), "
+                f"using in-process limits for {self.retry_interval:.0f}s"
+            )
+        self._down_until = now + self.retry_interval
+        with self._lock:
+            # Keep pending counts for the next sync, but stop admitting locally
+            for local in self._local.values():
+                local[2] = float("-inf")
+    
+    def _settle(self, key: str, local: Optional[list], pending: int) -> int:
+        """
+        Pending count of a key left after its `pending` requests were charged
+        
+        Requests admitted locally while the call was in flight stay pending.
+        Call with the lock held.
+        """
+        if local is None or self._local.get(key) is not local:
+            return 0
+        return local[1] - pending
+    
+    def hit(self, key: str, windows: List[Window], cost: int, now: float) -> RateLimitResult:
+        """Check and count a request (see RateLimitBackend.hit)"""
+        if now < self._down_until:
+            return self.fallback.hit(key, windows, cost, now)
+        
+        evicted = None
+        with self._lock:
+            local = self._local.get(key)
+            if local is not None:
+                self._local.move_to_end(key)
+                remaining_at_sync, pending, synced_at = local[0], local[1], local[2]
+                budget = min(self.local_batch, remaining_at_sync // 2)
+                if now - synced_at < self.sync_interval and pending + cost <= budget:
+                    local[1] = pending + cost
+                    return RateLimitResult(
+                        allowed=True,
+                        reason="OK",
+                        limit=local[3],
+                        remaining=remaining_at_sync - local[1],
+                        retry_after=0
+                    )
+            else:
+                pending = 0
+        
+        try:
+            reply = self._call(key, windows, pending, cost, now)
+        except Exception as e:
+            self._mark_down(e, now)
+            return self.fallback.hit(key, windows, cost, now)
+        
+        if int(reply[0]) != 1:
+            window, current, previous, elapsed = int(reply[1]), int(reply[2]), int(reply[3]), float(reply[4])
+            size, limit, label = windows[window - 1]
+            with self._lock:
+                carried = self._settle(key, local, pending)
+                if carried > 0:
+                    # No quota left to admit locally; only the pending flush remains
+                    self._local[key] = [0, carried, now, limit, windows]
+                else:
+                    self._local.pop(key, None)
+            return RateLimitResult(
+                allowed=False,
+                reason=f"Too many requests. Limit: {limit}/{label}",
+                limit=limit,
+                remaining=0,
+                retry_after=_retry_after(size, limit, cost, elapsed, current, previous)
+            )
+        
+        remaining, limit = max(0, int(reply[1])), int(reply[2])
+        if self.local_batch > 0:
+            with self._lock:
+                carried = self._settle(key, local, pending)
+                self._local[key] = [remaining, carried, now, limit, windows]
+                self._local.move_to_end(key)
+                if len(self._local) > self.max_entries:
+                    evicted = self._local.popitem(last=False)
+        
+        if evicted is not None and evicted[1][1] > 0:
+            # Flush the evicted key's locally admitted requests
+            evicted_key, evicted_state = evicted
+            try:
+                self._call(evicted_key, evicted_state[4], evicted_state[1], 0, now)
+            except Exception as e:
+                self._mark_down(e, now)
+                with self._lock:
+                    # Keep it for the next sync rather than lose its count
+                    self._local.setdefault(evicted_key, evicted_state)
+                    self._local.move_to_end(evicted_key, last=False)
+        
+        return RateLimitResult(
+            allowed=True,
+            reason="OK",
+            limit=limit,
+            remaining=remaining,
+            retry_after=0
+        )
+    
+    def refund(self, key: str, windows: List[Window], cost: int, now: float) -> None:
+        """Uncount a request (see RateLimitBackend.refund)"""
+        if now < self._down_until:
+            self.fallback.refund(key, windows, cost, now)
+            return
+        with self._lock:
+            local = self._local.get(key)
+            if local is not None and local[1] >= cost:
+                # Still pending locally: just never charge it
+                local[1] -= cost
+                return
+        try:
+            self._call(key, windows, 0, -cost, now)
+        except Exception as e:
+            self._mark_down(e, now)
+    
+    def flush(self, now: Optional[float] = None, force: bool = False) -> int:
+        """
+        Charge the pending requests of keys not synced for sync_interval
+        
+        Args:
+            now: Current time
+            force: Flush every key with pending requests
+        
+        Returns:
+            int: Keys flushed
+        """
+        now = time.time() if now is None else now
+        if now < self._down_until:
+            return 0
+        with self._lock:
+            idle = [
+                (key, local, local[1])
+                for key, local in self._local.items()
+                if local[1] > 0 and (force or now - local[2] >= self.sync_interval)
+            ]
+        
+        flushed = 0
+        for key, local, pending in idle:
+            try:
+                reply = self._call(key, local[4], pending, 0, now)
+            except Exception as e:
+                self._mark_down(e, now)
+                break
+            with self._lock:
+                carried = self._settle(key, local, pending)
+                if self._local.get(key) is local:
+                    local[0] = max(0, int(reply[1])) if int(reply[0]) == 1 else 0
+                    local[1] = carried
+                    local[2] = now
+            flushed += 1
+        return flushed
+    
+    def _sync_loop(self) -> None:
+        while not self._stop.wait(self.sync_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"Rate limit sync failed: {e}")
+    
+    def start(self) -> None:
+        """Start flushing idle keys every sync_interval (no-op without local batching)"""
+        if self.local_batch <= 0 or (self._syncer is not None and self._syncer.is_alive()):
+            return
+        self._stop.clear()
+        self._syncer = threading.Thread(target=self._sync_loop, name="rate-limit-sync", daemon=True)
+        self._syncer.start()
+    
+    def stop(self) -> None:
+        """Stop the sync thread and flush every pending count"""
+        if self._syncer is not None:
+            self._stop.set()
+            self._syncer.join(timeout=5)
+            self._syncer = None
+        self.flush(force=True)
+    
+    def reset(self) -> None:
+        """Forget local state (shared counters expire on their own)"""
+        with self._lock:
+            self._local.clear()
+        self.fallback.reset()
@@ -0,0 +1,293 @@
+"""
+Analysis result cache for CIMEIKA API
+Content-addressed cache of rule engine results, bounded by bytes and TTL
+"""
+import hashlib
+import json
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, List, Optional
+from app.core import heap, multiprocess
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.prometheus import RULE_CACHE
+
+logger = get_logger(__name__)
+
+# Bookkeeping per memory entry (key, tuple, OrderedDict slot), on top of the result
+ENTRY_OVERHEAD = 200
+
+
+def result_key(
+    rules_version: str,
+    mode: str,
+    text: str,
+    artifacts: Optional[List[Dict[str, Any]]] = None
+) -> str:
+    """
+    Content address of an analysis
+    
+    The text is hashed as decoded from the request, so the same log sent
+    with different JSON escaping or transfer encoding maps to one key. It
+    is not rewritten otherwise: results carry offsets into it.
+    
+    Args:
+        rules_version: Version of the rule set (RuleSet.version)
+        mode: Operation mode
+        text: Analyzed text
+        artifacts: Artifacts ({"name", "content_base64"}), in any order
+    
+    Returns:
+        str: SHA-256 hex digest
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{rules_version}\0{mode}\0{len(text)}\0".encode())
+    digest.update(text.encode("utf-8", "surrogatepass"))
+    for artifact in sorted(artifacts or [], key=lambda a: (a.get("name") or "", a.get("content_base64") or "")):
+        digest.update(f"\0{artifact.get('name')}\0{len(artifact.get('content_base64') or '')}\0".encode())
+        digest.update((artifact.get("content_base64") or "").encode())
+    return digest.hexdigest()
+
+
+class ResultCache(ABC):
+    """
+    Storage strategy for analysis results
+    
+    Results are JSON-serializable dicts keyed by result_key(). Returned
+    results are shared between callers and must not be modified.
+    
+    Caches with ``blocking`` set may wait on the network in get() and
+    set(), so async callers run analyses that use them in a worker thread.
+    """
+    
+    name = "none"
+    blocking = False
+    
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Cached result of a key, counting the hit or miss
+        
+        Args:
+            key: Result key
+        
+        Returns:
+            dict | None: Cached result
+        """
+        result = self._get(key)
+        if result is None:
+            self.misses += 1
+            RULE_CACHE.labels("miss").inc()
+        else:
+            self.hits += 1
+            RULE_CACHE.labels("hit").inc()
+        return result
+    
+    @abstractmethod
+    def _get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached result of a key, without counting"""
+        pass
+    
+    @abstractmethod
+    def set(self, key: str, result: Dict[str, Any]) -> None:
+        """
+        Store a result
+        
+        Args:
+            key: Result key
+            result: Analysis result
+        """
+        pass
+    
+    @abstractmethod
+    def clear(self) -> None:
+        """Drop every cached result"""
+        pass
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Counters of this process
+        
+        Returns:
+            dict: {"backend", "hits", "misses", ...backend details}
+        """
+        return {"backend": self.name, "hits": self.hits, "misses": self.misses}
+
+
+class MemoryResultCache(ResultCache):
+    """
+    In-process LRU cache bounded by bytes, with a TTL
+    
+    Entries are sized by their JSON encoding; the least recently used ones
+    are evicted until the total fits ``max_bytes``. Expired entries are
+    dropped when looked up, or when they reach the cold end of the LRU
+    order. A hit is a dict lookup, so it costs about a microsecond.
+    """
+    
+    name = "memory"
+    
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, ttl: float = 3600):
+        """
+        Initialize memory cache
+        
+        Args:
+            max_bytes: Total size of the cached results
+            ttl: Seconds a result stays valid
+        """
+        super().__init__()
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bytes = 0
+        self.evictions = 0
+        # {key: (expires_at, size, result)}, least recently used first
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = Lock()
+    
+    def _get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._entries[key]
+                self.bytes -= entry[1]
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+    
+    def set(self, key: str, result: Dict[str, Any], size: Optional[int] = None) -> None:
+        """
+        Store a result (see ResultCache.set)
+        
+        Args:
+            key: Result key
+            result: Analysis result
+            size: Size of its JSON encoding, if already known
+        """
+        if size is None:
+            size = len(json.dumps(result, separators=(",", ":")))
+        size += ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[1]
+            self._entries[key] = (now + self.ttl, size, result)
+            self.bytes += size
+            while self.bytes > self.max_bytes or (self._entries and next(iter(self._entries.values()))[0] <= now):
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **super().stats(),
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "ttl_seconds": self.ttl,
+        }
+
+
+_cache: Optional[ResultCache] = None
+_cache_loaded = False
+
+
+def get_result_cache() -> Optional[ResultCache]:
+    """
+    Get the process-wide result cache selected by settings
+    
+    With RESULT_CACHE_BACKEND=redis and REDIS_HOST set, results are shared
+    through Redis behind a per-process memory tier; otherwise (or if the
+    redis package is missing) they are kept in process memory.
+    
+    Returns:
+        ResultCache | None: Shared cache, or None if RESULT_CACHE_ENABLED is off
+    """
+    global _cache, _cache_loaded
+    if _cache_loaded:
+        return _cache
+    _cache_loaded = True
+    if not settings.RESULT_CACHE_ENABLED:
+        return None
+    
+    memory = MemoryResultCache(settings.RESULT_CACHE_MAX_BYTES, settings.RESULT_CACHE_TTL)
+    if settings.RESULT_CACHE_BACKEND == "redis":
+        if not settings.REDIS_HOST:
+            logger.warning("RESULT_CACHE_BACKEND=redis but REDIS_HOST is not set, using memory result cache")
+        else:
+            try:
+                from app.core.result_cache_redis import RedisResultCache
+                _cache = RedisResultCache.from_settings(memory)
+                logger.info(f"Result cache backend: redis ({settings.REDIS_HOST}:{settings.REDIS_PORT})")
+                return _cache
+            except ImportError:
+                logger.warning(
+                    "redis package not installed, using memory result cache. "
+                    "Install with: pip install redis"
+                )
+    _cache = memory
+    return _cache
+
+
+def export_state() -> Dict[str, int]:
+    """Hit and miss counts of this process, for multi-worker aggregation"""
+    cache = _cache
+    if cache is None:
+        return {"hits": 0, "misses": 0}
+    return {"hits": cache.hits, "misses": cache.misses}
+
+
+def merge_states(states: List[Dict[str, int]]) -> Dict[str, int]:
+    """Hit and miss counts of exited workers, summed"""
+    return {"hits": sum(state["hits"] for state in states), "misses": sum(state["misses"] for state in states)}
+
+
+def get_cache_status() -> Dict[str, Any]:
+    """
+    Result cache status for the status endpoint
+    
+    Hits and misses are summed over all workers when METRICS_MULTIPROC_DIR
+    is set; sizes are this process's.
+    
+    Returns:
+        dict: {"enabled", "backend", "hits", "misses", "hit_ratio", ...}
+    """
+    cache = get_result_cache()
+    if cache is None:
+        return {"enabled": False}
+    states = multiprocess.read_states("result_cache")
+    hits = sum(state["hits"] for state in states)
+    misses = sum(state["misses"] for state in states)
+    lookups = hits + misses
+    return {
+        "enabled": True,
+        **cache.stats(),
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+    }
+
+
+def _local_entries():
+    cache = _cache
+    if isinstance(cache, MemoryResultCache):
+        return cache._entries
+    return getattr(getattr(cache, "local", None), "_entries", {})
+
+
+multiprocess.register_state("result_cache", export_state, merge_states)
+heap.register_store("result_cache.entries", _local_entries)
@@ -0,0 +1,137 @@
+"""
+Redis result cache for CIMEIKA API
+Shares analysis results across uvicorn workers and replicas
+"""
+import json
+import time
+from typing import Any, Dict, Optional
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.result_cache import MemoryResultCache, ResultCache
+
+logger = get_logger(__name__)
+
+
+class RedisResultCache(ResultCache):
+    """
+    Redis-backed result cache with a per-process memory tier
+    
+    Lookups try the memory tier first (microseconds), then Redis; results
+    found in Redis are copied into the memory tier. Results are stored in
+    both, with the same TTL.
+    
+    If Redis is unreachable the cache serves from the memory tier alone and
+    retries Redis after ``retry_interval`` seconds, so an outage only
+    lowers the hit ratio. An entry that does not decode is a miss.
+    
+    Redis calls block, so analyses using this cache run off the event loop
+    (see ResultCache.blocking).
+    """
+    
+    name = "redis"
+    blocking = True
+    
+    def __init__(
+        self,
+        client,
+        local: Optional[MemoryResultCache] = None,
+        ttl: float = 3600,
+        retry_interval: float = 5.0,
+        prefix: str = "resultcache:"
+    ):
+        """
+        Initialize Redis cache
+        
+        Args:
+            client: redis.Redis client
+            local: Memory tier (defaults to a 64MB MemoryResultCache)
+            ttl: Seconds a result stays valid
+            retry_interval: Seconds to stay on the memory tier after a Redis error
+            prefix: Key prefix in Redis
+        """
+        super().__init__()
+        self.client = client
+        self.local = local or MemoryResultCache(ttl=ttl)
+        self.ttl = ttl
+        self.retry_interval = retry_interval
+        self.prefix = prefix
+        self._down_until = 0.0
+    
+    @classmethod
+    def from_settings(cls, local: Optional[MemoryResultCache] = None) -> "RedisResultCache":
+        """
+        Build a cache from REDIS_* and RESULT_CACHE_* settings
+        
+        Raises:
+            ImportError: If the redis package is not installed
+        """
+        import redis
+        
+        client = redis.Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            password=settings.REDIS_PASSWORD,
+            socket_timeout=settings.RESULT_CACHE_REDIS_TIMEOUT,
+            socket_connect_timeout=settings.RESULT_CACHE_REDIS_TIMEOUT,
+        )
+        return cls(client, local=local, ttl=settings.RESULT_CACHE_TTL)
+    
+    @property
+    def available(self) -> bool:
+        """Whether Redis is currently considered reachable"""
+        return time.time() >= self._down_until
+    
+    def _mark_down(self, error: Exception) -> None:
+        now = time.time()
+        if now >= self._down_until:
+            logger.warning(
+                f"Redis result cache unreachable ({error}), "
+                f"using the in-process cache for {self.retry_interval:.0f}s"
+            )
+        self._down_until = now + self.retry_interval
+    
+    def _get(self, key: str) -> Optional[Dict[str, Any]]:
+        result = self.local._get(key)
+        if result is not None or not self.available:
+            return result
+        try:
+            payload = self.client.get(self.prefix + key)
+        except Exception as e:
+            self._mark_down(e)
+            return None
+        if payload is None:
+            return None
+        try:
+            result = json.loads(payload)
+        except ValueError as e:
+            logger.warning(f"Ignoring undecodable result cache entry {key[:12]}: {e}")
+            return None
+        self.local.set(key, result, len(payload))
+        return result
+    
+    def set(self, key: str, result: Dict[str, Any]) -> None:
+        """Store a result in both tiers (see ResultCache.set)"""
+        payload = json.dumps(result, separators=(",", ":"))
+        self.local.set(key, result, len(payload))
+        if not self.available:
+            return
+        try:
+            self.client.set(self.prefix + key, payload, ex=max(1, int(self.ttl)))
+        except Exception as e:
+            self._mark_down(e)
+    
+    def clear(self) -> None:
+        """Drop the memory tier; Redis entries expire by TTL"""
+        self.local.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        local = self.local.stats()
+        return {
+            **super().stats(),
+            "redis_available": self.available,
+            "entries": local["entries"],
+            "bytes": local["bytes"],
+            "max_bytes": local["max_bytes"],
+            "evictions": local["evictions"],
+            "ttl_seconds": self.ttl,
+        }
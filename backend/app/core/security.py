@@ -2,6 +2,7 @@
 Security utilities for CIMEIKA API
 API key validation and security middleware
 """
+import hmac
 import os
 from typing import Optional
 from fastapi import Header, HTTPException, status
@@ -72,3 +73,46 @@ def is_api_key_configured() -> bool:
         bool: True if key is configured
     """
     return get_participant_api_key() is not None
+
+
+def get_admin_api_key() -> Optional[str]:
+    """
+    Get the admin API key from environment
+    
+    Returns:
+        str | None: API key or None if not configured
+    """
+    return os.getenv("CIMEIKA_ADMIN_KEY") or None
+
+
+async def verify_admin_key(x_admin_key: Optional[str] = Header(None, alias="X-ADMIN-KEY")) -> str:
+    """
+    Verify admin API key from header (diagnostics endpoints)
+    
+    Args:
+        x_admin_key: API key from X-ADMIN-KEY header (optional, so a missing
+            header gets the same 404/401 as a wrong one instead of a 422)
+    
+    Returns:
+        str: Validated API key
+    
+    Raises:
+        HTTPException: If the admin key is not configured, missing or invalid
+    """
+    expected_key = get_admin_api_key()
+    
+    if not expected_key:
+        # Admin endpoints are off unless a key is configured
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Not Found"
+        )
+    
+    if not x_admin_key or not hmac.compare_digest(x_admin_key.encode(), expected_key.encode()):
+        logger.warning("Admin request with invalid X-ADMIN-KEY")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid admin key"
+        )
+    
+    return x_admin_key
@@ -0,0 +1,400 @@
+"""
+Slow-request capture for CIMEIKA API
+Per-route latency budgets and a bounded log of over-budget requests
+"""
+import asyncio
+import time
+from collections import deque
+from pathlib import Path
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+import yaml
+from app.core import heap
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.prometheus import SLOW_REQUESTS
+from app.core.profiler import short_filename
+from app.core.tracing import NOOP_SPAN, current_span
+
+logger = get_logger(__name__)
+
+DEFAULT_CONFIG_PATH = Path(__file__).parent.parent / "config" / "latency_budgets.yaml"
+
+# Parameter names whose values are never stored
+SENSITIVE_PARAMS = ("key", "token", "secret", "password", "passwd", "auth", "signature", "session", "cookie")
+MAX_PARAM_LENGTH = 200
+
+
+class LatencyBudgets:
+    """
+    Latency budget per route
+    
+    A budget is looked up by "METHOD /route/template", then by the route
+    template alone, then falls back to the default.
+    """
+    
+    def __init__(self, config: Dict[str, Any]):
+        """
+        Initialize budgets
+        
+        Args:
+            config: Parsed budgets config ({"default_ms", "routes"})
+        
+        Raises:
+            ValueError: If a budget is not a positive number
+        """
+        self.default = self._seconds("default_ms", config.get("default_ms", 1000))
+        self.routes: Dict[str, float] = {
+            str(route): self._seconds(route, ms) for route, ms in (config.get("routes") or {}).items()
+        }
+        self.shortest = min([self.default, *self.routes.values()])
+    
+    @staticmethod
+    def _seconds(name: str, ms: Any) -> float:
+        try:
+            value = float(ms)
+        except (TypeError, ValueError):
+            raise ValueError(f"Latency budget {name!r} must be a number of milliseconds")
+        if value <= 0:
+            raise ValueError(f"Latency budget {name!r} must be positive")
+        return value / 1000
+    
+    @classmethod
+    def from_file(cls, path: Optional[str] = None) -> "LatencyBudgets":
+        """
+        Load budgets from a YAML config
+        
+        Args:
+            path: Config path (defaults to SLOW_REQUEST_CONFIG or the bundled config)
+        
+        Returns:
+            LatencyBudgets: Configured budgets
+        """
+        config_path = Path(path or settings.SLOW_REQUEST_CONFIG or DEFAULT_CONFIG_PATH)
+        with open(config_path, "r", encoding="utf-8") as f:
+            config = yaml.safe_load(f) or {}
+        return cls(config)
+    
+    def budget(self, method: str, route: Optional[str]) -> float:
+        """
+        Budget of a request in seconds
+        
+        Args:
+            method: HTTP method
+            route: Route template (None before routing)
+        
+        Returns:
+            float: Budget in seconds
+        """
+        if route is None:
+            return self.default
+        budget = self.routes.get(f"{method} {route}")
+        if budget is None:
+            budget = self.routes.get(route, self.default)
+        return budget
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Budgets in milliseconds"""
+        return {
+            "default_ms": self.default * 1000,
+            "routes": {route: seconds * 1000 for route, seconds in self.routes.items()},
+        }
+
+
+class SlowRequestLog:
+    """Bounded ring of captured slow requests, oldest evicted first"""
+    
+    def __init__(self, max_entries: int = 200):
+        """
+        Initialize log
+        
+        Args:
+            max_entries: Captures kept in memory
+        """
+        self._entries: deque = deque(maxlen=max_entries)
+        self._next_id = 1
+        self._lock = Lock()
+        self.captured = 0
+    
+    def add(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Store a capture (assigns its id)
+        
+        Returns:
+            dict: The stored entry
+        """
+        with self._lock:
+            entry["id"] = self._next_id
+            self._next_id += 1
+            self.captured += 1
+            self._entries.append(entry)
+        return entry
+    
+    def get(self, entry_id: int) -> Optional[Dict[str, Any]]:
+        """Capture by id, or None if unknown or evicted"""
+        with self._lock:
+            for entry in self._entries:
+                if entry["id"] == entry_id:
+                    return entry
+        return None
+    
+    def query(
+        self,
+        route: Optional[str] = None,
+        min_duration_ms: float = 0,
+        limit: int = 50
+    ) -> List[Dict[str, Any]]:
+        """
+        Recent captures, newest first
+        
+        Args:
+            route: Only captures of this route template
+            min_duration_ms: Only captures at least this slow
+            limit: Maximum number of captures
+        
+        Returns:
+            list: Matching captures
+        """
+        with self._lock:
+            entries = list(self._entries)
+        result = []
+        for entry in reversed(entries):
+            if route is not None and entry["route"] != route:
+                continue
+            if entry["duration_ms"] < min_duration_ms:
+                continue
+            result.append(entry)
+            if len(result) >= limit:
+                break
+        return result
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def sanitize_params(items: List[Tuple[str, Any]]) -> Dict[str, Any]:
+    """
+    Make request parameters safe to keep
+    
+    Values of sensitive-looking names are redacted and long values cut.
+    
+    Args:
+        items: (name, value) pairs
+    
+    Returns:
+        dict: {name: value}; repeated names keep the last value
+    """
+    params = {}
+    for name, value in items:
+        lowered = name.lower()
+        if any(marker in lowered for marker in SENSITIVE_PARAMS):
+            params[name] = "[redacted]"
+            continue
+        value = str(value)
+        if len(value) > MAX_PARAM_LENGTH:
+            value = value[:MAX_PARAM_LENGTH] + "..."
+        params[name] = value
+    return params
+
+
+def await_stack(task: Optional[asyncio.Task]) -> List[str]:
+    """
+    Where a task is suspended: its chain of awaited coroutines
+    
+    Args:
+        task: Task to inspect
+    
+    Returns:
+        list: "file:line in function" entries, outermost first
+    """
+    stack = []
+    coro = task.get_coro() if task is not None else None
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        stack.append(f"{short_filename(frame.f_code.co_filename)}:{frame.f_lineno} in {frame.f_code.co_name}")
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return stack
+
+
+def span_tree(root, spans: List[Any]) -> Dict[str, Any]:
+    """
+    Nest finished spans under their parents
+    
+    Args:
+        root: Root span of the request
+        spans: Finished descendants
+    
+    Returns:
+        dict: {"name", "start_ms", "duration_ms", "status", "attributes", "children"}
+    """
+    end_ns = root.end_ns or time.time_ns()
+    
+    def node(span) -> Dict[str, Any]:
+        span_end = span.end_ns or end_ns
+        return {
+            "name": span.name,
+            "start_ms": round((span.start_ns - root.start_ns) / 1e6, 3),
+            "duration_ms": round((span_end - span.start_ns) / 1e6, 3),
+            "status": span.status,
+            "attributes": span.attributes,
+            "children": [],
+        }
+    
+    nodes = {root.span_id: node(root)}
+    for span in sorted(spans, key=lambda s: s.start_ns):
+        if span is not root:
+            nodes[span.span_id] = node(span)
+    for span in spans:
+        if span is not root:
+            parent = nodes.get(span.parent_id, nodes[root.span_id])
+            parent["children"].append(nodes[span.span_id])
+    for entry in nodes.values():
+        entry["children"].sort(key=lambda child: child["start_ms"])
+    return nodes[root.span_id]
+
+
+class SlowRequestMiddleware:
+    """
+    Pure ASGI middleware capturing requests that exceed their latency budget
+    
+    A timer armed when the request starts records where the request is
+    waiting the moment it crosses its budget. When an over-budget request
+    finishes it is stored with its route, sanitized params, status, SQL
+    statements, span tree (from the tracer's recorded spans) and that
+    stack. Within budget, the cost is one timer per request.
+    
+    Must run inside TracingMiddleware to see the request's spans.
+    """
+    
+    def __init__(self, app, budgets: Optional[LatencyBudgets] = None, log: Optional[SlowRequestLog] = None):
+        self.app = app
+        self._budgets = budgets
+        self._log = log
+    
+    @property
+    def budgets(self) -> LatencyBudgets:
+        return self._budgets or get_latency_budgets()
+    
+    @property
+    def log(self) -> SlowRequestLog:
+        return self._log or slow_request_log
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.SLOW_REQUEST_CAPTURE:
+            await self.app(scope, receive, send)
+            return
+        
+        budgets = self.budgets
+        method = scope.get("method", "")
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        state: Dict[str, Any] = {"status": None, "stack": None, "timer": None}
+        task = asyncio.current_task()
+        
+        def check():
+            # Runs on the loop; re-arms until the route's own budget is known
+            elapsed = time.perf_counter() - start
+            budget = budgets.budget(method, getattr(scope.get("route"), "path", None))
+            if elapsed >= budget:
+                state["stack"] = await_stack(task)
+                state["timer"] = None
+            else:
+                state["timer"] = loop.call_later(budget - elapsed, check)
+        
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            await send(message)
+        
+        state["timer"] = loop.call_later(budgets.shortest, check)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if state["timer"] is not None:
+                state["timer"].cancel()
+            duration = time.perf_counter() - start
+            route = getattr(scope.get("route"), "path", None)
+            budget = budgets.budget(method, route)
+            if duration > budget:
+                try:
+                    self._capture(scope, method, route, state, duration, budget)
+                except Exception as e:
+                    logger.warning(f"Failed to capture slow request: {e}")
+    
+    def _capture(
+        self,
+        scope: dict,
+        method: str,
+        route: Optional[str],
+        state: Dict[str, Any],
+        duration: float,
+        budget: float
+    ) -> None:
+        query = scope.get("query_string", b"").decode("latin-1")
+        params = {
+            "path": sanitize_params(list((scope.get("path_params") or {}).items())),
+            "query": sanitize_params(parse_qsl(query, keep_blank_values=True)),
+        }
+        
+        root = current_span()
+        spans, sql, trace_id = None, [], None
+        if root is not NOOP_SPAN and root.collector is not None:
+            finished = list(root.collector)
+            spans = span_tree(root, finished)
+            spans["name"] = f"{method} {route or scope.get('path', '')}"
+            sql = [
+                {
+                    "statement": span.attributes.get("db.statement"),
+                    "duration_ms": round(span.duration_ms, 3),
+                    "status": span.status,
+                }
+                for span in finished
+                if span.name == "db.query"
+            ]
+            if root.sampled:
+                trace_id = root.trace_id
+        
+        entry = self.log.add({
+            "captured_at": time.time(),
+            "method": method,
+            "route": route or "<unmatched>",
+            "path": scope.get("path", ""),
+            "status": state["status"],
+            "duration_ms": round(duration * 1000, 3),
+            "budget_ms": round(budget * 1000, 3),
+            "params": params,
+            "sql": sql,
+            "sql_ms": round(sum(q["duration_ms"] for q in sql), 3),
+            "spans": spans,
+            "stack": state["stack"],
+            "trace_id": trace_id,
+        })
+        SLOW_REQUESTS.labels(entry["route"]).inc()
+        logger.warning(
+            f"Slow request #{entry['id']}: {method} {entry['route']} took {entry['duration_ms']}ms "
+            f"(budget {entry['budget_ms']}ms)"
+        )
+
+
+_budgets: Optional[LatencyBudgets] = None
+
+
+def get_latency_budgets() -> LatencyBudgets:
+    """
+    Get the process-wide latency budgets
+    
+    Returns:
+        LatencyBudgets: Budgets loaded from the configured file
+    """
+    global _budgets
+    if _budgets is None:
+        _budgets = LatencyBudgets.from_file()
+    return _budgets
+
+
+slow_request_log = SlowRequestLog(max_entries=settings.SLOW_REQUEST_BUFFER)
+heap.register_store("slow_requests.log", lambda: slow_request_log._entries)
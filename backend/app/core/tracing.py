@@ -0,0 +1,619 @@
+"""
+Request tracing for CIMEIKA API
+W3C traceparent propagation, sampled spans and offline exporters
+"""
+import atexit
+import inspect
+import json
+import os
+import random
+import time
+from collections import deque
+from contextvars import ContextVar
+from functools import wraps
+from threading import Event, Lock, Thread
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Span of the current request/task; None when the request is not sampled
+_current_span: ContextVar[Optional["Span"]] = ContextVar("cimeika_current_span", default=None)
+
+
+def _new_id(bytes_count: int) -> str:
+    return "%0*x" % (bytes_count * 2, random.getrandbits(bytes_count * 8))
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """
+    Parse a W3C traceparent header
+    
+    Args:
+        header: "00-<32 hex trace id>-<16 hex parent id>-<2 hex flags>"
+    
+    Returns:
+        tuple | None: (trace_id, parent_id, sampled), or None if invalid
+    """
+    if not header:
+        return None
+    parts = header.strip().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or len(parts[3]) != 2:
+        return None
+    version, trace_id, parent_id, flags = parts[0], parts[1].lower(), parts[2].lower(), parts[3]
+    if version == "ff" or trace_id == "0" * 32 or parent_id == "0" * 16:
+        return None
+    try:
+        int(trace_id, 16)
+        int(parent_id, 16)
+        sampled = bool(int(flags, 16) & 0x01)
+    except ValueError:
+        return None
+    return trace_id, parent_id, sampled
+
+
+class Span:
+    """
+    A timed operation within a trace
+    
+    Used as a context manager: entering makes it the current span (so
+    nested spans become its children), leaving ends and exports it.
+    
+    Unsampled spans only exist while the tracer is recording (see
+    Tracer.record): they are collected for the request, up to
+    Tracer.max_recorded per request, but never exported.
+    """
+    
+    __slots__ = (
+        "tracer", "name", "trace_id", "span_id", "parent_id", "kind",
+        "start_ns", "end_ns", "attributes", "status", "status_message",
+        "sampled", "collector", "_token",
+    )
+    
+    def __init__(
+        self,
+        tracer: "Tracer",
+        name: str,
+        trace_id: str,
+        parent_id: Optional[str] = None,
+        kind: str = "INTERNAL",
+        attributes: Optional[Dict[str, Any]] = None,
+        sampled: bool = True,
+        collector: Optional[List["Span"]] = None
+    ):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = attributes or {}
+        self.status = "UNSET"
+        self.status_message: Optional[str] = None
+        self.sampled = sampled
+        self.collector = collector
+        self._token = None
+    
+    @property
+    def traceparent(self) -> str:
+        """W3C traceparent identifying this span"""
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+    
+    @property
+    def duration_ms(self) -> Optional[float]:
+        """Span duration in milliseconds (None while running)"""
+        if self.end_ns is None:
+            return None
+        return (self.end_ns - self.start_ns) / 1e6
+    
+    def set_attribute(self, key: str, value: Any) -> None:
+        """Attach an attribute"""
+        self.attributes[key] = value
+    
+    def set_status(self, status: str, message: Optional[str] = None) -> None:
+        """Set the status ("OK" or "ERROR")"""
+        self.status = status
+        self.status_message = message
+    
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        return self
+    
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.end_ns = time.time_ns()
+        if exc_type is not None and self.status == "UNSET":
+            self.set_status("ERROR", f"{exc_type.__name__}: {exc}"[:200])
+        if self._token is not None:
+            try:
+                _current_span.reset(self._token)
+            except ValueError:
+                # Ended from another context (e.g. a different task)
+                pass
+            self._token = None
+        collector = self.collector
+        if collector is not None and len(collector) < self.tracer.max_recorded:
+            collector.append(self)
+        if self.sampled:
+            self.tracer.export(self)
+        return False
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Serialize in the shape of an OTLP/JSON span
+        
+        Returns:
+            dict: traceId, spanId, parentSpanId, name, kind, times, attributes, status
+        """
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "kind": f"SPAN_KIND_{self.kind}",
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "attributes": self.attributes,
+            "status": {"code": f"STATUS_CODE_{self.status}", "message": self.status_message or ""},
+        }
+
+
+class _NoopSpan:
+    """Stand-in for unsampled work: every operation is a no-op"""
+    
+    __slots__ = ()
+    
+    traceparent = None
+    duration_ms = None
+    
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+    
+    def set_status(self, status: str, message: Optional[str] = None) -> None:
+        pass
+    
+    def __enter__(self) -> "_NoopSpan":
+        return self
+    
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class InMemoryExporter:
+    """Keeps the most recent finished spans in memory"""
+    
+    def __init__(self, max_spans: int = 10_000):
+        self._spans: deque = deque(maxlen=max_spans)
+    
+    def export(self, span: Span) -> None:
+        self._spans.append(span)
+    
+    def get_finished_spans(self) -> List[Span]:
+        """Finished spans, oldest first"""
+        return list(self._spans)
+    
+    def clear(self) -> None:
+        self._spans.clear()
+
+
+class FileExporter:
+    """
+    Appends finished spans as JSON lines (one OTLP-shaped span per line)
+    
+    export() only queues the span; a writer thread serializes the queue and
+    appends it to the file every flush_interval seconds (or once batch_size
+    spans wait), so requests never block on disk. Past max_pending unwritten
+    spans the oldest are dropped (and counted). Spans exported before
+    start() wait for the first flush.
+    """
+    
+    def __init__(self, path: str, flush_interval: float = 1.0, batch_size: int = 500, max_pending: int = 10_000):
+        """
+        Initialize exporter
+        
+        Args:
+            path: JSONL file
+            flush_interval: Seconds between writes
+            batch_size: Pending spans that trigger an early write
+            max_pending: Unwritten spans kept before the oldest are dropped
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._pending: deque = deque(maxlen=max_pending)
+        self._write_lock = Lock()
+        self._wake = Event()
+        self._stop = Event()
+        self._writer: Optional[Thread] = None
+        self.written = 0
+        self.dropped = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+    
+    def export(self, span: Span) -> None:
+        # deque appends are atomic: no lock on the request path
+        pending = self._pending
+        if len(pending) == pending.maxlen:
+            self.dropped += 1
+        pending.append(span)
+        if len(pending) >= self.batch_size:
+            self._wake.set()
+    
+    def flush(self) -> int:
+        """
+        Append the pending spans to the file
+        
+        Returns:
+            int: Spans written
+        """
+        with self._write_lock:
+            pending = self._pending
+            batch = []
+            for _ in range(len(pending)):
+                try:
+                    batch.append(pending.popleft())
+                except IndexError:
+                    # A full deque evicted its oldest span meanwhile
+                    break
+            if not batch:
+                return 0
+            lines = "".join(
+                json.dumps(span.to_dict(), default=str, separators=(",", ":")) + "\n" for span in batch
+            )
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(lines)
+            except OSError as e:
+                logger.warning(f"Failed to write {len(batch)} spans: {e}")
+                self.dropped += len(batch)
+                return 0
+            self.written += len(batch)
+            return len(batch)
+    
+    def start(self) -> None:
+        """Start the writer thread"""
+        if self._writer is not None and self._writer.is_alive():
+            return
+        self._stop.clear()
+        self._writer = Thread(target=self._write_loop, name="trace-file-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.stop)
+    
+    def stop(self) -> None:
+        """Stop the writer and write what is still pending"""
+        if self._writer is not None:
+            self._stop.set()
+            self._wake.set()
+            self._writer.join(timeout=5)
+            self._writer = None
+        self.flush()
+    
+    def _write_loop(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"Trace file write failed: {e}")
+
+
+class Tracer:
+    """
+    Creates sampled traces and hands finished spans to an exporter
+    
+    Sampling is decided once per trace: an incoming traceparent's sampled
+    flag is honoured, otherwise a new trace is sampled with probability
+    sample_rate. Work outside a sampled trace gets NOOP_SPAN, so disabled
+    or unsampled tracing costs one context variable lookup per span.
+    
+    With ``record`` set (opt-in, for slow-request capture), every request
+    gets a root span regardless of sampling, and the root collects its
+    finished descendants in ``collector`` so the request can be inspected
+    after the fact. An unsampled request gets at most ``max_recorded``
+    child spans (later ones are NOOP_SPAN) and the collector never holds
+    more than that; only sampled spans reach the exporter.
+    """
+    
+    def __init__(
+        self,
+        enabled: bool = False,
+        sample_rate: float = 1.0,
+        exporter=None,
+        record: bool = False,
+        max_recorded: int = 100
+    ):
+        """
+        Initialize tracer
+        
+        Args:
+            enabled: Whether requests are traced at all
+            sample_rate: Probability of tracing a request without a traceparent
+            exporter: Receives finished spans (defaults to InMemoryExporter)
+            record: Create (unexported) spans for unsampled requests too
+            max_recorded: Spans collected per request while recording
+        """
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.exporter = exporter if exporter is not None else InMemoryExporter()
+        self.record = record
+        self.max_recorded = max_recorded
+    
+    def start_trace(
+        self,
+        name: str,
+        traceparent: Optional[str] = None,
+        attributes: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Start the root (server) span of a request
+        
+        Args:
+            name: Span name
+            traceparent: Incoming W3C traceparent header, if any
+            attributes: Initial attributes
+        
+        Returns:
+            Span | NOOP_SPAN: Root span, or NOOP_SPAN if neither sampled nor recording
+        """
+        trace_id, parent_id, sampled = None, None, False
+        if self.enabled:
+            parent = parse_traceparent(traceparent)
+            if parent is not None:
+                trace_id, parent_id, sampled = parent
+            else:
+                sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        if not sampled and not self.record:
+            return NOOP_SPAN
+        if trace_id is None:
+            trace_id = _new_id(16)
+        return Span(
+            self, name, trace_id, parent_id, kind="SERVER", attributes=attributes,
+            sampled=sampled, collector=[] if self.record else None
+        )
+    
+    def start(self) -> None:
+        """Start the exporter's background writer, if it has one"""
+        start = getattr(self.exporter, "start", None)
+        if start is not None:
+            start()
+    
+    def stop(self) -> None:
+        """Stop the exporter's background writer and flush it"""
+        stop = getattr(self.exporter, "stop", None)
+        if stop is not None:
+            stop()
+    
+    def export(self, span: Span) -> None:
+        """Hand a finished span to the exporter"""
+        try:
+            self.exporter.export(span)
+        except Exception as e:
+            logger.warning(f"Failed to export span {span.name}: {e}")
+
+
+def _tracer_from_settings() -> Tracer:
+    exporter = None
+    if settings.TRACE_EXPORTER == "file":
+        exporter = FileExporter(settings.TRACE_FILE)
+    return Tracer(
+        enabled=settings.TRACING_ENABLED,
+        sample_rate=settings.TRACE_SAMPLE_RATE,
+        exporter=exporter,
+        record=settings.SLOW_REQUEST_CAPTURE,
+        max_recorded=settings.SLOW_REQUEST_MAX_SPANS
+    )
+
+
+tracer = _tracer_from_settings()
+
+
+def current_span():
+    """
+    Get the current span
+    
+    Returns:
+        Span | NOOP_SPAN: Current span, or NOOP_SPAN outside a sampled trace
+    """
+    return _current_span.get() or NOOP_SPAN
+
+
+def start_span(name: str, kind: str = "INTERNAL", **attributes: Any):
+    """
+    Start a child of the current span
+    
+    Use as a context manager:
+        
+        with start_span("rule_engine.analyze", mode=mode):
+            ...
+    
+    Args:
+        name: Span name
+        kind: INTERNAL, CLIENT, ...
+        **attributes: Initial attributes
+    
+    Returns:
+        Span | NOOP_SPAN: New span, or NOOP_SPAN outside a sampled trace
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return NOOP_SPAN
+    if not parent.sampled and len(parent.collector) >= parent.tracer.max_recorded:
+        # Recording only: keep the request's span tree bounded
+        return NOOP_SPAN
+    return Span(
+        parent.tracer, name, parent.trace_id, parent.span_id, kind=kind, attributes=attributes,
+        sampled=parent.sampled, collector=parent.collector
+    )
+
+
+def traced(name: str) -> Callable:
+    """
+    Decorator running a function inside a child span
+    
+    Args:
+        name: Span name
+    """
+    def decorator(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if _current_span.get() is None:
+                    return await func(*args, **kwargs)
+                with start_span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+        
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return func(*args, **kwargs)
+            with start_span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ModuleInterface/ServiceInterface housekeeping, not worth a span
+_UNTRACED_METHODS = frozenset(("get_name", "get_status", "initialize", "shutdown", "get_metadata", "validate"))
+
+
+def trace_service(module: str) -> Callable[[type], type]:
+    """
+    Class decorator running every public service method in a span
+    
+    Spans are named "<module>.<method>".
+    
+    Args:
+        module: Module name
+    """
+    def decorator(cls: type) -> type:
+        for attr, value in list(vars(cls).items()):
+            if attr.startswith("_") or attr in _UNTRACED_METHODS or not inspect.isfunction(value):
+                continue
+            setattr(cls, attr, traced(f"{module}.{attr}")(value))
+        return cls
+    return decorator
+
+
+def inject(headers: Dict[str, str]) -> Dict[str, str]:
+    """
+    Add the current traceparent to outbound request headers
+    
+    Args:
+        headers: Header dict to update
+    
+    Returns:
+        dict: The same dict
+    """
+    span = _current_span.get()
+    if span is not None:
+        headers["traceparent"] = span.traceparent
+    return headers
+
+
+class TracingMiddleware:
+    """
+    Pure ASGI middleware opening the root span of each sampled (or, when
+    the tracer is recording, every) request
+    
+    Reads the incoming traceparent header and returns the trace context of
+    sampled requests in a traceresponse header, so callers can look the
+    trace up.
+    """
+    
+    def __init__(self, app, tracer: Optional[Tracer] = None):
+        self.app = app
+        self._tracer = tracer
+    
+    @property
+    def tracer(self) -> Tracer:
+        return self._tracer or tracer
+    
+    async def __call__(self, scope, receive, send):
+        active = self.tracer
+        if scope["type"] != "http" or not (active.enabled or active.record):
+            await self.app(scope, receive, send)
+            return
+        
+        traceparent = None
+        for key, value in scope.get("headers", ()):
+            if key == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+        
+        method = scope.get("method", "")
+        root = active.start_trace(
+            f"{method} {scope.get('path', '')}",
+            traceparent,
+            {"http.method": method, "http.target": scope.get("path", "")}
+        )
+        if root is NOOP_SPAN:
+            await self.app(scope, receive, send)
+            return
+        
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                root.set_attribute("http.status_code", message["status"])
+                if message["status"] >= 500:
+                    root.set_status("ERROR")
+                if root.sampled:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"traceresponse", root.traceparent.encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+        
+        with root:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = getattr(scope.get("route"), "path", None)
+                if route is not None:
+                    root.name = f"{method} {route}"
+                    root.set_attribute("http.route", route)
+
+
+def instrument_engine(engine) -> None:
+    """
+    Open a span around every SQL statement of a SQLAlchemy engine
+    
+    Args:
+        engine: SQLAlchemy Engine
+    """
+    from sqlalchemy import event
+    
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _current_span.get() is None:
+            return
+        span = start_span(
+            "db.query",
+            kind="CLIENT",
+            **{"db.system": engine.dialect.name, "db.statement": statement[:200]}
+        )
+        span.__enter__()
+        conn.info.setdefault("cimeika_spans", []).append(span)
+    
+    def _finish(conn, error: Optional[BaseException] = None):
+        spans = conn.info.get("cimeika_spans")
+        if not spans:
+            return
+        span = spans.pop()
+        if error is not None:
+            span.__exit__(type(error), error, None)
+        else:
+            span.__exit__(None, None, None)
+    
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        _finish(conn)
+    
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        if exception_context.connection is not None:
+            _finish(exception_context.connection, exception_context.original_exception)
@@ -0,0 +1,269 @@
+"""
+Artifact scanning for the rule engine
+Decodes base64 artifacts and runs the rule patterns over them in a bounded
+process pool, with per-artifact size and time limits
+"""
+import asyncio
+import binascii
+import codecs
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.result_cache import ResultCache, result_key
+from app.engines.rule_engine import CACHEABLE_SCANS, RuleEngine
+from app.engines.rule_packs import RulePackError, get_rule_registry
+
+logger = get_logger(__name__)
+
+# Scan outcomes; only complete ones (CACHEABLE_SCANS) are cached
+SCAN_STATUSES = ("ok", "too_large", "invalid", "timeout", "error")
+
+# Decoded bytes analyzed at a time (the time limit is checked between windows)
+SCAN_WINDOW = 1 << 20
+SCAN_LOOKBEHIND = 1 << 16
+
+# Seconds a worker may overrun the time limit before it is considered hung
+HUNG_GRACE = 2.0
+
+
+def _scan(name: str, status: str, size: int, started: float, matches: Optional[list] = None) -> Dict[str, Any]:
+    return {
+        "name": name,
+        "status": status,
+        "bytes": size,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+        "matches": matches or [],
+    }
+
+
+def decoded_size(content_base64: str) -> int:
+    """Upper bound of the decoded size of base64 text"""
+    return len(content_base64) * 3 // 4
+
+
+def scan_artifact(
+    name: str,
+    content_base64: str,
+    rules_version: Optional[str] = None,
+    max_bytes: int = 10 * 1024 * 1024,
+    timeout: float = 5.0
+) -> Dict[str, Any]:
+    """
+    Decode an artifact and match the rule patterns against it
+    
+    Runs in a pool worker. The decoded buffer is read through memoryview
+    slices one window at a time, so it is never copied whole and text is
+    only materialized per window. When the time limit runs out the scan
+    stops after the current window and reports what it found so far.
+    
+    Args:
+        name: Artifact name
+        content_base64: Base64 content
+        rules_version: Rule set version of the caller; the worker's rules
+            are reloaded if they differ
+        max_bytes: Largest decoded size scanned
+        timeout: Seconds the scan may take
+    
+    Returns:
+        dict: {"name", "status", "bytes", "elapsed_ms", "matches"}, where
+        matches are PatternMatch dicts (best first) in artifact coordinates
+    """
+    started = time.perf_counter()
+    deadline = started + timeout
+    if decoded_size(content_base64) > max_bytes:
+        return _scan(name, "too_large", decoded_size(content_base64), started)
+    try:
+        data = binascii.a2b_base64(content_base64)
+    except (binascii.Error, ValueError):
+        return _scan(name, "invalid", 0, started)
+    
+    registry = get_rule_registry()
+    if rules_version is not None and registry.rules.version != rules_version:
+        try:
+            registry.reload()
+        except RulePackError as e:
+            logger.warning(f"Artifact worker kept rules {registry.rules.version}: {e}")
+    
+    view = memoryview(data)
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    analysis = RuleEngine(registry.patterns).stream(
+        window=SCAN_WINDOW, lookbehind=SCAN_LOOKBEHIND, stop_severity=None
+    )
+    status = "ok"
+    for offset in range(0, len(view), SCAN_WINDOW):
+        if time.perf_counter() > deadline:
+            status = "timeout"
+            break
+        analysis.feed(decoder.decode(view[offset:offset + SCAN_WINDOW]))
+    else:
+        analysis.feed(decoder.decode(b"", final=True))
+    result = analysis.finish()
+    return _scan(name, status, len(view), started, result["outputs"]["matches"])
+
+
+def _warm_worker() -> None:
+    """Pool initializer: load the rules (from the compiled pack cache) up front"""
+    get_rule_registry().rules
+
+
+class ArtifactScanner:
+    """
+    Scans the artifacts of a request concurrently in a process pool
+    
+    Decoding and matching are CPU-bound, so they run in ``workers``
+    processes (started with "spawn": forking a process that runs threads
+    is unsafe) instead of on the event loop; a request's artifacts are
+    scanned in parallel, so latency follows the largest artifact rather
+    than their sum. With ``workers=0`` scans run in a thread instead.
+    
+    Limits per artifact: larger than ``max_bytes`` decoded is reported as
+    too_large without decoding; a scan stops at ``timeout`` seconds with
+    partial matches. A worker that does not return within the timeout
+    plus a grace period is considered hung: the pool is replaced and its
+    processes terminated.
+    
+    Complete scans are cached by content (name, content, rule set version)
+    when a result cache is given.
+    """
+    
+    def __init__(
+        self,
+        workers: int = 2,
+        max_bytes: int = 10 * 1024 * 1024,
+        timeout: float = 5.0,
+        cache: Optional[ResultCache] = None
+    ):
+        """
+        Initialize scanner
+        
+        Args:
+            workers: Pool processes (0 scans in a thread)
+            max_bytes: Largest decoded artifact scanned
+            timeout: Seconds per artifact scan
+            cache: Result cache for complete scans
+        """
+        self.workers = workers
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.cache = cache
+        self.recycled = 0
+        self._pool: Optional[ProcessPoolExecutor] = None
+    
+    def _executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 0:
+            return None
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_warm_worker,
+            )
+        return self._pool
+    
+    def start(self) -> None:
+        """Start the worker processes ahead of the first request"""
+        pool = self._executor()
+        if pool is not None:
+            for _ in range(self.workers):
+                pool.submit(time.sleep, 0)
+    
+    def _recycle(self, pool: ProcessPoolExecutor) -> None:
+        """Replace a pool whose workers hung or died"""
+        if self._pool is pool:
+            self._pool = None
+            self.recycled += 1
+        # No public way to stop a running task: terminate the processes
+        for process in list((getattr(pool, "_processes", None) or {}).values()):
+            process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+    
+    def shutdown(self) -> None:
+        """Stop the worker processes"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+    
+    def _lookup(self, rules_version: str, artifact: Dict[str, Any]) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """Cache key of an artifact and its cached scan, if any"""
+        key = result_key(rules_version, "artifact", "", [artifact])
+        return key, self.cache.get(key)
+    
+    async def _scan_one(self, artifact: Dict[str, Any], rules_version: Optional[str]) -> Dict[str, Any]:
+        name = artifact["name"]
+        content = artifact["content_base64"]
+        if decoded_size(content) > self.max_bytes:
+            return _scan(name, "too_large", decoded_size(content), time.perf_counter())
+        
+        key = None
+        if self.cache is not None and rules_version is not None:
+            # Hashing the whole content and a Redis round trip stay off the event loop
+            if self.cache.blocking:
+                key, cached = await asyncio.to_thread(self._lookup, rules_version, artifact)
+            else:
+                key, cached = self._lookup(rules_version, artifact)
+            if cached is not None:
+                return cached
+        
+        started = time.perf_counter()
+        args = (name, content, rules_version, self.max_bytes, self.timeout)
+        pool = self._executor()
+        try:
+            if pool is None:
+                scan = await asyncio.to_thread(scan_artifact, *args)
+            else:
+                future = asyncio.get_running_loop().run_in_executor(pool, scan_artifact, *args)
+                scan = await asyncio.wait_for(future, self.timeout + HUNG_GRACE)
+        except asyncio.TimeoutError:
+            logger.error(f"Artifact scan of {name} hung past {self.timeout + HUNG_GRACE:.0f}s, restarting pool")
+            self._recycle(pool)
+            return _scan(name, "timeout", decoded_size(content), started)
+        except BrokenProcessPool as e:
+            logger.error(f"Artifact scan pool broke while scanning {name}: {e}")
+            self._recycle(pool)
+            return _scan(name, "error", decoded_size(content), started)
+        
+        if key is not None and scan["status"] in CACHEABLE_SCANS:
+            if self.cache.blocking:
+                await asyncio.to_thread(self.cache.set, key, scan)
+            else:
+                self.cache.set(key, scan)
+        return scan
+    
+    async def scan(self, artifacts: List[Dict[str, Any]], rules_version: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Scan artifacts concurrently
+        
+        Args:
+            artifacts: Artifacts ({"name", "content_base64"})
+            rules_version: Rule set version the results must match
+        
+        Returns:
+            list: Scan per artifact, in input order (see scan_artifact)
+        """
+        return list(await asyncio.gather(*(self._scan_one(a, rules_version) for a in artifacts)))
+
+
+_scanner: Optional[ArtifactScanner] = None
+
+
+def get_artifact_scanner() -> ArtifactScanner:
+    """
+    Get the process-wide artifact scanner
+    
+    Returns:
+        ArtifactScanner: Scanner configured by ARTIFACT_* settings
+    """
+    global _scanner
+    if _scanner is None:
+        from app.core.result_cache import get_result_cache
+        _scanner = ArtifactScanner(
+            workers=settings.ARTIFACT_WORKERS,
+            max_bytes=settings.ARTIFACT_MAX_BYTES,
+            timeout=settings.ARTIFACT_TIMEOUT,
+            cache=get_result_cache(),
+        )
+    return _scanner
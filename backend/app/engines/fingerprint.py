@@ -0,0 +1,389 @@
+"""
+Failure fingerprints for CI logs
+Reduces a log to its normalized error lines and groups the runs that
+failed the same way into clusters
+"""
+import hashlib
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.core.prometheus import FAILURE_FINGERPRINTS
+
+# Lines that describe the failure (lowercase; ASCII logs are searched lowercased,
+# which is several times faster than IGNORECASE)
+_ERROR_WORDS = r"error|err!|fail|exception|traceback|fatal|panic|denied|cannot|unable|not found|timed out"
+_ERROR_LINE = re.compile(_ERROR_WORDS)
+_ERROR_LINE_ANY_CASE = re.compile(_ERROR_WORDS, re.IGNORECASE)
+
+# Run-specific parts of a line, replaced in this order
+_NORMALIZE = (
+    (re.compile(r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}(?::\d{2}(?:[.,]\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?"), "<ts>"),
+    (re.compile(r"\b\d{1,2}:\d{2}:\d{2}(?:[.,]\d+)?\b"), "<ts>"),
+    (re.compile(r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b", re.IGNORECASE), "<id>"),
+    (re.compile(r"\b(?=[0-9a-f]*\d)(?=[0-9a-f]*[a-f])[0-9a-f]{7,}\b", re.IGNORECASE), "<hash>"),
+    # Directories differ between runners; the file name is kept
+    (re.compile(r"(?:[A-Za-z]:)?[\\/]?(?:[\w.@+-]+[\\/])+([\w.@+-]+)"), r"<path>/\1"),
+    (re.compile(r"\d+(?:\.\d+)*"), "<n>"),
+    (re.compile(r"\s+"), " "),
+)
+
+# Error lines kept per fingerprint (the last ones), and lines stored per cluster
+MAX_LINES = 50
+SAMPLE_LINES = 10
+# Characters of an error line fingerprinted
+MAX_LINE_CHARS = 1000
+# Fingerprints of one cluster remembered for exact lookups
+MAX_DIGESTS = 100
+
+SIMHASH_BITS = 64
+
+
+def normalize_line(line: str) -> str:
+    """
+    A log line without its run-specific parts
+    
+    Timestamps, UUIDs, hex hashes, directories and numbers are replaced by
+    placeholders, whitespace is collapsed and the line is lowercased, so the
+    same failure gives the same line in every run.
+    
+    Args:
+        line: Log line
+    
+    Returns:
+        str: Normalized line
+    """
+    for pattern, replacement in _NORMALIZE:
+        line = pattern.sub(replacement, line)
+    return line.strip().lower()
+
+
+def error_lines(text: str, tail: int = 256 * 1024) -> List[str]:
+    """
+    Normalized error lines of a log, in order and without repeats
+    
+    Only the last ``tail`` characters are read: CI logs end with the error
+    that failed the run.
+    
+    Args:
+        text: Log text
+        tail: Characters read from the end of the log
+    
+    Returns:
+        list: The last MAX_LINES distinct normalized error lines
+    """
+    if len(text) > tail:
+        start = text.find("\n", len(text) - tail)
+        text = text[start + 1:] if start != -1 else text[-tail:]
+    searched, pattern = (text.lower(), _ERROR_LINE) if text.isascii() else (text, _ERROR_LINE_ANY_CASE)
+    lines: Dict[str, None] = {}
+    pos = 0
+    while True:
+        match = pattern.search(searched, pos)
+        if match is None:
+            break
+        line_start = text.rfind("\n", 0, match.start()) + 1
+        line_end = text.find("\n", match.end())
+        if line_end == -1:
+            line_end = len(text)
+        # Minified logs put everything on one line; keep the part around the error
+        if line_end - line_start > MAX_LINE_CHARS:
+            line_start = max(line_start, match.start() - MAX_LINE_CHARS // 4)
+        normalized = normalize_line(text[line_start:min(line_end, line_start + MAX_LINE_CHARS)])
+        if normalized:
+            lines.pop(normalized, None)
+            lines[normalized] = None
+        pos = line_end + 1
+    return list(lines)[-MAX_LINES:]
+
+
+def _feature_hash(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def simhash(lines: List[str]) -> int:
+    """
+    64-bit SimHash of word 3-shingles of the lines
+    
+    Logs that share most of their error lines get hashes a few bits apart.
+    
+    Args:
+        lines: Normalized lines
+    
+    Returns:
+        int: SimHash
+    """
+    weights = [0] * SIMHASH_BITS
+    for line in lines:
+        words = line.split()
+        shingles = [" ".join(words[i:i + 3]) for i in range(max(1, len(words) - 2))]
+        for shingle in shingles:
+            value = _feature_hash(shingle)
+            for bit in range(SIMHASH_BITS):
+                weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+@dataclass(frozen=True)
+class Fingerprint:
+    """Normalized failure of one log"""
+    digest: str
+    simhash: int
+    lines: Tuple[str, ...]
+
+
+def fingerprint_log(text: str, tail: int = 256 * 1024) -> Optional[Fingerprint]:
+    """
+    Fingerprint a log by its error lines
+    
+    Args:
+        text: Log text
+        tail: Characters read from the end of the log (see error_lines)
+    
+    Returns:
+        Fingerprint | None: None if the log has no error lines
+    """
+    lines = error_lines(text, tail)
+    if not lines:
+        return None
+    digest = hashlib.blake2b("\n".join(lines).encode("utf-8"), digest_size=8).hexdigest()
+    return Fingerprint(digest, simhash(lines), tuple(lines))
+
+
+def text_digest(text: str) -> str:
+    """
+    Digest of a whole log (the key of FailureIndex.known_rules)
+    
+    Args:
+        text: Log text
+    
+    Returns:
+        str: SHA-256 hex digest
+    """
+    return hashlib.sha256(text.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+class FailureIndex:
+    """
+    Clusters of fingerprinted failures, in process memory
+    
+    A fingerprint joins the cluster that already holds the same digest, or
+    else the closest cluster whose SimHash is at most ``max_distance`` bits
+    away; otherwise it starts a new cluster. Near neighbours are found by
+    splitting the hash into ``max_distance + 1`` bands: hashes that close
+    agree on at least one band. The least recently seen clusters are
+    evicted past ``max_clusters``.
+    
+    Each digest also remembers the rules that matched its last complete
+    analysis, together with the text_digest() of that log. Only a log with
+    the same text digest may skip the other rules: logs sharing their
+    error lines can still differ anywhere else, and so match other rules.
+    """
+    
+    def __init__(self, max_clusters: int = 10000, max_distance: int = 8):
+        """
+        Initialize index
+        
+        Args:
+            max_clusters: Clusters kept
+            max_distance: Largest SimHash distance (bits) within a cluster
+        """
+        self.max_clusters = max_clusters
+        self.max_distance = max_distance
+        self.evictions = 0
+        bands = max_distance + 1
+        width = SIMHASH_BITS // bands
+        # (shift, mask) of each band; the last one takes the remaining bits
+        self._bands = [
+            (band * width, (1 << (width if band < bands - 1 else SIMHASH_BITS - band * width)) - 1)
+            for band in range(bands)
+        ]
+        # cluster id -> cluster, least recently seen first
+        self._clusters: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # digest -> {"cluster", "rules", "rules_version", "text"}
+        self._digests: Dict[str, Dict[str, Any]] = {}
+        # (band, value) -> cluster ids
+        self._buckets: Dict[Tuple[int, int], set] = {}
+        self._lock = Lock()
+    
+    def _keys(self, value: int) -> List[Tuple[int, int]]:
+        return [(band, value >> shift & mask) for band, (shift, mask) in enumerate(self._bands)]
+    
+    def _nearest(self, fingerprint: Fingerprint) -> Tuple[Optional[Dict[str, Any]], str]:
+        known = self._digests.get(fingerprint.digest)
+        if known is not None:
+            return self._clusters[known["cluster"]], "exact"
+        best = None
+        for key in self._keys(fingerprint.simhash):
+            for cluster_id in self._buckets.get(key, ()):
+                cluster = self._clusters[cluster_id]
+                distance = (cluster["simhash"] ^ fingerprint.simhash).bit_count()
+                if distance <= self.max_distance and (best is None or distance < best[0]):
+                    best = (distance, cluster)
+        return (best[1], "similar") if best else (None, "new")
+    
+    def known_rules(
+        self,
+        fingerprint: Fingerprint,
+        rules_version: Optional[str],
+        text: str
+    ) -> Optional[List[str]]:
+        """
+        Rules that matched the last complete analysis of this exact log
+        
+        Args:
+            fingerprint: Fingerprint of the log
+            rules_version: Current rule set version
+            text: text_digest() of the log
+        
+        Returns:
+            list | None: Rule names, or None if the fingerprint is unknown,
+            its last analysis was of another log or with another rule set
+        """
+        with self._lock:
+            known = self._digests.get(fingerprint.digest)
+            if (
+                known is None or rules_version is None
+                or known.get("rules_version") != rules_version or known.get("text") != text
+            ):
+                return None
+            return known["rules"]
+    
+    def record(
+        self,
+        fingerprint: Fingerprint,
+        run: Optional[Dict[str, Any]] = None,
+        rules: Optional[List[str]] = None,
+        rules_version: Optional[str] = None,
+        text: Optional[str] = None
+    ) -> Tuple[Dict[str, Any], str]:
+        """
+        Add a run to the cluster of its fingerprint
+        
+        Args:
+            fingerprint: Fingerprint of the run's log
+            run: {"repo", "run_id", "pr"} of the run
+            rules: Rules its analysis matched (None if the analysis was partial)
+            rules_version: Rule set version of the analysis
+            text: text_digest() of the run's log (None: its rules are not
+                reused by known_rules)
+        
+        Returns:
+            tuple: (cluster as in get(), "new", "exact" or "similar")
+        """
+        seen = {"at": datetime.now(timezone.utc).isoformat(), **(run or {})}
+        with self._lock:
+            cluster, match = self._nearest(fingerprint)
+            if cluster is None:
+                cluster = {
+                    "id": fingerprint.digest,
+                    "simhash": fingerprint.simhash,
+                    "seen": 0,
+                    "first_seen": seen,
+                    "digests": [],
+                    "repos": [],
+                    "lines": list(fingerprint.lines[-SAMPLE_LINES:]),
+                }
+                self._clusters[cluster["id"]] = cluster
+                for key in self._keys(fingerprint.simhash):
+                    self._buckets.setdefault(key, set()).add(cluster["id"])
+            cluster["seen"] += 1
+            cluster["last_seen"] = seen
+            repo = seen.get("repo")
+            if repo and repo not in cluster["repos"] and len(cluster["repos"]) < MAX_DIGESTS:
+                cluster["repos"].append(repo)
+            self._clusters.move_to_end(cluster["id"])
+            
+            known = self._digests.get(fingerprint.digest)
+            if known is None and len(cluster["digests"]) < MAX_DIGESTS:
+                cluster["digests"].append(fingerprint.digest)
+                known = self._digests[fingerprint.digest] = {"cluster": cluster["id"]}
+            if known is not None and rules is not None:
+                known["rules"] = list(rules)
+                known["rules_version"] = rules_version
+                known["text"] = text
+            if len(self._clusters) > self.max_clusters:
+                self._evict()
+            FAILURE_FINGERPRINTS.labels(match).inc()
+            return self._summary(cluster), match
+    
+    def _evict(self) -> None:
+        _, cluster = self._clusters.popitem(last=False)
+        for digest in cluster["digests"]:
+            self._digests.pop(digest, None)
+        for key in self._keys(cluster["simhash"]):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(cluster["id"])
+                if not bucket:
+                    del self._buckets[key]
+        self.evictions += 1
+    
+    @staticmethod
+    def _summary(cluster: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "id": cluster["id"],
+            "seen": cluster["seen"],
+            "first_seen": dict(cluster["first_seen"]),
+            "last_seen": dict(cluster["last_seen"]),
+            "repos": list(cluster["repos"]),
+            "fingerprints": len(cluster["digests"]),
+            "lines": list(cluster["lines"]),
+        }
+    
+    def get(self, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """
+        Cluster of a fingerprint digest (or cluster id)
+        
+        Args:
+            fingerprint: Digest returned with an analysis
+        
+        Returns:
+            dict | None: {"id", "seen", "first_seen", "last_seen", "repos",
+            "fingerprints", "lines"}, or None if unknown
+        """
+        with self._lock:
+            known = self._digests.get(fingerprint)
+            cluster = self._clusters.get(known["cluster"] if known else fingerprint)
+            return self._summary(cluster) if cluster is not None else None
+    
+    def clear(self) -> None:
+        """Forget every cluster"""
+        with self._lock:
+            self._clusters.clear()
+            self._digests.clear()
+            self._buckets.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Index size
+        
+        Returns:
+            dict: {"clusters", "fingerprints", "max_clusters", "max_distance", "evictions"}
+        """
+        return {
+            "clusters": len(self._clusters),
+            "fingerprints": len(self._digests),
+            "max_clusters": self.max_clusters,
+            "max_distance": self.max_distance,
+            "evictions": self.evictions,
+        }
+
+
+_index: Optional[FailureIndex] = None
+
+
+def get_failure_index() -> FailureIndex:
+    """
+    Get the process-wide failure index
+    
+    Returns:
+        FailureIndex: Index sized by FINGERPRINT_MAX_CLUSTERS and FINGERPRINT_MAX_DISTANCE
+    """
+    global _index
+    if _index is None:
+        _index = FailureIndex(settings.FINGERPRINT_MAX_CLUSTERS, settings.FINGERPRINT_MAX_DISTANCE)
+    return _index
@@ -0,0 +1,377 @@
+"""
+Literal prefilter for the rule engine
+Finds the candidate offsets of each regex's required literals and runs the
+regex only where it can match
+"""
+import re
+from re import _constants as sre_c, _parser as sre_parse
+from typing import Any, Dict, List, Optional, Tuple
+from app.engines.safe_regex import CpuBudget, compile_rule_regex
+
+# Nodes whose matches never contain a newline
+_SAFE_CATEGORIES = (sre_c.CATEGORY_DIGIT, sre_c.CATEGORY_WORD, sre_c.CATEGORY_NOT_SPACE)
+
+Span = Tuple[int, int]
+
+
+class TextScan:
+    """
+    Case-insensitive literal lookups over one text
+    
+    ASCII text is lowercased once and searched with str.find; other text is
+    searched with IGNORECASE regexes so offsets stay exact. First
+    occurrences are memoized, so a literal shared by many patterns (e.g.
+    "error") is located once per analysis.
+    
+    The scan also carries the limits of the searches run on it: a CPU
+    budget, and the longest slice of text one regex call may see.
+    """
+    
+    def __init__(self, text: str, budget: Optional[CpuBudget] = None, max_span: int = 0):
+        """
+        Initialize scan
+        
+        Args:
+            text: Text to search
+            budget: CPU budget of the searches (None is unlimited)
+            max_span: Longest text one regex call sees (0 is unlimited);
+                longer lines are searched in overlapping windows, so
+                matches longer than this may be missed
+        """
+        self.text = text
+        self.length = len(text)
+        self.budget = budget
+        self.max_span = max_span
+        self._lowered = text.lower() if text.isascii() else None
+        self._literals: Dict[str, re.Pattern] = {}
+        self._first: Dict[str, int] = {}
+    
+    def spend(self, chars: int = 0) -> bool:
+        """Account for a search step; whether the budget is exhausted"""
+        return self.budget is not None and self.budget.spend(chars)
+    
+    def find(self, literal: str, start: int = 0, end: Optional[int] = None) -> int:
+        """
+        Offset of a lowercase literal in text[start:end], or -1
+        
+        Args:
+            literal: Lowercase ASCII literal
+            start: First offset searched
+            end: Offset the literal must end by (defaults to the text end)
+        
+        Returns:
+            int: Offset of the first occurrence, or -1
+        """
+        if end is None:
+            end = self.length
+        if start == 0 and end == self.length:
+            first = self._first.get(literal)
+            if first is None:
+                first = self._first[literal] = self._find(literal, 0, end)
+            return first
+        return self._find(literal, start, end)
+    
+    def _find(self, literal: str, start: int, end: int) -> int:
+        if self._lowered is not None:
+            return self._lowered.find(literal, start, end)
+        pattern = self._literals.get(literal)
+        if pattern is None:
+            pattern = self._literals[literal] = re.compile(re.escape(literal), re.IGNORECASE)
+        match = pattern.search(self.text, start, end)
+        return match.start() if match else -1
+    
+    def line_start(self, offset: int) -> int:
+        return self.text.rfind("\n", 0, offset) + 1
+    
+    def line_end(self, offset: int) -> int:
+        end = self.text.find("\n", offset)
+        return self.length if end == -1 else end
+
+
+def _is_gap(node) -> bool:
+    """Whether a node is ``.*`` or ``.*?``"""
+    op, av = node
+    return (
+        op in (sre_c.MIN_REPEAT, sre_c.MAX_REPEAT)
+        and av[0] == 0 and av[1] == sre_c.MAXREPEAT
+        and list(av[2]) == [(sre_c.ANY, None)]
+    )
+
+
+def _literal(nodes) -> Optional[str]:
+    """Nodes as a lowercase literal, or None if they are not plain ASCII characters"""
+    chars = []
+    for op, av in nodes:
+        if op != sre_c.LITERAL or av > 127 or av == 10:
+            return None
+        chars.append(chr(av))
+    return "".join(chars).lower() or None
+
+
+def _literal_runs(nodes) -> List[str]:
+    """Maximal runs of plain characters in a node sequence (all required)"""
+    runs = []
+    current: list = []
+    for node in list(nodes) + [(None, None)]:
+        if node[0] == sre_c.LITERAL and _literal([node]):
+            current.append(node)
+        elif current:
+            runs.append(_literal(current))
+            current = []
+    return runs
+
+
+def _windowable(nodes) -> bool:
+    """
+    Whether matches of these nodes always lie within one line and do not
+    depend on text outside it (no newlines, anchors, lookarounds or backrefs)
+    """
+    for op, av in nodes:
+        if op == sre_c.LITERAL:
+            if av == 10:
+                return False
+        elif op == sre_c.ANY:
+            continue
+        elif op == sre_c.IN:
+            for item_op, item_av in av:
+                if item_op == sre_c.LITERAL and item_av != 10:
+                    continue
+                if item_op == sre_c.RANGE and not item_av[0] <= 10 <= item_av[1]:
+                    continue
+                if item_op == sre_c.CATEGORY and item_av in _SAFE_CATEGORIES:
+                    continue
+                return False
+        elif op in (sre_c.MIN_REPEAT, sre_c.MAX_REPEAT, sre_c.POSSESSIVE_REPEAT):
+            if not _windowable(av[2]):
+                return False
+        elif op == sre_c.SUBPATTERN:
+            if av[1] or av[2] or not _windowable(av[3]):
+                return False
+        elif op == sre_c.ATOMIC_GROUP:
+            if not _windowable(av):
+                return False
+        elif op == sre_c.BRANCH:
+            if not all(_windowable(branch) for branch in av[1]):
+                return False
+        else:
+            return False
+    return True
+
+
+class AnchoredRegex:
+    """
+    A regex searched only around occurrences of its required literals
+    
+    The pattern is split on top-level ``.*?``/``.*`` gaps. Without DOTALL a
+    gap cannot cross a line, which gives three exact strategies:
+    
+    - ``chain``: the pattern starts with literal segments joined by gaps.
+      The leftmost match starts at the first occurrence of the first
+      literal on the first line where the following literals appear in
+      order; if the regex fails from there it fails for the whole line, so
+      each line is tried at most once (lines longer than the scan's
+      max_span from each occurrence of the first literal). Literal chains
+      joined by lazy gaps need no regex.
+    - ``line``: the pattern never matches a newline; it is searched only on
+      the lines holding its longest literal.
+    - ``gated``: anything else is searched over the whole text, but only if
+      all of its literals occur.
+    
+    search() returns the same span as ``regex.search(text)`` for matches
+    shorter than the scan's max_span. Searches stop early (no match) once
+    the scan's CPU budget is exhausted.
+    
+    The analysis is plain data (plan()), so it can be stored and restored
+    with from_plan() without parsing the pattern again; the regex is then
+    only compiled once a search needs it.
+    """
+    
+    def __init__(self, regex: re.Pattern):
+        # Compiled again on first use, with the repeat bounds (see safe_regex)
+        self._regex: Optional[re.Pattern] = None
+        self.pattern = regex.pattern
+        self.flags = regex.flags
+        self.chain: List[str] = []
+        self.literals: List[str] = []
+        self.needs_regex = True
+        self.strategy = "gated"
+        
+        parsed = sre_parse.parse(regex.pattern, regex.flags)
+        segments: List[list] = [[]]
+        greedy = False
+        for node in parsed:
+            if _is_gap(node):
+                greedy = greedy or node[0] == sre_c.MAX_REPEAT
+                segments.append([])
+            else:
+                segments[-1].append(node)
+        literals = [_literal(segment) for segment in segments]
+        self.literals = [run for segment in segments for run in _literal_runs(segment)]
+        ignorecase = regex.flags & re.IGNORECASE
+        
+        # Candidates are found case-insensitively, so only IGNORECASE
+        # patterns can be skipped from the first candidate of a line
+        if not ignorecase or regex.flags & re.DOTALL or not all(segments):
+            return
+        if literals[0]:
+            self.strategy = "chain"
+            for literal in literals:
+                if literal is None:
+                    break
+                self.chain.append(literal)
+            # A greedy gap runs to the last occurrence of the next literal,
+            # which only the regex knows
+            self.needs_regex = bool(regex.flags & re.ASCII) or greedy or len(self.chain) < len(segments)
+        elif self.literals and _windowable(parsed):
+            self.strategy = "line"
+    
+    @classmethod
+    def from_plan(cls, plan: Dict[str, Any]) -> "AnchoredRegex":
+        """
+        Restore an analyzed regex from its plan
+        
+        Args:
+            plan: Output of plan()
+        
+        Returns:
+            AnchoredRegex: Regex with the stored strategy (compiled lazily)
+        """
+        anchored = cls.__new__(cls)
+        anchored._regex = None
+        anchored.pattern = plan["pattern"]
+        anchored.flags = plan["flags"]
+        anchored.strategy = plan["strategy"]
+        anchored.chain = list(plan["chain"])
+        anchored.literals = list(plan["literals"])
+        anchored.needs_regex = plan["needs_regex"]
+        return anchored
+    
+    def plan(self) -> Dict[str, Any]:
+        """The analysis as JSON-serializable data (see from_plan)"""
+        return {
+            "pattern": self.pattern,
+            "flags": self.flags,
+            "strategy": self.strategy,
+            "chain": self.chain,
+            "literals": self.literals,
+            "needs_regex": self.needs_regex,
+        }
+    
+    @property
+    def regex(self) -> re.Pattern:
+        """The compiled regex (compiled on first use, by compile_rule_regex)"""
+        if self._regex is None:
+            self._regex = compile_rule_regex(self.pattern, self.flags)
+        return self._regex
+    
+    def search(self, scan: TextScan, pos: int = 0) -> Optional[Span]:
+        """
+        Leftmost match of the regex in the scanned text
+        
+        Args:
+            scan: Text to search
+            pos: Offset the match may start at, at the earliest
+        
+        Returns:
+            tuple | None: (start, end) of the match
+        """
+        for literal in self.literals:
+            if scan.find(literal) == -1:
+                return None
+        if self.strategy == "chain":
+            return self._search_chain(scan, pos)
+        if self.strategy == "line":
+            return self._search_lines(scan, pos)
+        return self._search_range(scan, pos, scan.length, max(self.literals, key=len, default=None))
+    
+    def finditer(self, scan: TextScan, limit: int = 1000) -> List[Span]:
+        """
+        Non-overlapping matches, in order (as ``regex.finditer``)
+        
+        Args:
+            scan: Text to search
+            limit: Stop after this many matches
+        
+        Returns:
+            list: (start, end) of each match
+        """
+        spans: List[Span] = []
+        pos = 0
+        while len(spans) < limit and pos <= scan.length:
+            span = self.search(scan, pos)
+            if span is None:
+                break
+            spans.append(span)
+            pos = span[1] if span[1] > span[0] else span[1] + 1
+        return spans
+    
+    def _search_range(self, scan: TextScan, pos: int, end: int, anchor: Optional[str]) -> Optional[Span]:
+        """
+        regex.search over text[pos:end], one bounded window at a time
+        
+        Ranges longer than twice the scan's max_span are searched in windows
+        of 2 * max_span overlapping by max_span, skipping windows without the
+        anchor literal, so any match up to max_span long is found and no
+        regex call sees more than 2 * max_span characters.
+        """
+        span = scan.max_span
+        start = pos
+        while True:
+            stop = end if not span or end - start <= 2 * span else start + 2 * span
+            if anchor is None or scan.find(anchor, start, stop) != -1:
+                if scan.spend(stop - start):
+                    return None
+                match = self.regex.search(scan.text, start, stop)
+                if match:
+                    return match.span()
+            if stop == end:
+                return None
+            start += span
+    
+    def _search_chain(self, scan: TextScan, pos: int) -> Optional[Span]:
+        first = self.chain[0]
+        while True:
+            if scan.spend():
+                return None
+            start = scan.find(first, pos)
+            if start == -1:
+                return None
+            line_end = scan.line_end(start)
+            end = start + len(first)
+            for literal in self.chain[1:]:
+                found = scan.find(literal, end, line_end)
+                if found == -1:
+                    # The next candidate line must hold this literal too
+                    found = scan.find(literal, line_end)
+                    if found == -1:
+                        return None
+                    pos = scan.line_start(found)
+                    break
+                end = found + len(literal)
+            else:
+                if not self.needs_regex:
+                    return start, end
+                stop = scan.length if not scan.max_span else min(scan.length, start + scan.max_span)
+                if scan.spend(stop - start):
+                    return None
+                match = self.regex.match(scan.text, start, stop)
+                if match:
+                    return match.span()
+                # The bounded try missed the rest of a long line: retry from
+                # the next occurrence of the leading literal on it
+                pos = start + 1 if stop < line_end else line_end + 1
+    
+    def _search_lines(self, scan: TextScan, pos: int) -> Optional[Span]:
+        anchor = max(self.literals, key=len)
+        while True:
+            if scan.spend():
+                return None
+            found = scan.find(anchor, pos)
+            if found == -1:
+                return None
+            line_start = max(scan.line_start(found), pos)
+            line_end = scan.line_end(found)
+            span = self._search_range(scan, line_start, line_end, anchor)
+            if span is not None or (scan.budget is not None and scan.budget.exceeded):
+                return span
+            pos = line_end + 1
@@ -2,8 +2,28 @@
 Rule Engine for CI Failure Detection
 Recognizes common CI failures and provides actionable guidance
 """
+import math
 import re
-from typing import Dict, List, Any, Optional
+import time
+from typing import Dict, List, Any, Optional, Tuple
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.prometheus import RULE_ANALYSES, RULE_BUDGET_EXCEEDED, RULE_LATENCY
+from app.core.result_cache import ResultCache, result_key
+from app.core.tracing import start_span
+from app.engines.prefilter import AnchoredRegex, Span, TextScan
+from app.engines.rule_stats import rule_stats
+from app.engines.safe_regex import CpuBudget
+
+logger = get_logger(__name__)
+
+# Artifact scan outcomes whose analysis may be cached (see app/engines/artifacts.py)
+CACHEABLE_SCANS = ("ok", "too_large", "invalid")
+
+# Matches counted per pattern, and locations reported (the first ones and the last)
+MAX_MATCHES = 1000
+MAX_LOCATIONS = 5
+EXCERPT_CHARS = 200
 
 
 class CIFailurePattern:
@@ -15,269 +35,300 @@ class CIFailurePattern:
         patterns: List[str],
         message: str,
         actions: List[Dict[str, str]],
-        severity: str = "error"
+        severity: str = "error",
+        plans: Optional[List[Dict[str, Any]]] = None
     ):
+        """
+        Initialize pattern
+        
+        Args:
+            name: Pattern name
+            patterns: Regexes, matched case-insensitively
+            message: Guidance shown for a match
+            actions: Suggested actions ({"type", "title", "details"})
+            severity: info, warn or error
+            plans: Stored prefilter plans of the regexes (AnchoredRegex.plan);
+                restoring them skips parsing and compiling the regexes
+        
+        Raises:
+            re.error: If a regex is invalid
+        """
         self.name = name
-        self.patterns = [re.compile(p, re.IGNORECASE) for p in patterns]
+        if plans is not None:
+            self.anchored = [AnchoredRegex.from_plan(plan) for plan in plans]
+        else:
+            self.anchored = [AnchoredRegex(re.compile(p, re.IGNORECASE)) for p in patterns]
         self.message = message
         self.actions = actions
         self.severity = severity
     
+    @property
+    def patterns(self) -> List[re.Pattern]:
+        """The compiled regexes"""
+        return [anchored.regex for anchored in self.anchored]
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Pattern with its prefilter plans (restored by CIFailurePattern(**data))"""
+        return {
+            "name": self.name,
+            "patterns": [anchored.pattern for anchored in self.anchored],
+            "message": self.message,
+            "actions": self.actions,
+            "severity": self.severity,
+            "plans": [anchored.plan() for anchored in self.anchored],
+        }
+    
     def matches(self, text: str) -> bool:
         """Check if any pattern matches the text"""
-        return any(pattern.search(text) for pattern in self.patterns)
+        return self.matches_scan(TextScan(text))
+    
+    def matches_scan(self, scan: TextScan) -> bool:
+        """Check if any pattern matches a scanned text (shares literal lookups)"""
+        return any(pattern.search(scan) is not None for pattern in self.anchored)
+    
+    def find_spans(self, scan: TextScan, limit: int = MAX_MATCHES) -> Tuple[List[Span], int]:
+        """
+        Where the pattern matches a scanned text
+        
+        Args:
+            scan: Text to search
+            limit: Matches collected per regex
+        
+        Returns:
+            tuple: (non-overlapping spans in order, literal characters of the
+            most specific regex that matched)
+        """
+        spans: List[Span] = []
+        specificity = 0
+        for anchored in self.anchored:
+            found = anchored.finditer(scan, limit)
+            if found:
+                spans.extend(found)
+                specificity = max(specificity, sum(len(literal) for literal in anchored.literals))
+        spans.sort()
+        merged: List[Span] = []
+        for span in spans:
+            if not merged or span[0] >= merged[-1][1]:
+                merged.append(span)
+        return merged[:limit], specificity
 
 
-# Define common CI failure patterns
-CI_PATTERNS = [
-    CIFailurePattern(
-        name="node_version_mismatch",
-        patterns=[
-            r"error.*?node.*?version",
-            r"expected node.*?but got",
-            r"required node.*?version",
-            r"unsupported engine.*?node"
-        ],
-        message="Node.js version mismatch detected. Check your .nvmrc or package.json engines field.",
-        actions=[
-            {
-                "type": "check",
-                "title": "Verify Node.js version",
-                "details": "Check .nvmrc file or package.json engines.node field matches CI environment"
-            },
-            {
-                "type": "suggest",
-                "title": "Update CI workflow",
-                "details": "Update .github/workflows to use correct Node.js version via actions/setup-node"
-            }
-        ],
-        severity="error"
-    ),
-    
-    CIFailurePattern(
-        name="npm_lockfile_mismatch",
-        patterns=[
-            r"npm.*?lockfile.*?version",
-            r"package-lock\.json.*?conflict",
-            r"npm ci.*?failed",
-            r"lockfile.*?out of date",
-            r"package-lock\.json is outdated"
-        ],
-        message="npm lockfile is out of sync. Run 'npm install' locally and commit the updated package-lock.json.",
-        actions=[
-            {
-                "type": "patch",
-                "title": "Regenerate package-lock.json",
-                "details": "Run: rm -rf node_modules package-lock.json && npm install"
-            },
-            {
-                "type": "check",
-                "title": "Verify npm version",
-                "details": "Ensure CI and local npm versions match"
-            }
-        ],
-        severity="error"
-    ),
-    
-    CIFailurePattern(
-        name="python_deps_install_failed",
-        patterns=[
-            r"error.*?installing.*?requirements",
-            r"pip install.*?failed",
-            r"could not find.*?version.*?pypi",
-            r"no matching distribution found"
-        ],
-        message="Python dependency installation failed. Check requirements.txt for invalid versions or unavailable packages.",
-        actions=[
-            {
-                "type": "check",
-                "title": "Verify requirements.txt",
-                "details": "Check for typos, version constraints, and package availability on PyPI"
-            },
-            {
-                "type": "suggest",
-                "title": "Pin exact versions",
-                "details": "Use pip freeze to generate exact versions if using loose constraints"
-            }
-        ],
-        severity="error"
-    ),
-    
-    CIFailurePattern(
-        name="ruff_linting_errors",
-        patterns=[
-            r"ruff.*?found.*?error",
-            r"ruff check.*?failed",
-            r"ruff.*?\d+\s+error"
-        ],
-        message="Ruff linting errors detected. Run 'ruff check --fix .' locally to auto-fix most issues.",
-        actions=[
-            {
-                "type": "patch",
-                "title": "Auto-fix with Ruff",
-                "details": "Run: ruff check --fix ."
-            },
-            {
-                "type": "check",
-                "title": "Review remaining errors",
-                "details": "Run: ruff check . to see unfixable errors"
-            }
-        ],
-        severity="warn"
-    ),
-    
-    CIFailurePattern(
-        name="flake8_errors",
-        patterns=[
-            r"flake8.*?error",
-            r"flake8.*?failed"
-        ],
-        message="Flake8 linting errors found. Run 'flake8' locally and fix reported issues.",
-        actions=[
-            {
-                "type": "check",
-                "title": "Run flake8 locally",
-                "details": "Run: flake8 . to see all errors"
-            },
-            {
-                "type": "suggest",
-                "title": "Consider using Ruff",
-                "details": "Ruff is a faster alternative to flake8 with auto-fix capabilities"
-            }
-        ],
-        severity="warn"
-    ),
-    
-    CIFailurePattern(
-        name="pytest_import_errors",
-        patterns=[
-            r"import.*?error.*?pytest",
-            r"modulenotfounderror",
-            r"no module named",
-            r"pytest.*?collection.*?error"
-        ],
-        message="Python import errors during test collection. Check missing dependencies or PYTHONPATH issues.",
-        actions=[
-            {
-                "type": "check",
-                "title": "Verify all dependencies installed",
-                "details": "Ensure all packages in requirements.txt are installed: pip install -r requirements.txt"
-            },
-            {
-                "type": "check",
-                "title": "Check PYTHONPATH",
-                "details": "Verify test files can import application modules correctly"
-            }
-        ],
-        severity="error"
-    ),
-    
-    CIFailurePattern(
-        name="cancelled_run",
-        patterns=[
-            r"workflow.*?cancelled",
-            r"run.*?cancelled",
-            r"cancelled by"
-        ],
-        message="Workflow run was cancelled. This is typically a manual action or superseded by newer run.",
-        actions=[
-            {
-                "type": "check",
-                "title": "Check cancellation reason",
-                "details": "Review GitHub Actions UI for cancellation details"
-            },
-            {
-                "type": "suggest",
-                "title": "Re-run if needed",
-                "details": "Manually trigger a new run if this was cancelled in error"
-            }
-        ],
-        severity="info"
-    ),
-    
-    CIFailurePattern(
-        name="test_failures",
-        patterns=[
-            r"\d+\s+failed.*?test",
-            r"test.*?failed",
-            r"assertion.*?error",
-            r"pytest.*?\d+\s+failed"
-        ],
-        message="Test failures detected. Review test output for specific assertion errors.",
-        actions=[
-            {
-                "type": "check",
-                "title": "Run tests locally",
-                "details": "Run the same test suite locally to reproduce failures"
-            },
-            {
-                "type": "check",
-                "title": "Review test logs",
-                "details": "Check CI logs for detailed assertion errors and stack traces"
-            }
-        ],
-        severity="error"
-    ),
-    
-    CIFailurePattern(
-        name="build_timeout",
-        patterns=[
-            r"timeout.*?exceeded",
-            r"build.*?timeout",
-            r"execution.*?timeout"
-        ],
-        message="Build or test execution timed out. Optimize slow tests or increase timeout limits.",
-        actions=[
-            {
-                "type": "check",
-                "title": "Identify slow tests",
-                "details": "Run tests with timing info: pytest --durations=10"
-            },
-            {
-                "type": "suggest",
-                "title": "Increase timeout",
-                "details": "Update workflow timeout-minutes if jobs legitimately need more time"
-            }
-        ],
-        severity="warn"
-    ),
-    
-    CIFailurePattern(
-        name="docker_build_failed",
-        patterns=[
-            r"docker.*?build.*?failed",
-            r"error.*?building.*?image",
-            r"dockerfile.*?error"
-        ],
-        message="Docker image build failed. Check Dockerfile syntax and base image availability.",
-        actions=[
-            {
-                "type": "check",
-                "title": "Test Docker build locally",
-                "details": "Run: docker build -t test-image ."
-            },
-            {
-                "type": "check",
-                "title": "Verify base image",
-                "details": "Ensure base image in FROM statement is accessible"
-            }
-        ],
-        severity="error"
-    ),
-]
+def score_match(severity: str, count: int, specificity: int, last_end: int, length: int) -> float:
+    """
+    Confidence that a matched pattern explains the failure, 0..1
+    
+    Weighs severity (0.4), how often it matched (0.2, saturating at 10
+    matches), how specific the matching regex is (0.2, literal characters)
+    and how close to the end of the log it last matched (0.2), since CI
+    logs end with the error that failed the run.
+    """
+    return round(
+        0.4 * SEVERITY_RANK[severity] / 2
+        + 0.2 * min(1.0, math.log1p(count) / math.log1p(10))
+        + 0.2 * min(1.0, specificity / 24)
+        + 0.2 * (last_end / length if length else 0.0),
+        3
+    )
+
+
+def budgeted_scan(text: str) -> TextScan:
+    """TextScan with the configured CPU budget and regex span limits"""
+    return TextScan(text, CpuBudget(settings.RULE_CPU_BUDGET), settings.RULE_REGEX_MAX_SPAN)
+
+
+def budget_stop(scan: TextScan, patterns: List[CIFailurePattern], index: int) -> Optional[Dict[str, Any]]:
+    """
+    Report of an exhausted budget, once patterns[index] has run
+    
+    Args:
+        scan: The scan the patterns ran on
+        patterns: Patterns in rule order
+        index: Pattern that just ran
+    
+    Returns:
+        dict | None: CpuBudget.report (None while within budget)
+    """
+    if scan.budget is None or not scan.budget.check():
+        return None
+    name = patterns[index].name
+    report = scan.budget.report(name, [pattern.name for pattern in patterns[index + 1:]])
+    RULE_BUDGET_EXCEEDED.labels(name).inc()
+    logger.warning(
+        f"Rule CPU budget of {report['budget_ms']}ms exceeded in {name} "
+        f"({len(scan.text)} chars), skipped {len(report['skipped'])} rules"
+    )
+    return report
+
+
+def locate(
+    text: str,
+    spans: List[Span],
+    offset: int = 0,
+    line: int = 1,
+    byte_offset: int = 0
+) -> List[Dict[str, Any]]:
+    """
+    Line numbers, offsets and excerpts of match spans
+    
+    Args:
+        text: Text the spans index into
+        spans: Sorted (start, end) spans
+        offset: Offset of text in the whole log (characters)
+        line: Line number of the start of text
+        byte_offset: Offset of text in the whole log (UTF-8 bytes)
+    
+    Returns:
+        list: [{"line", "start", "end", "byte_start", "byte_end", "excerpt"}]
+    """
+    ascii_text = text.isascii()
+    locations = []
+    pos = 0
+    byte_pos = byte_offset
+    for start, end in spans:
+        line += text.count("\n", pos, start)
+        if ascii_text:
+            byte_start, byte_end = byte_offset + start, byte_offset + end
+        else:
+            byte_pos += len(text[pos:start].encode("utf-8"))
+            byte_start = byte_pos
+            byte_end = byte_start + len(text[start:end].encode("utf-8"))
+        pos = start
+        line_start = text.rfind("\n", 0, start) + 1
+        line_end = text.find("\n", start)
+        if line_end == -1:
+            line_end = len(text)
+        excerpt_start = max(line_start, min(start, line_end - EXCERPT_CHARS))
+        locations.append({
+            "line": line,
+            "start": offset + start,
+            "end": offset + end,
+            "byte_start": byte_start,
+            "byte_end": byte_end,
+            "excerpt": text[excerpt_start:min(line_end, excerpt_start + EXCERPT_CHARS)],
+        })
+    return locations
+
+
+class PatternMatch:
+    """A matched pattern, where it matched and how confident the match is"""
+    
+    def __init__(
+        self,
+        pattern: CIFailurePattern,
+        count: int,
+        specificity: int,
+        last_end: int,
+        length: int,
+        locations: List[Dict[str, Any]],
+        artifact: Optional[str] = None
+    ):
+        self.pattern = pattern
+        self.count = count
+        self.specificity = specificity
+        self.locations = locations
+        self.artifact = artifact
+        self.score = score_match(pattern.severity, count, specificity, last_end, length)
+    
+    @classmethod
+    def from_artifact(cls, pattern: CIFailurePattern, match: Dict[str, Any], artifact: str) -> "PatternMatch":
+        """
+        Rebuild a match reported by an artifact scan
+        
+        Args:
+            pattern: The matched pattern
+            match: Match dict (to_dict) scored against the artifact
+            artifact: Artifact name
+        """
+        restored = cls(pattern, match["count"], 0, 0, 0, match["locations"], artifact)
+        restored.score = match["score"]
+        return restored
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "pattern": self.pattern.name,
+            "message": self.pattern.message,
+            "severity": self.pattern.severity,
+            "score": self.score,
+            "count": self.count,
+            "locations": self.locations,
+            "artifact": self.artifact,
+        }
+
+
+def reported_spans(spans: List[Span]) -> List[Span]:
+    """The spans whose locations are reported: the first ones and the last"""
+    if len(spans) <= MAX_LOCATIONS:
+        return spans
+    return spans[:MAX_LOCATIONS - 1] + spans[-1:]
+
+
+def rank(matches: List[PatternMatch]) -> List[PatternMatch]:
+    """Matches by descending score; ties keep rule order"""
+    return sorted(matches, key=lambda match: -match.score)
 
 
 class RuleEngine:
-    """Rule engine for analyzing CI failures and providing guidance"""
+    """
+    Rule engine for analyzing CI failures and providing guidance
+    
+    Patterns come from the rule packs (app/config/rules) unless given; each
+    analysis uses the rule set current when it starts, so a hot swap never
+    changes the patterns under a running analysis.
+    
+    With a result cache, analyses of the rule packs are looked up by
+    content (text, artifacts, mode and rule set version) first; a new rule
+    set version misses every older entry.
     
-    def __init__(self):
-        self.patterns = CI_PATTERNS
+    An analysis stops once it has spent RULE_CPU_BUDGET seconds matching;
+    the result then carries ``outputs["budget_exceeded"]`` (the rule that
+    was running and the rules skipped) and is not cached.
+    
+    Artifacts are scanned separately (app/engines/artifacts.py); their
+    matches are ranked together with the text's.
+    """
+    
+    def __init__(
+        self,
+        patterns: Optional[List[CIFailurePattern]] = None,
+        cache: Optional[ResultCache] = None
+    ):
+        """
+        Initialize engine
+        
+        Args:
+            patterns: Fixed patterns (defaults to the loaded rule packs;
+                results of fixed patterns are not cached)
+            cache: Result cache (None analyzes every time)
+        """
+        self._patterns = patterns
+        self.cache = cache
+    
+    @property
+    def patterns(self) -> List[CIFailurePattern]:
+        """Patterns in rule order"""
+        return self._rules()[0]
+    
+    @property
+    def rules_version(self) -> Optional[str]:
+        """Version of the current rule set (None for fixed patterns)"""
+        return self._rules()[1]
+    
+    def _rules(self) -> Tuple[List[CIFailurePattern], Optional[str]]:
+        """Patterns to analyze with and their rule set version (None if fixed)"""
+        if self._patterns is not None:
+            return self._patterns, None
+        # Imported here: rule packs are built from CIFailurePattern
+        from app.engines.rule_packs import get_rule_registry
+        rules = get_rule_registry().rules
+        return rules.patterns, rules.version
     
     def analyze(
         self,
         text: str,
         mode: str = "analysis",
-        artifacts: List[Dict[str, Any]] = None
+        artifacts: List[Dict[str, Any]] = None,
+        scans: Optional[List[Dict[str, Any]]] = None,
+        rules: Optional[List[str]] = None
     ) -> Dict[str, Any]:
         """
         Analyze text for CI failure patterns
@@ -286,13 +337,90 @@ class RuleEngine:
             text: Input text to analyze (logs, error messages, etc.)
             mode: Operation mode (analysis, autofix, logger)
             artifacts: Optional list of artifacts with base64 content
+            scans: Scans of the artifacts (ArtifactScanner.scan), merged
+                into the matches; without them only the text is analyzed
+            rules: Only run these rules, by name (e.g. the rules a known
+                failure matched before); cached results of a full analysis
+                are still used, but these results are not cached
             
         Returns:
             dict: Analysis result with message, severity, and actions
         """
-        # Find matching patterns
-        matches = [pattern for pattern in self.patterns if pattern.matches(text)]
-        
+        with start_span("rule_engine.analyze", mode=mode, text_length=len(text)) as span:
+            patterns, version = self._rules()
+            if rules is not None:
+                wanted = set(rules)
+                patterns = [pattern for pattern in patterns if pattern.name in wanted]
+                span.set_attribute("rules", len(patterns))
+            key = None
+            result = None
+            # Incomplete scans (timeouts, crashed workers) are not cached
+            if self.cache is not None and version is not None and all(
+                scan["status"] in CACHEABLE_SCANS for scan in scans or []
+            ):
+                key = result_key(version, mode, text, artifacts if scans is not None else None)
+                result = self.cache.get(key)
+                span.set_attribute("cache_hit", result is not None)
+            if result is None:
+                start = time.perf_counter()
+                result = self._analyze(patterns, text, mode, artifacts, scans)
+                RULE_LATENCY.observe(time.perf_counter() - start)
+                if key is not None and rules is None and "budget_exceeded" not in result["outputs"]:
+                    self.cache.set(key, result)
+            RULE_ANALYSES.labels(mode, result["severity"]).inc()
+            span.set_attribute("severity", result["severity"])
+        return result
+    
+    def _analyze(
+        self,
+        patterns: List[CIFailurePattern],
+        text: str,
+        mode: str,
+        artifacts: Optional[List[Dict[str, Any]]],
+        scans: Optional[List[Dict[str, Any]]] = None
+    ) -> Dict[str, Any]:
+        """Run the patterns over the text and merge the artifact scans (see analyze)"""
+        # Find matching patterns; regexes only run near their literals
+        scan = budgeted_scan(text)
+        matches = []
+        exceeded = None
+        for index, pattern in enumerate(patterns):
+            start = time.perf_counter()
+            spans, specificity = pattern.find_spans(scan)
+            rule_stats.record(pattern.name, time.perf_counter() - start, len(text), len(spans))
+            if spans:
+                matches.append(PatternMatch(
+                    pattern, len(spans), specificity, spans[-1][1], len(text),
+                    locate(text, reported_spans(spans))
+                ))
+            exceeded = budget_stop(scan, patterns, index)
+            if exceeded is not None:
+                break
+        if scans:
+            by_name = {pattern.name: pattern for pattern in patterns}
+            for scan in scans:
+                # Skip rules that were swapped out while the artifact was scanned
+                matches.extend(
+                    PatternMatch.from_artifact(by_name[match["pattern"]], match, scan["name"])
+                    for match in scan["matches"] if match["pattern"] in by_name
+                )
+        result = self._result(rank(matches), mode, text, artifacts)
+        if scans is not None:
+            result["outputs"]["artifacts"] = [
+                {key: value for key, value in scan.items() if key != "matches"} for scan in scans
+            ]
+        if exceeded is not None:
+            result["outputs"]["budget_exceeded"] = exceeded
+        return result
+    
+    def _result(
+        self,
+        matches: List[PatternMatch],
+        mode: str,
+        text: str,
+        artifacts: Optional[List[Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        """Build the analysis result from the ranked matches, best first"""
         if not matches:
             return {
                 "message": "No recognized CI failure patterns detected. Please review logs manually.",
@@ -305,12 +433,13 @@ class RuleEngine:
                             "title": "Review full logs",
                             "details": "Check complete CI output for error details"
                         }
-                    ]
+                    ],
+                    "matches": []
                 }
             }
         
-        # Use the first match (most specific)
-        match = matches[0]
+        # Guidance comes from the best-scoring match
+        match = matches[0].pattern
         
         # For autofix mode, attempt to generate patch
         patch = None
@@ -322,7 +451,8 @@ class RuleEngine:
             "severity": match.severity,
             "outputs": {
                 "patch_unified_diff": patch,
-                "actions": match.actions
+                "actions": match.actions,
+                "matches": [m.to_dict() for m in matches]
             }
         }
     
@@ -357,3 +487,191 @@ class RuleEngine:
     def get_pattern_names(self) -> List[str]:
         """Get list of recognized pattern names"""
         return [p.name for p in self.patterns]
+    
+    def stream(
+        self,
+        mode: str = "analysis",
+        window: int = 1 << 20,
+        lookbehind: int = 1 << 16,
+        stop_severity: Optional[str] = "error"
+    ) -> "StreamAnalysis":
+        """
+        Start an incremental analysis (see StreamAnalysis)
+        
+        Args:
+            mode: Operation mode (analysis, autofix, logger)
+            window: Characters buffered before the patterns run
+            lookbehind: Characters of the previous window searched again
+            stop_severity: Stop at the first match of at least this
+                severity (None reads everything)
+        
+        Returns:
+            StreamAnalysis: Analysis to feed text into
+        """
+        return StreamAnalysis(self, mode, window, lookbehind, stop_severity)
+
+
+SEVERITY_RANK = {"info": 0, "warn": 1, "error": 2}
+
+
+class StreamAnalysis:
+    """
+    Incremental analysis of a log that arrives in chunks
+    
+    Text is buffered into windows of ``window`` characters; each window is
+    searched together with the last ``lookbehind`` characters of the
+    previous one, so matches spanning a chunk boundary are still found as
+    long as they are shorter than the look-behind. Memory stays bounded by
+    window + look-behind whatever the log size.
+    
+    Matches are counted and located in whole-log coordinates (line
+    numbers, character and byte offsets); a match found again in the
+    look-behind is not counted twice.
+    
+    With ``stop_severity`` set, the analysis is done as soon as a pattern
+    of that severity (or higher) matches; the ranking then only covers the
+    log read so far.
+    
+    Each window gets its own CPU budget (RULE_CPU_BUDGET); the first window
+    that exceeds it is reported in ``outputs["budget_exceeded"]``.
+    """
+    
+    def __init__(
+        self,
+        engine: RuleEngine,
+        mode: str = "analysis",
+        window: int = 1 << 20,
+        lookbehind: int = 1 << 16,
+        stop_severity: Optional[str] = "error"
+    ):
+        self.engine = engine
+        self.patterns = engine.patterns
+        self.mode = mode
+        self.window = window
+        self.lookbehind = lookbehind
+        self.stop_rank = SEVERITY_RANK[stop_severity] if stop_severity else None
+        self.chars = 0
+        self.windows = 0
+        self.done = False
+        self.stopped_early = False
+        # pattern index -> {"count", "specificity", "last_start", "last_end", "first", "last"}
+        self._found: Dict[int, Dict[str, Any]] = {}
+        self._pending: List[str] = []
+        self._pending_chars = 0
+        self._tail = ""
+        self._lines = 0
+        self._bytes = 0
+        self._busy = 0.0
+        self.budget_exceeded: Optional[Dict[str, Any]] = None
+    
+    @property
+    def matches(self) -> List[str]:
+        """Names of the patterns matched so far, in rule order"""
+        return [self.patterns[index].name for index in sorted(self._found)]
+    
+    def feed(self, text: str) -> bool:
+        """
+        Add text, analyzing every full window
+        
+        Args:
+            text: Next chunk of the log
+        
+        Returns:
+            bool: Whether the analysis is done (no more text needed)
+        """
+        if self.done or not text:
+            return self.done
+        self._pending.append(text)
+        self._pending_chars += len(text)
+        if self._pending_chars < self.window:
+            return False
+        
+        buffered = "".join(self._pending)
+        offset = 0
+        while len(buffered) - offset >= self.window and not self.done:
+            self._process(buffered[offset:offset + self.window])
+            offset += self.window
+        rest = buffered[offset:] if not self.done else ""
+        self._pending = [rest] if rest else []
+        self._pending_chars = len(rest)
+        self.stopped_early = self.done
+        return self.done
+    
+    def _process(self, chunk: str) -> None:
+        tail = self._tail
+        text = tail + chunk
+        # Where the window starts in the whole log
+        offset = self.chars - len(tail)
+        line = self._lines - tail.count("\n") + 1
+        byte_offset = self._bytes - (len(tail) if tail.isascii() else len(tail.encode("utf-8")))
+        
+        self._tail = text[-self.lookbehind:] if self.lookbehind else ""
+        self.chars += len(chunk)
+        self._lines += chunk.count("\n")
+        self._bytes += len(chunk) if chunk.isascii() else len(chunk.encode("utf-8"))
+        self.windows += 1
+        
+        start = time.perf_counter()
+        with start_span("rule_engine.window", mode=self.mode, text_length=len(text)):
+            scan = budgeted_scan(text)
+            for index, pattern in enumerate(self.patterns):
+                started = time.perf_counter()
+                spans, specificity = pattern.find_spans(scan)
+                rule_stats.record(pattern.name, time.perf_counter() - started, len(text), len(spans))
+                exceeded = budget_stop(scan, self.patterns, index)
+                if exceeded is not None and self.budget_exceeded is None:
+                    self.budget_exceeded = exceeded
+                found = self._found.get(index)
+                if found is not None:
+                    # Drop matches already seen in the previous window
+                    spans = [span for span in spans if span[0] + offset > found["last_start"]]
+                if not spans:
+                    if exceeded is not None:
+                        break
+                    continue
+                if found is None:
+                    found = self._found[index] = {
+                        "count": 0, "specificity": 0, "last_start": -1, "last_end": 0, "first": [], "last": None
+                    }
+                
+                wanted = spans[:MAX_LOCATIONS - 1 - len(found["first"])]
+                located = locate(text, wanted + spans[len(wanted):][-1:], offset, line, byte_offset)
+                found["first"].extend(located[:len(wanted)])
+                found["last"] = located[-1]
+                found["count"] = min(MAX_MATCHES, found["count"] + len(spans))
+                found["specificity"] = max(found["specificity"], specificity)
+                found["last_start"] = spans[-1][0] + offset
+                found["last_end"] = spans[-1][1] + offset
+                if self.stop_rank is not None and SEVERITY_RANK[pattern.severity] >= self.stop_rank:
+                    self.done = True
+                if exceeded is not None:
+                    break
+        self._busy += time.perf_counter() - start
+    
+    def finish(self) -> Dict[str, Any]:
+        """
+        Analyze any remaining text and build the result
+        
+        Returns:
+            dict: Analysis result (same shape as RuleEngine.analyze)
+        """
+        if not self.done and self._pending:
+            self._process("".join(self._pending))
+            self._pending.clear()
+        self.done = True
+        matches = []
+        for index, found in sorted(self._found.items()):
+            locations = list(found["first"])
+            if found["last"]["start"] > locations[-1]["start"]:
+                locations.append(found["last"])
+            matches.append(PatternMatch(
+                self.patterns[index], found["count"], found["specificity"],
+                found["last_end"], self.chars, locations
+            ))
+        result = self.engine._result(rank(matches), self.mode, self._tail, None)
+        if self.budget_exceeded is not None:
+            result["outputs"]["budget_exceeded"] = self.budget_exceeded
+        # Time spent analyzing, not waiting for the upload
+        RULE_LATENCY.observe(self._busy)
+        RULE_ANALYSES.labels(self.mode, result["severity"]).inc()
+        return result
@@ -0,0 +1,606 @@
+"""
+Rule packs for the rule engine
+CI failure rules loaded from YAML/JSON files, cached precompiled on disk
+and swapped in atomically when the files change
+"""
+import hashlib
+import json
+import os
+import re
+import stat
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import yaml
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.engines.rule_engine import CIFailurePattern
+from app.engines.safe_regex import audit_patterns, regex_engine
+
+logger = get_logger(__name__)
+
+DEFAULT_RULES_PATH = Path(__file__).parent.parent / "config" / "rules"
+PACK_SUFFIXES = (".yaml", ".yml", ".json")
+
+# Pack schema versions understood by this loader
+PACK_FORMATS = (1,)
+# Bump when the cached prefilter plans change shape or meaning
+CACHE_FORMAT = 2
+
+SEVERITIES = ("info", "warn", "error")
+ACTION_TYPES = ("check", "suggest", "patch")
+RULE_KEYS = {"name", "severity", "patterns", "message", "actions"}
+ACTION_KEYS = {"type", "title", "details"}
+PLAN_KEYS = {"pattern", "flags", "strategy", "chain", "literals", "needs_regex"}
+PLAN_STRATEGIES = ("chain", "line", "gated")
+
+
+class RulePackError(ValueError):
+    """Raised when a rule pack cannot be read or is invalid"""
+
+
+class RulePack:
+    """A validated rule pack"""
+    
+    def __init__(
+        self,
+        name: str,
+        version: str,
+        path: Path,
+        digest: str,
+        patterns: List[CIFailurePattern],
+        cached: bool = False
+    ):
+        self.name = name
+        self.version = version
+        self.path = path
+        self.digest = digest
+        self.patterns = patterns
+        self.cached = cached
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "version": self.version,
+            "path": str(self.path),
+            "digest": self.digest[:12],
+            "rules": len(self.patterns),
+            "cached": self.cached,
+        }
+
+
+def _fail(source: Path, message: str) -> RulePackError:
+    return RulePackError(f"{source}: {message}")
+
+
+def _text(rule: Dict[str, Any], key: str, where: str, source: Path) -> str:
+    value = rule.get(key)
+    if not isinstance(value, str) or not value.strip():
+        raise _fail(source, f"{where}: '{key}' must be a non-empty string")
+    return value
+
+
+def _is_strings(value: Any) -> bool:
+    return isinstance(value, list) and all(isinstance(item, str) and item for item in value)
+
+
+def _validate_plans(plans: Any, patterns: List[str], where: str, source: Path) -> None:
+    """Check the shape of cached prefilter plans (see AnchoredRegex.plan)"""
+    if not isinstance(plans, list) or len(plans) != len(patterns):
+        raise _fail(source, f"{where}: cached plans do not match the patterns")
+    for plan, pattern in zip(plans, patterns):
+        if (
+            not isinstance(plan, dict) or set(plan) != PLAN_KEYS
+            or plan["pattern"] != pattern
+            or type(plan["flags"]) is not int or not plan["flags"] & re.IGNORECASE
+            or plan["strategy"] not in PLAN_STRATEGIES
+            or not _is_strings(plan["chain"]) or not _is_strings(plan["literals"])
+            or not isinstance(plan["needs_regex"], bool)
+            or (plan["strategy"] == "chain" and not plan["chain"])
+            or (plan["strategy"] == "line" and not plan["literals"])
+        ):
+            raise _fail(source, f"{where}: invalid cached plan for {pattern!r}")
+
+
+def validate_rule(rule: Any, index: int, source: Path, plans: Any = None) -> CIFailurePattern:
+    """
+    Build one rule of a pack
+    
+    Args:
+        rule: Parsed rule
+        index: Position of the rule in the pack (for error messages)
+        source: Pack path (for error messages)
+        plans: Cached prefilter plans of the rule's patterns, checked and
+            used instead of analyzing the patterns again
+    
+    Returns:
+        CIFailurePattern: Pattern with compiled regexes
+    
+    Raises:
+        RulePackError: If the rule is invalid
+    """
+    if not isinstance(rule, dict):
+        raise _fail(source, f"rule #{index + 1} must be a mapping")
+    name = _text(rule, "name", f"rule #{index + 1}", source)
+    where = f"rule '{name}'"
+    unknown = set(rule) - RULE_KEYS
+    if unknown:
+        raise _fail(source, f"{where}: unknown keys {sorted(unknown)}")
+    
+    severity = rule.get("severity", "error")
+    if severity not in SEVERITIES:
+        raise _fail(source, f"{where}: severity must be one of {SEVERITIES}, got {severity!r}")
+    patterns = rule.get("patterns")
+    if not isinstance(patterns, list) or not patterns or not all(isinstance(p, str) and p for p in patterns):
+        raise _fail(source, f"{where}: 'patterns' must be a non-empty list of regexes")
+    message = _text(rule, "message", where, source)
+    
+    actions = rule.get("actions", [])
+    if not isinstance(actions, list):
+        raise _fail(source, f"{where}: 'actions' must be a list")
+    for action in actions:
+        if not isinstance(action, dict) or set(action) != ACTION_KEYS:
+            raise _fail(source, f"{where}: every action needs exactly {sorted(ACTION_KEYS)}")
+        if action["type"] not in ACTION_TYPES:
+            raise _fail(source, f"{where}: action type must be one of {ACTION_TYPES}, got {action['type']!r}")
+        if not all(isinstance(action[key], str) for key in ("title", "details")):
+            raise _fail(source, f"{where}: action title and details must be strings")
+    
+    if plans is not None:
+        _validate_plans(plans, patterns, where, source)
+    try:
+        return CIFailurePattern(name, patterns, message, actions, severity, plans)
+    except re.error as e:
+        raise _fail(source, f"{where}: invalid pattern {e.pattern!r}: {e}")
+
+
+def validate_pack(
+    config: Any,
+    source: Path,
+    plans: Optional[List[Any]] = None
+) -> Tuple[str, str, List[CIFailurePattern]]:
+    """
+    Validate a parsed rule pack
+    
+    Args:
+        config: Parsed pack ({"format", "name", "version", "rules"})
+        source: Pack path (for error messages)
+        plans: Cached prefilter plans, one list per rule (see validate_rule)
+    
+    Returns:
+        tuple: (name, version, patterns)
+    
+    Raises:
+        RulePackError: If the pack is invalid
+    """
+    if not isinstance(config, dict):
+        raise _fail(source, "a rule pack must be a mapping")
+    pack_format = config.get("format", 1)
+    if pack_format not in PACK_FORMATS:
+        raise _fail(source, f"unsupported format {pack_format!r} (supported: {PACK_FORMATS})")
+    name = _text(config, "name", "pack", source)
+    version = config.get("version")
+    if not isinstance(version, (str, int, float)) or isinstance(version, bool) or not str(version).strip():
+        raise _fail(source, "pack: 'version' is required")
+    rules = config.get("rules")
+    if not isinstance(rules, list) or not rules:
+        raise _fail(source, "pack: 'rules' must be a non-empty list")
+    
+    if plans is not None and len(plans) != len(rules):
+        raise _fail(source, "cached plans do not match the rules")
+    patterns = [
+        validate_rule(rule, index, source, plans[index] if plans is not None else None)
+        for index, rule in enumerate(rules)
+    ]
+    names = [pattern.name for pattern in patterns]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise _fail(source, f"duplicate rule names {duplicates}")
+    return name, str(version), patterns
+
+
+def _cache_path(cache_dir: str, digest: str) -> Path:
+    # Plans come from the regex parser of this Python version
+    return Path(cache_dir) / f"{digest}.v{CACHE_FORMAT}.py{sys.version_info[0]}{sys.version_info[1]}.json"
+
+
+def _private_dir(cache_dir: str) -> bool:
+    """Create the cache directory (0700); False unless only this user can write to it"""
+    try:
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        info = os.lstat(cache_dir)
+    except OSError as e:
+        logger.warning(f"Rule pack cache disabled, cannot create {cache_dir}: {e}")
+        return False
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o022:
+        logger.warning(
+            f"Rule pack cache disabled: {cache_dir} must be a directory owned by this user "
+            "and not writable by others"
+        )
+        return False
+    return True
+
+
+def _read_cache(cache_dir: str, digest: str, path: Path) -> Optional[RulePack]:
+    try:
+        with open(_cache_path(cache_dir, digest), "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        rules = cached["rules"]
+        if not isinstance(rules, list) or not all(isinstance(rule, dict) for rule in rules):
+            raise ValueError("'rules' must be a list of mappings")
+        # Validated like the pack file itself, plans included
+        config = {
+            "name": cached["name"],
+            "version": cached["version"],
+            "rules": [{key: value for key, value in rule.items() if key != "plans"} for rule in rules],
+        }
+        name, version, patterns = validate_pack(config, path, [rule.get("plans") for rule in rules])
+        return RulePack(name, version, path, digest, patterns, cached=True)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logger.warning(f"Ignoring unreadable rule pack cache for {path}: {e}")
+        return None
+
+
+def _write_cache(cache_dir: str, pack: RulePack) -> None:
+    """Store the compiled pack; replaced atomically, failures only logged"""
+    payload = {"name": pack.name, "version": pack.version, "rules": [p.to_dict() for p in pack.patterns]}
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix=".pack_", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(payload, f, separators=(",", ":"))
+            os.replace(tmp_path, _cache_path(cache_dir, pack.digest))
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+    except OSError as e:
+        logger.warning(f"Failed to cache rule pack {pack.path}: {e}")
+
+
+def load_pack(
+    path: Path,
+    cache_dir: Optional[str] = None,
+    loaded: Optional[Dict[str, RulePack]] = None
+) -> RulePack:
+    """
+    Load a rule pack file
+    
+    A pack is identified by the SHA-256 of its bytes. Packs already loaded
+    from the same file are reused as they are; otherwise the compiled pack
+    (rules and prefilter plans) is read from the disk cache, and only
+    parsed, validated and analyzed when the cache has no entry for it.
+    Cached entries are validated like pack files, and the cache is only
+    used if its directory is owned by this user and writable by no one
+    else (it is created with mode 0700).
+    
+    Args:
+        path: Pack file (.yaml, .yml or .json)
+        cache_dir: Directory of compiled packs (None disables the cache)
+        loaded: Packs in use, by digest
+    
+    Returns:
+        RulePack: Loaded pack
+    
+    Raises:
+        RulePackError: If the file cannot be read or the pack is invalid
+    """
+    path = Path(path)
+    try:
+        raw = path.read_bytes()
+    except OSError as e:
+        raise _fail(path, f"cannot read rule pack: {e}")
+    digest = hashlib.sha256(raw).hexdigest()
+    
+    current = (loaded or {}).get(digest)
+    if current is not None and current.path == path:
+        return current
+    if cache_dir and not _private_dir(cache_dir):
+        cache_dir = None
+    if cache_dir:
+        cached = _read_cache(cache_dir, digest, path)
+        if cached is not None:
+            return cached
+    
+    try:
+        if path.suffix == ".json":
+            config = json.loads(raw.decode("utf-8"))
+        else:
+            config = yaml.safe_load(raw)
+    except (ValueError, yaml.YAMLError) as e:
+        raise _fail(path, f"cannot parse rule pack: {e}")
+    name, version, patterns = validate_pack(config, path)
+    pack = RulePack(name, version, path, digest, patterns)
+    if cache_dir:
+        _write_cache(cache_dir, pack)
+    return pack
+
+
+def pack_files(paths: List[str]) -> List[Path]:
+    """
+    Rule pack files of the configured paths
+    
+    Args:
+        paths: Pack files, or directories whose *.yaml, *.yml and *.json
+            files are packs (in file name order)
+    
+    Returns:
+        list: Pack files in load order
+    
+    Raises:
+        RulePackError: If a path does not exist
+    """
+    files = []
+    for entry in paths:
+        path = Path(entry)
+        if path.is_dir():
+            files.extend(sorted(
+                child for child in path.iterdir()
+                if child.suffix in PACK_SUFFIXES and not child.name.startswith(".") and child.is_file()
+            ))
+        elif path.is_file():
+            files.append(path)
+        else:
+            raise RulePackError(f"{path}: no such rule pack file or directory")
+    return files
+
+
+class RuleSet:
+    """
+    The rules of a set of packs, merged in load order
+    
+    A rule named like one of an earlier pack replaces it in place, so a
+    local pack can override a bundled rule without reordering the others.
+    Instances are never modified; a reload builds a new one.
+    """
+    
+    def __init__(self, packs: List[RulePack]):
+        """
+        Merge packs
+        
+        Args:
+            packs: Packs in load order
+        
+        Raises:
+            RulePackError: If two packs have the same name
+        """
+        self.packs = packs
+        self.loaded_at = time.time()
+        patterns: List[CIFailurePattern] = []
+        positions: Dict[str, int] = {}
+        owners: Dict[str, Path] = {}
+        for pack in packs:
+            if pack.name in owners:
+                raise _fail(pack.path, f"pack name '{pack.name}' is already used by {owners[pack.name]}")
+            owners[pack.name] = pack.path
+            for pattern in pack.patterns:
+                if pattern.name in positions:
+                    patterns[positions[pattern.name]] = pattern
+                else:
+                    positions[pattern.name] = len(patterns)
+                    patterns.append(pattern)
+        self.patterns = patterns
+        digests = "\n".join(f"{pack.name}:{pack.digest}" for pack in packs)
+        self.version = hashlib.sha256(digests.encode()).hexdigest()[:12]
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "loaded_at": self.loaded_at,
+            "rules": len(self.patterns),
+            "packs": [pack.to_dict() for pack in self.packs],
+        }
+
+
+class RuleRegistry:
+    """
+    The current rule set, reloaded when its pack files change
+    
+    Readers take ``rules`` (or ``patterns``) once and keep using that
+    object; a reload builds a complete new RuleSet and swaps it in with a
+    single assignment, so readers see either the old rules or the new ones,
+    never a mix. A pack that fails to load or validate leaves the current
+    rules in place.
+    
+    The watcher thread polls the pack files' modification times and sizes
+    (files added to or removed from a pack directory count as changes).
+    Write pack files atomically (write elsewhere, then rename) so a reload
+    never reads a half-written file.
+    """
+    
+    def __init__(self, paths: List[str], cache_dir: Optional[str] = None, interval: float = 2.0):
+        """
+        Initialize registry
+        
+        Args:
+            paths: Pack files and directories (see pack_files)
+            cache_dir: Directory of compiled packs (None disables the cache)
+            interval: Seconds between file checks of the watcher
+        """
+        self.paths = paths
+        self.cache_dir = cache_dir
+        self.interval = interval
+        self.reloads = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        # Regexes of the current rules that can backtrack exponentially
+        self.unsafe_patterns: List[Dict[str, Any]] = []
+        self._rules: Optional[RuleSet] = None
+        self._signature: Optional[tuple] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+    
+    @property
+    def rules(self) -> RuleSet:
+        """The current rule set (loaded on first use)"""
+        rules = self._rules
+        if rules is None:
+            with self._lock:
+                if self._rules is None:
+                    self._load()
+                rules = self._rules
+        return rules
+    
+    @property
+    def patterns(self) -> List[CIFailurePattern]:
+        """Patterns of the current rule set, in rule order"""
+        return self.rules.patterns
+    
+    def reload(self) -> RuleSet:
+        """
+        Load the pack files and swap in the new rules
+        
+        Returns:
+            RuleSet: The new rule set
+        
+        Raises:
+            RulePackError: If a pack is invalid (the current rules are kept)
+        """
+        with self._lock:
+            return self._load()
+    
+    def check(self) -> bool:
+        """
+        Reload if a pack file changed since the last load
+        
+        Returns:
+            bool: True if new rules were swapped in
+        """
+        try:
+            signature = self._stat(pack_files(self.paths))
+        except RulePackError as e:
+            signature = str(e)
+        if signature == self._signature:
+            return False
+        previous = self._rules
+        try:
+            rules = self.reload()
+        except RulePackError as e:
+            version = previous.version if previous else None
+            logger.error(f"Rule packs not reloaded, keeping version {version}: {e}")
+            return False
+        logger.info(f"Rule packs reloaded: version {rules.version}, {len(rules.patterns)} rules")
+        return True
+    
+    def _stat(self, files: List[Path]) -> tuple:
+        signature = []
+        for path in files:
+            try:
+                stat = path.stat()
+                signature.append((str(path), stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append((str(path), None, None))
+        return tuple(signature)
+    
+    def _load(self) -> RuleSet:
+        try:
+            files = pack_files(self.paths)
+        except RulePackError as e:
+            self._signature = str(e)
+            raise self._failed(e)
+        # Taken before reading, so a write during the load is seen by the next check
+        self._signature = self._stat(files)
+        if not files:
+            raise self._failed(RulePackError(f"No rule packs in {', '.join(map(str, self.paths))}"))
+        
+        loaded = {pack.digest: pack for pack in self._rules.packs} if self._rules else {}
+        try:
+            rules = RuleSet([load_pack(path, self.cache_dir, loaded) for path in files])
+        except RulePackError as e:
+            raise self._failed(e)
+        if self._rules is not None:
+            self.reloads += 1
+        self.last_error = None
+        self.unsafe_patterns = audit_patterns(rules.patterns)
+        for unsafe in self.unsafe_patterns:
+            # Still loaded: the CPU budget bounds what they can cost
+            logger.warning(f"Rule {unsafe['rule']} regex {unsafe['pattern']!r} is unsafe: {unsafe['reason']}")
+        self._rules = rules
+        return rules
+    
+    def _failed(self, error: RulePackError) -> RulePackError:
+        self.failures += 1
+        self.last_error = str(error)
+        return error
+    
+    def start(self) -> bool:
+        """
+        Start watching the pack files (no-op with a non-positive interval)
+        
+        Returns:
+            bool: True if the watcher runs
+        """
+        if self.interval <= 0:
+            return False
+        if self._watcher is not None and self._watcher.is_alive():
+            return True
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, name="rule-pack-watcher", daemon=True)
+        self._watcher.start()
+        return True
+    
+    def stop(self) -> None:
+        """Stop watching"""
+        if self._watcher is None:
+            return
+        self._stop.set()
+        self._watcher.join(timeout=5)
+        self._watcher = None
+    
+    def _watch(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.warning(f"Rule pack check failed: {e}")
+    
+    def status(self) -> Dict[str, Any]:
+        """
+        Current rules and reload history
+        
+        Returns:
+            dict: Rule set (version, packs, rule count), "reloads",
+            "failures", "last_error", "regex_engine", "unsafe_patterns"
+            and watcher settings
+        """
+        return {
+            **self.rules.to_dict(),
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "regex_engine": regex_engine(),
+            "unsafe_patterns": self.unsafe_patterns,
+            "watching": self._watcher is not None and self._watcher.is_alive(),
+            "interval_seconds": self.interval,
+            "paths": [str(path) for path in self.paths],
+            "cache_dir": self.cache_dir,
+        }
+
+
+_registry: Optional[RuleRegistry] = None
+
+
+def get_rule_registry() -> RuleRegistry:
+    """
+    Get the process-wide rule registry
+    
+    Returns:
+        RuleRegistry: Registry of the packs in RULE_PACKS (defaults to app/config/rules)
+    """
+    global _registry
+    if _registry is None:
+        paths = [path.strip() for path in (settings.RULE_PACKS or "").split(",") if path.strip()]
+        _registry = RuleRegistry(
+            paths or [str(DEFAULT_RULES_PATH)],
+            cache_dir=settings.RULE_PACK_CACHE_DIR or None,
+            interval=settings.RULE_PACK_RELOAD_INTERVAL,
+        )
+    return _registry
@@ -0,0 +1,146 @@
+"""
+Per-rule hit and cost statistics
+Counts how often each rule runs and matches and how long it takes, so
+dead rules can be pruned and hot ones optimized
+"""
+import heapq
+import time
+from datetime import datetime, timezone
+from threading import Lock
+from typing import Any, Dict, List, Optional
+from app.core.prometheus import RULE_PATTERN_EVALUATIONS, RULE_PATTERN_MATCHES, RULE_PATTERN_SECONDS
+
+# Slowest evaluations kept per rule
+SLOWEST = 5
+
+SORT_KEYS = ("seconds", "evaluations", "matches", "ms_per_mb", "max_ms")
+
+
+class _RuleCounters:
+    __slots__ = ("evaluations", "matches", "match_count", "seconds", "chars", "slowest", "children")
+    
+    def __init__(self, name: str):
+        self.evaluations = 0
+        self.matches = 0
+        self.match_count = 0
+        self.seconds = 0.0
+        self.chars = 0
+        # Min-heap of (seconds, chars, at): the slowest evaluations
+        self.slowest: List[tuple] = []
+        self.children = (
+            RULE_PATTERN_EVALUATIONS.labels(name),
+            RULE_PATTERN_MATCHES.labels(name),
+            RULE_PATTERN_SECONDS.labels(name),
+        )
+
+
+class RuleStats:
+    """
+    Evaluations, matches and time of each rule, in this process
+    
+    Every run of a rule over a text (an analysis, a streamed window or an
+    artifact window) counts as one evaluation; artifacts scanned in the
+    process pool are counted in the pool's processes. The Prometheus counters
+    (cimeika_rule_pattern_*) are fed as well, so /metrics aggregates them
+    across workers; the slowest evaluations, with their input sizes, are
+    only kept here.
+    """
+    
+    def __init__(self, slowest: int = SLOWEST):
+        """
+        Initialize statistics
+        
+        Args:
+            slowest: Slowest evaluations kept per rule
+        """
+        self.slowest = slowest
+        self.since = time.time()
+        self._rules: Dict[str, _RuleCounters] = {}
+        self._lock = Lock()
+    
+    def record(self, name: str, seconds: float, chars: int, matches: int) -> None:
+        """
+        Record one evaluation of a rule
+        
+        Args:
+            name: Rule name
+            seconds: Time the rule took
+            chars: Size of the text it ran over
+            matches: Matches it found
+        """
+        with self._lock:
+            counters = self._rules.get(name)
+            if counters is None:
+                counters = self._rules[name] = _RuleCounters(name)
+            counters.evaluations += 1
+            counters.seconds += seconds
+            counters.chars += chars
+            if matches:
+                counters.matches += 1
+                counters.match_count += matches
+            if len(counters.slowest) < self.slowest:
+                heapq.heappush(counters.slowest, (seconds, chars, time.time()))
+            elif seconds > counters.slowest[0][0]:
+                heapq.heapreplace(counters.slowest, (seconds, chars, time.time()))
+        evaluations, matched, spent = counters.children
+        evaluations.inc()
+        spent.inc(seconds)
+        if matches:
+            matched.inc()
+    
+    def snapshot(self, rules: Optional[List[str]] = None, sort: str = "seconds") -> List[Dict[str, Any]]:
+        """
+        Statistics of every rule
+        
+        Args:
+            rules: Rules to report even if they never ran (e.g. the current
+                rule set); others are reported once they ran
+            sort: One of SORT_KEYS, highest first
+        
+        Returns:
+            list: [{"pattern", "evaluations", "matches", "match_count",
+            "seconds", "mean_ms", "max_ms", "ms_per_mb", "slowest": [{"ms",
+            "chars", "at"}]}]
+        """
+        with self._lock:
+            names = list(self._rules)
+            names += [name for name in rules or [] if name not in self._rules]
+            entries = [self._entry(name, self._rules.get(name)) for name in names]
+        entries.sort(key=lambda entry: entry[sort], reverse=True)
+        return entries
+    
+    @staticmethod
+    def _entry(name: str, counters: Optional[_RuleCounters]) -> Dict[str, Any]:
+        if counters is None:
+            return {
+                "pattern": name, "evaluations": 0, "matches": 0, "match_count": 0, "seconds": 0.0,
+                "mean_ms": 0.0, "max_ms": 0.0, "ms_per_mb": 0.0, "slowest": [],
+            }
+        slowest = sorted(counters.slowest, reverse=True)
+        return {
+            "pattern": name,
+            "evaluations": counters.evaluations,
+            "matches": counters.matches,
+            "match_count": counters.match_count,
+            "seconds": round(counters.seconds, 6),
+            "mean_ms": round(counters.seconds * 1000 / counters.evaluations, 3),
+            "max_ms": round(slowest[0][0] * 1000, 3),
+            "ms_per_mb": round(counters.seconds * 1000 / (counters.chars / 1_000_000), 3) if counters.chars else 0.0,
+            "slowest": [
+                {
+                    "ms": round(seconds * 1000, 3),
+                    "chars": chars,
+                    "at": datetime.fromtimestamp(at, timezone.utc).isoformat(),
+                }
+                for seconds, chars, at in slowest
+            ],
+        }
+    
+    def reset(self) -> None:
+        """Start counting again (the Prometheus counters keep running)"""
+        with self._lock:
+            self._rules.clear()
+            self.since = time.time()
+
+
+rule_stats = RuleStats()
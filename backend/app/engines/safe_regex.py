@@ -0,0 +1,307 @@
+"""
+Bounded regex execution for the rule engine
+Compiles rule regexes so that no input can make them backtrack without
+limit, and meters the CPU time an analysis spends in them
+"""
+import re
+import time
+from re import _constants as sre_c, _parser as sre_parse
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+REGEX_ENGINES = ("re", "re2")
+
+# Characters handed to regexes (or loop iterations) between clock reads
+_CHECK_CHARS = 1 << 14
+_CHECK_TICKS = 64
+
+_QUANTIFIER = re.compile(r"\{(\d*)(,?)(\d*)\}")
+
+
+def bound_repeats(pattern: str, limit: int) -> str:
+    """
+    Rewrite unbounded quantifiers into bounded ones
+    
+    ``*``, ``+`` and ``{m,}`` become ``{0,limit}``, ``{1,limit}`` and
+    ``{m,limit}`` (lazy and possessive suffixes are kept), so a single
+    repeat can backtrack over at most ``limit`` characters. Top-level
+    ``.*``/``.*?`` gaps are kept: the prefilter resolves them line by line
+    without backtracking.
+    
+    Args:
+        pattern: Regex source
+        limit: Largest repeat count
+    
+    Returns:
+        str: Equivalent regex for matches whose repeats stay within limit
+    """
+    out: List[str] = []
+    depth = 0
+    # Kind of the last token: "atom", "quantifier" or None
+    last = None
+    atom = ""
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        token = char
+        kind = "atom"
+        if char == "\\":
+            token = pattern[i:i + 2]
+        elif char == "[":
+            end = i + 1
+            if pattern.startswith("^", end):
+                end += 1
+            if pattern.startswith("]", end):
+                end += 1
+            while end < len(pattern) and pattern[end] != "]":
+                end += 2 if pattern[end] == "\\" else 1
+            token = pattern[i:end + 1]
+        elif char == "(":
+            depth += 1
+            # "(?" starts an extension, not a quantifier
+            token = "(?" if pattern.startswith("(?", i) else "("
+            kind = None
+        elif char == ")":
+            depth -= 1
+        elif char == "|":
+            kind = None
+        elif char in "?+" and last == "quantifier":
+            # Lazy or possessive suffix
+            kind = None
+        elif char in "*+?" and last == "atom":
+            kind = "quantifier"
+            if char != "?" and not (char == "*" and atom == "." and depth == 0):
+                i += 1
+                out.append("{%d,%d}" % (0 if char == "*" else 1, limit))
+                last = kind
+                continue
+        elif char == "{" and last == "atom":
+            quantifier = _QUANTIFIER.match(pattern, i)
+            # "{,}" is a quantifier too; "{}" is a literal
+            if quantifier and (quantifier.group(1) or quantifier.group(2)):
+                token = quantifier.group()
+                kind = "quantifier"
+                low, comma, high = quantifier.groups()
+                if comma and not high and int(low or 0) < limit:
+                    token = "{%s,%d}" % (low or 0, limit)
+                i = quantifier.end() - len(token)
+        out.append(token)
+        i += len(token)
+        last = kind
+        if kind == "atom":
+            atom = token
+    return "".join(out)
+
+
+def _max_repeats(nodes) -> List[tuple]:
+    """Repeat nodes of a parsed regex that can match more than once"""
+    found = []
+    for op, av in nodes:
+        if op in (sre_c.MIN_REPEAT, sre_c.MAX_REPEAT, sre_c.POSSESSIVE_REPEAT):
+            if av[1] > 1:
+                found.append((op, av))
+            else:
+                found.extend(_max_repeats(av[2]))
+        elif op == sre_c.SUBPATTERN:
+            found.extend(_max_repeats(av[3]))
+        elif op == sre_c.ATOMIC_GROUP:
+            found.extend(_max_repeats(av))
+        elif op == sre_c.BRANCH:
+            for branch in av[1]:
+                found.extend(_max_repeats(branch))
+    return found
+
+
+def unsafe_reason(pattern: str, flags: int = 0) -> Optional[str]:
+    """
+    Why a regex can backtrack exponentially, if it can
+    
+    Flags nested repeats such as ``(\\w+\\s?)+``: bounding each repeat
+    does not help when they multiply. These regexes are only safe with
+    the re2 engine (or within the CPU budget).
+    
+    Args:
+        pattern: Regex source
+        flags: re flags
+    
+    Returns:
+        str | None: Reason, or None for regexes without nested repeats
+    """
+    for op, av in _max_repeats(sre_parse.parse(pattern, flags)):
+        if _max_repeats(av[2]):
+            return "nested repeat"
+    return None
+
+
+class _Re2Pattern:
+    """re2 regex with the re.Pattern search/match interface"""
+    
+    def __init__(self, regex, pattern: str, flags: int):
+        self._regex = regex
+        self.pattern = pattern
+        self.flags = flags
+    
+    def search(self, text: str, pos: int = 0, endpos: Optional[int] = None):
+        return self._regex.search(text, pos, len(text) if endpos is None else endpos)
+    
+    def match(self, text: str, pos: int = 0, endpos: Optional[int] = None):
+        return self._regex.match(text, pos, len(text) if endpos is None else endpos)
+
+
+_re2 = None
+_re2_missing = False
+
+
+def _compile_re2(pattern: str, flags: int) -> Optional[_Re2Pattern]:
+    global _re2, _re2_missing
+    if _re2 is None and not _re2_missing:
+        try:
+            import re2
+            _re2 = re2
+        except ImportError:
+            _re2_missing = True
+            logger.warning(
+                "RULE_REGEX_ENGINE=re2 but the re2 package is not installed, using bounded re. "
+                "Install with: pip install google-re2"
+            )
+    if _re2 is None:
+        return None
+    inline = ("i" if flags & re.IGNORECASE else "") + ("s" if flags & re.DOTALL else "")
+    try:
+        return _Re2Pattern(_re2.compile(f"(?{inline}){pattern}" if inline else pattern), pattern, flags)
+    except Exception as e:
+        # Lookarounds, backreferences and the like have no linear-time equivalent
+        logger.warning(f"Regex {pattern!r} is not supported by re2 ({e}), using bounded re")
+        return None
+
+
+def compile_rule_regex(pattern: str, flags: int):
+    """
+    Compile a rule regex with the configured engine
+    
+    With RULE_REGEX_ENGINE=re2 (and the re2 package installed) regexes run
+    in linear time. Otherwise, or for regexes re2 cannot express, repeats
+    are bounded by RULE_REGEX_MAX_REPEAT (see bound_repeats).
+    
+    Args:
+        pattern: Regex source
+        flags: re flags
+    
+    Returns:
+        Compiled regex with search(text, pos, endpos) and match(text, pos, endpos)
+    """
+    if settings.RULE_REGEX_ENGINE == "re2":
+        compiled = _compile_re2(pattern, flags)
+        if compiled is not None:
+            return compiled
+    if settings.RULE_REGEX_MAX_REPEAT > 0:
+        pattern = bound_repeats(pattern, settings.RULE_REGEX_MAX_REPEAT)
+    return re.compile(pattern, flags)
+
+
+def regex_engine() -> str:
+    """Engine rule regexes run on: "re2" or "re" (bounded)"""
+    if settings.RULE_REGEX_ENGINE == "re2" and _compile_re2("x", 0) is not None:
+        return "re2"
+    return "re"
+
+
+def audit_patterns(patterns) -> List[Dict[str, Any]]:
+    """
+    Rule regexes that can backtrack exponentially under the current engine
+    
+    Args:
+        patterns: CIFailurePattern list
+    
+    Returns:
+        list: [{"rule", "pattern", "reason"}]
+    """
+    if regex_engine() == "re2":
+        return [
+            {"rule": rule.name, "pattern": anchored.pattern, "reason": "not supported by re2"}
+            for rule in patterns for anchored in rule.anchored
+            if _compile_re2(anchored.pattern, anchored.flags) is None
+        ]
+    unsafe = []
+    for rule in patterns:
+        for anchored in rule.anchored:
+            reason = unsafe_reason(anchored.pattern, anchored.flags)
+            if reason:
+                unsafe.append({"rule": rule.name, "pattern": anchored.pattern, "reason": reason})
+    return unsafe
+
+
+class CpuBudget:
+    """
+    CPU time an analysis may spend matching
+    
+    Measured as CPU time of the analyzing thread, so time spent waiting
+    for the GIL or the OS is not charged. Regex calls cannot be interrupted;
+    searches check the budget between calls, each of which sees a bounded
+    slice of text (RULE_REGEX_MAX_SPAN).
+    """
+    
+    def __init__(self, seconds: float):
+        """
+        Initialize budget
+        
+        Args:
+            seconds: CPU seconds allowed (0 or less is unlimited)
+        """
+        self.seconds = seconds
+        self.started = time.thread_time()
+        self.deadline = self.started + seconds if seconds > 0 else None
+        self.exceeded = False
+        self._chars = 0
+        self._ticks = 0
+    
+    def check(self) -> bool:
+        """Read the clock; whether the budget is exhausted"""
+        if self.deadline is not None and not self.exceeded:
+            self.exceeded = time.thread_time() > self.deadline
+        return self.exceeded
+    
+    @property
+    def used(self) -> float:
+        """CPU seconds spent so far"""
+        return time.thread_time() - self.started
+    
+    def spend(self, chars: int = 0) -> bool:
+        """
+        Account for a search step, reading the clock now and then
+        
+        Args:
+            chars: Characters the next regex call will see
+        
+        Returns:
+            bool: Whether the budget is exhausted (searches should stop)
+        """
+        if self.deadline is None or self.exceeded:
+            return self.exceeded
+        self._chars += chars
+        self._ticks += 1
+        if self._chars < _CHECK_CHARS and self._ticks < _CHECK_TICKS:
+            return False
+        self._chars = self._ticks = 0
+        return self.check()
+    
+    def report(self, pattern: str, skipped: List[str]) -> Dict[str, Any]:
+        """
+        What an exhausted budget left out, for the analysis result
+        
+        Args:
+            pattern: Rule that was running when the budget ran out
+            skipped: Rules not evaluated
+        
+        Returns:
+            dict: {"pattern", "skipped", "cpu_ms", "budget_ms"}
+        """
+        return {
+            "pattern": pattern,
+            "skipped": skipped,
+            "cpu_ms": round(self.used * 1000, 3),
+            "budget_ms": round(self.seconds * 1000, 3),
+        }
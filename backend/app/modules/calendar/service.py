@@ -5,10 +5,12 @@ Business logic goes here
 from typing import Dict, Any, List, Optional
 from sqlalchemy.orm import Session
 from app.core.interfaces import ModuleInterface, ServiceInterface
+from app.core.tracing import trace_service
 from app.modules.calendar.model import CalendarEntry
 from app.modules.calendar.schema import CalendarEntryCreate, CalendarEntryUpdate
 
 
+@trace_service("calendar")
 class CalendarService(ModuleInterface, ServiceInterface):
     """Service for Calendar module operations - implements core interfaces"""
     
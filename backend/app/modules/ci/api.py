@@ -7,6 +7,7 @@ from fastapi import APIRouter, HTTPException
 from datetime import datetime
 from typing import List, Optional
 from app.config.seo import seo_service
+from app.core import heap
 from app.modules.ci.schema import CiCaptureRequest, CiCaptureResponse, CiChatRequest, CiChatResponse
 from app.modules.ci.legend_ci_content import LEGEND_CI_NODES, LEGEND_CI_METADATA, SYMBOLIC_LIBRARY
 from app.modules.ci.legend_duality_full import DUALITY_LEGEND_FULL
@@ -15,6 +16,10 @@ import uuid
 
 router = APIRouter(prefix="/ci", tags=["ci"])
 
+heap.register_store("ci.legend_nodes", lambda: LEGEND_CI_NODES)
+heap.register_store("ci.duality_legend", lambda: DUALITY_LEGEND_FULL)
+heap.register_store("ci.symbolic_library", lambda: SYMBOLIC_LIBRARY)
+
 
 @router.get("/")
 async def get_ci_status():
@@ -5,11 +5,13 @@ Business logic goes here
 from typing import Dict, Any, List, Optional
 from sqlalchemy.orm import Session
 from app.core.interfaces import ModuleInterface, ServiceInterface
+from app.core.tracing import trace_service
 from app.config.seo import seo_service
 from app.modules.ci.model import CiEntity
 from app.modules.ci.schema import CiEntityCreate, CiEntityUpdate
 
 
+@trace_service("ci")
 class CiService(ModuleInterface, ServiceInterface):
     """Service for Ci module operations - implements core interfaces"""
     
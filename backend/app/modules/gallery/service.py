@@ -5,10 +5,12 @@ Business logic goes here
 from typing import Dict, Any, List, Optional
 from sqlalchemy.orm import Session
 from app.core.interfaces import ModuleInterface, ServiceInterface
+from app.core.tracing import trace_service
 from app.modules.gallery.model import GalleryItem
 from app.modules.gallery.schema import GalleryItemCreate, GalleryItemUpdate
 
 
+@trace_service("gallery")
 class GalleryService(ModuleInterface, ServiceInterface):
     """Service for Gallery module operations - implements core interfaces"""
     
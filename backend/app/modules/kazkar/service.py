@@ -5,10 +5,12 @@ Business logic goes here
 from typing import Dict, Any, List, Optional
 from sqlalchemy.orm import Session
 from app.core.interfaces import ModuleInterface, ServiceInterface
+from app.core.tracing import trace_service
 from app.modules.kazkar.model import KazkarStory
 from app.modules.kazkar.schema import KazkarStoryCreate, KazkarStoryUpdate
 
 
+@trace_service("kazkar")
 class KazkarService(ModuleInterface, ServiceInterface):
     """Service for Kazkar module operations - implements core interfaces"""
     
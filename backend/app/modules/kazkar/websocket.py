@@ -7,6 +7,8 @@ from fastapi import WebSocket, WebSocketDisconnect
 import json
 import logging
 from datetime import datetime
+from app.core import heap
+from app.core.prometheus import WS_BROADCASTS, WS_CONNECTIONS, WS_MESSAGES
 
 logger = logging.getLogger(__name__)
 
@@ -22,7 +24,8 @@ class KazkarWebSocketManager:
         """Accept a new WebSocket connection"""
         await websocket.accept()
         self.active_connections.add(websocket)
-        logger.info(f"New WebSocket connection. Total: {len(self.active_connections)}")
+        WS_CONNECTIONS.labels("kazkar").inc()
+        logger.info("New WebSocket connection. Total: %d", len(self.active_connections))
         
         # Send initial connection confirmation
         await websocket.send_json({
@@ -33,8 +36,10 @@ class KazkarWebSocketManager:
     
     def disconnect(self, websocket: WebSocket):
         """Remove a WebSocket connection"""
-        self.active_connections.discard(websocket)
-        logger.info(f"WebSocket disconnected. Total: {len(self.active_connections)}")
+        if websocket in self.active_connections:
+            self.active_connections.discard(websocket)
+            WS_CONNECTIONS.labels("kazkar").dec()
+        logger.info("WebSocket disconnected. Total: %d", len(self.active_connections))
     
     async def broadcast(self, event: Dict):
         """
@@ -51,13 +56,15 @@ class KazkarWebSocketManager:
         if "timestamp" not in event:
             event["timestamp"] = int(datetime.now().timestamp())
         
-        logger.info(f"Broadcasting event to {len(self.active_connections)} clients: {event.get('event', 'unknown')}")
+        logger.info("Broadcasting event to %d clients: %s", len(self.active_connections), event.get("event", "unknown"))
+        WS_BROADCASTS.labels("kazkar", str(event.get("event", "unknown"))).inc()
         
         # Send to all connections
         disconnected = set()
         for connection in self.active_connections:
             try:
                 await connection.send_json(event)
+                WS_MESSAGES.labels("kazkar").inc()
             except Exception as e:
                 logger.error(f"Error sending to client: {e}")
                 disconnected.add(connection)
@@ -79,6 +86,7 @@ class KazkarWebSocketManager:
         
         try:
             await websocket.send_json(event)
+            WS_MESSAGES.labels("kazkar").inc()
         except Exception as e:
             logger.error(f"Error sending to specific client: {e}")
             self.disconnect(websocket)
@@ -86,6 +94,7 @@ class KazkarWebSocketManager:
 
 # Global WebSocket manager instance
 kazkar_ws_manager = KazkarWebSocketManager()
+heap.register_store("kazkar.websocket_connections", lambda: kazkar_ws_manager.active_connections, deep=False)
 
 
 async def broadcast_legend_event(event_type: str, legend_id: int = None, sense: str = None, data: Dict = None):
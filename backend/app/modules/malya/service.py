@@ -5,10 +5,12 @@ Business logic goes here
 from typing import Dict, Any, List, Optional
 from sqlalchemy.orm import Session
 from app.core.interfaces import ModuleInterface, ServiceInterface
+from app.core.tracing import trace_service
 from app.modules.malya.model import MalyaIdea
 from app.modules.malya.schema import MalyaIdeaCreate, MalyaIdeaUpdate
 
 
+@trace_service("malya")
 class MalyaService(ModuleInterface, ServiceInterface):
     """Service for Malya module operations - implements core interfaces"""
     
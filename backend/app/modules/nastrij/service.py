@@ -5,10 +5,12 @@ Business logic goes here
 from typing import Dict, Any, List, Optional
 from sqlalchemy.orm import Session
 from app.core.interfaces import ModuleInterface, ServiceInterface
+from app.core.tracing import trace_service
 from app.modules.nastrij.model import NastrijEmotion
 from app.modules.nastrij.schema import NastrijEmotionCreate, NastrijEmotionUpdate
 
 
+@trace_service("nastrij")
 class NastrijService(ModuleInterface, ServiceInterface):
     """Service for Nastrij module operations - implements core interfaces"""
     
@@ -5,10 +5,12 @@ Business logic goes here
 from typing import Dict, Any, List, Optional
 from sqlalchemy.orm import Session
 from app.core.interfaces import ModuleInterface, ServiceInterface
+from app.core.tracing import trace_service
 from app.modules.podija.model import PodijaEvent
 from app.modules.podija.schema import PodijaEventCreate, PodijaEventUpdate
 
 
+@trace_service("podija")
 class PodijaService(ModuleInterface, ServiceInterface):
     """Service for Podija module operations - implements core interfaces"""
     
@@ -0,0 +1,127 @@
+"""
+Logging overhead per request in production mode
+
+Compares the time a request thread spends logging with:
+  legacy  - StreamHandler + json.dumps formatter (the pre-queue setup)
+  sync    - StreamHandler + current StructuredFormatter
+  queue   - DroppingQueueHandler -> QueueListener -> StreamHandler (default)
+
+Each simulated request emits the two INFO records of a participant message.
+Records are written to a temporary file; --sink-latency-us adds a delay per
+write to mimic a slow stdout pipe (e.g. a busy log collector).
+
+Usage:
+    python benchmarks/bench_logging.py [--requests 20000] [--sink-latency-us 0]
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import sys
+import tempfile
+import time
+from datetime import datetime
+from logging.handlers import QueueListener
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('ENVIRONMENT', 'production')
+
+from app.core.logging import DroppingQueueHandler, StructuredFormatter
+
+
+class LegacyFormatter(logging.Formatter):
+    """StructuredFormatter as it was before the queue pipeline"""
+    
+    def format(self, record):
+        log_data = {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "module": record.module,
+            "function": record.funcName,
+            "line": record.lineno,
+        }
+        if record.exc_info:
+            log_data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(log_data)
+
+
+class SlowStream:
+    """File wrapper that waits after every write"""
+    
+    def __init__(self, stream, latency: float):
+        self.stream = stream
+        self.latency = latency
+    
+    def write(self, text):
+        self.stream.write(text)
+        if self.latency:
+            deadline = time.perf_counter() + self.latency
+            while time.perf_counter() < deadline:
+                pass
+    
+    def flush(self):
+        self.stream.flush()
+
+
+def simulate_request(logger: logging.Logger, i: int) -> None:
+    logger.info(f"Participant message received: conversation_id=bench-{i}, mode=analysis, topic=test failure")
+    logger.info(f"Participant message processed: severity=warn, actions=2, latency={i % 50 / 10:.2f}ms")
+
+
+def run(name: str, requests: int, sink_latency: float) -> dict:
+    logger = logging.getLogger(f"bench.{name}")
+    logger.handlers.clear()
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    
+    with tempfile.TemporaryFile("w+") as f:
+        handler = logging.StreamHandler(SlowStream(f, sink_latency))
+        handler.setFormatter(LegacyFormatter() if name == "legacy" else StructuredFormatter())
+        listener = None
+        if name == "queue":
+            log_queue = queue.SimpleQueue()
+            listener = QueueListener(log_queue, handler)
+            listener.start()
+            logger.addHandler(DroppingQueueHandler(log_queue, max_size=requests * 2))
+        else:
+            logger.addHandler(handler)
+        
+        start = time.perf_counter()
+        for i in range(requests):
+            simulate_request(logger, i)
+        request_time = time.perf_counter() - start
+        if listener is not None:
+            listener.stop()
+        total_time = time.perf_counter() - start
+        f.seek(0)
+        written = sum(1 for _ in f)
+    
+    return {
+        "pipeline": name,
+        "request_us": request_time / requests * 1e6,
+        "total_us": total_time / requests * 1e6,
+        "records": written,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--sink-latency-us", type=float, default=0.0)
+    args = parser.parse_args()
+    
+    print(f"{args.requests} requests, 2 records each, sink latency {args.sink_latency_us}us/write")
+    print(f"{'pipeline':<8} {'request thread us/req':>22} {'incl. writer us/req':>20} {'records':>8}")
+    for name in ("legacy", "sync", "queue"):
+        result = run(name, args.requests, args.sink_latency_us / 1e6)
+        print(
+            f"{result['pipeline']:<8} {result['request_us']:>22.2f} "
+            f"{result['total_us']:>20.2f} {result['records']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Per-request cost of recording HTTP metrics
+
+Times record_http_request for a known route: the Prometheus counter and
+histogram, the rolling series behind /api/status and the route's latency
+sketch. The budget is 5us per request; wall-clock timings depend on the
+machine and its load, so this is a benchmark rather than a test.
+
+Usage:
+    python benchmarks/bench_prometheus.py [--requests 20000] [--rounds 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('ENVIRONMENT', 'test')
+os.environ.setdefault('LOG_LEVEL', 'ERROR')
+
+from main import app
+from app.core.prometheus import record_http_request
+
+BUDGET_SECONDS = 5e-6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    
+    scope = {"type": "http", "method": "GET", "route": app.routes[-1]}
+    record_http_request(scope, 200, 0.003)
+    
+    best = float("inf")
+    for _ in range(args.rounds):
+        start = time.perf_counter()
+        for _ in range(args.requests):
+            record_http_request(scope, 200, 0.003)
+        best = min(best, (time.perf_counter() - start) / args.requests)
+    
+    print(f"record_http_request: {best * 1e6:.2f}us per request (budget {BUDGET_SECONDS * 1e6:.0f}us)")
+    return 0 if best < BUDGET_SECONDS else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
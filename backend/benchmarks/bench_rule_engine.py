@@ -0,0 +1,88 @@
+"""
+Rule engine analysis time on large CI logs
+
+Compares, per log size and shape:
+  naive      - every CI pattern regex searched over the whole text
+  prefilter  - RuleEngine.analyze (literal prefilter, regexes near candidates)
+
+Logs are synthetic CI output (timestamps, step names, pip/npm/docker noise)
+with no recognized failure, which forces every pattern to be ruled out;
+"tail" logs end with an npm lockfile error. "single-line" logs have no
+newlines, like minified JSON logs, where ``.*?`` patterns backtrack across
+the whole text.
+
+Usage:
+    python benchmarks/bench_rule_engine.py [--sizes 1,10,100] [--naive-limit-mb 10]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('ENVIRONMENT', 'production')
+
+from app.engines.rule_engine import RuleEngine
+
+WORDS = (
+    "Run actions/checkout@v4 Downloading setup-python Collecting requests Installing collected packages "
+    "Successfully built wheel compiling module src/app/main.py PASSED tests/test_api.py::test_health "
+    "INFO WARNING debug step cache restored key linux-x64 npm notice node_modules resolving "
+    "docker layer sha256 pulling fs done 0.42s 1.2MB Building image pushed ok"
+).split()
+TAIL = "npm ERR! npm ci can only install with an existing lockfile: version mismatch"
+
+
+def make_log(size: int, single_line: bool = False, tail: bool = False, seed: int = 0) -> str:
+    rnd = random.Random(seed)
+    lines = []
+    total = 0
+    while total < size:
+        line = "2024-05-01T12:00:%02d.%03dZ " % (rnd.randrange(60), rnd.randrange(1000)) + " ".join(
+            rnd.choice(WORDS) for _ in range(rnd.randrange(4, 16))
+        )
+        lines.append(line)
+        total += len(line) + 1
+    if tail:
+        lines.append(TAIL)
+    return (" " if single_line else "\n").join(lines)
+
+
+def naive(text: str) -> list:
+    return [pattern.name for pattern in RuleEngine().patterns if any(regex.search(text) for regex in pattern.patterns)]
+
+
+def timed(func, *args) -> float:
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="1,10,100", help="Log sizes in MB")
+    parser.add_argument("--naive-limit-mb", type=float, default=10, help="Skip naive runs above this size")
+    args = parser.parse_args()
+    
+    engine = RuleEngine()
+    print(f"{'log':<22} {'naive s':>10} {'prefilter s':>12} {'speedup':>8}")
+    for size_mb in (float(size) for size in args.sizes.split(",")):
+        for single_line in (False, True):
+            for tail in (False, True):
+                text = make_log(int(size_mb * 1_000_000), single_line, tail)
+                shape = "single-line" if single_line else "multi-line"
+                label = f"{size_mb:g}MB {shape}{' tail' if tail else ''}"
+                
+                prefiltered = timed(engine.analyze, text)
+                # Single-line naive search is quadratic; keep it to small logs
+                limit = args.naive_limit_mb / (100 if single_line else 1)
+                if size_mb <= limit:
+                    baseline = timed(naive, text)
+                    print(f"{label:<22} {baseline:>10.3f} {prefiltered:>12.3f} {baseline / prefiltered:>7.0f}x")
+                else:
+                    print(f"{label:<22} {'-':>10} {prefiltered:>12.3f} {'-':>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Synthetic CI log corpus for rule engine benchmarks and performance tests
+
+Logs come in the shapes the participant API sees:
+  npm       - npm install/ci output ending in a lockfile error
+  pytest    - a pytest session with a failing test
+  ruff      - ruff diagnostics ending in a failed check
+  docker    - BuildKit output of a failing image build
+  minified  - one huge line of minified JSON log records (no newlines)
+
+Each log is built from seeded noise lines that match no rule, with one
+failure block appended, so the expected matches are known exactly. Any
+size from bytes to hundreds of megabytes can be generated; the same
+(shape, size, seed) always gives the same log.
+
+Usage:
+    python benchmarks/corpus.py npm 1MB > npm.log
+"""
+import random
+import sys
+from dataclasses import dataclass
+from typing import Iterator, Tuple
+
+SHAPES = ("npm", "pytest", "ruff", "docker", "minified")
+SIZES = (1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+
+# Noise line templates per shape; none of them may match a rule on its own
+NOISE = {
+    "npm": (
+        "npm WARN deprecated {pkg}@{ver}: this package is no longer supported",
+        "npm notice New minor release of npm available! {ver} -> {ver2}",
+        "npm http fetch GET 200 https://registry.npmjs.org/{pkg} {ms}ms (cache hit)",
+        "added {n} packages, and audited {n2} packages in {s}s",
+        "{n} packages are looking for funding",
+        "> {pkg}@{ver} postinstall",
+        "> node scripts/build.js --mode production",
+        "  run `npm fund` for details",
+    ),
+    "pytest": (
+        "tests/test_{mod}.py::test_{name} PASSED                                 [{pct:>3}%]",
+        "tests/test_{mod}.py::test_{name}[{param}] PASSED                        [{pct:>3}%]",
+        "tests/test_{mod}.py::test_{name} SKIPPED (requires network)             [{pct:>3}%]",
+        "collected {n} items",
+        "platform linux -- Python 3.11.{d}, pytest-7.4.{d}, pluggy-1.3.0",
+        "rootdir: /home/runner/work/{pkg}/{pkg}",
+        "plugins: asyncio-0.21.1, cov-4.1.0, anyio-3.7.1",
+    ),
+    "ruff": (
+        "src/{pkg}/{mod}.py:{n}:{d}: F401 [*] `{name}` imported but unused",
+        "src/{pkg}/{mod}.py:{n}:{d}: E501 Line too long ({n2} > 120)",
+        "src/{pkg}/{mod}.py:{n}:{d}: B008 Do not perform function call in argument defaults",
+        "src/{pkg}/{mod}.py:{n}:{d}: UP006 [*] Use `list` instead of `List` for type annotation",
+        "tests/test_{mod}.py:{n}:{d}: S101 Use of `assert` detected",
+    ),
+    "docker": (
+        "#{d} [{d}/9] RUN pip install --no-cache-dir -r requirements.txt",
+        "#{d} sha256:{sha} {n}B / {n2}B {s}s",
+        "#{d} extracting sha256:{sha} {s}s done",
+        "#{d} CACHED",
+        "#{d} [internal] load metadata for docker.io/library/python:3.11-slim",
+        "#{d} DONE {s}s",
+        "#{d} writing image sha256:{sha} done",
+    ),
+    "minified": (
+        '{{"ts":{ms},"lvl":"info","msg":"GET /api/{mod}/{n} 200","dur":{s}}}',
+        '{{"ts":{ms},"lvl":"debug","msg":"cache hit","key":"{sha}"}}',
+        '{{"ts":{ms},"lvl":"info","msg":"worker {d} ready","pid":{n}}}',
+        '{{"ts":{ms},"lvl":"warn","msg":"slow query","table":"{mod}","rows":{n2}}}',
+    ),
+}
+
+# Failure block per shape and the rules it must match
+FAILURES = {
+    "npm": (
+        "npm ERR! code EUSAGE\n"
+        "npm ERR! `npm ci` can only install packages when your package.json and package-lock.json are in sync.\n"
+        "npm ERR! Invalid: lockfile's version of @types/node does not satisfy @types/node@20.11.5\n",
+        ("npm_lockfile_mismatch",),
+    ),
+    "pytest": (
+        "tests/test_api.py::test_health FAILED                                   [100%]\n"
+        "E       AssertionError: assert 500 == 200\n"
+        "=========================== 1 failed, 212 passed in 4.21s ===========================\n",
+        ("test_failures",),
+    ),
+    "ruff": (
+        "Found 4 errors.\n"
+        "[*] 3 fixable with the `--fix` option.\n"
+        "Error: ruff check failed with exit code 1\n",
+        ("ruff_linting_errors",),
+    ),
+    "docker": (
+        "#9 ERROR: process \"/bin/sh -c pip install --no-cache-dir -r requirements.txt\" exit code: 1\n"
+        "Error: docker build failed: exit status 1\n",
+        ("docker_build_failed",),
+    ),
+    "minified": (
+        '{"ts":1714564800000,"lvl":"fatal","msg":"ModuleNotFoundError: No module named \'yaml\'"}',
+        ("pytest_import_errors",),
+    ),
+}
+
+WORDS = ("alpha", "beta", "cache", "users", "orders", "billing", "router", "schema", "client", "worker")
+
+
+@dataclass(frozen=True)
+class CorpusLog:
+    """A generated log and the rules it is known to match"""
+    shape: str
+    size: int
+    text: str
+    expected: Tuple[str, ...]
+    
+    @property
+    def label(self) -> str:
+        return f"{self.shape}-{format_size(self.size)}"
+
+
+def format_size(size: int) -> str:
+    """1000 -> "1KB", 10_000_000 -> "10MB" """
+    for unit, scale in (("MB", 1_000_000), ("KB", 1_000)):
+        if size >= scale:
+            return f"{size / scale:g}{unit}"
+    return f"{size}B"
+
+
+def parse_size(text: str) -> int:
+    """ "10MB" -> 10_000_000 """
+    text = text.strip().upper()
+    for unit, scale in (("MB", 1_000_000), ("KB", 1_000), ("B", 1)):
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * scale)
+    return int(text)
+
+
+def _noise_pool(shape: str, rnd: random.Random, count: int = 2000) -> list:
+    """Distinct noise lines to draw from"""
+    templates = NOISE[shape]
+    pool = []
+    for _ in range(count):
+        pool.append(rnd.choice(templates).format(
+            pkg=rnd.choice(WORDS) + "-" + rnd.choice(WORDS),
+            mod=rnd.choice(WORDS),
+            name="_".join(rnd.sample(WORDS, 2)),
+            param=rnd.choice(WORDS),
+            ver=f"{rnd.randrange(10)}.{rnd.randrange(30)}.{rnd.randrange(10)}",
+            ver2=f"{rnd.randrange(10)}.{rnd.randrange(30)}.{rnd.randrange(10)}",
+            sha="%064x" % rnd.getrandbits(256),
+            pct=rnd.randrange(101),
+            n=rnd.randrange(1, 5000),
+            n2=rnd.randrange(1, 50000),
+            d=rnd.randrange(1, 10),
+            ms=rnd.randrange(10 ** 12, 10 ** 13),
+            s=f"{rnd.random() * 10:.2f}",
+        ))
+    return pool
+
+
+def generate(shape: str, size: int, seed: int = 0) -> CorpusLog:
+    """
+    Generate a log of about ``size`` characters ending in its failure
+    
+    Args:
+        shape: One of SHAPES
+        size: Target size in characters (the failure block is included)
+        seed: Random seed
+    
+    Returns:
+        CorpusLog: The log and the rules it matches
+    """
+    failure, expected = FAILURES[shape]
+    rnd = random.Random(f"{shape}:{seed}")
+    pool = _noise_pool(shape, rnd)
+    separator = " " if shape == "minified" else "\n"
+    budget = max(0, size - len(failure))
+    average = sum(len(line) + 1 for line in pool) / len(pool)
+    lines = rnd.choices(pool, k=int(budget / average * 1.05) + 1)
+    noise = separator.join(lines)[:budget - 1] + separator if budget else ""
+    return CorpusLog(shape, size, noise + failure, expected)
+
+
+def corpus(sizes=SIZES, shapes=SHAPES, seed: int = 0) -> Iterator[CorpusLog]:
+    """Every shape at every size, smallest first"""
+    for size in sizes:
+        for shape in shapes:
+            yield generate(shape, size, seed)
+
+
+if __name__ == "__main__":
+    sys.stdout.write(generate(sys.argv[1], parse_size(sys.argv[2])).text)
@@ -0,0 +1,172 @@
+"""
+Rule engine performance regression harness
+
+Runs RuleEngine.analyze over the synthetic corpus (benchmarks/corpus.py)
+and reports, per log:
+  MB/s      - analysis throughput (best of --repeats runs)
+  peak      - memory allocated during the analysis, as a multiple of the log
+  slowest   - the costliest rule and its cost in ms per MB of log
+  ok        - matches are the expected ones and every budget holds
+
+Rule costs are measured one rule at a time on a fresh TextScan, so literal
+lookups shared between rules are charged to each of them. Budgets live in
+benchmarks/rule_engine_budgets.yaml; --check exits non-zero on a violation.
+
+Usage:
+    python benchmarks/perf_rule_engine.py [--sizes 1KB,1MB,100MB] [--shapes npm,minified] [--check]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import yaml
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('ENVIRONMENT', 'production')
+
+from app.engines.prefilter import TextScan
+from app.engines.rule_engine import RuleEngine
+from benchmarks.corpus import SHAPES, CorpusLog, corpus, parse_size
+
+DEFAULT_BUDGETS_PATH = Path(__file__).parent / "rule_engine_budgets.yaml"
+
+
+def load_budgets(path: Path = DEFAULT_BUDGETS_PATH, scale: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Read the budgets, scaled for slower hardware
+    
+    Args:
+        path: Budgets file
+        scale: Multiplier of the time budgets (defaults to PERF_BUDGET_SCALE or 1)
+    
+    Returns:
+        dict: Budgets, as in the file
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        budgets = yaml.safe_load(f)
+    if scale is None:
+        scale = float(os.getenv("PERF_BUDGET_SCALE", "1"))
+    budgets["throughput_mb_s"] = {k: v / scale for k, v in budgets["throughput_mb_s"].items()}
+    budgets["pattern_ms_per_mb"] = {k: v * scale for k, v in budgets["pattern_ms_per_mb"].items()}
+    return budgets
+
+
+def _best(func, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def measure(engine: RuleEngine, log: CorpusLog, repeats: int = 3) -> Dict[str, Any]:
+    """
+    Measure one corpus log
+    
+    Args:
+        engine: Engine to measure (without a result cache)
+        log: Corpus log
+        repeats: Timed runs; the best one counts
+    
+    Returns:
+        dict: {"label", "shape", "size", "matches", "mb_s", "peak_ratio",
+        "pattern_ms_per_mb": {rule: ms}}
+    """
+    megabytes = len(log.text) / 1_000_000
+    result = engine.analyze(log.text)
+    seconds = _best(lambda: engine.analyze(log.text), repeats)
+    
+    tracemalloc.start()
+    try:
+        engine.analyze(log.text)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    
+    costs = {}
+    for pattern in engine.patterns:
+        scans = [TextScan(log.text) for _ in range(repeats)]
+        seconds_per_rule = _best(lambda: pattern.find_spans(scans.pop()), repeats)
+        costs[pattern.name] = seconds_per_rule * 1000 / megabytes
+    return {
+        "label": log.label,
+        "shape": log.shape,
+        "size": len(log.text),
+        "matches": tuple(match["pattern"] for match in result["outputs"]["matches"]),
+        "mb_s": megabytes / seconds,
+        "peak_ratio": peak / len(log.text),
+        "pattern_ms_per_mb": costs,
+    }
+
+
+def check(log: CorpusLog, measured: Dict[str, Any], budgets: Dict[str, Any]) -> List[str]:
+    """
+    Budget violations of a measured log
+    
+    Args:
+        log: The corpus log
+        measured: Its measurement (see measure)
+        budgets: Budgets (see load_budgets)
+    
+    Returns:
+        list: Violations, empty if the log is within budget
+    """
+    problems = []
+    if measured["matches"] != log.expected:
+        problems.append(f"{log.label}: matched {list(measured['matches'])}, expected {list(log.expected)}")
+    if measured["size"] < budgets["min_size"]:
+        return problems
+    
+    throughput = budgets["throughput_mb_s"]
+    floor = throughput.get(log.shape, throughput["default"])
+    if measured["mb_s"] < floor:
+        problems.append(f"{log.label}: {measured['mb_s']:.1f} MB/s, budget {floor:g} MB/s")
+    if measured["peak_ratio"] > budgets["peak_memory_ratio"]:
+        problems.append(
+            f"{log.label}: peak memory {measured['peak_ratio']:.1f}x the log, budget {budgets['peak_memory_ratio']}x"
+        )
+    limits = budgets["pattern_ms_per_mb"]
+    for name, cost in measured["pattern_ms_per_mb"].items():
+        limit = limits.get(name, limits["default"])
+        if cost > limit:
+            problems.append(f"{log.label}: rule {name} costs {cost:.1f} ms/MB, budget {limit:g} ms/MB")
+    return problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="1KB,10KB,100KB,1MB,10MB", help="Log sizes (up to 100MB)")
+    parser.add_argument("--shapes", default=",".join(SHAPES), help="Log shapes")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs per measurement")
+    parser.add_argument("--budgets", default=str(DEFAULT_BUDGETS_PATH), help="Budgets file")
+    parser.add_argument("--check", action="store_true", help="Exit 1 if a budget is exceeded")
+    args = parser.parse_args()
+    
+    engine = RuleEngine()
+    budgets = load_budgets(Path(args.budgets))
+    sizes = [parse_size(size) for size in args.sizes.split(",")]
+    problems = []
+    print(f"{'log':<16} {'MB/s':>8} {'peak':>6}  {'slowest rule':<28} {'ms/MB':>7}  ok")
+    for log in corpus(sizes, args.shapes.split(",")):
+        measured = measure(engine, log, args.repeats)
+        found = check(log, measured, budgets)
+        problems.extend(found)
+        slowest = max(measured["pattern_ms_per_mb"].items(), key=lambda item: item[1])
+        print(
+            f"{log.label:<16} {measured['mb_s']:>8.1f} {measured['peak_ratio']:>5.1f}x  "
+            f"{slowest[0]:<28} {slowest[1]:>7.1f}  {'no' if found else 'yes'}"
+        )
+    
+    for problem in problems:
+        print(f"BUDGET {problem}", file=sys.stderr)
+    if args.check and problems:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,12 +11,21 @@ from app.config.database import init_db
 from app.config.canon import CANON_BUNDLE_ID
 from app.api.v1.router import api_router
 from app.api.v1 import health
-from app.api import status, participant
+from app.api import status, participant, metrics, admin
 from app.startup import setup_modules
 from app.core.config import settings
 from app.core.logging import setup_logging, get_logger
-from app.core.rate_limit import RateLimitMiddleware
+from app.core.rate_limit import RateLimitMiddleware, get_rate_limit_backend
+from app.core.quota import get_quota_engine
+from app.core.prometheus import MetricsMiddleware
+from app.core.tracing import TracingMiddleware, tracer
+from app.core.slow_requests import SlowRequestMiddleware
 from app.core.monitoring import init_sentry, get_monitoring_status
+from app.core import multiprocess
+from app.core.audit_log import get_audit_log
+from app.core.loop_monitor import get_loop_monitor
+from app.engines.artifacts import get_artifact_scanner
+from app.engines.rule_packs import get_rule_registry
 
 # Load environment variables
 load_dotenv()
@@ -61,11 +70,49 @@ async def lifespan(app: FastAPI):
         logger.error(f"Startup error: {e}", exc_info=True)
         raise
     
+    # Share this worker's metrics with the others (METRICS_MULTIPROC_DIR)
+    multiprocess.start()
+    
+    # Flush locally pre-counted rate limit hits of idle keys (Redis backend)
+    rate_limit_backend = get_rate_limit_backend()
+    rate_limit_backend.start()
+    
+    # Watch the event loop for lag and blocking calls
+    loop_monitor = get_loop_monitor(app)
+    if settings.LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+        if loop_monitor.strict:
+            logger.warning("Event loop strict mode: blocking calls raise BlockingCallError")
+    
+    # Load the rule packs before serving (compiled cache), then watch them
+    rule_registry = get_rule_registry()
+    rules = rule_registry.rules
+    logger.info(f"Rule packs loaded: version {rules.version}, {len(rules.patterns)} rules")
+    rule_registry.start()
+    
+    # Start the artifact scan workers ahead of the first request
+    artifact_scanner = get_artifact_scanner()
+    artifact_scanner.start()
+    
+    # Write the audit log to AUDIT_LOG_DIR in the background
+    audit_log = get_audit_log()
+    audit_log.start()
+    
+    # Write exported spans (TRACE_EXPORTER=file) in the background
+    tracer.start()
+    
     logger.info("CIMEIKA Backend started successfully")
     yield
     
     # Shutdown: cleanup if needed
     logger.info("Shutting down CIMEIKA Backend...")
+    await loop_monitor.stop()
+    rule_registry.stop()
+    artifact_scanner.shutdown()
+    audit_log.stop()
+    tracer.stop()
+    rate_limit_backend.stop()
+    multiprocess.stop()
 
 
 # Create FastAPI application
@@ -89,13 +136,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Add rate limiting middleware
-app.add_middleware(
-    RateLimitMiddleware,
-    requests_per_minute=60,
-    requests_per_hour=1000,
-    exclude_paths=["/health", "/ready", "/", "/api/docs", "/api/redoc", "/api/openapi.json"]
-)
+# Capture requests over their latency budget (app/config/latency_budgets.yaml).
+# Inside tracing and rate limiting, so it runs in the task serving the route
+app.add_middleware(SlowRequestMiddleware)
+
+# Add rate limiting middleware (quotas in app/config/rate_limits.yaml)
+quota_engine = get_quota_engine()
+app.add_middleware(RateLimitMiddleware, engine=quota_engine)
+
+# Add request tracing (root span per sampled request, around rate limiting)
+app.add_middleware(TracingMiddleware)
+
+# Add request metrics middleware (outermost, so 429s and CORS preflights count)
+app.add_middleware(MetricsMiddleware)
 
 
 @app.get("/")
@@ -128,6 +181,12 @@ app.include_router(status.router)
 # Include participant router (at root level)
 app.include_router(participant.router)
 
+# Include Prometheus metrics router (at root level)
+app.include_router(metrics.router)
+
+# Include admin diagnostics router (X-ADMIN-KEY)
+app.include_router(admin.router)
+
 # Include API v1 router
 app.include_router(api_router, prefix="/api/v1")
 
@@ -3,10 +3,13 @@ OpenAI Integration Service
 Provides conversational AI capabilities using OpenAI GPT models
 """
 import os
+import time
 import logging
 from typing import List, Dict, Optional
 from openai import OpenAI
 from dotenv import load_dotenv
+from app.core.prometheus import OPENAI_CALLS, OPENAI_LATENCY
+from app.core.tracing import inject, start_span
 
 load_dotenv()
 
@@ -81,15 +84,25 @@ class OpenAIService:
             messages.append({"role": "user", "content": user_message})
             
             # Call OpenAI API
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=self.temperature,
-                max_tokens=self.max_tokens,
-                top_p=1.0,
-                frequency_penalty=0.0,
-                presence_penalty=0.0
-            )
+            with start_span("openai.chat_completion", kind="CLIENT", model=self.model):
+                start = time.perf_counter()
+                try:
+                    response = self.client.chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        temperature=self.temperature,
+                        max_tokens=self.max_tokens,
+                        top_p=1.0,
+                        frequency_penalty=0.0,
+                        presence_penalty=0.0,
+                        extra_headers=inject({})
+                    )
+                except Exception:
+                    OPENAI_CALLS.labels(self.model, "error").inc()
+                    raise
+                finally:
+                    OPENAI_LATENCY.labels(self.model).observe(time.perf_counter() - start)
+                OPENAI_CALLS.labels(self.model, "ok").inc()
             
             # Extract and return the response
             return response.choices[0].message.content
@@ -0,0 +1,14 @@
+"""
+Shared test fixtures
+"""
+import sys
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def reset_rate_limiter():
+    """Give every test a fresh per-IP quota on the shared app"""
+    main = sys.modules.get("main")
+    if main is not None:
+        main.quota_engine.reset()
+    yield
@@ -0,0 +1,195 @@
+"""
+Tests for admin diagnostics endpoints
+"""
+import pytest
+import sys
+import os
+import threading
+import time
+from fastapi.testclient import TestClient
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Set test environment variables before importing app
+os.environ['ENVIRONMENT'] = 'test'
+os.environ['LOG_LEVEL'] = 'ERROR'
+os.environ['POSTGRES_HOST'] = 'localhost'
+os.environ['CIMEIKA_ADMIN_KEY'] = 'test_admin_key'
+
+from main import app
+from app.core.profiler import SamplingProfiler, ProfilerBusyError
+
+# Create test client
+client = TestClient(app)
+
+ADMIN = {"X-ADMIN-KEY": "test_admin_key"}
+
+
+def _spin_until(stop):
+    """Distinctive busy loop for the profiler to find"""
+    while not stop.is_set():
+        sum(range(1000))
+
+
+@pytest.fixture
+def busy_thread():
+    stop = threading.Event()
+    thread = threading.Thread(target=_spin_until, args=(stop,), name="busy-worker")
+    thread.start()
+    yield thread
+    stop.set()
+    thread.join()
+
+
+def test_admin_requires_key():
+    """Test that admin endpoints reject missing or wrong keys"""
+    assert client.get("/api/admin/profile?seconds=0.1").status_code == 401
+    response = client.get("/api/admin/profile?seconds=0.1", headers={"X-ADMIN-KEY": "wrong"})
+    assert response.status_code == 401
+
+
+def test_admin_disabled_without_configured_key(monkeypatch):
+    """Test that admin endpoints do not exist unless a key is configured"""
+    monkeypatch.delenv("CIMEIKA_ADMIN_KEY")
+    response = client.get("/api/admin/profile?seconds=0.1", headers=ADMIN)
+    assert response.status_code == 404
+    assert client.get("/api/admin/profile?seconds=0.1").status_code == 404
+
+
+def test_profile_collapsed_stacks(busy_thread):
+    """Test that the profile shows where busy threads spend time"""
+    response = client.get("/api/admin/profile?seconds=0.3&interval_ms=5", headers=ADMIN)
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert int(response.headers["X-Profile-Samples"]) > 10
+    busy = [line for line in response.text.splitlines() if line.startswith("busy-worker;")]
+    assert busy
+    assert "_spin_until (tests/test_admin.py:" in busy[0]
+    assert int(busy[0].rsplit(" ", 1)[1]) > 0
+
+
+def test_profile_speedscope(busy_thread):
+    """Test the speedscope output format"""
+    response = client.get("/api/admin/profile?seconds=0.2&format=speedscope", headers=ADMIN)
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert data["$schema"] == "https://www.speedscope.app/file-format-schema.json"
+    frames = data["shared"]["frames"]
+    profile = next(p for p in data["profiles"] if p["name"] == "busy-worker")
+    assert profile["type"] == "sampled"
+    assert len(profile["samples"]) == len(profile["weights"])
+    assert any(frames[i]["name"] == "_spin_until" for sample in profile["samples"] for i in sample)
+
+
+def test_profile_route_filter(busy_thread):
+    """Test that a route filter drops stacks not serving that route"""
+    response = client.get(
+        "/api/admin/profile?seconds=0.2&route=/api/participant/message",
+        headers=ADMIN
+    )
+    assert response.status_code == 200
+    assert "busy-worker" not in response.text
+    
+    response = client.get("/api/admin/profile?seconds=0.1&route=/no/such/route", headers=ADMIN)
+    assert response.status_code == 404
+
+
+def test_profiler_runs_one_profile_at_a_time():
+    """Test that concurrent profiles are refused instead of stacking up"""
+    sampler = SamplingProfiler()
+    worker = threading.Thread(target=sampler.run, args=(0.3,))
+    worker.start()
+    time.sleep(0.05)
+    try:
+        with pytest.raises(ProfilerBusyError):
+            sampler.run(0.1)
+    finally:
+        worker.join()
+    assert not sampler.busy
+
+
+def test_profile_duration_is_capped():
+    """Test that a profile never runs past max_seconds"""
+    sampler = SamplingProfiler(max_seconds=0.1)
+    start = time.perf_counter()
+    result = sampler.run(10)
+    
+    assert time.perf_counter() - start < 1.0
+    assert result.duration < 0.5
+
+
+def test_heap_stores_report_known_structures():
+    """Test that in-process store sizes are reported without tracemalloc"""
+    response = client.get("/api/admin/heap/stores", headers=ADMIN)
+    
+    assert response.status_code == 200
+    stores = response.json()
+    for name in ("rate_limit.counters", "participant.audit_log", "kazkar.websocket_connections",
+                 "ci.legend_nodes", "metrics.rolling_series", "latency.sketches"):
+        assert name in stores
+    assert stores["ci.legend_nodes"]["entries"] > 0
+    assert stores["ci.legend_nodes"]["bytes"] > 0
+
+
+def test_heap_snapshot_requires_tracing():
+    """Test that snapshots are refused until tracemalloc is started"""
+    client.post("/api/admin/heap/stop", headers=ADMIN)
+    response = client.post("/api/admin/heap/snapshots", headers=ADMIN)
+    assert response.status_code == 409
+
+
+def test_heap_snapshot_diff_finds_growth():
+    """Test that a diff attributes growth to the allocation site and store"""
+    from app.engines.fingerprint import get_failure_index
+    
+    assert client.post("/api/admin/heap/start?frames=5", headers=ADMIN).json()["tracing"] is True
+    try:
+        base = client.post("/api/admin/heap/snapshots?limit=5", headers=ADMIN).json()
+        assert base["top"]
+        
+        # Simulate a leak in a known store
+        leak = [bytearray(1024) for _ in range(500)]
+        clusters = get_failure_index()._clusters
+        clusters.update((f"leak-{i}", {"payload": chunk}) for i, chunk in enumerate(leak))
+        try:
+            target = client.post("/api/admin/heap/snapshots?limit=5", headers=ADMIN).json()
+            diff = client.get(
+                f"/api/admin/heap/diff?base={base['id']}&target={target['id']}&limit=5",
+                headers=ADMIN
+            ).json()
+        finally:
+            for i in range(len(leak)):
+                del clusters[f"leak-{i}"]
+        
+        assert diff["traced_bytes_diff"] > 500 * 1024
+        assert diff["sites"][0]["site"].startswith("tests/test_admin.py:")
+        assert diff["sites"][0]["size_diff_bytes"] > 500 * 1024
+        assert diff["stores"]["participant.failure_index"]["entries_diff"] == 500
+        assert diff["stores"]["participant.failure_index"]["bytes_diff"] > 500 * 1024
+        
+        status_body = client.get("/api/admin/heap", headers=ADMIN).json()
+        assert status_body["tracing"] is True
+        assert [s["id"] for s in status_body["snapshots"]][-2:] == [base["id"], target["id"]]
+        
+        response = client.get("/api/admin/heap/diff?base=9999&target=1", headers=ADMIN)
+        assert response.status_code == 404
+    finally:
+        client.post("/api/admin/heap/stop", headers=ADMIN)
+
+
+def test_rules_status_and_reload():
+    """Test the rule pack status and reload endpoints"""
+    response = client.get("/api/admin/rules", headers=ADMIN)
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert data["rules"] >= 10
+    assert data["packs"][0]["name"] == "ci"
+    assert data["failures"] == 0
+    
+    response = client.post("/api/admin/rules/reload", headers=ADMIN)
+    assert response.status_code == 200
+    assert response.json()["version"] == data["version"]
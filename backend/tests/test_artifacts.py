@@ -0,0 +1,213 @@
+"""
+Tests for artifact scanning
+"""
+import asyncio
+import base64
+import os
+import sys
+from types import SimpleNamespace
+import pytest
+from fastapi.testclient import TestClient
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Set test environment variables before importing app
+os.environ['ENVIRONMENT'] = 'test'
+os.environ['LOG_LEVEL'] = 'ERROR'
+os.environ['POSTGRES_HOST'] = 'localhost'
+os.environ['CIMEIKA_PARTICIPANT_KEY'] = 'test_api_key_12345'
+
+from main import app
+from app.core.result_cache import MemoryResultCache
+from app.engines import artifacts
+from app.engines.artifacts import ArtifactScanner, scan_artifact
+from app.engines.rule_engine import RuleEngine
+
+client = TestClient(app)
+
+PIP_LOG = "Collecting requests\n" * 3 + "pip install -r requirements.txt failed\n"
+
+
+def _b64(text: str) -> str:
+    return base64.b64encode(text.encode()).decode()
+
+
+def test_scan_locates_matches_in_the_artifact():
+    """Test that matches are located in the decoded artifact, across windows"""
+    text = "héllo\n" * 5000 + PIP_LOG
+    scan = scan_artifact("error.log", _b64(text))
+    
+    assert scan["status"] == "ok"
+    assert scan["bytes"] == len(text.encode())
+    match = scan["matches"][0]
+    assert match["pattern"] == "python_deps_install_failed"
+    location = match["locations"][0]
+    assert location["line"] == 5004
+    assert location["byte_start"] == text.encode().index(b"pip install")
+
+
+def test_scan_windows_split_multibyte_characters(monkeypatch):
+    """Test that a window boundary inside a UTF-8 character is decoded intact"""
+    monkeypatch.setattr(artifacts, "SCAN_WINDOW", 7)
+    text = "ü" * 10 + "\npip install x failed\n"
+    scan = scan_artifact("error.log", _b64(text))
+    
+    location = scan["matches"][0]["locations"][0]
+    assert location["start"] == text.index("pip")
+    assert location["excerpt"] == "pip install x failed"
+
+
+def test_scan_limits():
+    """Test oversized and malformed artifacts"""
+    assert scan_artifact("big.log", _b64("x" * 100), max_bytes=50)["status"] == "too_large"
+    assert scan_artifact("bad.log", "not base64!")["status"] == "invalid"
+
+
+def test_scan_stops_at_timeout_with_partial_matches(monkeypatch):
+    """Test that a slow scan reports the matches of the windows it read"""
+    clock = iter(range(100))
+    monkeypatch.setattr(artifacts, "time", SimpleNamespace(perf_counter=lambda: next(clock)))
+    monkeypatch.setattr(artifacts, "SCAN_WINDOW", 64)
+    text = PIP_LOG + "x\n" * 200 + "Error: Cannot find module 'left-pad'\n"
+    scan = scan_artifact("error.log", _b64(text), timeout=2.5)
+    
+    assert scan["status"] == "timeout"
+    assert [m["pattern"] for m in scan["matches"]] == ["python_deps_install_failed"]
+
+
+def test_engine_merges_artifact_matches():
+    """Test that artifact matches are ranked with the text's and labelled"""
+    engine = RuleEngine(RuleEngine().patterns)
+    scans = [
+        scan_artifact("error.log", _b64(PIP_LOG)),
+        {"name": "gone.log", "status": "ok", "bytes": 1, "elapsed_ms": 0.1,
+         "matches": [{"pattern": "removed_rule", "score": 1.0, "count": 1, "locations": []}]},
+    ]
+    result = engine.analyze("ruff check failed\n", scans=scans)
+    
+    matches = result["outputs"]["matches"]
+    assert [(m["pattern"], m["artifact"]) for m in matches] == [
+        ("python_deps_install_failed", "error.log"),
+        ("ruff_linting_errors", None),
+    ]
+    assert result["message"] == matches[0]["message"]
+    assert [scan["name"] for scan in result["outputs"]["artifacts"]] == ["error.log", "gone.log"]
+    assert "matches" not in result["outputs"]["artifacts"][0]
+
+
+def test_incomplete_scans_are_not_cached():
+    """Test that analyses with timed out artifact scans are redone"""
+    cache = MemoryResultCache()
+    engine = RuleEngine(cache=cache)
+    artifact = [{"name": "error.log", "content_base64": _b64(PIP_LOG)}]
+    scan = {"name": "error.log", "status": "timeout", "bytes": 10, "elapsed_ms": 5000.0, "matches": []}
+    engine.analyze("log", artifacts=artifact, scans=[scan])
+    engine.analyze("log", artifacts=artifact, scans=[{**scan, "status": "ok"}])
+    engine.analyze("log", artifacts=artifact, scans=[{**scan, "status": "ok"}])
+    
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_pool_scans_concurrently_in_input_order():
+    """Test scanning several artifacts in worker processes"""
+    scanner = ArtifactScanner(workers=2, max_bytes=1000)
+    docs = [
+        {"name": "a.log", "content_base64": _b64(PIP_LOG)},
+        {"name": "b.log", "content_base64": _b64("x" * 2000)},
+        {"name": "c.log", "content_base64": _b64("ruff check failed\n")},
+    ]
+    try:
+        scans = asyncio.run(scanner.scan(docs))
+    finally:
+        scanner.shutdown()
+    
+    assert [(s["name"], s["status"]) for s in scans] == [("a.log", "ok"), ("b.log", "too_large"), ("c.log", "ok")]
+    assert scans[2]["matches"][0]["pattern"] == "ruff_linting_errors"
+
+
+def test_hung_pool_is_replaced(monkeypatch):
+    """Test that a scan overrunning its deadline restarts the pool"""
+    monkeypatch.setattr(artifacts, "HUNG_GRACE", 0)
+    # Starting a worker takes longer than this
+    scanner = ArtifactScanner(workers=1, timeout=0.01)
+    doc = {"name": "a.log", "content_base64": _b64(PIP_LOG)}
+    try:
+        assert asyncio.run(scanner.scan([doc]))[0]["status"] == "timeout"
+        assert scanner.recycled == 1
+        assert scanner._pool is None
+    finally:
+        scanner.shutdown()
+
+
+def test_thread_mode_caches_scans():
+    """Test scanning without a pool, with scans cached by content"""
+    cache = MemoryResultCache()
+    scanner = ArtifactScanner(workers=0, cache=cache)
+    doc = {"name": "a.log", "content_base64": _b64(PIP_LOG)}
+    first = asyncio.run(scanner.scan([doc], "v1"))
+    
+    assert asyncio.run(scanner.scan([doc], "v1")) == first
+    assert (cache.hits, cache.misses) == (1, 1)
+    asyncio.run(scanner.scan([doc], "v2"))
+    assert cache.misses == 2
+
+
+def test_blocking_cache_is_called_off_the_event_loop():
+    """Test that a network-backed cache is not called from the event loop"""
+    
+    class LoopCheckingCache(MemoryResultCache):
+        blocking = True
+        
+        def __init__(self):
+            super().__init__()
+            self.on_loop = []
+        
+        def _check(self):
+            try:
+                asyncio.get_running_loop()
+                self.on_loop.append(True)
+            except RuntimeError:
+                self.on_loop.append(False)
+        
+        def get(self, key):
+            self._check()
+            return super().get(key)
+        
+        def set(self, key, value):
+            self._check()
+            super().set(key, value)
+    
+    cache = LoopCheckingCache()
+    scanner = ArtifactScanner(workers=0, cache=cache)
+    doc = {"name": "a.log", "content_base64": _b64(PIP_LOG)}
+    first = asyncio.run(scanner.scan([doc], "v1"))
+    
+    assert asyncio.run(scanner.scan([doc], "v1")) == first
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.on_loop == [False, False, False]
+
+
+def test_participant_reports_artifact_matches():
+    """Test that /message scans artifacts and reports where they matched"""
+    body = {
+        "conversation_id": "artifacts",
+        "mode": "analysis",
+        "topic": "deps",
+        "input": {
+            "text": "Run pip install\nProcess completed with exit code 1\n",
+            "artifacts": [
+                {"name": "pip.log", "content_base64": _b64(PIP_LOG)},
+                {"name": "broken.bin", "content_base64": "abc"},
+            ],
+            "metadata": {"source": "ci"},
+        },
+    }
+    response = client.post("/api/participant/message", headers={"X-API-KEY": "test_api_key_12345"}, json=body)
+    
+    assert response.status_code == 200
+    outputs = response.json()["outputs"]
+    assert outputs["matches"][0]["pattern"] == "python_deps_install_failed"
+    assert outputs["matches"][0]["artifact"] == "pip.log"
+    assert outputs["matches"][0]["locations"][0]["line"] == 4
+    assert [(a["name"], a["status"]) for a in outputs["artifacts"]] == [("pip.log", "ok"), ("broken.bin", "invalid")]
@@ -0,0 +1,172 @@
+"""
+Tests for the audit log ring, its file store and the query endpoint
+"""
+import gzip
+import json
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+import pytest
+from fastapi.testclient import TestClient
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Set test environment variables before importing app
+os.environ['ENVIRONMENT'] = 'test'
+os.environ['LOG_LEVEL'] = 'ERROR'
+os.environ['POSTGRES_HOST'] = 'localhost'
+os.environ['CIMEIKA_PARTICIPANT_KEY'] = 'test_api_key_12345'
+os.environ['CIMEIKA_ADMIN_KEY'] = 'test_admin_key'
+
+from main import app
+from app.core import audit_log as audit_module
+from app.core.audit_log import AuditLog, percentile
+
+client = TestClient(app)
+
+ADMIN = {"X-ADMIN-KEY": "test_admin_key"}
+START = datetime(2024, 5, 1, tzinfo=timezone.utc)
+
+
+def _entry(minute: int, path: str = "/api/participant/message", status_code: int = 200, latency_ms: float = 10.0):
+    return {
+        "timestamp": (START + timedelta(minutes=minute)).isoformat(),
+        "path": path,
+        "status_code": status_code,
+        "latency_ms": latency_ms,
+        "metadata": {},
+    }
+
+
+@pytest.fixture
+def stored(tmp_path):
+    log = AuditLog(directory=str(tmp_path), flush_interval=60)
+    yield log
+    log.stop()
+
+
+def test_ring_keeps_the_newest_entries():
+    """Test that memory stays bounded without a directory"""
+    log = AuditLog(max_entries=3)
+    for minute in range(5):
+        log.record(_entry(minute))
+    
+    assert [e["timestamp"] for e in log.ring] == [_entry(m)["timestamp"] for m in (2, 3, 4)]
+    assert log.flush() == 0
+    assert log.stats()["recorded"] == 5 and log.stats()["files"] == []
+
+
+def test_batches_are_appended_as_gzip_jsonl(stored, tmp_path):
+    """Test that each flush appends one readable gzip member"""
+    stored.record(_entry(0))
+    stored.record(_entry(1))
+    assert stored.flush() == 2
+    stored.record(_entry(2))
+    assert stored.flush() == 1
+    assert stored.flush() == 0
+    
+    with gzip.open(tmp_path / "audit.jsonl.gz", "rt", encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f]
+    assert [line["timestamp"] for line in lines] == [_entry(m)["timestamp"] for m in range(3)]
+    assert stored.stats()["written"] == 3 and stored.stats()["pending"] == 0
+
+
+def test_rotation_keeps_the_newest_files(tmp_path):
+    """Test that the active file is rotated past max_bytes and old files are removed"""
+    log = AuditLog(directory=str(tmp_path), max_bytes=1, backups=2)
+    for minute in range(4):
+        log.record(_entry(minute))
+        log.flush()
+    
+    assert log.rotations == 4
+    assert len(log.stats()["files"]) == 2
+    assert [e["timestamp"] for e in log.query()["entries"]] == [_entry(m)["timestamp"] for m in (3, 2)]
+
+
+def test_pending_entries_are_dropped_when_the_disk_falls_behind(tmp_path):
+    """Test that unwritten entries stay bounded"""
+    log = AuditLog(directory=str(tmp_path), max_pending=2)
+    for minute in range(5):
+        log.record(_entry(minute))
+    
+    assert log.dropped == 3
+    assert log.flush() == 2
+
+
+def test_writer_thread_flushes_full_batches(tmp_path):
+    """Test that the writer wakes up once a batch is full and flushes on stop"""
+    log = AuditLog(directory=str(tmp_path), flush_interval=60, batch_size=2)
+    assert log.start()
+    log.record(_entry(0))
+    log.record(_entry(1))
+    for _ in range(100):
+        if log.written == 2:
+            break
+        log._stop.wait(0.02)
+    assert log.written == 2
+    
+    log.record(_entry(2))
+    log.stop()
+    assert log.written == 3
+
+
+def test_query_filters(stored):
+    """Test the time, path, status and latency percentile filters"""
+    stored.record(_entry(0, status_code=200, latency_ms=5))
+    stored.record(_entry(1, status_code=429, latency_ms=1))
+    stored.record(_entry(2, path="/api/participant/failures/ab", status_code=404, latency_ms=2))
+    stored.flush()
+    for minute, latency_ms in ((3, 50), (4, 500), (5, 20)):
+        stored.record(_entry(minute, status_code=500, latency_ms=latency_ms))
+    
+    def minutes(**filters):
+        return [
+            int((datetime.fromisoformat(e["timestamp"]) - START).total_seconds() // 60)
+            for e in stored.query(**filters)["entries"]
+        ]
+    
+    assert minutes() == [5, 4, 3, 2, 1, 0]
+    assert minutes(since=START + timedelta(minutes=2), until=START + timedelta(minutes=4)) == [3, 2]
+    assert minutes(since=datetime(2024, 5, 1, 0, 4)) == [5, 4]
+    assert minutes(path="/api/participant/failures") == [2]
+    assert minutes(status="5xx") == [5, 4, 3]
+    assert minutes(status="429") == [1]
+    assert minutes(limit=2) == [5, 4]
+    
+    result = stored.query(status="5xx", min_percentile=60)
+    assert result["threshold_ms"] == 50
+    assert [e["latency_ms"] for e in result["entries"]] == [500, 50]
+    assert result["matched"] == 2 and result["source"] == "files"
+
+
+def test_percentile():
+    """Test the nearest-rank percentile"""
+    values = [float(v) for v in range(1, 101)]
+    
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile(values, 100) == 100
+    assert percentile([7.0], 1) == 7
+
+
+def test_requests_are_audited_and_queryable(monkeypatch):
+    """Test that participant requests reach the admin query endpoint"""
+    monkeypatch.setattr(audit_module, "_audit_log", AuditLog(max_entries=50))
+    headers = {"X-API-KEY": "test_api_key_12345"}
+    client.post(
+        "/api/participant/message",
+        headers=headers,
+        json={"conversation_id": "audit", "mode": "analysis", "topic": "ci", "input": {"text": "build ok\n"}},
+    )
+    
+    response = client.get("/api/admin/audit?path=/api/participant/message&status=2xx", headers=ADMIN)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["source"] == "memory" and body["matched"] == 1
+    assert body["entries"][0]["path"] == "/api/participant/message"
+    assert body["store"]["recorded"] == 1
+    
+    assert client.get("/api/admin/audit?status=6xx", headers=ADMIN).status_code == 422
+    assert client.get("/api/admin/audit?percentile=0", headers=ADMIN).status_code == 422
+    assert client.get("/api/admin/audit", headers={"X-ADMIN-KEY": "wrong"}).status_code == 401
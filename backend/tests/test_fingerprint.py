@@ -0,0 +1,195 @@
+"""
+Tests for failure fingerprints and clusters
+"""
+import os
+import sys
+import pytest
+from fastapi.testclient import TestClient
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Set test environment variables before importing app
+os.environ['ENVIRONMENT'] = 'test'
+os.environ['LOG_LEVEL'] = 'ERROR'
+os.environ['POSTGRES_HOST'] = 'localhost'
+os.environ['CIMEIKA_PARTICIPANT_KEY'] = 'test_api_key_12345'
+
+from main import app
+from app.api import participant
+from app.engines.fingerprint import FailureIndex, fingerprint_log, get_failure_index, normalize_line, text_digest
+
+client = TestClient(app)
+
+NPM_LOG = (
+    "2024-05-01T10:00:01Z npm ERR! code ERESOLVE\n"
+    "10:00:02 npm ERR! /home/runner/work/app/app/node_modules/foo/index.js:12\n"
+    "npm ERR! While resolving: cimeika-frontend@0.1.0\n"
+    "npm ERR! Found: react@18.2.0\n"
+    "npm ERR! Could not resolve dependency: peer react@\"^17.0.0\" from react-dom@17.0.2\n"
+    "npm ERR! Fix the upstream dependency conflict, or retry this command with --force\n"
+    "npm ERR! `npm ci` can only install packages when your package.json and package-lock.json are in sync.\n"
+    "Error: npm ci failed after 4.21s (commit 3fa9c2e1b7)\n"
+)
+
+
+def _rerun(log: str) -> str:
+    """The same failure in another run: other timestamps, paths, durations and hashes"""
+    return (
+        log.replace("2024-05-01T10:00:01Z", "2024-06-11T11:12:13.123+02:00")
+        .replace("10:00:02", "23:59:59")
+        .replace("/home/runner/work/app/app", "/builds/team/app")
+        .replace("4.21s", "17.9s")
+        .replace("3fa9c2e1b7", "deadbeef12")
+    )
+
+
+def _post(text: str, run_id: str):
+    return client.post(
+        "/api/participant/message",
+        headers={"X-API-KEY": "test_api_key_12345"},
+        json={
+            "conversation_id": "fp",
+            "mode": "analysis",
+            "topic": "ci",
+            "input": {"text": text, "metadata": {"source": "ci", "repo": "org/app", "run_id": run_id, "pr": 7}},
+        },
+    )
+
+
+@pytest.fixture(autouse=True)
+def empty_index():
+    get_failure_index().clear()
+    yield
+    get_failure_index().clear()
+
+
+def test_normalize_line_strips_run_specific_parts():
+    """Test that timestamps, hashes, directories and numbers are replaced"""
+    line = "2024-05-01T10:00:01Z ERROR /home/runner/src/app.py:812 sha 3fa9c2e1b7 took 4.21s"
+    
+    assert normalize_line(line) == "<ts> error <path>/app.py:<n> sha <hash> took <n>s"
+
+
+def test_reruns_share_a_fingerprint():
+    """Test that the same failure in two runs gets the same fingerprint"""
+    first = fingerprint_log(NPM_LOG)
+    
+    assert first == fingerprint_log(_rerun(NPM_LOG))
+    assert first.digest != fingerprint_log(NPM_LOG.replace("ERESOLVE", "EUSAGE")).digest
+    assert fingerprint_log("all 212 tests passed\n") is None
+
+
+def test_error_lines_come_from_the_tail():
+    """Test that only the end of a long log is fingerprinted"""
+    log = "Error: early failure\n" + "ok\n" * 1000 + NPM_LOG
+    
+    assert fingerprint_log(log, tail=len(NPM_LOG) + 10) == fingerprint_log(NPM_LOG)
+
+
+def test_index_groups_exact_and_similar_failures():
+    """Test exact, near-duplicate and new fingerprints"""
+    index = FailureIndex()
+    first = fingerprint_log(NPM_LOG)
+    similar = fingerprint_log(NPM_LOG.replace("Found: react@", "Found: vue@"))
+    other = fingerprint_log("Traceback (most recent call last):\nModuleNotFoundError: No module named 'yaml'\n")
+    
+    cluster, match = index.record(first, {"run_id": "1"}, ["npm_lockfile_mismatch"], "v1")
+    assert (match, cluster["seen"], cluster["id"]) == ("new", 1, first.digest)
+    assert index.record(first, {"run_id": "2"})[1] == "exact"
+    cluster, match = index.record(similar, {"run_id": "3"})
+    assert (match, cluster["id"], cluster["seen"], cluster["fingerprints"]) == ("similar", first.digest, 3, 2)
+    assert cluster["first_seen"]["run_id"] == "1" and cluster["last_seen"]["run_id"] == "3"
+    assert index.record(other)[1] == "new"
+    
+    assert index.get(similar.digest)["id"] == first.digest
+    assert index.get("unknown") is None
+
+
+def test_known_rules_need_the_same_log_and_rule_set():
+    """Test that rules are only reused for the exact log and rule set version"""
+    index = FailureIndex()
+    first = fingerprint_log(NPM_LOG)
+    digest = text_digest(NPM_LOG)
+    index.record(first, None, ["npm_lockfile_mismatch"], "v1", digest)
+    # A partial analysis does not overwrite them
+    index.record(first, None, None, "v1", text_digest(_rerun(NPM_LOG)))
+    
+    assert index.known_rules(first, "v1", digest) == ["npm_lockfile_mismatch"]
+    assert index.known_rules(first, "v2", digest) is None
+    assert index.known_rules(first, None, digest) is None
+    # Same error lines, but the rest of the log may match other rules
+    assert index.known_rules(fingerprint_log(_rerun(NPM_LOG)), "v1", text_digest(_rerun(NPM_LOG))) is None
+
+
+def test_least_recently_seen_clusters_are_evicted():
+    """Test that the index stays within max_clusters"""
+    index = FailureIndex(max_clusters=2)
+    logs = [fingerprint_log(f"Error: {word} exploded\n") for word in ("alpha", "beta", "gamma")]
+    for fingerprint in logs:
+        index.record(fingerprint)
+    
+    assert index.get(logs[0].digest) is None
+    assert index.stats()["clusters"] == 2 and index.stats()["evictions"] == 1
+
+
+def test_message_reports_the_failure_cluster():
+    """Test that reruns are clustered"""
+    first = _post(NPM_LOG, "101").json()
+    second = _post(_rerun(NPM_LOG), "102").json()
+    
+    assert first["failure"]["match"] == "new" and not first["failure"]["short_circuit"]
+    assert second["failure"]["match"] == "exact" and not second["failure"]["short_circuit"]
+    assert second["failure"]["cluster"]["seen"] == 2
+    patterns = [m["pattern"] for m in first["outputs"]["matches"]]
+    assert patterns and [m["pattern"] for m in second["outputs"]["matches"]] == patterns
+    assert _post("build ok\n", "103").json()["failure"] is None
+
+
+def test_short_circuit_only_runs_known_rules(monkeypatch):
+    """Test that a log analyzed before limits the analysis to its rules"""
+    monkeypatch.setattr(participant.settings, "FINGERPRINT_SHORT_CIRCUIT", True)
+    _post(NPM_LOG, "201")
+    calls = []
+    analyze = participant.rule_engine.analyze
+    
+    def spy(*args, **kwargs):
+        calls.append(kwargs["rules"])
+        return analyze(*args, **kwargs)
+    
+    monkeypatch.setattr(participant.rule_engine, "analyze", spy)
+    second = _post(NPM_LOG, "202").json()
+    _post(_rerun(NPM_LOG), "203")
+    
+    # The rerun shares the error lines but not the text: all rules run
+    assert calls == [["npm_lockfile_mismatch"], None]
+    assert second["failure"]["short_circuit"]
+
+
+def test_short_circuit_keeps_matches_outside_the_error_lines(monkeypatch):
+    """Test that a log with the same error lines but more matches is fully analyzed"""
+    monkeypatch.setattr(participant.settings, "FINGERPRINT_SHORT_CIRCUIT", True)
+    exit_line = "Error: Process completed with exit code 1.\n"
+    first = _post(exit_line, "401").json()
+    second = _post(
+        "Run was cancelled by user\nworkflow cancelled\nbuild timeout exceeded\n" + exit_line, "402"
+    ).json()
+    
+    assert second["failure"]["fingerprint"] == first["failure"]["fingerprint"]
+    assert not second["failure"]["short_circuit"]
+    assert {m["pattern"] for m in second["outputs"]["matches"]} == {"build_timeout", "cancelled_run"}
+
+
+def test_failure_lookup():
+    """Test that the lookup endpoint says how often a failure was seen"""
+    fingerprint = _post(NPM_LOG, "301").json()["failure"]["fingerprint"]
+    _post(_rerun(NPM_LOG), "302")
+    headers = {"X-API-KEY": "test_api_key_12345"}
+    
+    response = client.get(f"/api/participant/failures/{fingerprint}", headers=headers)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["summary"] == "seen 2 times, first at run 301"
+    assert body["repos"] == ["org/app"] and body["last_seen"]["pr"] == 7
+    assert client.get("/api/participant/failures/0000", headers=headers).status_code == 404
+    assert client.get(f"/api/participant/failures/{fingerprint}").status_code == 422
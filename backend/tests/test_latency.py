@@ -0,0 +1,106 @@
+"""
+Tests for streaming latency percentiles
+"""
+import pytest
+import sys
+import os
+import random
+from fastapi.testclient import TestClient
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Set test environment variables before importing app
+os.environ['ENVIRONMENT'] = 'test'
+os.environ['LOG_LEVEL'] = 'ERROR'
+os.environ['POSTGRES_HOST'] = 'localhost'
+
+from main import app
+from app.core.latency import (
+    LatencyHistogram,
+    LatencySketch,
+    bucket_index,
+    bucket_value,
+)
+
+# Create test client
+client = TestClient(app)
+
+
+def test_bucket_relative_error():
+    """Test that bucket midpoints stay within ~3% of the recorded value"""
+    value = 2e-6
+    while value < 200:
+        estimate = bucket_value(bucket_index(value))
+        assert abs(estimate - value) / value < 0.035
+        value *= 1.37
+
+
+def test_histogram_percentiles_match_exact():
+    """Test percentiles against exact order statistics"""
+    rng = random.Random(42)
+    values = [rng.lognormvariate(-4, 1) for _ in range(20_000)]
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record(value)
+    
+    values.sort()
+    for q in (0.5, 0.9, 0.99, 0.999):
+        exact = values[int(q * len(values)) - 1]
+        assert abs(histogram.quantile(q) - exact) / exact < 0.05
+    assert histogram.count == 20_000
+
+
+def test_histograms_merge_exactly():
+    """Test that merged histograms equal one histogram of all observations"""
+    left, right, both = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+    for i in range(1, 500):
+        value = i / 1000
+        (left if i % 2 else right).record(value)
+        both.record(value)
+    
+    merged = LatencyHistogram().merge(left).merge(right)
+    assert merged.counts == both.counts
+    assert merged.count == both.count
+    assert merged.quantile(0.99) == both.quantile(0.99)
+
+
+def test_sketch_sliding_window():
+    """Test that old sub-windows leave the window"""
+    sketch = LatencySketch()
+    start = 1_700_000_000.0
+    for _ in range(100):
+        sketch.record(1.0, now=start)
+    for _ in range(100):
+        sketch.record(0.01, now=start + 240)
+    
+    assert sketch.snapshot(300, now=start + 240).count == 200
+    assert sketch.snapshot(60, now=start + 240).count == 100
+    assert sketch.snapshot(60, now=start + 240).quantile(0.99) < 0.011
+    assert sketch.snapshot(300, now=start + 600).count == 0
+    
+    # Ring slot reused on the next lap starts empty
+    sketch.record(0.5, now=start + 300)
+    assert sketch.snapshot(300, now=start + 300).count == 101
+
+
+def test_status_reports_route_and_module_percentiles():
+    """Test that /api/status exposes latency per route and module"""
+    for _ in range(5):
+        client.get("/api/v1/ci/seo/states")
+    
+    latency = client.get("/api/status").json()["latency"]
+    
+    route = latency["routes"]["GET /api/v1/ci/seo/states"]["1m"]
+    assert route["count"] >= 5
+    assert 0 < route["p50"] <= route["p90"] <= route["p99"] <= route["p999"]
+    assert latency["modules"]["ci"]["5m"]["count"] >= route["count"]
+
+
+def test_metrics_expose_window_quantiles():
+    """Test that /metrics exposes sliding-window percentiles"""
+    client.get("/api/v1/ci/seo/states")
+    body = client.get("/metrics").text
+    
+    assert 'cimeika_http_request_latency_5m_seconds{method="GET",route="/api/v1/ci/seo/states",module="ci",quantile="0.99"}' in body
+    assert 'cimeika_module_latency_5m_seconds{module="ci",quantile="0.5"}' in body
@@ -0,0 +1,145 @@
+"""
+Tests for structured, queue-based logging
+"""
+import json
+import logging
+import queue
+import sys
+import os
+from datetime import datetime, timezone
+from logging.handlers import QueueListener
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Set test environment variables before importing app
+os.environ['ENVIRONMENT'] = 'test'
+os.environ['LOG_LEVEL'] = 'ERROR'
+os.environ['POSTGRES_HOST'] = 'localhost'
+
+import pytest
+from app.core.logging import DroppingQueueHandler, LogThrottleFilter, StructuredFormatter, parse_sample_rates
+
+
+def _record(msg="hello %s", args=("world",), level=logging.INFO, exc_info=None, extra=None, lineno=42):
+    return logging.getLogger("cimeika.test").makeRecord(
+        "cimeika.test", level, "/app/core/thing.py", lineno, msg, args, exc_info, func="do_thing", extra=extra
+    )
+
+
+def test_structured_formatter_fields():
+    """Test that records become one JSON object with the standard fields"""
+    record = _record()
+    data = json.loads(StructuredFormatter().format(record))
+    
+    assert data["level"] == "INFO"
+    assert data["logger"] == "cimeika.test"
+    assert data["message"] == "hello world"
+    assert data["module"] == "thing"
+    assert data["function"] == "do_thing"
+    assert data["line"] == 42
+    expected = datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="microseconds")
+    assert data["timestamp"] == expected.replace("+00:00", "Z")
+
+
+def test_structured_formatter_escapes_and_extras():
+    """Test quoting, non-ASCII text, extra context and exceptions"""
+    formatter = StructuredFormatter()
+    record = _record('quote " and тест\n', (), extra={"extra": {"user": "x", "n": 1, "when": datetime(2024, 1, 1)}})
+    data = json.loads(formatter.format(record))
+    assert data["message"] == 'quote " and тест\n'
+    assert data["extra"]["user"] == "x"
+    assert data["extra"]["when"] == "2024-01-01 00:00:00"
+    
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = _record("failed", (), exc_info=sys.exc_info())
+    data = json.loads(formatter.format(record))
+    assert "ValueError: boom" in data["exception"]
+    
+    # Cached fields are per call site
+    other = _record(level=logging.WARNING)
+    assert json.loads(formatter.format(other))["level"] == "WARNING"
+
+
+def test_queue_handler_hands_records_to_listener():
+    """Test that records are written by the listener thread"""
+    log_queue = queue.SimpleQueue()
+    received = []
+    
+    class Collect(logging.Handler):
+        def emit(self, record):
+            received.append(self.format(record))
+    
+    sink = Collect()
+    sink.setFormatter(StructuredFormatter())
+    listener = QueueListener(log_queue, sink)
+    listener.start()
+    try:
+        args = ["mutable"]
+        DroppingQueueHandler(log_queue).handle(_record("value=%s", (args,)))
+        args.append("changed later")
+    finally:
+        listener.stop()
+    
+    assert json.loads(received[0])["message"] == "value=['mutable']"
+
+
+def test_queue_handler_drops_when_full():
+    """Test that a full queue drops records instead of blocking"""
+    handler = DroppingQueueHandler(queue.SimpleQueue(), max_size=2)
+    for _ in range(5):
+        handler.handle(_record())
+    
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 3
+
+
+def test_throttle_filter_limits_each_call_site():
+    """Test that a call site is cut off after its burst while others still log"""
+    throttle = LogThrottleFilter(window=10, burst=3)
+    
+    passed = [throttle.filter(_record()) for _ in range(10)]
+    assert passed == [True] * 3 + [False] * 7
+    assert throttle.suppressed == 7
+    assert throttle.filter(_record(lineno=43))
+    assert throttle.filter(_record(level=logging.ERROR))
+
+
+def test_throttle_filter_reports_suppressed_count():
+    """Test that the first record of a new window carries the suppressed count"""
+    throttle = LogThrottleFilter(window=10, burst=1)
+    first = _record()
+    assert throttle.filter(first)
+    for _ in range(4):
+        assert not throttle.filter(_record())
+    
+    later = _record()
+    later.created = first.created + 11
+    assert throttle.filter(later)
+    assert later.getMessage() == "hello world (4 similar messages suppressed in last 10s)"
+    
+    quiet = _record()
+    quiet.created = first.created + 25
+    assert throttle.filter(quiet)
+    assert quiet.getMessage() == "hello world"
+
+
+def test_throttle_filter_samples_info_per_logger():
+    """Test that sampled loggers keep only their share of INFO records"""
+    throttle = LogThrottleFilter(window=10, burst=10_000, sample_rates={"cimeika.test": 0.0})
+    
+    assert not throttle.filter(_record())
+    assert throttle.filter(_record(level=logging.WARNING))
+    assert throttle.sampled_out == 1
+
+
+def test_parse_sample_rates():
+    """Test parsing of LOG_SAMPLE_RATES"""
+    assert parse_sample_rates("") == {}
+    assert parse_sample_rates("a.b=0.1, c=1") == {"a.b": 0.1, "c": 1.0}
+    with pytest.raises(ValueError):
+        parse_sample_rates("a.b")
+    with pytest.raises(ValueError):
+        parse_sample_rates("a.b=2")
@@ -0,0 +1,112 @@
+"""
+Tests for the event loop lag monitor and blocking-call detector
+"""
+import pytest
+import sys
+import os
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Set test environment variables before importing app
+os.environ['ENVIRONMENT'] = 'test'
+os.environ['LOG_LEVEL'] = 'ERROR'
+os.environ['POSTGRES_HOST'] = 'localhost'
+
+from main import app
+from app.core.loop_monitor import BlockingCallError, LoopMonitor
+from app.core.prometheus import LOOP_LAG
+
+# Create test client
+client = TestClient(app)
+
+
+def _monitored_app(strict=False):
+    """Small app whose lifespan runs a fast loop monitor"""
+    monitor = LoopMonitor(interval=0.01, threshold=0.1, strict=strict)
+    
+    @asynccontextmanager
+    async def lifespan(test_app):
+        monitor.start()
+        yield
+        await monitor.stop()
+    
+    test_app = FastAPI(lifespan=lifespan)
+    monitor.app = test_app
+    
+    @test_app.get("/blocking")
+    async def blocking_handler():
+        time.sleep(0.4)
+        return {"ok": True}
+    
+    @test_app.get("/cooperative")
+    async def cooperative_handler():
+        await asyncio.sleep(0.4)
+        return {"ok": True}
+    
+    return test_app, monitor
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_blocking_handler_is_attributed_to_route_and_function():
+    """Test that a blocking call is reported with its route and function"""
+    test_app, monitor = _monitored_app()
+    with TestClient(test_app) as test_client:
+        assert test_client.get("/blocking").status_code == 200
+        assert _wait_for(lambda: monitor.reports)
+    
+    report = monitor.get_reports()[0]
+    assert report["route"] == "/blocking"
+    assert report["function"].startswith("tests/test_loop_monitor.py:blocking_handler:")
+    assert report["blocked_for_ms"] >= 100
+    assert any("time.sleep" in line for line in report["stack"])
+    assert monitor.max_lag >= 0.1
+
+
+def test_cooperative_handler_is_not_reported():
+    """Test that awaiting does not count as blocking"""
+    test_app, monitor = _monitored_app()
+    with TestClient(test_app) as test_client:
+        assert test_client.get("/cooperative").status_code == 200
+        time.sleep(0.05)
+        assert monitor.running
+    
+    assert monitor.get_reports() == []
+    assert not monitor.running
+
+
+def test_strict_mode_fails_loudly():
+    """Test that strict mode raises inside the blocking handler"""
+    test_app, monitor = _monitored_app(strict=True)
+    with TestClient(test_app) as test_client:
+        with pytest.raises(BlockingCallError):
+            test_client.get("/blocking")
+
+
+def test_lag_is_exported():
+    """Test that loop lag samples reach the metrics surface"""
+    before = LOOP_LAG._children[()].snapshot()[0]
+    test_app, monitor = _monitored_app()
+    with TestClient(test_app):
+        time.sleep(0.1)
+    
+    assert sum(LOOP_LAG._children[()].snapshot()[0]) > sum(before)
+    assert "cimeika_event_loop_lag_seconds_bucket" in client.get("/metrics").text
+
+
+def test_status_reports_event_loop():
+    """Test that /api/status includes the event loop summary"""
+    data = client.get("/api/status").json()
+    
+    assert set(data["event_loop"]) == {"running", "lag_ms", "max_lag_ms", "blocks"}
@@ -0,0 +1,135 @@
+"""
+Tests for multi-process metrics aggregation
+"""
+import json
+import pytest
+import sys
+import os
+import subprocess
+from fastapi.testclient import TestClient
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Set test environment variables before importing app
+os.environ['ENVIRONMENT'] = 'test'
+os.environ['LOG_LEVEL'] = 'ERROR'
+os.environ['POSTGRES_HOST'] = 'localhost'
+
+from main import app
+from app.core import metrics, multiprocess
+from app.core.config import settings
+
+# Create test client
+client = TestClient(app)
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# A worker process: serves `n` requests, counts `n` interactions, then
+# writes its state file like the background writer would
+WORKER = """
+import sys
+from fastapi.testclient import TestClient
+from main import app
+from app.core import metrics, multiprocess
+
+n = int(sys.argv[1])
+client = TestClient(app)
+for _ in range(n):
+    metrics.increment_interaction_count()
+    metrics.record_request()
+    assert client.get("/api/v1/ci/seo/intents").status_code == 200
+multiprocess.write_state()
+"""
+
+
+def _run_workers(directory, counts):
+    env = dict(os.environ, METRICS_MULTIPROC_DIR=str(directory), PYTHONPATH=BACKEND_DIR)
+    workers = [
+        subprocess.Popen([sys.executable, "-c", WORKER, str(n)], cwd=BACKEND_DIR, env=env)
+        for n in counts
+    ]
+    for worker in workers:
+        assert worker.wait(timeout=120) == 0
+
+
+def _sample(body, prefix):
+    return sum(float(line.rsplit(" ", 1)[1]) for line in body.splitlines() if line.startswith(prefix))
+
+
+def test_status_and_metrics_sum_across_workers(tmp_path, monkeypatch):
+    """Test that totals from several worker processes add up"""
+    counts = [3, 5, 7]
+    _run_workers(tmp_path, counts)
+    assert len(list(tmp_path.glob("worker_*.json"))) == len(counts)
+    
+    local = metrics.export_state()
+    local_route = metrics.get_rolling_counts(["requests.ci"])["requests.ci"]["5m"]
+    monkeypatch.setattr(settings, "METRICS_MULTIPROC_DIR", str(tmp_path))
+    
+    data = client.get("/api/status").json()
+    assert data["загальна_кількість_взаємодій"] == local["interactions"] + sum(counts)
+    assert data["requests_last_5m"] >= sum(counts)
+    assert data["rolling"]["requests.ci"]["5m"] == local_route + sum(counts)
+    assert data["latency"]["routes"]["GET /api/v1/ci/seo/intents"]["5m"]["count"] >= sum(counts)
+    
+    body = client.get("/metrics").text
+    served = _sample(body, 'cimeika_http_requests_total{method="GET",route="/api/v1/ci/seo/intents",status="200"')
+    assert served >= sum(counts)
+    assert _sample(body, "cimeika_interactions ") == data["загальна_кількість_взаємодій"]
+    # Exited workers do not leave in-progress requests behind
+    assert _sample(body, "cimeika_http_requests_in_progress") == 1
+
+
+def test_exited_workers_are_folded_and_files_read_once(tmp_path, monkeypatch):
+    """Test that exited workers' files are folded into one and each scrape reads them once"""
+    counts = [2, 4]
+    _run_workers(tmp_path, counts)
+    # One of them had been running for a long time
+    old_worker = next(tmp_path.glob("worker_*.json"))
+    payload = json.loads(old_worker.read_text())
+    payload["states"]["metrics"]["start_time"] = 1.0
+    old_worker.write_text(json.dumps(payload))
+    monkeypatch.setattr(settings, "METRICS_MULTIPROC_DIR", str(tmp_path))
+    reads = []
+    read_payloads = multiprocess._read_payloads
+    monkeypatch.setattr(multiprocess, "_read_payloads", lambda: reads.append(1) or read_payloads())
+    
+    first = client.get("/metrics").text
+    assert len(reads) == 1
+    assert not list(tmp_path.glob("worker_*.json"))
+    assert (tmp_path / multiprocess.RETIRED_FILE).exists()
+    
+    second = client.get("/metrics").text
+    served = 'cimeika_http_requests_total{method="GET",route="/api/v1/ci/seo/intents",status="200"'
+    assert _sample(second, served) == _sample(first, served) >= sum(counts)
+    # Uptime is this (live) worker's, not the exited ones'
+    assert _sample(second, "cimeika_uptime_seconds ") <= metrics.get_uptime_seconds() + 1
+    
+    data = client.get("/api/status").json()
+    assert len(reads) == 3
+    assert data["загальна_кількість_взаємодій"] == metrics.get_interaction_count() + sum(counts)
+
+
+def test_disabled_without_directory(monkeypatch):
+    """Test that metrics stay per-process when no directory is configured"""
+    monkeypatch.setattr(settings, "METRICS_MULTIPROC_DIR", None)
+    
+    assert multiprocess.is_enabled() is False
+    assert multiprocess.start() is False
+    assert multiprocess.read_states("metrics") == [metrics.export_state()]
+
+
+def test_writer_thread_flushes_state(tmp_path, monkeypatch):
+    """Test that start() writes a state file and stop() flushes it"""
+    monkeypatch.setattr(settings, "METRICS_MULTIPROC_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "METRICS_SYNC_INTERVAL", 0.05)
+    
+    try:
+        assert multiprocess.start() is True
+        assert (tmp_path / f"worker_{os.getpid()}.json").exists()
+    finally:
+        multiprocess.stop()
+    
+    # Own file is skipped on read: the live state is used instead
+    assert len(multiprocess.read_states("metrics")) == 1
@@ -1,6 +1,7 @@
 """
 Tests for participant API endpoint
 """
+import json
 import pytest
 import sys
 import os
@@ -270,3 +271,117 @@ def test_participant_message_with_artifacts():
     assert response.status_code == 200
     data = response.json()
     assert data["participant"] == "cimeika-api"
+
+
+STREAM_PARAMS = {"conversation_id": "stream-1", "topic": "large log"}
+
+
+def test_participant_stream_plain_text():
+    """Test that a raw log body is analyzed like /message"""
+    log = "step ok\n" * 5000 + "npm ERR! npm ci can only install with an existing lockfile version\n"
+    response = client.post(
+        "/api/participant/message/stream",
+        headers={"X-API-KEY": "test_api_key_12345", "Content-Type": "text/plain"},
+        params=STREAM_PARAMS,
+        content=log.encode()
+    )
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert "lockfile" in data["message"]
+    assert data["stream"]["bytes_received"] == len(log)
+    assert data["stream"]["chars_analyzed"] == len(log)
+    assert data["stream"]["matches"] == ["npm_lockfile_mismatch"]
+
+
+def test_participant_stream_ndjson():
+    """Test that NDJSON records are joined as log lines"""
+    records = ['{"text": "Run pytest"}', '"ModuleNotFoundError: No module named app"', '{"text": "done"}']
+    response = client.post(
+        "/api/participant/message/stream",
+        headers={"X-API-KEY": "test_api_key_12345", "Content-Type": "application/x-ndjson"},
+        params=STREAM_PARAMS,
+        content="\n".join(records).encode()
+    )
+    
+    assert response.status_code == 200
+    assert "import errors" in response.json()["message"]
+
+
+def test_participant_stream_invalid_ndjson():
+    """Test that malformed NDJSON is rejected"""
+    response = client.post(
+        "/api/participant/message/stream",
+        headers={"X-API-KEY": "test_api_key_12345", "Content-Type": "application/x-ndjson"},
+        params=STREAM_PARAMS,
+        content=b'{"text": "ok"}\n{"lines": 3}\n'
+    )
+    
+    assert response.status_code == 400
+
+
+def test_participant_stream_too_large(monkeypatch):
+    """Test that bodies over PARTICIPANT_STREAM_MAX_BYTES are rejected"""
+    from app.api import participant
+    
+    monkeypatch.setattr(participant.settings, "PARTICIPANT_STREAM_MAX_BYTES", 1000)
+    response = client.post(
+        "/api/participant/message/stream",
+        headers={"X-API-KEY": "test_api_key_12345"},
+        params=STREAM_PARAMS,
+        content=b"x" * 1001
+    )
+    
+    assert response.status_code == 413
+
+
+def test_participant_stream_sse_progress(monkeypatch):
+    """Test SSE progress events and early stop at an error-severity match"""
+    from app.api import participant
+    
+    monkeypatch.setattr(participant.settings, "PARTICIPANT_STREAM_WINDOW", 1000)
+    log = "Run flake8: 3 errors\n" + "line\n" * 1000 + "no module named app\n" + "line\n" * 1000
+    response = client.post(
+        "/api/participant/message/stream",
+        headers={"X-API-KEY": "test_api_key_12345", "Accept": "text/event-stream"},
+        params=STREAM_PARAMS,
+        content=log.encode()
+    )
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [
+        (block.split("\n")[0][len("event: "):], json.loads(block.split("\n")[1][len("data: "):]))
+        for block in response.text.strip().split("\n\n")
+    ]
+    assert events[0][0] == "progress"
+    assert events[0][1]["matches"] == ["flake8_errors", "pytest_import_errors"]
+    name, result = events[-1]
+    assert name == "result"
+    assert result["stream"]["stopped_early"] is True
+    assert result["stream"]["windows"] == 6
+    assert result["stream"]["chars_analyzed"] < len(log)
+
+
+def test_participant_message_returns_ranked_matches():
+    """Test that all matching patterns are returned with their locations"""
+    response = client.post(
+        "/api/participant/message",
+        headers={"X-API-KEY": "test_api_key_12345"},
+        json={
+            "conversation_id": "test-matches",
+            "mode": "analysis",
+            "topic": "lint and lockfile",
+            "input": {
+                "text": "flake8 reported 2 errors\nnpm ERR! lockfile version mismatch",
+                "metadata": {"source": "ci"}
+            }
+        }
+    )
+    
+    assert response.status_code == 200
+    data = response.json()
+    matches = data["outputs"]["matches"]
+    assert [m["pattern"] for m in matches] == ["npm_lockfile_mismatch", "flake8_errors"]
+    assert data["message"] == matches[0]["message"]
+    assert matches[0]["locations"][0]["line"] == 2
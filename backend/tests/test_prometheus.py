@@ -0,0 +1,163 @@
+"""
+Tests for the Prometheus metrics surface
+"""
+import gc
+import pytest
+import sys
+import os
+import tracemalloc
+from fastapi.testclient import TestClient
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Set test environment variables before importing app
+os.environ['ENVIRONMENT'] = 'test'
+os.environ['LOG_LEVEL'] = 'ERROR'
+os.environ['POSTGRES_HOST'] = 'localhost'
+os.environ['CIMEIKA_PARTICIPANT_KEY'] = 'test_api_key_12345'
+
+from main import app
+from app.core.prometheus import (
+    DB_STATEMENTS,
+    HTTP_LATENCY,
+    HTTP_REQUESTS,
+    Counter,
+    Gauge,
+    Histogram,
+    Registry,
+    instrument_engine,
+    record_http_request,
+)
+
+# Create test client
+client = TestClient(app)
+
+
+def test_metrics_endpoint_exposition_format():
+    """Test that /metrics serves Prometheus text format"""
+    client.get("/api/status")
+    response = client.get("/metrics")
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    assert "# TYPE cimeika_http_request_duration_seconds histogram" in body
+    assert 'route="/api/status"' in body
+    assert "cimeika_uptime_seconds" in body
+
+
+def test_metrics_use_route_templates():
+    """Test that path parameters do not leak into labels"""
+    client.get("/api/v1/ci/seo/module/not-a-state")
+    body = client.get("/metrics").text
+    
+    assert 'route="/api/v1/ci/seo/module/{state}"' in body
+    assert "not-a-state" not in body
+    assert 'module="ci"' in body
+
+
+def test_unmatched_routes_share_one_label():
+    """Test that 404s do not create a series per path"""
+    client.get("/no/such/path/12345")
+    body = client.get("/metrics").text
+    
+    assert 'route="<unmatched>"' in body
+    assert "12345" not in body
+
+
+def test_participant_analysis_is_recorded():
+    """Test that rule engine analyses show up on the metrics surface"""
+    client.post(
+        "/api/participant/message",
+        headers={"X-API-KEY": "test_api_key_12345"},
+        json={
+            "conversation_id": "metrics",
+            "mode": "analysis",
+            "topic": "metrics",
+            "input": {"text": "npm ci failed", "artifacts": [], "metadata": {"source": "ci"}},
+        },
+    )
+    body = client.get("/metrics").text
+    
+    assert 'cimeika_rule_engine_analyses_total{mode="analysis",severity="error"}' in body
+    assert "cimeika_rule_engine_analysis_duration_seconds_count" in body
+
+
+def test_failed_statements_do_not_shift_db_timings():
+    """Test that a failing statement drops its start time"""
+    from sqlalchemy import create_engine, exc, text
+    
+    engine = create_engine("sqlite://")
+    instrument_engine(engine)
+    selects = DB_STATEMENTS.labels("SELECT").value
+    
+    with engine.connect() as conn:
+        with pytest.raises(exc.OperationalError):
+            conn.execute(text("SELECT * FROM missing"))
+        assert conn.info["cimeika_query_start"] == []
+        conn.execute(text("SELECT 1")).fetchall()
+        assert conn.info["cimeika_query_start"] == []
+    
+    assert DB_STATEMENTS.labels("SELECT").value == selects + 2
+
+
+def test_registry_renders_all_metric_types():
+    """Test counter, gauge and histogram exposition"""
+    registry = Registry()
+    counter = Counter("t_total", "help", ("a",), registry=registry)
+    gauge = Gauge("t_gauge", "help", registry=registry)
+    histogram = Histogram("t_seconds", "help", buckets=(0.1, 1.0), registry=registry)
+    
+    counter.labels('x"y').inc(2)
+    gauge.set(3.5)
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5)
+    
+    body = registry.generate_latest()
+    assert 't_total{a="x\\"y"} 2' in body
+    assert "t_gauge 3.5" in body
+    assert 't_seconds_bucket{le="0.1"} 1' in body
+    assert 't_seconds_bucket{le="1"} 2' in body
+    assert 't_seconds_bucket{le="+Inf"} 3' in body
+    assert "t_seconds_count 3" in body
+
+
+def test_duplicate_metric_names_rejected():
+    """Test that a registry refuses duplicate names"""
+    registry = Registry()
+    Counter("dup_total", "help", registry=registry)
+    with pytest.raises(ValueError):
+        Counter("dup_total", "help", registry=registry)
+
+
+def test_hot_path_recording_allocates_nothing():
+    """Test that recording a known route reuses its cached children
+    
+    The per-request cost is measured by benchmarks/bench_prometheus.py;
+    here only the property behind it is checked: after the first request of
+    a route, recording creates no label children and retains no memory.
+    """
+    route = app.routes[-1]
+    scope = {"type": "http", "method": "GET", "route": route}
+    record_http_request(scope, 200, 0.003)
+    children = len(HTTP_REQUESTS._children), len(HTTP_LATENCY._children)
+    
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    try:
+        gc.collect()
+        before = tracemalloc.get_traced_memory()[0]
+        for _ in range(20_000):
+            record_http_request(scope, 200, 0.003)
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        if started:
+            tracemalloc.stop()
+    
+    assert (len(HTTP_REQUESTS._children), len(HTTP_LATENCY._children)) == children
+    # A few hundred bytes at most when a rolling bucket rolls over; not per request
+    assert retained < 4096
@@ -0,0 +1,162 @@
+"""
+Tests for the quota policy engine
+"""
+import pytest
+import sys
+import os
+from fastapi.testclient import TestClient
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Set test environment variables before importing app
+os.environ['ENVIRONMENT'] = 'test'
+os.environ['LOG_LEVEL'] = 'ERROR'
+os.environ['POSTGRES_HOST'] = 'localhost'
+os.environ['CIMEIKA_PARTICIPANT_KEY'] = 'test_api_key_12345'
+
+from main import app
+from app.core.quota import QuotaEngine, api_key_id
+from app.core.rate_limit import MemoryBackend
+
+# Create test client
+client = TestClient(app)
+
+CONFIG = {
+    "quotas": {
+        "ip": {"key": "ip", "per_minute": 10, "per_hour": 100},
+        "keyed": {
+            "key": "api_key",
+            "per_minute": 5,
+            "overrides": {api_key_id("trusted"): {"per_minute": 50}},
+        },
+    },
+    "rules": [
+        {"path": "/chat", "methods": ["POST"], "quotas": ["ip"], "cost": 5},
+        {"path": "/upload/", "quotas": ["ip", "keyed"], "payload_unit_kb": 1},
+        {"path": "/", "quotas": ["ip"]},
+    ],
+    "exclude": ["/", "/health"],
+}
+
+
+def make_engine():
+    return QuotaEngine(CONFIG, backend=MemoryBackend())
+
+
+def test_bundled_config_loads():
+    """Test that the shipped quota file is valid"""
+    engine = QuotaEngine.from_file(backend=MemoryBackend())
+    
+    assert "ip" in engine.quotas
+    assert "participant" in engine.quotas
+    assert engine.match("/api/participant/message", "POST") is not None
+    assert engine.match("/health", "GET") is None
+
+
+def test_rule_matching_by_path_and_method():
+    """Test that the first rule matching path and method wins"""
+    engine = make_engine()
+    
+    assert engine.match("/chat", "POST").cost == 5
+    assert engine.match("/chat", "GET").cost == 1  # falls through to "/"
+    assert engine.match("/upload/file", "PUT").path == "/upload/"
+    assert engine.match("/", "GET") is None
+    assert engine.match("/health/deep", "GET") is None
+
+
+def test_weighted_cost_shares_one_budget():
+    """Test that expensive routes draw more from the shared IP quota"""
+    engine = make_engine()
+    
+    assert engine.check_request("/chat", "POST", "ip", "1.1.1.1").allowed
+    assert engine.check_request("/chat", "POST", "ip", "1.1.1.1").allowed
+    # 10 units used: a cheap request no longer fits either
+    assert not engine.check_request("/other", "GET", "ip", "1.1.1.1").allowed
+
+
+def test_payload_size_raises_cost():
+    """Test that large bodies cost more"""
+    engine = make_engine()
+    rule = engine.match("/upload/x", "POST")
+    
+    assert rule.cost_for(0) == 1
+    assert rule.cost_for(3 * 1024) == 4
+    
+    # Cost is capped by the quota size, so a huge body is still admissible once
+    result = engine.check(rule, "api_key", "k", content_length=10 * 1024 * 1024)
+    assert result.allowed
+    assert result.remaining == 0
+
+
+def test_key_types_are_charged_separately():
+    """Test that IP quotas and API-key quotas are charged independently"""
+    engine = make_engine()
+    rule = engine.match("/upload/x", "POST")
+    
+    for _ in range(5):
+        assert engine.check(rule, "api_key", "k").allowed
+    assert not engine.check(rule, "api_key", "k").allowed
+    
+    # The IP quota of the same rule is untouched by API-key checks
+    assert engine.check(rule, "ip", "1.1.1.1").remaining == 9
+
+
+def test_rejected_request_charges_no_quota():
+    """Test that quotas charged before a rejecting one are refunded"""
+    engine = QuotaEngine(
+        {
+            "quotas": {
+                "burst": {"key": "ip", "per_minute": 10},
+                "hourly": {"key": "ip", "per_minute": 100, "per_hour": 3},
+            },
+            "rules": [{"path": "/", "quotas": ["burst", "hourly"]}],
+        },
+        backend=MemoryBackend()
+    )
+    
+    assert all(engine.check_request("/x", "GET", "ip", "1.1.1.1").allowed for _ in range(3))
+    for _ in range(20):
+        result = engine.check_request("/x", "GET", "ip", "1.1.1.1")
+        assert not result.allowed and result.limit == 3
+    
+    # Only the three admitted requests count against the burst quota
+    assert engine.quotas["burst"].limiter.check("1.1.1.1", cost=0).remaining == 7
+
+
+def test_api_key_override():
+    """Test per-key overrides and that raw keys are not stored"""
+    backend = MemoryBackend()
+    engine = QuotaEngine(CONFIG, backend=backend)
+    rule = engine.match("/upload/x", "POST")
+    
+    assert sum(engine.check(rule, "api_key", "trusted").allowed for _ in range(20)) == 20
+    assert not any("trusted" in key for key in backend.storage)
+
+
+def test_invalid_config_is_rejected():
+    """Test validation of quota configs"""
+    with pytest.raises(ValueError):
+        QuotaEngine({"quotas": {"q": {"key": "cookie", "per_minute": 1}}}, backend=MemoryBackend())
+    with pytest.raises(ValueError):
+        QuotaEngine({"quotas": {}, "rules": [{"path": "/", "quotas": ["missing"]}]}, backend=MemoryBackend())
+
+
+def test_participant_endpoint_uses_api_key_quota():
+    """Test that the participant endpoint is limited per API key"""
+    payload = {
+        "conversation_id": "quota",
+        "mode": "analysis",
+        "topic": "quota",
+        "input": {"text": "npm ci failed", "artifacts": [], "metadata": {"source": "ci"}},
+    }
+    headers = {"X-API-KEY": "test_api_key_12345"}
+    
+    statuses = []
+    for i in range(31):
+        # Spread over IPs so only the API-key quota can trigger
+        headers["X-Forwarded-For"] = f"10.9.0.{i}"
+        statuses.append(client.post("/api/participant/message", headers=headers, json=payload).status_code)
+    
+    assert statuses[:30] == [200] * 30
+    assert statuses[30] == 429
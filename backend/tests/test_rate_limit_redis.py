@@ -0,0 +1,212 @@
+"""
+Tests for shared (Redis) rate limit backend
+"""
+import asyncio
+import pytest
+import sys
+import os
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.core.quota import QuotaEngine
+from app.core.rate_limit import MemoryBackend, RateLimiter, RateLimitMiddleware
+from app.core.rate_limit_redis import RedisBackend
+
+
+class CountingScript:
+    """Stand-in for a registered Lua script backed by a MemoryBackend"""
+    
+    def __init__(self):
+        self.store = MemoryBackend()
+        self.calls = 0
+        self.fail = False
+    
+    def __call__(self, keys, args):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("redis down")
+        
+        now, pending, cost = float(args[0]), int(args[1]), int(args[2])
+        windows = [
+            (int(args[i]), int(args[i + 1]), "window")
+            for i in range(3, len(args), 2)
+        ]
+        if pending:
+            # Admitted locally before the sync, counted unconditionally
+            self.store.hit(keys[0], [(s, 10**9, l) for s, _, l in windows], pending, now)
+        result = self.store.hit(keys[0], windows, cost, now)
+        if result.allowed:
+            return [1, result.remaining, result.limit]
+        return [0, 1, result.limit, 0, "0"]
+
+
+class StubRedis:
+    """Minimal client exposing register_script"""
+    
+    def __init__(self, script):
+        self.script = script
+    
+    def register_script(self, source):
+        return self.script
+
+
+def test_workers_share_one_quota():
+    """Test that limiters in different workers enforce one combined quota"""
+    script = CountingScript()
+    worker_a = RateLimiter(10, 1000, backend=RedisBackend(StubRedis(script), local_batch=0))
+    worker_b = RateLimiter(10, 1000, backend=RedisBackend(StubRedis(script), local_batch=0))
+    
+    allowed = 0
+    for _ in range(10):
+        allowed += worker_a.check("1.2.3.4", now=0.0).allowed
+        allowed += worker_b.check("1.2.3.4", now=0.0).allowed
+    
+    assert allowed == 10
+
+
+def test_local_batching_cuts_round_trips():
+    """Test that keys with ample quota are pre-counted locally"""
+    script = CountingScript()
+    backend = RedisBackend(StubRedis(script), local_batch=10, sync_interval=1.0)
+    limiter = RateLimiter(1000, None, backend=backend)
+    
+    for _ in range(100):
+        assert limiter.check("1.2.3.4", now=0.5).allowed
+    
+    # One sync per batch of 10 locally admitted requests
+    assert script.calls <= 12
+    
+    # Pending requests are flushed with the next sync
+    limiter.check("1.2.3.4", now=2.0)
+    assert script.store.storage["ratelimit:{ip:1.2.3.4}"][2] >= 100
+
+
+def test_local_batching_stops_near_the_limit():
+    """Test that local pre-counting never admits past the shared limit"""
+    script = CountingScript()
+    backend = RedisBackend(StubRedis(script), local_batch=10)
+    limiter = RateLimiter(20, None, backend=backend)
+    
+    allowed = sum(limiter.check("1.2.3.4", now=0.5).allowed for _ in range(50))
+    
+    assert allowed == 20
+
+
+def test_degrades_to_memory_when_redis_unreachable():
+    """Test that a Redis outage falls back to in-process limits"""
+    script = CountingScript()
+    script.fail = True
+    backend = RedisBackend(StubRedis(script), local_batch=0, retry_interval=5.0)
+    limiter = RateLimiter(3, None, backend=backend)
+    
+    results = [limiter.check("1.2.3.4", now=10.0).allowed for _ in range(5)]
+    
+    # Still limited, and Redis is not retried on every request
+    assert results == [True, True, True, False, False]
+    assert script.calls == 1
+    
+    # Redis is retried after retry_interval
+    script.fail = False
+    assert limiter.check("5.6.7.8", now=16.0).allowed
+    assert script.calls == 2
+
+
+def test_lua_script_sliding_window():
+    """Test the Lua script against an embedded Redis (skipped without fakeredis)"""
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    
+    client = fakeredis.FakeRedis()
+    worker_a = RateLimiter(5, 100, backend=RedisBackend(client, local_batch=0))
+    worker_b = RateLimiter(5, 100, backend=RedisBackend(client, local_batch=0))
+    start = 1_000_040.0  # 20s into a minute window
+    
+    assert all(worker_a.check("k", now=start).allowed for _ in range(3))
+    assert all(worker_b.check("k", now=start).allowed for _ in range(2))
+    
+    denied = worker_b.check("k", now=start)
+    assert not denied.allowed
+    assert not worker_a.check("k", now=start + denied.retry_after - 2).allowed
+    assert worker_a.check("k", now=start + denied.retry_after).allowed
+
+
+def test_pending_requests_survive_a_redis_error():
+    """Test that locally admitted requests are charged once Redis is back"""
+    script = CountingScript()
+    backend = RedisBackend(StubRedis(script), local_batch=10, sync_interval=1.0, retry_interval=5.0)
+    limiter = RateLimiter(1000, None, backend=backend)
+    for _ in range(6):
+        limiter.check("1.2.3.4", now=0.5)
+    synced = script.store.storage["ratelimit:{ip:1.2.3.4}"][2]
+    
+    script.fail = True
+    limiter.check("1.2.3.4", now=1.6)
+    script.fail = False
+    limiter.check("1.2.3.4", now=7.0)
+    
+    # 5 locally admitted before the error, plus the request after recovery
+    assert script.store.storage["ratelimit:{ip:1.2.3.4}"][2] == synced + 5 + 1
+
+
+def test_idle_keys_are_flushed():
+    """Test that pending requests of a key that goes idle are still charged"""
+    script = CountingScript()
+    backend = RedisBackend(StubRedis(script), local_batch=10, sync_interval=1.0)
+    limiter = RateLimiter(1000, None, backend=backend)
+    for _ in range(4):
+        limiter.check("1.2.3.4", now=0.5)
+    
+    assert backend.flush(now=1.0) == 0
+    assert backend.flush(now=1.6) == 1
+    assert script.store.storage["ratelimit:{ip:1.2.3.4}"][2] == 4
+    assert backend.flush(now=3.0) == 0
+    
+    limiter.check("1.2.3.4", now=3.1)
+    backend.stop()
+    assert script.store.storage["ratelimit:{ip:1.2.3.4}"][2] == 5
+
+
+def test_refund_uncounts_pending_and_synced_requests():
+    """Test that refunds come off local pending counts first, then Redis"""
+    script = CountingScript()
+    backend = RedisBackend(StubRedis(script), local_batch=10, sync_interval=60)
+    limiter = RateLimiter(100, None, backend=backend)
+    
+    limiter.check("k", now=0.0)
+    limiter.check("k", now=0.0)
+    limiter.refund("k", now=0.0)
+    assert script.calls == 1
+    limiter.refund("k", now=0.0)
+    assert script.calls == 2
+    
+    backend.flush(now=0.0, force=True)
+    assert script.store.hit("ratelimit:{ip:k}", [(60, 100, "minute")], 0, 0.0).remaining == 100
+
+
+def test_middleware_checks_redis_off_the_event_loop():
+    """Test that Redis round trips of the rate limit middleware leave the event loop free"""
+    class LoopCheckingScript(CountingScript):
+        def __call__(self, keys, args):
+            try:
+                asyncio.get_running_loop()
+                self.on_loop = True
+            except RuntimeError:
+                self.on_loop = False
+            return super().__call__(keys, args)
+    
+    script = LoopCheckingScript()
+    backend = RedisBackend(StubRedis(script), local_batch=0)
+    app = FastAPI()
+    
+    @app.get("/items")
+    async def items():
+        return {}
+    
+    app.add_middleware(RateLimitMiddleware, engine=QuotaEngine.simple(2, None, backend=backend))
+    client = TestClient(app)
+    
+    assert [client.get("/items").status_code for _ in range(3)] == [200, 200, 429]
+    assert script.calls == 3 and script.on_loop is False
@@ -0,0 +1,211 @@
+"""
+Tests for the rule engine result cache
+"""
+import asyncio
+import json
+import os
+import sys
+import pytest
+from fastapi.testclient import TestClient
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Set test environment variables before importing app
+os.environ['ENVIRONMENT'] = 'test'
+os.environ['LOG_LEVEL'] = 'ERROR'
+os.environ['POSTGRES_HOST'] = 'localhost'
+os.environ['CIMEIKA_PARTICIPANT_KEY'] = 'test_api_key_12345'
+
+from main import app
+from app.core import result_cache
+from app.core.result_cache import ENTRY_OVERHEAD, MemoryResultCache, result_key
+from app.core.result_cache_redis import RedisResultCache
+from app.engines import rule_packs
+from app.engines.rule_engine import RuleEngine
+from app.engines.rule_packs import RuleRegistry
+
+client = TestClient(app)
+
+LOG = "Run npm ci\nnpm ERR! npm ci can only install with an existing lockfile\nnpm ci FAILED\n"
+
+
+class StubRedis:
+    """Dict-backed stand-in for redis.Redis get/set"""
+    
+    def __init__(self):
+        self.data = {}
+        self.fail = False
+    
+    def get(self, key):
+        if self.fail:
+            raise ConnectionError("redis down")
+        return self.data.get(key)
+    
+    def set(self, key, value, ex=None):
+        if self.fail:
+            raise ConnectionError("redis down")
+        self.data[key] = value.encode()
+
+
+def test_result_key_is_content_addressed():
+    """Test that keys depend on content, not on artifact order"""
+    a = {"name": "a.log", "content_base64": "YQ=="}
+    b = {"name": "b.log", "content_base64": "Yg=="}
+    key = result_key("v1", "analysis", LOG, [a, b])
+    
+    assert result_key("v1", "analysis", LOG, [b, a]) == key
+    assert result_key("v2", "analysis", LOG, [a, b]) != key
+    assert result_key("v1", "autofix", LOG, [a, b]) != key
+    assert result_key("v1", "analysis", LOG + " ", [a, b]) != key
+    assert result_key("v1", "analysis", LOG, [a]) != key
+    assert result_key("v1", "analysis", LOG) == result_key("v1", "analysis", LOG, [])
+
+
+def test_memory_cache_evicts_least_recently_used_by_bytes():
+    """Test that the cache stays within max_bytes, evicting cold entries"""
+    cache = MemoryResultCache(max_bytes=3 * (100 + ENTRY_OVERHEAD))
+    for key in "abc":
+        cache.set(key, {"k": key}, size=100)
+    assert cache.get("a") is not None
+    
+    cache.set("d", {"k": "d"}, size=100)
+    assert cache.get("b") is None
+    assert [cache.get(key)["k"] for key in "acd"] == ["a", "c", "d"]
+    assert cache.bytes <= cache.max_bytes
+    assert cache.evictions == 1
+    
+    cache.set("huge", {"k": "huge"}, size=10 * cache.max_bytes)
+    assert cache.get("huge") is None
+    assert cache.stats()["entries"] == 3
+
+
+def test_memory_cache_expires_entries(monkeypatch):
+    """Test that entries expire after the TTL"""
+    now = [1000.0]
+    monkeypatch.setattr(result_cache.time, "time", lambda: now[0])
+    cache = MemoryResultCache(ttl=60)
+    cache.set("a", {"k": "a"})
+    
+    now[0] += 59
+    assert cache.get("a") == {"k": "a"}
+    now[0] += 2
+    assert cache.get("a") is None
+    assert cache.bytes == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_engine_serves_repeated_logs_from_cache(tmp_path, monkeypatch):
+    """Test that a repeated log is not analyzed again until the rules change"""
+    pack = tmp_path / "ci.json"
+    rule = {"name": "lockfile", "patterns": ["npm ci.*?failed"], "message": "Lockfile out of sync"}
+    pack.write_text(json.dumps({"name": "ci", "version": "1", "rules": [rule]}))
+    registry = RuleRegistry([str(pack)], interval=0)
+    monkeypatch.setattr(rule_packs, "_registry", registry)
+    
+    cache = MemoryResultCache()
+    engine = RuleEngine(cache=cache)
+    first = engine.analyze(LOG)
+    assert engine.analyze(LOG) is first
+    assert engine.analyze(LOG, mode="autofix") is not first
+    assert (cache.hits, cache.misses) == (1, 2)
+    
+    pack.write_text(json.dumps({"name": "ci", "version": "2", "rules": [{**rule, "message": "Regenerate it"}]}))
+    registry.reload()
+    assert engine.analyze(LOG)["message"] == "Regenerate it"
+    assert cache.misses == 3
+
+
+def test_fixed_patterns_are_not_cached():
+    """Test that engines with fixed patterns bypass the cache"""
+    cache = MemoryResultCache()
+    engine = RuleEngine(RuleEngine().patterns, cache=cache)
+    engine.analyze(LOG)
+    engine.analyze(LOG)
+    
+    assert (cache.hits, cache.misses) == (0, 0)
+
+
+def test_redis_cache_is_shared_between_workers():
+    """Test that a result stored by one worker is a hit in another"""
+    redis = StubRedis()
+    worker_a = RedisResultCache(redis, local=MemoryResultCache())
+    worker_b = RedisResultCache(redis, local=MemoryResultCache())
+    result = {"message": "ok", "severity": "info"}
+    
+    assert worker_a.get("k") is None
+    worker_a.set("k", result)
+    assert worker_b.get("k") == result
+    # Copied into worker B's memory tier
+    redis.data.clear()
+    assert worker_b.get("k") == result
+    assert (worker_b.hits, worker_b.misses) == (2, 0)
+
+
+def test_redis_outage_falls_back_to_memory_tier():
+    """Test that Redis errors lower the hit ratio instead of failing"""
+    redis = StubRedis()
+    cache = RedisResultCache(redis, local=MemoryResultCache(), retry_interval=60)
+    redis.fail = True
+    
+    assert cache.get("k") is None
+    assert not cache.available
+    cache.set("k", {"message": "ok"})
+    assert cache.get("k") == {"message": "ok"}
+    assert cache.stats()["redis_available"] is False
+
+
+def test_undecodable_redis_entry_is_a_miss():
+    """Test that a corrupt Redis entry is a miss, not an error"""
+    redis = StubRedis()
+    cache = RedisResultCache(redis, local=MemoryResultCache())
+    redis.data[cache.prefix + "k"] = b"{not json"
+    
+    assert cache.get("k") is None
+    assert (cache.hits, cache.misses) == (0, 1)
+    assert cache.available
+
+
+def test_redis_lookups_run_off_the_event_loop(monkeypatch):
+    """Test that the message endpoint does not call Redis on the event loop"""
+    class LoopCheckingRedis(StubRedis):
+        def get(self, key):
+            try:
+                asyncio.get_running_loop()
+                self.on_loop = True
+            except RuntimeError:
+                self.on_loop = False
+            return super().get(key)
+    
+    from app.api import participant
+    redis = LoopCheckingRedis()
+    monkeypatch.setattr(participant.rule_engine, "cache", RedisResultCache(redis, local=MemoryResultCache()))
+    body = {"conversation_id": "redis", "mode": "analysis", "topic": "ci", "input": {"text": "ModuleNotFoundError: No module named 'loop'\n"}}
+    response = client.post("/api/participant/message", headers={"X-API-KEY": "test_api_key_12345"}, json=body)
+    
+    assert response.status_code == 200
+    assert redis.on_loop is False
+    assert len(redis.data) == 1
+
+
+def test_status_reports_hit_ratio():
+    """Test that re-posted logs show up as hits in /api/status"""
+    before = client.get("/api/status").json()["result_cache"]
+    assert before["enabled"] is True
+    
+    body = {
+        "conversation_id": "cache",
+        "mode": "analysis",
+        "topic": "retry",
+        "input": {"text": LOG + "unique-to-status-test\n", "artifacts": [], "metadata": {"source": "ci"}},
+    }
+    headers = {"X-API-KEY": "test_api_key_12345"}
+    responses = [client.post("/api/participant/message", headers=headers, json=body) for _ in range(3)]
+    assert all(response.status_code == 200 for response in responses)
+    assert responses[0].json()["outputs"] == responses[2].json()["outputs"]
+    
+    after = client.get("/api/status").json()["result_cache"]
+    assert after["hits"] - before["hits"] == 2
+    assert after["misses"] - before["misses"] == 1
+    assert 0 < after["hit_ratio"] <= 1
+    assert after["entries"] >= 1
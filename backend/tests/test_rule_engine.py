@@ -0,0 +1,174 @@
+"""
+Tests for the rule engine and its literal prefilter
+"""
+import random
+import re
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Set test environment variables before importing app
+os.environ['ENVIRONMENT'] = 'test'
+os.environ['LOG_LEVEL'] = 'ERROR'
+os.environ['POSTGRES_HOST'] = 'localhost'
+
+from app.engines.prefilter import AnchoredRegex, TextScan
+from app.engines.rule_engine import RuleEngine
+
+CI_PATTERNS = RuleEngine().patterns
+
+FRAGMENTS = (
+    "error", "node", "version", "npm ci", "lockfile", "Failed", "run", "Cancelled", "test", "3", "12",
+    "pytest", "ruff", "found", "\n", "\n\n", " ", "x", "abc", "é", "NODE", "İ", "timeout", "exceeded",
+)
+
+
+def _naive_span(regex, text):
+    match = regex.search(text)
+    return match.span() if match else None
+
+
+def test_strategies_of_ci_patterns():
+    """Test that CI patterns are split into literal chains where possible"""
+    plans = {anchored.pattern: anchored for pattern in CI_PATTERNS for anchored in pattern.anchored}
+    
+    chain = plans[r"error.*?node.*?version"]
+    assert chain.strategy == "chain"
+    assert chain.chain == ["error", "node", "version"]
+    assert not chain.needs_regex
+    
+    assert plans[r"ruff.*?\d+\s+error"].needs_regex
+    assert plans[r"ruff.*?\d+\s+error"].literals == ["ruff", "error"]
+    # \s may cross lines, so this one cannot be searched line by line
+    assert plans[r"\d+\s+failed.*?test"].strategy == "gated"
+
+
+def test_prefilter_matches_regex_search():
+    """Test that prefiltered searches return exactly what re.search returns"""
+    extra = [
+        re.compile(r"\d+ (foo|bar)baz", re.IGNORECASE),
+        re.compile(r"[a-z]+ failed", re.IGNORECASE),
+        re.compile(r"^run.*?cancel", re.IGNORECASE),
+        re.compile(r"Error.*?node"),
+        re.compile(r"error.*node", re.IGNORECASE | re.DOTALL),
+        re.compile(r"error.*failed", re.IGNORECASE),
+        re.compile(r"npm ci.*?error.*node", re.IGNORECASE),
+    ]
+    regexes = [anchored.regex for pattern in CI_PATTERNS for anchored in pattern.anchored] + extra
+    plans = [AnchoredRegex(regex) for regex in regexes]
+    rnd = random.Random(7)
+    
+    for _ in range(500):
+        text = "".join(rnd.choice(FRAGMENTS) + rnd.choice(("", " ")) for _ in range(rnd.randrange(1, 30)))
+        scan = TextScan(text)
+        for regex, plan in zip(regexes, plans):
+            assert plan.search(scan) == _naive_span(regex, text), (regex.pattern, text)
+
+
+def test_greedy_gaps_match_like_the_regex():
+    """Test that a greedy gap extends to the last literal on the line"""
+    plan = AnchoredRegex(re.compile(r"a.*b", re.IGNORECASE))
+    assert plan.needs_regex
+    assert plan.search(TextScan("xx a 1 b 2 b")) == (3, 12)
+    
+    plan = AnchoredRegex(re.compile(r"error.*failed", re.IGNORECASE))
+    assert plan.finditer(TextScan("error: step failed, retry failed")) == [(0, 32)]
+
+
+def test_chain_only_matches_within_a_line():
+    """Test that gap patterns never match across lines"""
+    plan = AnchoredRegex(re.compile(r"npm ci.*?failed", re.IGNORECASE))
+    
+    assert plan.search(TextScan("npm ci\nfailed")) is None
+    assert plan.search(TextScan("npm ci ok\nNPM CI step FAILED")) == (10, 28)
+
+
+def test_analyze_single_line_log():
+    """Test that a long single-line log is analyzed without backtracking blowup"""
+    text = " ".join(["Run step ok"] * 20_000) + " ModuleNotFoundError: No module named 'x'"
+    result = RuleEngine().analyze(text)
+    
+    assert "import errors" in result["message"]
+    assert result["severity"] == "error"
+
+
+def test_analyze_non_ascii_log():
+    """Test that non-ASCII logs keep exact offsets"""
+    result = RuleEngine().analyze("İİİ schritt fehlgeschlagen\nnpm ci install FAILED")
+    
+    assert "lockfile" in result["message"]
+
+
+def test_stream_matches_across_chunks():
+    """Test that a match split between windows is found through the look-behind"""
+    analysis = RuleEngine().stream(window=100, lookbehind=50, stop_severity=None)
+    text = "x" * 95 + "\nnpm ci run FAILED\n" + "y" * 300
+    for i in range(0, len(text), 7):
+        analysis.feed(text[i:i + 7])
+    result = analysis.finish()
+    
+    assert analysis.windows > 1
+    assert analysis.chars == len(text)
+    assert "lockfile" in result["message"]
+
+
+def test_stream_stops_at_error_severity():
+    """Test that streaming stops at the first error-severity match"""
+    analysis = RuleEngine().stream(window=100, lookbehind=20)
+    
+    assert not analysis.feed("flake8 error\n" + "a" * 100)
+    assert analysis.matches == ["flake8_errors"]
+    assert analysis.feed("ModuleNotFoundError\n" + "b" * 100)
+    assert analysis.stopped_early
+    assert analysis.feed("c" * 1000)
+    assert analysis.chars == 200
+    assert analysis.matches == ["flake8_errors", "pytest_import_errors"]
+    assert analysis.finish()["severity"] == "error"
+
+
+def test_analyze_ranks_all_matches():
+    """Test that every matching pattern is returned, best-scoring first"""
+    text = (
+        "Run flake8 .\n"
+        "flake8 found 1 error\n"
+        "collected 12 items\n"
+        "ERROR tests/test_api.py - ModuleNotFoundError: No module named 'httpx'\n"
+    )
+    result = RuleEngine().analyze(text)
+    matches = result["outputs"]["matches"]
+    
+    assert [m["pattern"] for m in matches] == ["pytest_import_errors", "flake8_errors"]
+    assert result["message"] == matches[0]["message"]
+    assert matches[0]["score"] > matches[1]["score"]
+    assert matches[0]["count"] == 2
+    location = matches[0]["locations"][0]
+    assert location["line"] == 4
+    assert text[location["start"]:location["end"]].lower() == "modulenotfounderror"
+    assert location["byte_start"] == location["start"]
+    assert "No module named" in location["excerpt"]
+
+
+def test_locations_use_byte_offsets():
+    """Test that byte offsets account for multi-byte characters"""
+    text = "крок 1\nnpm ci FAILED\n"
+    location = RuleEngine().analyze(text)["outputs"]["matches"][0]["locations"][0]
+    
+    assert location["line"] == 2
+    assert location["start"] == 7
+    assert location["byte_start"] == len("крок 1\n".encode("utf-8"))
+    assert location["byte_end"] - location["byte_start"] == len("npm ci FAILED")
+
+
+def test_stream_locations_match_analyze():
+    """Test that streamed match locations use whole-log coordinates"""
+    text = "step ok\n" * 40 + "ModuleNotFoundError: x\n" + "ok\n" * 40 + "no module named y\n"
+    analysis = RuleEngine().stream(window=64, lookbehind=32, stop_severity=None)
+    for i in range(0, len(text), 10):
+        analysis.feed(text[i:i + 10])
+    
+    streamed = analysis.finish()["outputs"]["matches"][0]
+    analyzed = RuleEngine().analyze(text)["outputs"]["matches"][0]
+    assert streamed["count"] == analyzed["count"] == 2
+    assert streamed["locations"] == analyzed["locations"]
@@ -0,0 +1,73 @@
+"""
+Performance regression tests for the rule engine
+
+Runs the synthetic corpus (benchmarks/corpus.py) against the budgets in
+benchmarks/rule_engine_budgets.yaml. On slow machines set PERF_BUDGET_SCALE.
+"""
+import os
+import sys
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Set test environment variables before importing app
+os.environ['ENVIRONMENT'] = 'test'
+os.environ['LOG_LEVEL'] = 'ERROR'
+os.environ['POSTGRES_HOST'] = 'localhost'
+
+from app.engines.rule_engine import CIFailurePattern, RuleEngine
+from benchmarks.corpus import SHAPES, generate
+from benchmarks.perf_rule_engine import check, load_budgets, measure
+
+SIZES = (100, 1_000, 100_000, 1_000_000)
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return RuleEngine(RuleEngine().patterns)
+
+
+@pytest.fixture(scope="module")
+def budgets():
+    return load_budgets()
+
+
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize("shape", SHAPES)
+def test_corpus_matches_expected_rules(engine, shape, size):
+    """Test that every corpus log matches exactly its failure's rules"""
+    log = generate(shape, size)
+    matches = engine.analyze(log.text)["outputs"]["matches"]
+    
+    assert tuple(m["pattern"] for m in matches) == log.expected
+
+
+def test_corpus_is_deterministic():
+    """Test that a (shape, size, seed) always gives the same log"""
+    assert generate("npm", 50_000).text == generate("npm", 50_000).text
+    assert generate("npm", 50_000, seed=1).text != generate("npm", 50_000).text
+    assert len(generate("docker", 50_000).text) == 50_000
+    assert "\n" not in generate("minified", 50_000).text
+
+
+@pytest.mark.parametrize("shape", SHAPES)
+def test_rules_within_budgets(engine, budgets, shape):
+    """Test throughput, memory and per-rule cost on 1MB logs"""
+    log = generate(shape, 1_000_000)
+    
+    assert check(log, measure(engine, log), budgets) == []
+
+
+def test_slow_rule_fails_the_budget(budgets):
+    """Test that a rule without a selective literal shows up as a violation"""
+    # Its only literal is "x", so the regex runs from nearly every line
+    slow = CIFailurePattern(
+        "slow_rule", [r"\w+\s+\w+\s+\d{7}x"], "slow", [{"type": "check", "title": "t", "details": "d"}]
+    )
+    engine = RuleEngine(RuleEngine().patterns + [slow])
+    log = generate("pytest", 200_000)
+    
+    problems = check(log, measure(engine, log, repeats=1), budgets)
+    assert any("rule slow_rule costs" in problem for problem in problems)
+    assert not any("rule test_failures" in problem for problem in problems)
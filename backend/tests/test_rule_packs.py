@@ -0,0 +1,213 @@
+"""
+Tests for rule packs: validation, compiled cache and hot reload
+"""
+import json
+import os
+import sys
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Set test environment variables before importing app
+os.environ['ENVIRONMENT'] = 'test'
+os.environ['LOG_LEVEL'] = 'ERROR'
+os.environ['POSTGRES_HOST'] = 'localhost'
+
+from app.engines import rule_packs
+from app.engines.rule_engine import RuleEngine
+from app.engines.rule_packs import DEFAULT_RULES_PATH, RulePackError, RuleRegistry, load_pack
+
+RULE = {
+    "name": "disk_full",
+    "severity": "error",
+    "patterns": [r"no space left.*?device"],
+    "message": "The runner ran out of disk space.",
+    "actions": [{"type": "suggest", "title": "Free space", "details": "Prune docker images"}],
+}
+
+
+def _write(path, rules, name="local", version="1"):
+    # Replaced atomically, as the registry expects
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps({"format": 1, "name": name, "version": version, "rules": rules}))
+    os.replace(tmp, path)
+    return path
+
+
+def test_bundled_pack_loads():
+    """Test that the bundled pack has the built-in CI rules"""
+    pack = load_pack(DEFAULT_RULES_PATH / "ci.yaml")
+    
+    assert pack.name == "ci"
+    assert [p.name for p in pack.patterns][:2] == ["node_version_mismatch", "npm_lockfile_mismatch"]
+    assert len(pack.patterns) == 10
+    assert all(p.actions for p in pack.patterns)
+
+
+def test_cache_restores_compiled_pack(tmp_path):
+    """Test that a cached pack skips compiling and analyzes the same"""
+    first = load_pack(DEFAULT_RULES_PATH / "ci.yaml", str(tmp_path))
+    second = load_pack(DEFAULT_RULES_PATH / "ci.yaml", str(tmp_path))
+    
+    assert not first.cached and second.cached
+    assert second.digest == first.digest
+    assert [p.to_dict() for p in second.patterns] == [p.to_dict() for p in first.patterns]
+    # Regexes only compile once a search needs them
+    assert all(anchored._regex is None for p in second.patterns for anchored in p.anchored)
+    
+    text = "step 1\nnpm ci FAILED\nModuleNotFoundError: x\n"
+    assert RuleEngine(second.patterns).analyze(text) == RuleEngine(first.patterns).analyze(text)
+    assert any(a._regex is None for p in second.patterns for a in p.anchored if not a.needs_regex)
+
+
+def test_corrupt_cache_is_ignored(tmp_path):
+    """Test that an unreadable cache entry is rebuilt from the pack file"""
+    pack = load_pack(DEFAULT_RULES_PATH / "ci.yaml", str(tmp_path))
+    for entry in tmp_path.iterdir():
+        entry.write_text("{not json")
+    
+    reloaded = load_pack(DEFAULT_RULES_PATH / "ci.yaml", str(tmp_path))
+    assert not reloaded.cached
+    assert len(reloaded.patterns) == len(pack.patterns)
+
+
+def test_tampered_cache_is_rebuilt(tmp_path):
+    """Test that cached rules and plans are validated before use"""
+    load_pack(DEFAULT_RULES_PATH / "ci.yaml", str(tmp_path))
+    [entry] = tmp_path.iterdir()
+    cached = json.loads(entry.read_text())
+    cached["rules"][0]["plans"][0]["strategy"] = "line"
+    cached["rules"][0]["plans"][0]["literals"] = []
+    entry.write_text(json.dumps(cached))
+    assert not load_pack(DEFAULT_RULES_PATH / "ci.yaml", str(tmp_path)).cached
+    
+    cached["rules"][0]["plans"] = None
+    cached["rules"][0]["severity"] = "fatal"
+    entry.write_text(json.dumps(cached))
+    assert not load_pack(DEFAULT_RULES_PATH / "ci.yaml", str(tmp_path)).cached
+
+
+def test_cache_dir_must_be_private(tmp_path):
+    """Test that the cache directory is created 0700 and shared ones are not used"""
+    cache_dir = tmp_path / "cache"
+    load_pack(DEFAULT_RULES_PATH / "ci.yaml", str(cache_dir))
+    assert cache_dir.stat().st_mode & 0o777 == 0o700
+    assert load_pack(DEFAULT_RULES_PATH / "ci.yaml", str(cache_dir)).cached
+    
+    cache_dir.chmod(0o777)
+    assert not load_pack(DEFAULT_RULES_PATH / "ci.yaml", str(cache_dir)).cached
+    
+    link = tmp_path / "link"
+    link.symlink_to(cache_dir)
+    cache_dir.chmod(0o700)
+    assert not load_pack(DEFAULT_RULES_PATH / "ci.yaml", str(link)).cached
+
+
+@pytest.mark.parametrize("change, error", [
+    ({"severity": "fatal"}, "severity must be one of"),
+    ({"patterns": ["(unclosed"]}, "invalid pattern"),
+    ({"patterns": []}, "non-empty list of regexes"),
+    ({"pattern": ["x"]}, "unknown keys ['pattern']"),
+    ({"actions": [{"type": "run", "title": "t", "details": "d"}]}, "action type"),
+    ({"message": ""}, "'message' must be a non-empty string"),
+])
+def test_invalid_rules_are_rejected(tmp_path, change, error):
+    """Test that rule validation errors name the pack and the rule"""
+    path = _write(tmp_path / "local.json", [{**RULE, **change}])
+    
+    with pytest.raises(RulePackError) as excinfo:
+        load_pack(path)
+    assert error in str(excinfo.value)
+    assert str(path) in str(excinfo.value)
+
+
+def test_invalid_packs_are_rejected(tmp_path):
+    """Test pack-level validation"""
+    with pytest.raises(RulePackError, match="duplicate rule names"):
+        load_pack(_write(tmp_path / "dup.json", [RULE, RULE]))
+    
+    path = tmp_path / "noversion.yaml"
+    path.write_text("name: x\nrules: []\n")
+    with pytest.raises(RulePackError, match="'version' is required"):
+        load_pack(path)
+    
+    path.write_text("format: 2\nname: x\nversion: 1\nrules: []\n")
+    with pytest.raises(RulePackError, match="unsupported format"):
+        load_pack(path)
+
+
+def test_later_pack_overrides_rule_in_place(tmp_path):
+    """Test that a rule of a later pack replaces the same-named one"""
+    _write(tmp_path / "10-base.json", [RULE, {**RULE, "name": "other"}], name="base")
+    _write(tmp_path / "20-local.json", [{**RULE, "severity": "warn"}, {**RULE, "name": "extra"}])
+    
+    registry = RuleRegistry([str(tmp_path)])
+    assert [p.name for p in registry.patterns] == ["disk_full", "other", "extra"]
+    assert registry.patterns[0].severity == "warn"
+    
+    _write(tmp_path / "30-clash.json", [RULE], name="base")
+    with pytest.raises(RulePackError, match="already used"):
+        registry.reload()
+
+
+def test_hot_swap_on_change(tmp_path):
+    """Test that changed packs are swapped in and invalid ones are not"""
+    path = _write(tmp_path / "local.json", [RULE])
+    registry = RuleRegistry([str(tmp_path)], cache_dir=str(tmp_path / "cache"), interval=0)
+    rules = registry.rules
+    
+    assert not registry.check()
+    assert registry.rules is rules
+    
+    _write(path, [RULE, {**RULE, "name": "disk_full_again"}], version="2")
+    assert registry.check()
+    assert registry.rules.version != rules.version
+    assert registry.rules.packs[0].version == "2"
+    assert len(registry.patterns) == 2
+    assert registry.reloads == 1
+    
+    swapped = registry.rules
+    _write(path, [{**RULE, "patterns": ["(broken"]}], version="3")
+    assert not registry.check()
+    assert registry.rules is swapped
+    assert registry.failures == 1
+    assert "invalid pattern" in registry.last_error
+    # The broken file is not retried until it changes again
+    assert not registry.check()
+    assert registry.failures == 1
+    
+    _write(path, [RULE], version="4")
+    assert registry.check()
+    assert registry.last_error is None
+    # Unchanged content is reused without parsing it again
+    before = registry.rules.packs[0]
+    (tmp_path / "extra.yaml").write_text("name: extra\nversion: 1\nrules:\n  - name: x\n    patterns: [x]\n    message: x\n")
+    assert registry.check()
+    assert registry.rules.packs[1] is before
+    assert [p.name for p in registry.patterns] == ["x", "disk_full"]
+
+
+def test_analysis_keeps_rules_of_its_start(tmp_path, monkeypatch):
+    """Test that a swap does not change the rules of a running stream"""
+    path = _write(tmp_path / "local.json", [RULE])
+    registry = RuleRegistry([str(path)], interval=0)
+    monkeypatch.setattr(rule_packs, "_registry", registry)
+    engine = RuleEngine()
+    
+    analysis = engine.stream(window=50, stop_severity=None)
+    analysis.feed("no space left on device\n" + "x" * 60)
+    _write(path, [{**RULE, "name": "renamed"}], version="2")
+    assert registry.check()
+    analysis.feed("no space left on device\n")
+    
+    assert analysis.finish()["outputs"]["matches"][0]["pattern"] == "disk_full"
+    assert engine.analyze("no space left on device")["outputs"]["matches"][0]["pattern"] == "renamed"
+
+
+def test_registry_needs_packs(tmp_path):
+    """Test that missing paths and empty directories are errors"""
+    with pytest.raises(RulePackError, match="no such rule pack"):
+        RuleRegistry([str(tmp_path / "missing")]).reload()
+    with pytest.raises(RulePackError, match="No rule packs"):
+        RuleRegistry([str(tmp_path)]).reload()
@@ -0,0 +1,95 @@
+"""
+Tests for per-rule hit and cost statistics
+"""
+import os
+import sys
+import pytest
+from fastapi.testclient import TestClient
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Set test environment variables before importing app
+os.environ['ENVIRONMENT'] = 'test'
+os.environ['LOG_LEVEL'] = 'ERROR'
+os.environ['POSTGRES_HOST'] = 'localhost'
+os.environ['CIMEIKA_ADMIN_KEY'] = 'test_admin_key'
+
+from main import app
+from app.engines.rule_engine import RuleEngine
+from app.engines.rule_stats import RuleStats, rule_stats
+
+client = TestClient(app)
+
+ADMIN = {"X-ADMIN-KEY": "test_admin_key"}
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats():
+    rule_stats.reset()
+    yield
+    rule_stats.reset()
+
+
+def test_record_counts_and_keeps_the_slowest():
+    """Test counters, the slowest evaluations and rules that never ran"""
+    stats = RuleStats(slowest=2)
+    for seconds, chars in ((0.001, 100), (0.004, 4000), (0.002, 200)):
+        stats.record("hot", seconds, chars, 0)
+    stats.record("hot", 0.003, 300, 2)
+    
+    hot, idle = stats.snapshot(["hot", "idle"])
+    assert (hot["pattern"], hot["evaluations"], hot["matches"], hot["match_count"]) == ("hot", 4, 1, 2)
+    assert [(s["ms"], s["chars"]) for s in hot["slowest"]] == [(4.0, 4000), (3.0, 300)]
+    assert hot["max_ms"] == 4.0 and hot["mean_ms"] == 2.5
+    assert hot["ms_per_mb"] == pytest.approx(10 / 0.0046, rel=1e-3)
+    assert (idle["pattern"], idle["evaluations"], idle["slowest"]) == ("idle", 0, [])
+
+
+def test_snapshot_sorting():
+    """Test that the snapshot is ordered by the requested field"""
+    stats = RuleStats()
+    stats.record("slow", 0.5, 10, 0)
+    stats.record("busy", 0.01, 10, 1)
+    stats.record("busy", 0.01, 10, 1)
+    
+    assert [e["pattern"] for e in stats.snapshot(sort="seconds")] == ["slow", "busy"]
+    assert [e["pattern"] for e in stats.snapshot(sort="evaluations")] == ["busy", "slow"]
+
+
+def test_analyses_and_streams_are_recorded():
+    """Test that every rule of an analysis, and of each streamed window, is counted"""
+    engine = RuleEngine()
+    names = engine.get_pattern_names()
+    engine.analyze("npm ci failed\n")
+    analysis = engine.stream(window=64, lookbehind=0, stop_severity=None)
+    analysis.feed("x" * 100)
+    analysis.finish()
+    
+    entries = {entry["pattern"]: entry for entry in rule_stats.snapshot()}
+    assert set(entries) == set(names)
+    assert all(entry["evaluations"] == 3 for entry in entries.values())
+    assert entries["npm_lockfile_mismatch"]["matches"] == 1
+    assert entries["npm_lockfile_mismatch"]["slowest"][0]["chars"] in (14, 64, 100)
+
+
+def test_stats_on_metrics_and_admin():
+    """Test the Prometheus counters and the admin endpoint"""
+    RuleEngine().analyze("npm ci failed\n")
+    
+    body = client.get("/metrics").text
+    assert 'cimeika_rule_pattern_evaluations_total{pattern="npm_lockfile_mismatch"}' in body
+    assert 'cimeika_rule_pattern_matches_total{pattern="npm_lockfile_mismatch"}' in body
+    assert 'cimeika_rule_pattern_seconds_total{pattern="docker_build_failed"}' in body
+    
+    response = client.get("/api/admin/rules/stats?sort=matches", headers=ADMIN)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["patterns"][0]["pattern"] == "npm_lockfile_mismatch"
+    assert "npm_lockfile_mismatch" not in data["never_matched"]
+    assert "docker_build_failed" in data["never_matched"]
+    assert client.get("/api/admin/rules/stats?sort=name", headers=ADMIN).status_code == 422
+    
+    assert client.post("/api/admin/rules/stats/reset", headers=ADMIN).status_code == 200
+    data = client.get("/api/admin/rules/stats", headers=ADMIN).json()
+    assert all(entry["evaluations"] == 0 for entry in data["patterns"])
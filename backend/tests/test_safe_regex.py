@@ -0,0 +1,137 @@
+"""
+Tests for bounded rule regexes and the rule engine CPU budget
+"""
+import os
+import re
+import sys
+import time
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Set test environment variables before importing app
+os.environ['ENVIRONMENT'] = 'test'
+os.environ['LOG_LEVEL'] = 'ERROR'
+os.environ['POSTGRES_HOST'] = 'localhost'
+
+from app.core.config import settings
+from app.core.result_cache import MemoryResultCache
+from app.engines import safe_regex
+from app.engines.prefilter import AnchoredRegex, TextScan
+from app.engines.rule_engine import CIFailurePattern, RuleEngine
+from app.engines.safe_regex import CpuBudget, audit_patterns, bound_repeats, compile_rule_regex, unsafe_reason
+
+# Digits before "failed" make test_failures' \d+\s+failed backtrack at every digit
+ADVERSARIAL = "test failed " + "1" * 200_000
+
+
+@pytest.mark.parametrize("pattern, bounded", [
+    (r"\d+\s+failed.*?test", r"\d{1,100}\s{1,100}failed.*?test"),
+    (r"x{2,}y{3}z{,}w{}v{,4}", r"x{2,100}y{3}z{0,100}w{}v{,4}"),
+    (r"(?:a|b)*?c++[+*]\*", r"(?:a|b){0,100}?c{1,100}+[+*]\*"),
+    (r"(Error:.*)+", r"(Error:.{0,100}){1,100}"),
+])
+def test_bound_repeats(pattern, bounded):
+    """Test that unbounded quantifiers get the limit and everything else is kept"""
+    assert bound_repeats(pattern, 100) == bounded
+    re.compile(bounded)
+
+
+def test_unsafe_reason_flags_nested_repeats():
+    """Test that only repeats of repeats are reported"""
+    assert unsafe_reason(r"(?:\w+\s?)+\d{7}x") == "nested repeat"
+    assert unsafe_reason(r"(a|b+)*c") == "nested repeat"
+    assert unsafe_reason(r"\d+\s+failed.*?test") is None
+    assert unsafe_reason(r"(?:npm ERR!)?\s+code") is None
+
+
+def test_audit_patterns_lists_unsafe_rules():
+    """Test that the audit names the rule and regex"""
+    rule = CIFailurePattern("nested", [r"(?:\w+\s?)+\d{7}x", "safe literal"], "m", [])
+    
+    assert audit_patterns([rule]) == [{"rule": "nested", "pattern": r"(?:\w+\s?)+\d{7}x", "reason": "nested repeat"}]
+    assert audit_patterns(RuleEngine().patterns) == []
+
+
+def test_adversarial_log_completes_quickly():
+    """Test that a log built to make a rule backtrack is analyzed in bounded time"""
+    start = time.process_time()
+    result = RuleEngine(RuleEngine().patterns).analyze(ADVERSARIAL)
+    
+    assert time.process_time() - start < settings.RULE_CPU_BUDGET
+    assert "budget_exceeded" not in result["outputs"]
+    assert [m["pattern"] for m in result["outputs"]["matches"]] == ["test_failures"]
+
+
+def test_long_lines_are_searched_in_windows():
+    """Test that matches past the first window of a long line are found"""
+    anchored = AnchoredRegex(re.compile(r"Error: \w+ failed", re.IGNORECASE))
+    text = "x" * 50_000 + " Error: build failed " + "y" * 50_000
+    
+    assert anchored.search(TextScan(text, max_span=1000)) == (50_001, 50_020)
+    assert anchored.search(TextScan(text)) == (50_001, 50_020)
+
+
+def test_long_lines_retry_chains_past_the_first_window():
+    """Test that a chain whose first try on a long line runs out of span is retried"""
+    anchored = AnchoredRegex(re.compile(r"ruff.*?\d+\s+error", re.IGNORECASE))
+    text = "ruff check . " + "x" * 50_000 + " ruff: 3 errors"
+    
+    assert anchored.strategy == "chain"
+    # The match from the first "ruff" is longer than max_span
+    assert anchored.search(TextScan(text, max_span=1000)) == (50_014, 50_027)
+    assert [m["pattern"] for m in RuleEngine().analyze(text)["outputs"]["matches"]] == ["ruff_linting_errors"]
+
+
+def test_budget_exceeded_is_reported(monkeypatch):
+    """Test that an analysis over its budget stops and names the running rule"""
+    monkeypatch.setattr(settings, "RULE_CPU_BUDGET", 0.01)
+    engine = RuleEngine(cache=MemoryResultCache())
+    patterns = engine.patterns
+    
+    result = engine.analyze(ADVERSARIAL)
+    
+    report = result["outputs"]["budget_exceeded"]
+    names = [pattern.name for pattern in patterns]
+    assert report["pattern"] == "test_failures"
+    assert report["skipped"] == names[names.index("test_failures") + 1:]
+    assert report["cpu_ms"] > report["budget_ms"] == 10
+    # Partial results are not cached
+    assert engine.cache.stats()["entries"] == 0
+
+
+def test_stream_reports_the_first_window_over_budget(monkeypatch):
+    """Test that streamed analyses carry the budget report"""
+    monkeypatch.setattr(settings, "RULE_CPU_BUDGET", 0.01)
+    analysis = RuleEngine(RuleEngine().patterns).stream(window=100_000, stop_severity=None)
+    analysis.feed(ADVERSARIAL)
+    
+    assert analysis.finish()["outputs"]["budget_exceeded"]["pattern"] == "test_failures"
+
+
+def test_budget_reads_the_clock_now_and_then(monkeypatch):
+    """Test that spend() only reads the clock every few steps"""
+    reads = []
+    monkeypatch.setattr(safe_regex.time, "thread_time", lambda: reads.append(1) or len(reads) * 10.0)
+    budget = CpuBudget(5)
+    
+    assert not any(budget.spend(10) for _ in range(safe_regex._CHECK_TICKS - 1))
+    assert len(reads) == 1
+    assert budget.spend(10)
+    assert budget.exceeded and len(reads) == 2
+    assert CpuBudget(0).spend(1 << 30) is False
+
+
+def test_re2_falls_back_to_bounded_re(monkeypatch):
+    """Test that RULE_REGEX_ENGINE=re2 without the package compiles bounded re"""
+    monkeypatch.setattr(settings, "RULE_REGEX_ENGINE", "re2")
+    monkeypatch.setattr(safe_regex, "_re2", None)
+    monkeypatch.setattr(safe_regex, "_re2_missing", False)
+    monkeypatch.setitem(sys.modules, "re2", None)
+    
+    compiled = compile_rule_regex(r"\d+ failed", re.IGNORECASE)
+    
+    assert isinstance(compiled, re.Pattern)
+    assert compiled.pattern == r"\d{1,%d} failed" % settings.RULE_REGEX_MAX_REPEAT
+    assert safe_regex.regex_engine() == "re"
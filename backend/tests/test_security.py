@@ -184,3 +184,104 @@ def test_input_validation_with_pydantic():
     except (ValidationError, TypeError):
         # ValidationError or TypeError for missing required argument
         pass
+
+
+def test_rate_limiter_sliding_window_recovers_under_steady_traffic():
+    """Test that steady traffic does not keep the minute window from rolling"""
+    from app.core.rate_limit import RateLimiter
+    
+    limiter = RateLimiter(requests_per_minute=10, requests_per_hour=10_000)
+    
+    # One request every 5 seconds (12/min) for 10 minutes: the old limiter never
+    # reset its counter because the gap between requests was always < 60s
+    now = 1_000_000.0
+    allowed = 0
+    for _ in range(120):
+        if limiter.check("10.0.0.1", now=now).allowed:
+            allowed += 1
+        now += 5
+    
+    # Roughly 10 of every 12 requests should pass once windows roll
+    assert 90 <= allowed <= 105
+
+
+def test_rate_limiter_retry_after_is_accurate():
+    """Test that Retry-After points at the moment a request is admitted again"""
+    from app.core.rate_limit import RateLimiter
+    
+    limiter = RateLimiter(requests_per_minute=5, requests_per_hour=1000)
+    start = 1_000_040.0  # 20s into a minute window
+    
+    for _ in range(5):
+        assert limiter.check("10.0.0.2", now=start).allowed
+    
+    denied = limiter.check("10.0.0.2", now=start)
+    assert not denied.allowed
+    assert denied.remaining == 0
+    assert denied.retry_after > 0
+    
+    # Still denied just before the hint, admitted at the hint
+    assert not limiter.check("10.0.0.2", now=start + denied.retry_after - 2).allowed
+    assert limiter.check("10.0.0.2", now=start + denied.retry_after).allowed
+
+
+def test_rate_limiter_remaining_counts_down():
+    """Test that remaining quota decreases with each request"""
+    from app.core.rate_limit import RateLimiter
+    
+    limiter = RateLimiter(requests_per_minute=3, requests_per_hour=1000)
+    
+    remaining = [limiter.check("10.0.0.3", now=0.0).remaining for _ in range(3)]
+    assert remaining == [2, 1, 0]
+
+
+def test_rate_limiter_expires_idle_entries():
+    """Test that idle keys are dropped once they can no longer affect limits"""
+    from app.core.rate_limit import RateLimiter
+    
+    limiter = RateLimiter(requests_per_minute=10, requests_per_hour=100)
+    
+    for i in range(5):
+        limiter.check(f"192.168.1.{i}", now=0.0)
+    assert len(limiter.storage) == 5
+    
+    limiter.check("192.168.2.1", now=limiter.idle_ttl + 1)
+    assert list(limiter.storage) == ["ip:192.168.2.1"]
+
+
+def test_rate_limiter_bounded_memory_under_ip_spray():
+    """Stress test: 1M distinct IPs never grow storage past max_entries"""
+    from app.core.rate_limit import RateLimiter
+    
+    limiter = RateLimiter(requests_per_minute=60, requests_per_hour=1000, max_entries=10_000)
+    now = 1_000_000.0
+    
+    # A victim that keeps making requests stays hot in the LRU order
+    for i in range(1_000_000):
+        limiter.check(f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}", now=now)
+        if i % 1000 == 0:
+            limiter.check("203.0.113.7", now=now)
+        now += 0.0001
+    
+    assert len(limiter.storage) <= 10_000
+    assert "ip:203.0.113.7" in limiter.storage
+
+
+def test_rate_limit_headers_on_limited_path():
+    """Test that non-excluded paths carry remaining-quota headers"""
+    response = client.get("/api/v1/modules/")
+    
+    assert response.status_code == 200
+    assert response.headers["X-RateLimit-Limit-Minute"] == "60"
+    assert int(response.headers["X-RateLimit-Remaining"]) == 59
+
+
+def test_rate_limit_429_has_computed_retry_after():
+    """Test that a 429 carries a computed Retry-After header"""
+    for _ in range(60):
+        client.get("/api/v1/modules/")
+    
+    response = client.get("/api/v1/modules/")
+    assert response.status_code == 429
+    assert 1 <= int(response.headers["Retry-After"]) <= 120
+    assert response.headers["X-RateLimit-Remaining"] == "0"
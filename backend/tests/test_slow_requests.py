@@ -0,0 +1,209 @@
+"""
+Tests for slow-request capture
+"""
+import asyncio
+import pytest
+import sys
+import os
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Set test environment variables before importing app
+os.environ['ENVIRONMENT'] = 'test'
+os.environ['LOG_LEVEL'] = 'ERROR'
+os.environ['POSTGRES_HOST'] = 'localhost'
+os.environ['CIMEIKA_ADMIN_KEY'] = 'test_admin_key'
+
+from main import app
+from app.core import slow_requests, tracing
+from app.core.slow_requests import (
+    LatencyBudgets,
+    SlowRequestLog,
+    SlowRequestMiddleware,
+    sanitize_params,
+)
+from app.core.tracing import Tracer, TracingMiddleware
+
+# Create test client
+client = TestClient(app)
+
+ADMIN = {"X-ADMIN-KEY": "test_admin_key"}
+
+
+@pytest.fixture(autouse=True)
+def capture_enabled(monkeypatch):
+    """Slow-request capture is opt-in"""
+    monkeypatch.setattr(slow_requests.settings, "SLOW_REQUEST_CAPTURE", True)
+
+
+@pytest.fixture
+def slow_log(monkeypatch):
+    """Fresh capture log with a tiny budget for the SEO states route"""
+    log = SlowRequestLog(max_entries=10)
+    budgets = LatencyBudgets({"default_ms": 60_000, "routes": {"GET /api/v1/ci/seo/states": 0.001}})
+    monkeypatch.setattr(slow_requests, "slow_request_log", log)
+    monkeypatch.setattr(slow_requests, "_budgets", budgets)
+    monkeypatch.setattr("app.api.admin.slow_request_log", log)
+    monkeypatch.setattr(tracing.tracer, "record", True)
+    return log
+
+
+def _standalone_app(budget_ms: float):
+    """Minimal app with tracing and slow-request capture"""
+    test_app = FastAPI()
+    log = SlowRequestLog()
+    budgets = LatencyBudgets({"default_ms": budget_ms})
+    
+    @test_app.get("/items/{item_id}")
+    async def wait_for_item(item_id: int, password: str = ""):
+        await asyncio.sleep(0.05)
+        return {"item_id": item_id}
+    
+    test_app.add_middleware(SlowRequestMiddleware, budgets=budgets, log=log)
+    test_app.add_middleware(TracingMiddleware, tracer=Tracer(enabled=False, record=True))
+    return test_app, log
+
+
+def test_over_budget_request_is_captured(slow_log):
+    """Test that a slow request is kept with params, status and span tree"""
+    response = client.get("/api/v1/ci/seo/states?lang=uk&api_token=secret-value")
+    assert response.status_code == 200
+    
+    [entry] = slow_log.query()
+    assert entry["method"] == "GET"
+    assert entry["route"] == "/api/v1/ci/seo/states"
+    assert entry["status"] == 200
+    assert entry["duration_ms"] > entry["budget_ms"] == 0.001
+    assert entry["params"]["query"] == {"lang": "uk", "api_token": "[redacted]"}
+    assert "secret-value" not in str(entry)
+    
+    tree = entry["spans"]
+    assert tree["name"] == "GET /api/v1/ci/seo/states"
+    assert "rate_limit.check" in [child["name"] for child in tree["children"]]
+    # Not sampled, so nothing points at an exported trace
+    assert entry["trace_id"] is None
+
+
+def test_within_budget_request_is_not_captured(slow_log):
+    """Test that requests within budget leave no trace"""
+    client.get("/api/v1/ci/")
+    assert slow_log.query() == []
+
+
+def test_slow_requests_admin_endpoints(slow_log):
+    """Test listing and fetching captures through the admin API"""
+    client.get("/api/v1/ci/seo/states")
+    
+    response = client.get("/api/admin/slow-requests?route=/api/v1/ci/seo/states", headers=ADMIN)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["captured"] == 1
+    assert data["budgets"]["routes"]["GET /api/v1/ci/seo/states"] == 0.001
+    [summary] = data["requests"]
+    assert "spans" not in summary
+    
+    detail = client.get(f"/api/admin/slow-requests/{summary['id']}", headers=ADMIN).json()
+    assert detail["route"] == summary["route"]
+    assert detail["spans"]["children"]
+    
+    assert client.get("/api/admin/slow-requests/9999", headers=ADMIN).status_code == 404
+    assert client.get("/api/admin/slow-requests").status_code == 401
+
+
+def test_stack_shows_where_request_waited():
+    """Test that the stack is taken while the request is past its budget"""
+    test_app, log = _standalone_app(budget_ms=10)
+    
+    response = TestClient(test_app).get("/items/7?password=hunter2")
+    assert response.status_code == 200
+    
+    [entry] = log.query()
+    assert entry["route"] == "/items/{item_id}"
+    assert entry["params"] == {"path": {"item_id": "7"}, "query": {"password": "[redacted]"}}
+    assert any(line.endswith("in wait_for_item") for line in entry["stack"])
+    assert entry["stack"][-1].endswith("in sleep")
+
+
+def test_sql_statements_are_captured():
+    """Test that SQL statements and timings are part of the bundle"""
+    from sqlalchemy import create_engine, text
+    
+    engine = create_engine("sqlite://")
+    tracing.instrument_engine(engine)
+    test_app = FastAPI()
+    log = SlowRequestLog()
+    
+    @test_app.get("/report")
+    def report():
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1")).fetchall()
+            conn.execute(text("SELECT 2")).fetchall()
+        return {}
+    
+    test_app.add_middleware(SlowRequestMiddleware, budgets=LatencyBudgets({"default_ms": 0.001}), log=log)
+    test_app.add_middleware(TracingMiddleware, tracer=Tracer(enabled=False, record=True))
+    TestClient(test_app).get("/report")
+    
+    [entry] = log.query()
+    assert [query["statement"] for query in entry["sql"]] == ["SELECT 1", "SELECT 2"]
+    assert entry["sql_ms"] >= 0
+    assert [child["name"] for child in entry["spans"]["children"]] == ["db.query", "db.query"]
+
+
+def test_recorded_spans_are_capped():
+    """Test that an unsampled request records at most max_recorded spans"""
+    tracer = Tracer(enabled=False, record=True, max_recorded=2)
+    
+    spans = []
+    with tracer.start_trace("GET /report") as root:
+        for i in range(4):
+            with tracing.start_span(f"step-{i}") as span:
+                spans.append(span)
+    
+    assert [span.name for span in root.collector] == ["step-0", "step-1"]
+    assert spans[2:] == [tracing.NOOP_SPAN, tracing.NOOP_SPAN]
+
+
+def test_log_is_bounded():
+    """Test that old captures are evicted"""
+    log = SlowRequestLog(max_entries=3)
+    for i in range(5):
+        log.add({"route": "/x", "duration_ms": float(i)})
+    
+    assert [entry["id"] for entry in log.query()] == [5, 4, 3]
+    assert log.captured == 5
+    assert log.get(1) is None
+    assert [entry["id"] for entry in log.query(min_duration_ms=4)] == [5]
+
+
+def test_budget_lookup_and_validation():
+    """Test budget precedence and config validation"""
+    budgets = LatencyBudgets({
+        "default_ms": 1000,
+        "routes": {"POST /api/x": 50, "/api/x": 200},
+    })
+    assert budgets.budget("POST", "/api/x") == 0.05
+    assert budgets.budget("GET", "/api/x") == 0.2
+    assert budgets.budget("GET", "/api/y") == 1.0
+    assert budgets.budget("GET", None) == 1.0
+    assert budgets.shortest == 0.05
+    
+    with pytest.raises(ValueError):
+        LatencyBudgets({"default_ms": 0})
+    with pytest.raises(ValueError):
+        LatencyBudgets({"routes": {"/api/x": "fast"}})
+    
+    # The bundled config loads
+    assert LatencyBudgets.from_file().budget("POST", "/api/v1/ci/chat") == 15.0
+
+
+def test_sanitize_params():
+    """Test that secrets are redacted and long values cut"""
+    params = sanitize_params([("Authorization", "Bearer x"), ("q", "a" * 500), ("page", 2)])
+    
+    assert params["Authorization"] == "[redacted]"
+    assert len(params["q"]) == 203
+    assert params["page"] == "2"
@@ -156,3 +156,51 @@ def test_status_endpoint_performance():
     # Status check should be fast (< 1 second)
     duration = end_time - start_time
     assert duration < 1.0, f"Status check took too long: {duration}s"
+
+
+def test_rolling_counter_counts_beyond_1000_events():
+    """Test that the 5 minute window is exact at high request rates"""
+    from app.core.metrics import RollingSeries
+    
+    series = RollingSeries()
+    start = 1_700_000_000.0
+    # 10 rps for 5 minutes
+    for i in range(3000):
+        series.add(now=start + i * 0.1)
+    
+    now = start + 299.9
+    assert series.count(300, now) == 3000
+    assert series.count(60, now) == 600
+    assert series.count(3600, now) == 3000
+
+
+def test_rolling_counter_expires_old_buckets():
+    """Test that events leave the window and stale slots are recycled"""
+    from app.core.metrics import RollingCounter
+    
+    counter = RollingCounter(buckets=300, bucket_seconds=1)
+    start = 1_700_000_000.0
+    counter.add(5, now=start)
+    counter.add(2, now=start + 100)
+    
+    assert counter.count(300, now=start + 100) == 7
+    assert counter.count(300, now=start + 300) == 2
+    
+    # Same ring slot, next lap: the old count must not leak in
+    counter.add(1, now=start + 300)
+    assert counter.count(300, now=start + 300) == 3
+    assert counter.count(300, now=start + 1000) == 0
+
+
+def test_status_endpoint_rolling_series():
+    """Test that /api/status reports per-module and 429 rolling series"""
+    from app.core.metrics import get_event_count
+    
+    before = get_event_count("requests.ci", 60)
+    client.get("/api/v1/ci/seo/states")
+    
+    data = client.get("/api/status").json()
+    
+    assert get_event_count("requests.ci", 60) == before + 1
+    assert set(data["rolling"]["requests.ci"]) == {"1m", "5m", "1h"}
+    assert data["rolling"]["requests.ci"]["1m"] >= 1
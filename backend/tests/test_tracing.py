@@ -0,0 +1,209 @@
+"""
+Tests for request tracing
+"""
+import pytest
+import sys
+import os
+import json
+import time
+from fastapi.testclient import TestClient
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Set test environment variables before importing app
+os.environ['ENVIRONMENT'] = 'test'
+os.environ['LOG_LEVEL'] = 'ERROR'
+os.environ['POSTGRES_HOST'] = 'localhost'
+os.environ['CIMEIKA_PARTICIPANT_KEY'] = 'test_api_key_12345'
+
+from main import app
+from app.core import tracing
+from app.core.tracing import (
+    NOOP_SPAN,
+    FileExporter,
+    InMemoryExporter,
+    Tracer,
+    parse_traceparent,
+    start_span,
+)
+from app.modules.ci.service import CiService
+
+# Create test client
+client = TestClient(app)
+
+TRACEPARENT = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+
+MESSAGE = {
+    "conversation_id": "trace-1",
+    "mode": "analysis",
+    "topic": "test failure",
+    "input": {"text": "npm ci failed with lockfile error", "artifacts": [], "metadata": {"source": "ci"}}
+}
+
+
+@pytest.fixture
+def exporter(monkeypatch):
+    """Trace every request into a fresh in-memory exporter"""
+    memory = InMemoryExporter()
+    monkeypatch.setattr(tracing.tracer, "enabled", True)
+    monkeypatch.setattr(tracing.tracer, "sample_rate", 1.0)
+    monkeypatch.setattr(tracing.tracer, "exporter", memory)
+    return memory
+
+
+def _spans_by_name(memory):
+    return {span.name: span for span in memory.get_finished_spans()}
+
+
+def test_participant_request_spans(exporter):
+    """Test that one request yields a root span with nested child spans"""
+    response = client.post(
+        "/api/participant/message",
+        headers={"X-API-KEY": "test_api_key_12345"},
+        json=MESSAGE
+    )
+    assert response.status_code == 200
+    
+    spans = _spans_by_name(exporter)
+    root = spans["POST /api/participant/message"]
+    assert root.kind == "SERVER"
+    assert root.parent_id is None
+    assert root.attributes["http.status_code"] == 200
+    assert root.attributes["http.route"] == "/api/participant/message"
+    
+    for name in ("rate_limit.check", "rule_engine.analyze"):
+        assert spans[name].trace_id == root.trace_id
+        assert spans[name].parent_id == root.span_id
+    assert spans["rule_engine.analyze"].attributes["severity"]
+    assert response.headers["traceresponse"] == root.traceparent
+
+
+def test_incoming_traceparent_is_continued(exporter):
+    """Test that a sampled traceparent header continues the caller's trace"""
+    client.get("/api/v1/ci/seo/states", headers={"traceparent": TRACEPARENT})
+    
+    root = _spans_by_name(exporter)["GET /api/v1/ci/seo/states"]
+    assert root.trace_id == "4bf92f3577b34da6a3ce929d0e0e4736"
+    assert root.parent_id == "00f067aa0ba902b7"
+
+
+def test_unsampled_traceparent_is_respected(exporter):
+    """Test that the caller can opt out of tracing"""
+    response = client.get(
+        "/api/v1/ci/seo/states",
+        headers={"traceparent": TRACEPARENT[:-2] + "00"}
+    )
+    
+    assert response.status_code == 200
+    assert exporter.get_finished_spans() == []
+    assert "traceresponse" not in response.headers
+
+
+def test_disabled_tracing_records_nothing(monkeypatch):
+    """Test that disabled tracing leaves requests untouched"""
+    memory = InMemoryExporter()
+    monkeypatch.setattr(tracing.tracer, "enabled", False)
+    monkeypatch.setattr(tracing.tracer, "exporter", memory)
+    
+    response = client.get("/api/v1/ci/seo/states", headers={"traceparent": TRACEPARENT})
+    
+    assert response.status_code == 200
+    assert memory.get_finished_spans() == []
+    assert "traceresponse" not in response.headers
+
+
+def test_sample_rate_zero_traces_nothing(exporter, monkeypatch):
+    """Test that requests without traceparent follow the sample rate"""
+    monkeypatch.setattr(tracing.tracer, "sample_rate", 0.0)
+    client.get("/api/v1/ci/seo/states")
+    
+    assert exporter.get_finished_spans() == []
+
+
+def test_parse_traceparent():
+    """Test W3C traceparent parsing"""
+    assert parse_traceparent(TRACEPARENT) == ("4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7", True)
+    assert parse_traceparent(None) is None
+    assert parse_traceparent("garbage") is None
+    assert parse_traceparent("00-" + "0" * 32 + "-00f067aa0ba902b7-01") is None
+    assert parse_traceparent("00-4bf92f3577b34da6a3ce929d0e0e473z-00f067aa0ba902b7-01") is None
+
+
+def test_service_methods_are_traced():
+    """Test that module service methods open spans inside a trace"""
+    memory = InMemoryExporter()
+    tracer = Tracer(enabled=True, sample_rate=1.0, exporter=memory)
+    service = CiService()
+    service.initialize()
+    
+    # Outside a trace the wrapper only calls through
+    assert service.process({"a": 1})["processed"] is True
+    assert memory.get_finished_spans() == []
+    
+    with tracer.start_trace("job") as root:
+        service.process({"a": 1})
+    
+    spans = _spans_by_name(memory)
+    assert spans["ci.process"].parent_id == root.span_id
+    assert "ci.get_status" not in spans
+
+
+def test_error_status_and_file_export(tmp_path):
+    """Test that exceptions mark spans and the file exporter writes JSON lines"""
+    path = tmp_path / "traces.jsonl"
+    exporter = FileExporter(str(path))
+    tracer = Tracer(enabled=True, sample_rate=1.0, exporter=exporter)
+    
+    with pytest.raises(RuntimeError):
+        with tracer.start_trace("job"):
+            with start_span("step", attempt=1):
+                raise RuntimeError("boom")
+    
+    # Spans are queued on the request path and written by flush()
+    assert not path.exists()
+    assert exporter.flush() == 2
+    assert exporter.flush() == 0
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    step, job = lines
+    assert step["name"] == "step"
+    assert step["parentSpanId"] == job["spanId"]
+    assert step["attributes"] == {"attempt": 1}
+    assert step["status"]["code"] == "STATUS_CODE_ERROR"
+    assert job["endTimeUnixNano"] >= job["startTimeUnixNano"]
+
+
+def test_file_exporter_writer_thread(tmp_path):
+    """Test that the writer thread flushes full batches and the rest on stop"""
+    path = tmp_path / "traces.jsonl"
+    exporter = FileExporter(str(path), flush_interval=60, batch_size=2, max_pending=3)
+    tracer = Tracer(enabled=True, sample_rate=1.0, exporter=exporter)
+    tracer.start()
+    with tracer.start_trace("job"):
+        with start_span("step"):
+            pass
+    for _ in range(100):
+        if exporter.written == 2:
+            break
+        exporter._stop.wait(0.02)
+    assert exporter.written == 2
+    
+    with tracer.start_trace("late"):
+        pass
+    tracer.stop()
+    assert [json.loads(line)["name"] for line in path.read_text().splitlines()] == ["step", "job", "late"]
+
+
+def test_span_outside_trace_is_nearly_free():
+    """Test that instrumentation costs well under a microsecond when not tracing"""
+    assert start_span("x") is NOOP_SPAN
+    
+    best = float("inf")
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(20_000):
+            with start_span("rule_engine.analyze", mode="analysis"):
+                pass
+        best = min(best, (time.perf_counter() - start) / 20_000)
+    
+    assert best < 1e-6